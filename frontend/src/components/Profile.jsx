@@ -111,8 +111,10 @@ export default function Profile() {
         }
     };
 
-    const handleAvatarSuccess = (profileData) => {
-        setUser(prev => ({ ...prev, photo_url: profileData.photo_url }));
+    const handleAvatarSuccess = (profileData, localPreview) => {
+        // photo_pending : vignettes générées en arrière-plan, l'aperçu local les remplace en attendant
+        const photoUrl = profileData.photo_pending ? localPreview : profileData.photo_url;
+        setUser(prev => ({ ...prev, photo_url: photoUrl }));
         setMessage({ type: 'success', text: 'Photo de profil mise à jour.' });
         setTimeout(() => setMessage({ type: '', text: '' }), 3000);
     };
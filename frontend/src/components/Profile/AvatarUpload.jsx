@@ -54,10 +54,12 @@ const AvatarUpload = ({ currentAvatar, name, onUploadSuccess }) => {
                 },
             });
 
+            const localPreview = preview;
             setFile(null);
             setPreview(null);
             if (onUploadSuccess) {
-                onUploadSuccess(response.data);
+                // Aperçu local transmis : affiché tant que les vignettes sont en cours de génération
+                onUploadSuccess(response.data, localPreview);
             }
         } catch (err) {
             console.error('Upload error:', err);
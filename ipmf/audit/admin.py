@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
 from datetime import timedelta
-from .models import AuditLog, ExportHistory, LoginHistory, SystemHealthLog
+from .models import AuditLog, ExportHistory, LoginHistory, SystemHealthLog, DomainEvent
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
@@ -243,4 +243,26 @@ class SystemHealthLogAdmin(admin.ModelAdmin):
         if obj.duree_execution:
             return f"{obj.duree_execution:.2f} ms"
         return "-"
-    duree_execution_format.short_description = 'Durée'
\ No newline at end of file
+    duree_execution_format.short_description = 'Durée'
+
+
+@admin.register(DomainEvent)
+class DomainEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'type', 'aggregate', 'aggregate_id', 'actor', 'status', 'attempts', 'processed_at')
+    list_filter = ('status', 'type', 'aggregate')
+    search_fields = ('type', 'aggregate', 'last_error')
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+    readonly_fields = [field.name for field in DomainEvent._meta.fields]
+    actions = ['relancer']
+
+    def has_add_permission(self, request):
+        return False
+
+    def relancer(self, request, queryset):
+        """Remet en file les événements en échec"""
+        updated = queryset.filter(status=DomainEvent.STATUS_FAILED).update(
+            status=DomainEvent.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} événement(s) remis en file')
+    relancer.short_description = "Relancer les événements en échec"
@@ -1,4 +1,9 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+# Métadonnées dérivées de la pièce justificative (suivie elle-même)
+PIECE_METADATA = ('piece_hash', 'piece_taille', 'piece_mime', 'piece_nom_original', 'piece_valide')
+
 
 class AuditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -8,4 +13,13 @@ class AuditConfig(AppConfig):
     def ready(self):
         # Import des signaux pour l'audit automatique
         #import audit.signals
-        pass
\ No newline at end of file
+        from . import tracking
+
+        # Suivi des modifications (différences d'audit)
+        tracking.register('finances.Depense', 'finances', exclude=PIECE_METADATA)
+        tracking.register('finances.EntreeArgent', 'finances', exclude=PIECE_METADATA)
+        tracking.register('tasks.Tache', 'tasks')
+        tracking.register(
+            settings.AUTH_USER_MODEL, 'users',
+            exclude=('password', 'last_login', 'date_joined', 'date_created', 'date_updated'),
+        )
\ No newline at end of file
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ipmf.events import BATCH_SIZE, process_pending
+
+
+class Command(BaseCommand):
+    help = "Traite les événements métier en attente (notifications et autres effets de bord)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Tourne en continu (processus consommateur)")
+        parser.add_argument('--interval', type=float, default=2, help="Pause (s) quand la file est vide")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Événements par passage")
+
+    def handle(self, *args, **options):
+        while True:
+            results = process_pending(options['batch_size'])
+            if results:
+                self.stdout.write(', '.join(f"{issue} {nombre}" for issue, nombre in sorted(results.items())))
+            if not options['loop']:
+                return
+            close_old_connections()
+            if not results:
+                time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0006_alter_auditlog_method_alter_auditlog_objet_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(max_length=100, verbose_name='Modèle')),
+                ('objet_id', models.PositiveBigIntegerField(verbose_name="ID de l'objet")),
+                ('proprietaire_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Propriétaire')),
+                ('date_suppression', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de suppression')),
+            ],
+            options={
+                'verbose_name': 'Suppression synchronisée',
+                'verbose_name_plural': 'Suppressions synchronisées',
+                'indexes': [models.Index(fields=['modele', 'date_suppression'], name='audit_tombs_modele_acf9d0_idx'), models.Index(fields=['modele', 'proprietaire_id', 'date_suppression'], name='audit_tombs_modele_473bb5_idx'), models.Index(fields=['date_suppression'], name='audit_tombs_date_su_1432f7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0007_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=60, verbose_name='Type')),
+                ('aggregate', models.CharField(max_length=100, verbose_name='Modèle')),
+                ('aggregate_id', models.PositiveBigIntegerField(verbose_name="ID de l'objet")),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Données')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('done', 'Traité'), ('failed', 'Échec')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de traitement')),
+                ('handlers_done', models.JSONField(blank=True, default=list, verbose_name='Traitants exécutés')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='domain_events', to=settings.AUTH_USER_MODEL, verbose_name='Auteur')),
+            ],
+            options={
+                'verbose_name': 'Événement métier',
+                'verbose_name_plural': 'Événements métier',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at', 'id'], name='domainevent_pending_idx'), models.Index(fields=['aggregate', 'aggregate_id', 'created_at'], name='audit_domai_aggrega_d7ef87_idx'), models.Index(fields=['type', 'created_at'], name='audit_domai_type_876219_idx'), models.Index(fields=['status', 'processed_at'], name='audit_domai_status_fa7696_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0008_domainevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='perimetre',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Périmètre'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['modele', 'perimetre', 'date_suppression'], name='audit_tombs_modele_b8c04e_idx'),
+        ),
+    ]
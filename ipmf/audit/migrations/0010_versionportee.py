@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-19 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0009_tombstone_perimetre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionPortee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('portee', models.CharField(max_length=150, unique=True, verbose_name='Portée')),
+                ('jeton', models.CharField(max_length=32, verbose_name='Jeton')),
+            ],
+            options={
+                'verbose_name': 'Version de données',
+                'verbose_name_plural': 'Versions de données',
+            },
+        ),
+    ]
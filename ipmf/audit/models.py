@@ -238,4 +238,105 @@ class SystemHealthLog(models.Model):
         ordering = ['-timestamp']
     
     def __str__(self):
-        return f"{self.type_check} - {self.composant} - {self.niveau}"
\ No newline at end of file
+        return f"{self.type_check} - {self.composant} - {self.niveau}"
+
+class Tombstone(models.Model):
+    """
+    Trace d'une ligne supprimée ou sortie d'un périmètre de visibilité, pour
+    les flux de changements (ipmf/sync.py) : les clients synchronisés
+    retirent l'objet de leur copie locale.
+    Conservée SYNC_TOMBSTONE_DAYS jours (purge_notifications).
+    """
+    modele = models.CharField(max_length=100, verbose_name="Modèle")  # 'finances.depense'
+    objet_id = models.PositiveBigIntegerField(verbose_name="ID de l'objet")
+    # Destinataire des ressources personnelles (notifications, alertes)
+    proprietaire_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="Propriétaire")
+    # Ressources partagées : périmètre restreint qui voyait la ligne ('user:12',
+    # 'role:caisse'...) ; vide : rôles voyant toutes les lignes uniquement
+    perimetre = models.CharField(max_length=50, blank=True, default='', verbose_name="Périmètre")
+    date_suppression = models.DateTimeField(default=timezone.now, verbose_name="Date de suppression")
+
+    class Meta:
+        verbose_name = "Suppression synchronisée"
+        verbose_name_plural = "Suppressions synchronisées"
+        indexes = [
+            models.Index(fields=['modele', 'date_suppression']),
+            models.Index(fields=['modele', 'proprietaire_id', 'date_suppression']),
+            models.Index(fields=['modele', 'perimetre', 'date_suppression']),
+            models.Index(fields=['date_suppression']),
+        ]
+
+    def __str__(self):
+        return f"{self.modele}#{self.objet_id} supprimé le {self.date_suppression:%d/%m/%Y %H:%M}"
+
+
+class VersionPortee(models.Model):
+    """
+    Version courante d'une portée de données pour les ETag (ipmf/etags.py).
+    Renouvelée dans la transaction de l'écriture : commune à tous les
+    processus (workers web, répartiteur, consommateur d'événements).
+    """
+    portee = models.CharField(max_length=150, unique=True, verbose_name="Portée")  # 'finances.depense'
+    jeton = models.CharField(max_length=32, verbose_name="Jeton")
+
+    class Meta:
+        verbose_name = "Version de données"
+        verbose_name_plural = "Versions de données"
+
+    def __str__(self):
+        return f"{self.portee} : {self.jeton}"
+
+
+class DomainEvent(models.Model):
+    """
+    Événement métier (outbox transactionnelle, ipmf/events.py).
+
+    Inséré par les services dans la transaction de la transition : l'événement
+    existe si et seulement si la transition est validée. Le consommateur
+    (process_events) exécute ensuite les effets de bord par lots, au moins
+    une fois ; `handlers_done` évite de rejouer un traitant déjà réussi.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_DONE, 'Traité'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    type = models.CharField(max_length=60, verbose_name="Type")  # 'depense.verifiee'
+    aggregate = models.CharField(max_length=100, verbose_name="Modèle")  # 'finances.depense'
+    aggregate_id = models.PositiveBigIntegerField(verbose_name="ID de l'objet")
+    actor = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='domain_events', verbose_name="Auteur"
+    )
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Données")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Date")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Statut")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Date de traitement")
+    handlers_done = models.JSONField(default=list, blank=True, verbose_name="Traitants exécutés")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+
+    class Meta:
+        verbose_name = "Événement métier"
+        verbose_name_plural = "Événements métier"
+        ordering = ['-created_at']
+        indexes = [
+            # File du consommateur : événements dus uniquement
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='domainevent_pending_idx',
+            ),
+            models.Index(fields=['aggregate', 'aggregate_id', 'created_at']),
+            models.Index(fields=['type', 'created_at']),
+            models.Index(fields=['status', 'processed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.aggregate}#{self.aggregate_id}"
@@ -0,0 +1,529 @@
+"""
+Rapports exportés (Excel, PDF, CSV, JSON) en mémoire bornée.
+
+Un Rapport décrit les colonnes d'un jeu de données (queryset) ; generer()
+parcourt le queryset par paquets (iterator), écrit chaque ligne dans un
+fichier temporaire avec le writer du format demandé, stocke le fichier dans
+ExportHistory.fichier puis retourne l'entrée d'historique. Seuls la ligne en
+cours, une page PDF et les totaux sont en mémoire :
+- Excel : classeur openpyxl en écriture seule (lignes écrites au fil de l'eau) ;
+- PDF : relevé paginé (A4 paysage, en-tête de colonnes répété, totaux en fin),
+  écrit objet par objet sans bibliothèque externe ;
+- CSV / JSON : écrits ligne par ligne (plus de json.dumps d'une liste entière).
+
+Le téléchargement passe par servir() (flux, Range, ETag : ipmf/downloads.py).
+Les rapports financiers sont définis dans finances/reports.py.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import textwrap
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from ipmf.downloads import serve_file
+from .models import ExportHistory
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportErreur(Exception):
+    """Format non supporté ou bibliothèque manquante"""
+
+
+# ============================================================================
+# DÉFINITION DES RAPPORTS
+# ============================================================================
+
+def _chemin(obj, chemin):
+    """Valeur d'un chemin 'created_by.username' (None si un maillon est vide)"""
+    for nom in chemin.split('.'):
+        if obj is None:
+            return None
+        obj = getattr(obj, nom)
+    return obj() if callable(obj) else obj
+
+
+class Colonne:
+    """
+    Colonne d'un rapport : valeur lue par chemin d'attributs (cle) ou par
+    fonction ; largeur relative (PDF, Excel) ; total cumulé en fin de rapport.
+    """
+
+    def __init__(self, cle, titre, valeur=None, largeur=1, total=False):
+        self.cle = cle
+        self.titre = titre
+        self.valeur = valeur or (lambda obj: _chemin(obj, cle))
+        self.largeur = largeur
+        self.total = total
+
+
+class Rapport:
+    titre = ''
+    module = ''
+    nom_fichier = 'rapport'
+    colonnes = ()
+    chunk_size = DEFAULT_CHUNK_SIZE
+
+    def __init__(self, queryset, periode=''):
+        self.queryset = queryset
+        self.periode = periode
+        self._totaux = {}
+
+    def objets(self):
+        return self.queryset.iterator(chunk_size=self.chunk_size)
+
+    def ligne(self, obj):
+        """Valeurs des colonnes ; cumule les totaux"""
+        valeurs = [colonne.valeur(obj) for colonne in self.colonnes]
+        for colonne, valeur in zip(self.colonnes, valeurs):
+            if colonne.total and valeur is not None:
+                self._totaux[colonne.cle] = self._totaux.get(colonne.cle, 0) + valeur
+        return valeurs
+
+    def enregistrement(self, obj):
+        """Objet JSON d'une ligne"""
+        return {colonne.cle: colonne.valeur(obj) for colonne in self.colonnes}
+
+    def totaux(self):
+        """Ligne des totaux (None hors colonnes totalisées), ou None sans colonne totalisée"""
+        if not any(colonne.total for colonne in self.colonnes):
+            return None
+        return [self._totaux.get(colonne.cle, 0) if colonne.total else None for colonne in self.colonnes]
+
+
+def periode(debut=None, fin=None):
+    """Libellé de période d'un rapport"""
+    def _date(valeur):
+        return valeur.strftime('%d/%m/%Y')
+
+    if debut and fin:
+        return f"Du {_date(debut)} au {_date(fin)}"
+    if debut:
+        return f"Depuis le {_date(debut)}"
+    if fin:
+        return f"Jusqu'au {_date(fin)}"
+    return ''
+
+
+class RapportAudit(Rapport):
+    titre = "Journal d'audit"
+    module = 'audit'
+    nom_fichier = 'audit_logs'
+    colonnes = (
+        Colonne('timestamp', 'Date', largeur=1.3),
+        Colonne('action_type', 'Type Action', lambda log: log.get_action_type_display()),
+        Colonne('module', 'Module', lambda log: log.get_module_display()),
+        Colonne('niveau', 'Niveau', lambda log: log.get_niveau_display(), largeur=0.7),
+        Colonne('utilisateur', 'Utilisateur',
+                lambda log: log.utilisateur.get_full_name() if log.utilisateur else 'System', largeur=1.3),
+        Colonne('ip_address', 'IP', lambda log: log.ip_address or 'N/A'),
+        Colonne('objet', 'Objet', lambda log: f"{log.objet_type} ({log.objet_id})" if log.objet_type else 'N/A'),
+        Colonne('message', 'Message',
+                lambda log: log.message[:100] + '...' if len(log.message) > 100 else log.message, largeur=3),
+        Colonne('url', 'URL', lambda log: log.url or 'N/A', largeur=1.5),
+        Colonne('method', 'Méthode', lambda log: log.method or 'N/A', largeur=0.6),
+        Colonne('status_code', 'Statut', lambda log: log.status_code or 'N/A', largeur=0.5),
+    )
+
+    def enregistrement(self, log):
+        # Structure historique de l'export JSON
+        return {
+            'id': log.id,
+            'timestamp': log.timestamp,
+            'action_type': log.action_type,
+            'action_type_display': log.get_action_type_display(),
+            'module': log.module,
+            'module_display': log.get_module_display(),
+            'niveau': log.niveau,
+            'utilisateur': {
+                'id': log.utilisateur.id,
+                'username': log.utilisateur.username,
+                'full_name': log.utilisateur.get_full_name(),
+            } if log.utilisateur else None,
+            'ip_address': log.ip_address,
+            'objet_type': log.objet_type,
+            'objet_id': log.objet_id,
+            'objet_repr': log.objet_repr,
+            'message': log.message,
+            'url': log.url,
+            'method': log.method,
+            'status_code': log.status_code,
+        }
+
+
+# ============================================================================
+# FORMATAGE
+# ============================================================================
+
+def _est_nombre(valeur):
+    return isinstance(valeur, (int, float, Decimal)) and not isinstance(valeur, bool)
+
+
+def _local(valeur):
+    """Datetime local naïf (Excel ne gère pas les fuseaux)"""
+    if isinstance(valeur, datetime) and timezone.is_aware(valeur):
+        return timezone.localtime(valeur).replace(tzinfo=None)
+    return valeur
+
+
+def texte(valeur):
+    """Valeur affichée (PDF) : montants groupés '1 234 567,00', dates françaises"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, bool):
+        return 'Oui' if valeur else 'Non'
+    if isinstance(valeur, (Decimal, float)):
+        return f"{valeur:,.2f}".replace(',', ' ').replace('.', ',')
+    if isinstance(valeur, datetime):
+        return _local(valeur).strftime('%d/%m/%Y %H:%M')
+    if isinstance(valeur, date):
+        return valeur.strftime('%d/%m/%Y')
+    return str(valeur)
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+class ReportWriter:
+    """Écrit un rapport dans un fichier binaire : ouvrir(), ecrire() par ligne, fermer()"""
+
+    extension = ''
+    content_type = 'application/octet-stream'
+    # Lignes de valeurs (Rapport.ligne) ; sinon enregistrements (Rapport.enregistrement)
+    tabulaire = True
+
+    def __init__(self, fichier, rapport, horodatage):
+        self.fichier = fichier
+        self.rapport = rapport
+        self.horodatage = horodatage
+
+    def ouvrir(self):
+        pass
+
+    def ecrire(self, ligne):
+        raise NotImplementedError
+
+    def fermer(self, totaux, lignes):
+        pass
+
+
+class CsvWriter(ReportWriter):
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def ouvrir(self):
+        self._texte = io.TextIOWrapper(self.fichier, encoding='utf-8', newline='')
+        self._csv = csv.writer(self._texte)
+        self._csv.writerow([colonne.titre for colonne in self.rapport.colonnes])
+
+    def ecrire(self, ligne):
+        self._csv.writerow([self._valeur(valeur) for valeur in ligne])
+
+    def _valeur(self, valeur):
+        if isinstance(valeur, datetime):
+            return _local(valeur).strftime('%d/%m/%Y %H:%M:%S')
+        if isinstance(valeur, date):
+            return valeur.strftime('%d/%m/%Y')
+        return '' if valeur is None else valeur
+
+    def fermer(self, totaux, lignes):
+        # Le fichier temporaire reste ouvert pour le stockage
+        self._texte.flush()
+        self._texte.detach()
+
+
+class JsonWriter(ReportWriter):
+    extension = 'json'
+    content_type = 'application/json'
+    tabulaire = False
+
+    def ouvrir(self):
+        self._premier = True
+        self.fichier.write(b'[')
+
+    def ecrire(self, enregistrement):
+        contenu = json.dumps(enregistrement, cls=DjangoJSONEncoder, indent=2, ensure_ascii=False)
+        self.fichier.write((('\n' if self._premier else ',\n') + textwrap.indent(contenu, '  ')).encode())
+        self._premier = False
+
+    def fermer(self, totaux, lignes):
+        self.fichier.write(b']' if self._premier else b'\n]')
+
+
+class XlsxWriter(ReportWriter):
+    """Classeur en écriture seule : les lignes ne sont pas conservées en mémoire"""
+
+    extension = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    FORMAT_MONTANT = '#,##0.00'
+    FORMAT_DATE = 'DD/MM/YYYY'
+    FORMAT_DATE_HEURE = 'DD/MM/YYYY HH:MM'
+    LARGEUR = 14
+
+    def ouvrir(self):
+        try:
+            from openpyxl import Workbook
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font
+            from openpyxl.utils import get_column_letter
+        except ImportError:
+            raise ExportErreur("Le format Excel nécessite openpyxl.")
+        self._cellule = WriteOnlyCell
+        self._gras = Font(bold=True)
+
+        self._classeur = Workbook(write_only=True)
+        self._feuille = self._classeur.create_sheet(self.rapport.titre[:31] or 'Rapport')
+        # Dimensions et volet figé : avant la première ligne en écriture seule
+        for index, colonne in enumerate(self.rapport.colonnes, start=1):
+            self._feuille.column_dimensions[get_column_letter(index)].width = self.LARGEUR * colonne.largeur
+        self._feuille.freeze_panes = 'A2'
+        self._feuille.append([self._cell(colonne.titre, gras=True) for colonne in self.rapport.colonnes])
+
+    def _cell(self, valeur, gras=False):
+        valeur = _local(valeur)
+        cellule = self._cellule(self._feuille, value=valeur)
+        if gras:
+            cellule.font = self._gras
+        if isinstance(valeur, (Decimal, float)):
+            cellule.number_format = self.FORMAT_MONTANT
+        elif isinstance(valeur, datetime):
+            cellule.number_format = self.FORMAT_DATE_HEURE
+        elif isinstance(valeur, date):
+            cellule.number_format = self.FORMAT_DATE
+        return cellule
+
+    def ecrire(self, ligne):
+        self._feuille.append([self._cell(valeur) for valeur in ligne])
+
+    def fermer(self, totaux, lignes):
+        if totaux:
+            self._feuille.append([])
+            ligne = list(totaux)
+            ligne[0] = ligne[0] if ligne[0] is not None else 'Total'
+            self._feuille.append([self._cell(valeur, gras=True) for valeur in ligne])
+        self._classeur.save(self.fichier)
+
+
+class PdfWriter(ReportWriter):
+    """
+    Relevé PDF paginé, polices standard Helvetica (WinAnsi) : les objets sont
+    écrits au fil de l'eau, seule la page en cours est en mémoire. Textes
+    tronqués à la largeur de leur colonne.
+    """
+
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    LARGEUR, HAUTEUR = 842, 595  # A4 paysage (points)
+    MARGE = 36
+    TAILLE = 7.5
+    INTERLIGNE = 11
+
+    # Objets réservés : catalogue, arbre des pages, polices normale et grasse
+    CATALOGUE, PAGES, POLICE, POLICE_GRASSE = 1, 2, 3, 4
+
+    def ouvrir(self):
+        self._position = 0
+        self._positions = {}
+        self._pages = []
+        self._suivant = 5
+        self._page = None
+
+        utile = self.LARGEUR - 2 * self.MARGE
+        poids = sum(colonne.largeur for colonne in self.rapport.colonnes)
+        self._colonnes = []
+        x = self.MARGE
+        for colonne in self.rapport.colonnes:
+            largeur = utile * colonne.largeur / poids
+            self._colonnes.append((x, largeur))
+            x += largeur
+
+        self._ecrire(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for numero, police in ((self.POLICE, 'Helvetica'), (self.POLICE_GRASSE, 'Helvetica-Bold')):
+            self._objet(numero, (
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{police} /Encoding /WinAnsiEncoding >>'
+            ).encode())
+        self._nouvelle_page()
+
+    # --- Bas niveau -----------------------------------------------------
+
+    def _ecrire(self, donnees):
+        self.fichier.write(donnees)
+        self._position += len(donnees)
+
+    def _objet(self, numero, corps):
+        self._positions[numero] = self._position
+        self._ecrire(b'%d 0 obj\n' % numero + corps + b'\nendobj\n')
+
+    def _reserver(self):
+        numero = self._suivant
+        self._suivant += 1
+        return numero
+
+    @staticmethod
+    def _chaine(valeur):
+        donnees = valeur.encode('cp1252', 'replace')
+        return b'(' + donnees.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+    @staticmethod
+    def _largeur_texte(valeur, taille):
+        """Largeur approchée en points (métriques Helvetica arrondies, par excès)"""
+        largeur = 0
+        for caractere in valeur:
+            if caractere in " .,:;'!|iljtfrI-()/[]":
+                largeur += 0.33
+            elif caractere in 'mwMW@%':
+                largeur += 0.89
+            elif caractere.isupper():
+                largeur += 0.72
+            else:
+                largeur += 0.56
+        return largeur * taille
+
+    def _texte(self, x, y, valeur, gras=False, taille=None, largeur=None, droite=False):
+        taille = taille or self.TAILLE
+        if largeur is not None:
+            maximum = largeur - 4
+            if self._largeur_texte(valeur, taille) > maximum:
+                while valeur and self._largeur_texte(valeur + '…', taille) > maximum:
+                    valeur = valeur[:-1]
+                valeur += '…'
+            if droite:
+                x += largeur - 4 - self._largeur_texte(valeur, taille)
+        police = 'F2' if gras else 'F1'
+        self._page.append(
+            b'BT /%s %.1f Tf %.2f %.2f Td %s Tj ET' % (police.encode(), taille, x, y, self._chaine(valeur))
+        )
+
+    def _trait(self, y):
+        self._page.append(b'0.5 w %.2f %.2f m %.2f %.2f l S' % (self.MARGE, y, self.LARGEUR - self.MARGE, y))
+
+    # --- Pages ----------------------------------------------------------
+
+    def _nouvelle_page(self):
+        self._page = []
+        numero = len(self._pages) + 1
+        y = self.HAUTEUR - self.MARGE
+        self._texte(self.MARGE, y - 10, self.rapport.titre, gras=True, taille=13)
+        sous_titre = ' - '.join(filter(None, [
+            self.rapport.periode, f"Édité le {texte(self.horodatage)}",
+        ]))
+        self._texte(self.MARGE, y - 24, sous_titre, taille=8)
+        self._texte(self.LARGEUR - self.MARGE - 40, self.MARGE - 16, f"Page {numero}", taille=7)
+
+        self._y = y - 44
+        self._ligne([colonne.titre for colonne in self.rapport.colonnes], gras=True)
+        self._trait(self._y + self.INTERLIGNE - 3)
+
+    def _terminer_page(self):
+        contenu = b'\n'.join(self._page)
+        flux = self._reserver()
+        self._objet(flux, b'<< /Length %d >>\nstream\n' % len(contenu) + contenu + b'\nendstream')
+        page = self._reserver()
+        self._objet(page, (
+            f'<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {self.LARGEUR} {self.HAUTEUR}] '
+            f'/Resources << /Font << /F1 {self.POLICE} 0 R /F2 {self.POLICE_GRASSE} 0 R >> >> '
+            f'/Contents {flux} 0 R >>'
+        ).encode())
+        self._pages.append(page)
+        self._page = None
+
+    def _ligne(self, valeurs, gras=False):
+        for (x, largeur), valeur in zip(self._colonnes, valeurs):
+            self._texte(x + 2, self._y, texte(valeur), gras=gras, largeur=largeur, droite=_est_nombre(valeur))
+        self._y -= self.INTERLIGNE
+
+    def ecrire(self, ligne):
+        if self._y < self.MARGE:
+            self._terminer_page()
+            self._nouvelle_page()
+        self._ligne(ligne)
+
+    def fermer(self, totaux, lignes):
+        if self._y < self.MARGE + 3 * self.INTERLIGNE:
+            self._terminer_page()
+            self._nouvelle_page()
+        self._trait(self._y + self.INTERLIGNE - 3)
+        if totaux:
+            ligne = list(totaux)
+            ligne[0] = ligne[0] if ligne[0] is not None else 'Total'
+            self._ligne(ligne, gras=True)
+        self._texte(self.MARGE, self._y - 4, f"{lignes} ligne(s)", taille=8)
+        self._terminer_page()
+
+        kids = ' '.join(f'{page} 0 R' for page in self._pages)
+        self._objet(self.PAGES, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>'.encode())
+        self._objet(self.CATALOGUE, f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode())
+
+        xref = self._position
+        lignes_xref = [b'xref\n0 %d\n' % self._suivant, b'0000000000 65535 f \n']
+        lignes_xref += [b'%010d 00000 n \n' % self._positions[numero] for numero in range(1, self._suivant)]
+        self._ecrire(b''.join(lignes_xref))
+        self._ecrire(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            self._suivant, self.CATALOGUE, xref
+        ))
+
+
+WRITERS = {
+    'excel': XlsxWriter,
+    'pdf': PdfWriter,
+    'csv': CsvWriter,
+    'json': JsonWriter,
+}
+
+
+# ============================================================================
+# GÉNÉRATION
+# ============================================================================
+
+def generer(rapport, format_export, utilisateur, parametres=None, ip_address=None):
+    """
+    Écrit le rapport au format demandé ('excel', 'pdf', 'csv', 'json') et
+    l'enregistre dans l'historique des exports (fichier, lignes, taille).
+    """
+    writer_class = WRITERS.get(format_export)
+    if writer_class is None:
+        raise ExportErreur(f"Format non supporté. Utilisez : {', '.join(WRITERS)}.")
+
+    horodatage = timezone.now()
+    with tempfile.TemporaryFile() as fichier:
+        writer = writer_class(fichier, rapport, horodatage)
+        writer.ouvrir()
+        lignes = 0
+        for obj in rapport.objets():
+            writer.ecrire(rapport.ligne(obj) if writer.tabulaire else rapport.enregistrement(obj))
+            lignes += 1
+        writer.fermer(rapport.totaux(), lignes)
+
+        taille = fichier.seek(0, os.SEEK_END)
+        fichier.seek(0)
+        export = ExportHistory(
+            utilisateur=utilisateur,
+            timestamp=horodatage,
+            format=format_export,
+            module=rapport.module,
+            parametres=parametres or {},
+            nombre_lignes=lignes,
+            taille_fichier=taille,
+            ip_address=ip_address,
+        )
+        nom = f"{rapport.nom_fichier}_{timezone.localtime(horodatage):%Y%m%d_%H%M%S}.{writer.extension}"
+        export.fichier.save(nom, File(fichier, name=nom), save=False)
+        export.save()
+    return export
+
+
+def servir(request, export):
+    """Téléchargement en flux d'un export généré"""
+    extension = os.path.splitext(export.fichier.name)[1].lstrip('.')
+    content_type = next(
+        (writer.content_type for writer in WRITERS.values() if writer.extension == extension), None
+    )
+    return serve_file(request, export.fichier, content_type=content_type, size=export.taille_fichier)
@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
@@ -82,42 +82,8 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-# Vous pouvez ajouter d'autres signaux pour auditer les modifications sur les modèles spécifiques
-@receiver(pre_save, sender=User)
-def log_user_changes(sender, instance, **kwargs):
-    """Journalise les modifications des utilisateurs"""
-    if instance.pk:
-        try:
-            ancien = User.objects.get(pk=instance.pk)
-            differences = {}
-            
-            # Comparer les champs modifiés
-            for field in ['username', 'email', 'first_name', 'last_name', 'role', 'is_active']:
-                ancienne_valeur = getattr(ancien, field)
-                nouvelle_valeur = getattr(instance, field)
-                
-                if ancienne_valeur != nouvelle_valeur:
-                    differences[field] = {
-                        'old': str(ancienne_valeur),
-                        'new': str(nouvelle_valeur)
-                    }
-            
-            if differences:
-                AuditLog.log_action(
-                    action_type='update',
-                    module='users',
-                    message=f"Modification de l'utilisateur {instance.username}",
-                    utilisateur=instance,  # Celui qui modifie (peut être différent)
-                    objet_type='User',
-                    objet_id=instance.pk,
-                    objet_repr=str(instance),
-                    anciennes_valeurs={k: v['old'] for k, v in differences.items()},
-                    nouvelles_valeurs={k: v['new'] for k, v in differences.items()},
-                    differences=differences
-                )
-                
-        except User.DoesNotExist:
-            pass
+# Les modifications des utilisateurs (et des dépenses, entrées, missions) sont
+# journalisées par le suivi par instantané : audit/tracking.py
 
 @receiver(post_save, sender=User)
 def log_user_creation(sender, instance, created, **kwargs):
@@ -1,3 +1,230 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from audit.models import AuditLog, DomainEvent, ExportHistory
+from ipmf import events, throttling
+from notifications.models import Notification
+from tasks.models import DemandeReport, Tache
+from tasks.services import TacheService
+
+User = get_user_model()
+
+
+class DomainEventTest(TestCase):
+    """Outbox : événements écrits avec la transition, effets par le consommateur"""
+
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_events', password='pwd', role='dg')
+        self.agent = User.objects.create_user(username='agent_events', password='pwd', role='agent')
+        self.tache = Tache.objects.create(
+            titre="Mission", description="-", createur=self.dg,
+            date_echeance=timezone.now() + timedelta(days=3),
+        )
+
+    def test_transition_puis_consommateur(self):
+        self.tache.agents_assignes.add(self.agent)
+        TacheService.demarrer(self.tache, self.agent)
+
+        event = DomainEvent.objects.get(type='tache.en_cours')
+        self.assertEqual((event.aggregate, event.aggregate_id), ('tasks.tache', self.tache.pk))
+        self.assertEqual(event.payload, {'de': 'creee', 'vers': 'en_cours'})
+        self.assertEqual(event.actor, self.agent)
+        # Rien n'est envoyé sur le chemin de la requête
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(events.process_pending()['traites'], 2)
+        self.assertEqual(list(Notification.objects.values_list('recipient__username', 'title')), [
+            ('agent_events', "Nouvelle tâche assignée"),
+        ])
+        self.assertFalse(DomainEvent.objects.filter(status=DomainEvent.STATUS_PENDING).exists())
+        self.assertEqual(events.process_pending(), {})
+
+    def test_annulation_de_la_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            TacheService.annuler(self.tache, self.dg)
+            raise RuntimeError
+        self.assertFalse(DomainEvent.objects.exists())
+
+    def test_reprise_apres_echec(self):
+        appels = []
+        ok = lambda lot: appels.extend(e.pk for e in lot)
+        fragile = mock.Mock(side_effect=[OSError("indisponible"), OSError("indisponible"), None])
+        fragile.__module__, fragile.__qualname__ = 'tests', 'fragile'
+        with mock.patch.dict(events._handlers, {'test.evenement': [ok, fragile]}):
+            event = events.publish('test.evenement', self.tache, self.dg)
+            with self.assertLogs('ipmf.events', 'WARNING'):
+                self.assertEqual(events.process_pending()['reportes'], 1)
+            event.refresh_from_db()
+            self.assertEqual(event.status, DomainEvent.STATUS_PENDING)
+            self.assertGreater(event.next_attempt_at, timezone.now())
+            self.assertEqual(event.handlers_done, [events.handler_name(ok)])
+
+            # Nouvelle tentative à l'échéance : seul le traitant en échec est rejoué
+            self.assertEqual(events.process_pending(now=event.next_attempt_at)['traites'], 1)
+        self.assertEqual(appels, [event.pk])
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), (DomainEvent.STATUS_DONE, 2))
+
+    def test_reponse_a_une_demande_de_report(self):
+        self.tache.agents_assignes.add(self.agent)
+        demande = DemandeReport.objects.create(
+            tache=self.tache, demandeur=self.agent, motif="Pluies",
+            date_demandee=timezone.now() + timedelta(days=10),
+        )
+        client = APIClient()
+        client.force_authenticate(self.dg)
+        response = client.post(f'/api/tasks/demandes-report/{demande.pk}/approuver/', {'commentaire': 'OK'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(DomainEvent.objects.filter(type='report.approuvee', payload__de='en_attente').exists())
+
+        events.process_pending()
+        self.assertTrue(Notification.objects.filter(recipient=self.agent, title="Demande de report approuvée").exists())
+
+
+class ChangeTrackingTest(TestCase):
+    """Différences d'audit calculées depuis l'instantané de chargement"""
+
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_suivi', password='pwd', role='dg')
+        self.tache = Tache.objects.create(
+            titre="Mission", description="-", createur=self.dg,
+            date_echeance=timezone.now() + timedelta(days=3),
+        )
+
+    def test_differences_sans_relecture(self):
+        tache = Tache.objects.get(pk=self.tache.pk)
+        tache.titre = "Mission terrain"
+        tache.priorite = 'haute'
+        with self.captureOnCommitCallbacks(execute=True):
+            # L'UPDATE et la version ETag : ni relecture ni écriture d'audit avant la validation
+            with self.assertNumQueries(2):
+                tache.save()
+            tache.titre = "Mission Nord"
+            tache.save(update_fields=['titre'])
+        log = AuditLog.objects.get(module='tasks', action_type='update')
+        self.assertEqual(log.differences, {
+            'titre': {'old': 'Mission', 'new': 'Mission Nord'},
+            'priorite': {'old': 'moyenne', 'new': 'haute'},
+        })
+
+    def test_differences_dans_l_entree_du_service(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TacheService.demarrer(self.tache, self.dg)
+        log = AuditLog.objects.get(module='tasks')
+        self.assertEqual(log.message, f"Tache {self.tache.numero} demarree")
+        self.assertEqual(log.differences['statut'], {'old': 'creee', 'new': 'en_cours'})
+        self.assertIsNone(log.differences['date_debut_reelle']['old'])
+
+    def test_modification_utilisateur_via_api(self):
+        agent = User.objects.create_user(username='agent_suivi', password='secret', role='agent')
+        client = APIClient()
+        client.force_authenticate(self.dg)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/users/{agent.pk}/', {'telephone': '0340000000'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        log = AuditLog.objects.get(module='users', action_type='update')
+        self.assertEqual(log.utilisateur, self.dg)
+        self.assertEqual(log.objet_id, str(agent.pk))
+        self.assertEqual(list(log.differences), ['telephone'])
+
+
+
+class ExportRapportTest(TestCase):
+    """Exports des logs d'audit écrits en flux et enregistrés dans l'historique"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        # Exports limités (ExportThrottle) : seaux propres au test
+        throttling.reset()
+        self.addCleanup(throttling.reset)
+
+        self.admin = User.objects.create_user(username='admin_export', password='pwd', role='admin')
+        AuditLog.objects.all().delete()
+        AuditLog.objects.bulk_create([
+            AuditLog(action_type='update', module='finances', message=f"Modification (n°{i}) \\ «test»",
+                     utilisateur=self.admin if i % 2 else None, status_code=200)
+            for i in range(150)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _exporter(self, format_export, **filtres):
+        response = self.client.post('/api/audit/logs/exporter/', {'format': format_export, **filtres}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_excel(self):
+        from openpyxl import load_workbook
+
+        contenu = self._exporter('excel')
+        feuille = load_workbook(BytesIO(contenu), read_only=True).active
+        lignes = list(feuille.values)
+        self.assertEqual(lignes[0][:3], ('Date', 'Type Action', 'Module'))
+        self.assertEqual(len(lignes), 151)
+        self.assertEqual(lignes[1][9], 'N/A')
+
+        export = ExportHistory.objects.get()
+        self.assertEqual((export.format, export.module, export.nombre_lignes), ('excel', 'audit', 150))
+        self.assertEqual(export.taille_fichier, len(contenu))
+        self.assertTrue(export.fichier.name.endswith('.xlsx'))
+
+    def test_pdf_pagine(self):
+        contenu = self._exporter('pdf')
+        self.assertTrue(contenu.startswith(b'%PDF-1.4'))
+        self.assertTrue(contenu.rstrip().endswith(b'%%EOF'))
+        pages = contenu.count(b'/Type /Page ')
+        self.assertGreater(pages, 1)
+        self.assertIn(b'/Count %d' % pages, contenu)
+        # Table des références : chaque objet à la position annoncée
+        debut = int(contenu.rsplit(b'startxref', 1)[1].split()[0])
+        entrees = contenu[debut:].split(b'\n')[3:]
+        for numero, entree in enumerate(entrees[:5], start=1):
+            position = int(entree[:10])
+            self.assertTrue(contenu[position:].startswith(b'%d 0 obj' % numero))
+        self.assertIn(b'(Page 2)', contenu)
+        self.assertIn(b'\\\\ \xabtest\xbb', contenu)
+
+    def test_json_et_csv(self):
+        donnees = json.loads(self._exporter('json', module='finances'))
+        self.assertEqual(len(donnees), 150)
+        self.assertEqual(donnees[0]['module_display'], 'Finances')
+
+        lignes = self._exporter('csv').decode().splitlines()
+        self.assertEqual(len(lignes), 151)
+        self.assertEqual(
+            list(ExportHistory.objects.order_by('timestamp').values_list('format', 'nombre_lignes')),
+            [('json', 150), ('csv', 150)],
+        )
+
+    def test_format_inconnu(self):
+        response = self.client.post('/api/audit/logs/exporter/', {'format': 'docx'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportHistory.objects.exists())
+
+    def test_telechargement_journalise_une_fois(self):
+        """Seul le téléchargement complet est journalisé (ni 304, ni reprise Range)"""
+        self._exporter('csv')
+        export = ExportHistory.objects.get()
+        url = f'/api/audit/exports-history/{export.pk}/telecharger/'
+        telechargements = AuditLog.objects.filter(objet_type='ExportHistory', objet_id=str(export.pk))
 
-# Create your tests here.
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(telechargements.count(), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-9').status_code, 206)
+        self.assertEqual(telechargements.count(), 1)
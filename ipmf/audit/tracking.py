@@ -0,0 +1,154 @@
+"""
+Suivi des modifications par instantané (différences d'audit sans relecture).
+
+Les modèles inscrits via register() (DirtyFieldsMixin, ipmf/dirty.py)
+mémorisent au chargement les valeurs lues ; à l'enregistrement (post_save),
+les différences des champs suivis avec cet instantané sont calculées sans
+requête puis accumulées sur l'instance.
+
+Les différences sont écrites dans AuditLog.differences :
+- par le service qui journalise la transition (pop_changes() dans
+  FinanceService._log_audit / TacheService._log_audit) ;
+- sinon à la validation de la transaction, dans une entrée 'update' dont
+  l'auteur est l'utilisateur de la requête en cours lors de l'enregistrement
+  (TrackingMiddleware).
+
+Seuls les champs chargés sont comparés (only()/defer() : champs différés
+ignorés) ; avec update_fields, seuls les champs écrits. Les écritures par
+.update() / bulk_update ne passent pas par save() et ne sont pas suivies.
+"""
+import contextvars
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from ipmf.dirty import field_value
+
+# Champs jamais suivis : horodatages techniques et journaux texte
+EXCLUS = {'created_at', 'updated_at', 'date_creation', 'historique'}
+
+MAX_LONGUEUR = 200
+
+_request = contextvars.ContextVar('audit_request', default=None)
+
+# {model: {'module': ..., 'fields': [(name, attname), ...]}}
+_registry = {}
+
+
+def register(model, module, exclude=()):
+    """Inscrit un modèle au suivi des modifications (AppConfig.ready)"""
+    if isinstance(model, str):
+        model = apps.get_model(model)
+    exclus = EXCLUS | set(exclude)
+    fields = [
+        (field.name, field.attname)
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in exclus
+        and not getattr(field, 'auto_now', False)
+        and not getattr(field, 'auto_now_add', False)
+    ]
+    _registry[model] = {'module': module, 'fields': fields}
+    post_save.connect(_on_save, sender=model, dispatch_uid=f'tracking:{model._meta.label_lower}')
+
+
+def _texte(value):
+    if value is None:
+        return None
+    texte = str(value)
+    return texte if len(texte) <= MAX_LONGUEUR else texte[:MAX_LONGUEUR - 1] + '…'
+
+
+def _on_save(sender, instance, created, update_fields=None, **kwargs):
+    # Instantané renouvelé par DirtyFieldsMixin.save() après ce signal
+    snapshot = instance.loaded_values
+    if created or not snapshot:
+        return
+    changes = {}
+    for name, attname in _registry[sender]['fields']:
+        if attname not in snapshot or (update_fields is not None and name not in update_fields):
+            continue
+        old, new = snapshot[attname], field_value(instance.__dict__.get(attname))
+        if old != new:
+            changes[name] = {'old': _texte(old), 'new': _texte(new)}
+    if changes:
+        _accumulate(instance, changes)
+
+
+def _accumulate(instance, changes):
+    """Fusionne avec les différences en attente : première ancienne valeur, dernière nouvelle"""
+    pending = instance.__dict__.setdefault('_tracking_changes', {})
+    for name, diff in changes.items():
+        old = pending[name]['old'] if name in pending else diff['old']
+        if old == diff['new']:
+            pending.pop(name, None)
+        else:
+            pending[name] = {'old': old, 'new': diff['new']}
+    if pending and '_tracking_actor' not in instance.__dict__:
+        # Auteur relevé à l'enregistrement : la validation peut survenir hors requête
+        instance._tracking_actor = current_user()
+        transaction.on_commit(lambda: flush(instance))
+
+
+def pop_changes(instance):
+    """Différences en attente de l'instance ({champ: {'old', 'new'}}), consommées"""
+    instance.__dict__.pop('_tracking_actor', None)
+    return instance.__dict__.pop('_tracking_changes', None) or {}
+
+
+def audit_values(changes):
+    """Arguments de AuditLog.log_action pour des différences"""
+    if not changes:
+        return {}
+    return {
+        'anciennes_valeurs': {k: v['old'] for k, v in changes.items()},
+        'nouvelles_valeurs': {k: v['new'] for k, v in changes.items()},
+        'differences': changes,
+    }
+
+
+def current_user():
+    """Utilisateur authentifié de la requête en cours (None hors requête)"""
+    request = _request.get()
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def flush(instance):
+    """Journalise les différences non consommées par un service"""
+    from .models import AuditLog
+
+    actor = instance.__dict__.get('_tracking_actor')
+    changes = pop_changes(instance)
+    if not changes:
+        return
+    opts = instance._meta
+    AuditLog.log_action(
+        action_type='update',
+        module=_registry[type(instance)]['module'],
+        message=f"Modification de {opts.verbose_name} {instance}",
+        utilisateur=actor,
+        objet_type=instance.__class__.__name__,
+        objet_id=str(instance.pk),
+        objet_repr=str(instance)[:200],
+        **audit_values(changes),
+    )
+
+
+class TrackingMiddleware:
+    """
+    Expose la requête au suivi des modifications (auteur des entrées d'audit).
+    L'utilisateur est lu à l'enregistrement de l'instance : l'authentification
+    DRF (JWT) l'a alors renseigné sur la requête Django.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
@@ -4,22 +4,24 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
-from django.http import HttpResponse
 from datetime import timedelta, datetime
-import csv
-import json
 
+from ipmf.downloads import serve_file
+from ipmf.db_routers import ReplicaReadMixin
+from ipmf.throttling import ExportThrottle, StatisticsThrottle
 from .models import AuditLog, ExportHistory, LoginHistory, SystemHealthLog
+from .reports import ExportErreur, RapportAudit, generer, periode, servir
 from .serializers import (
     AuditLogSerializer, ExportHistorySerializer, LoginHistorySerializer,
     SystemHealthLogSerializer, AuditStatsSerializer, AuditFilterSerializer
 )
 from users.permissions import IsAdminUser, IsDGUser
 
-class AuditLogViewSet(viewsets.ModelViewSet):
+class AuditLogViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la consultation des logs d'audit
     """
+    replica_actions = {'statistiques', 'exporter', 'activite_utilisateur'}
     queryset = AuditLog.objects.all()
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser | IsDGUser]
@@ -62,7 +64,7 @@ class AuditLogViewSet(viewsets.ModelViewSet):
         
         return queryset
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques(self, request):
         """
         Statistiques détaillées des logs d'audit
@@ -145,13 +147,15 @@ class AuditLogViewSet(viewsets.ModelViewSet):
         serializer = AuditStatsSerializer(stats)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[ExportThrottle])
     def exporter(self, request):
         """
-        Export des logs d'audit en CSV ou JSON
+        Export des logs d'audit (Excel, PDF, CSV ou JSON), enregistré dans
+        l'historique des exports
         """
         format_export = request.data.get('format', 'csv')
         queryset = self.get_queryset()
+        filters = {}
         
         # Appliquer les filtres de l'export
         filter_serializer = AuditFilterSerializer(data=request.data)
@@ -171,99 +175,16 @@ class AuditLogViewSet(viewsets.ModelViewSet):
             if filters.get('niveau'):
                 queryset = queryset.filter(niveau=filters['niveau'])
         
-        if format_export == 'csv':
-            return self.export_csv(queryset)
-        elif format_export == 'json':
-            return self.export_json(queryset)
-        else:
-            return Response(
-                {'error': 'Format non supporté. Utilisez "csv" ou "json".'},
-                status=status.HTTP_400_BAD_REQUEST
+        rapport = RapportAudit(queryset, periode=periode(filters.get('date_debut'), filters.get('date_fin')))
+        try:
+            export = generer(
+                rapport, format_export, request.user,
+                parametres={cle: str(valeur) for cle, valeur in filters.items() if valeur not in (None, '')},
+                ip_address=self.get_client_ip(request),
             )
-    
-    def export_csv(self, queryset):
-        """Export CSV des logs d'audit"""
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="audit_logs.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Date', 'Type Action', 'Module', 'Niveau', 'Utilisateur', 
-            'IP', 'Objet', 'Message', 'URL', 'Méthode', 'Statut'
-        ])
-        
-        for log in queryset:
-            writer.writerow([
-                log.timestamp.strftime("%d/%m/%Y %H:%M:%S"),
-                log.get_action_type_display(),
-                log.get_module_display(),
-                log.get_niveau_display(),
-                log.utilisateur.get_full_name() if log.utilisateur else 'System',
-                log.ip_address or 'N/A',
-                f"{log.objet_type} ({log.objet_id})" if log.objet_type else 'N/A',
-                log.message[:100] + '...' if len(log.message) > 100 else log.message,
-                log.url or 'N/A',
-                log.method or 'N/A',
-                log.status_code or 'N/A'
-            ])
-        
-        # Enregistrer l'export dans l'historique
-        ExportHistory.objects.create(
-            utilisateur=self.request.user,
-            format='csv',
-            module='audit',
-            fichier=None,  # On ne sauvegarde pas le fichier pour les exports CSV en temps réel
-            parametres={},
-            nombre_lignes=queryset.count(),
-            taille_fichier=len(response.content),
-            ip_address=self.get_client_ip(self.request)
-        )
-        
-        return response
-    
-    def export_json(self, queryset):
-        """Export JSON des logs d'audit"""
-        data = []
-        for log in queryset:
-            data.append({
-                'id': log.id,
-                'timestamp': log.timestamp.isoformat(),
-                'action_type': log.action_type,
-                'action_type_display': log.get_action_type_display(),
-                'module': log.module,
-                'module_display': log.get_module_display(),
-                'niveau': log.niveau,
-                'utilisateur': {
-                    'id': log.utilisateur.id if log.utilisateur else None,
-                    'username': log.utilisateur.username if log.utilisateur else None,
-                    'full_name': log.utilisateur.get_full_name() if log.utilisateur else 'System'
-                } if log.utilisateur else None,
-                'ip_address': log.ip_address,
-                'objet_type': log.objet_type,
-                'objet_id': log.objet_id,
-                'objet_repr': log.objet_repr,
-                'message': log.message,
-                'url': log.url,
-                'method': log.method,
-                'status_code': log.status_code
-            })
-        
-        response = HttpResponse(json.dumps(data, indent=2, ensure_ascii=False), content_type='application/json')
-        response['Content-Disposition'] = 'attachment; filename="audit_logs.json"'
-        
-        # Enregistrer l'export dans l'historique
-        ExportHistory.objects.create(
-            utilisateur=self.request.user,
-            format='json',
-            module='audit',
-            fichier=None,
-            parametres={},
-            nombre_lignes=queryset.count(),
-            taille_fichier=len(response.content),
-            ip_address=self.get_client_ip(self.request)
-        )
-        
-        return response
+        except ExportErreur as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return servir(request, export)
     
     @action(detail=False, methods=['get'])
     def activite_utilisateur(self, request, user_id=None):
@@ -311,10 +232,11 @@ class AuditLogViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class ExportHistoryViewSet(viewsets.ModelViewSet):
+class ExportHistoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour l'historique des exports
     """
+    replica_actions = {'statistiques_exports'}
     queryset = ExportHistory.objects.all()
     serializer_class = ExportHistorySerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser | IsDGUser]
@@ -351,23 +273,28 @@ class ExportHistoryViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Journaliser le téléchargement
-        AuditLog.log_action(
-            action_type='read',
-            module='audit',
-            message=f"Téléchargement de l'export {export.format} - {export.module}",
-            utilisateur=request.user,
-            ip_address=self.get_client_ip(request),
-            objet_type='ExportHistory',
-            objet_id=export.id,
-            objet_repr=str(export)
+        # Flux (Range, ETag, offload frontal) au lieu d'une lecture complète en mémoire
+        response = serve_file(
+            request, export.fichier,
+            content_type='application/octet-stream',
+            size=export.taille_fichier or None
         )
-        
-        response = HttpResponse(export.fichier.read(), content_type='application/octet-stream')
-        response['Content-Disposition'] = f'attachment; filename="{export.fichier.name}"'
+
+        # Journaliser le seul téléchargement complet (ni 304, ni reprise partielle)
+        if response.status_code == status.HTTP_200_OK:
+            AuditLog.log_action(
+                action_type='read',
+                module='audit',
+                message=f"Téléchargement de l'export {export.format} - {export.module}",
+                utilisateur=request.user,
+                ip_address=self.get_client_ip(request),
+                objet_type='ExportHistory',
+                objet_id=export.id,
+                objet_repr=str(export)
+            )
         return response
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques_exports(self, request):
         """
         Statistiques des exports
@@ -437,10 +364,11 @@ class ExportHistoryViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class LoginHistoryViewSet(viewsets.ModelViewSet):
+class LoginHistoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour l'historique des connexions
     """
+    replica_actions = {'statistiques_connexions'}
     queryset = LoginHistory.objects.all()
     serializer_class = LoginHistorySerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser | IsDGUser]
@@ -452,7 +380,7 @@ class LoginHistoryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return LoginHistory.objects.all().select_related('utilisateur')
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques_connexions(self, request):
         """
         Statistiques des connexions
@@ -549,10 +477,11 @@ class SystemHealthLogViewSet(viewsets.ModelViewSet):
         })
 
 
-class AuditToolsViewSet(viewsets.ViewSet):
+class AuditToolsViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """
     ViewSet pour les outils d'audit
     """
+    replica_actions = {'resume_securite'}
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     
     @action(detail=False, methods=['post'])
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import DashboardPreferences, Alert, WidgetConfig, DashboardView
 from django.utils import timezone
+from ipmf.etags import bump
 
 @admin.register(DashboardPreferences)
 class DashboardPreferencesAdmin(admin.ModelAdmin):
@@ -50,12 +51,14 @@ class AlertAdmin(admin.ModelAdmin):
     actions = ['marquer_comme_lues', 'marquer_comme_non_lues']
     
     def marquer_comme_lues(self, request, queryset):
-        updated = queryset.update(lue=True, date_lecture=timezone.now())
+        updated = queryset.update(lue=True, date_lecture=timezone.now(), updated_at=timezone.now())
+        bump(Alert._meta.label_lower)
         self.message_user(request, f'{updated} alerte(s) marquée(s) comme lue(s)')
     marquer_comme_lues.short_description = "Marquer les alertes sélectionnées comme lues"
     
     def marquer_comme_non_lues(self, request, queryset):
-        updated = queryset.update(lue=False, date_lecture=None)
+        updated = queryset.update(lue=False, date_lecture=None, updated_at=timezone.now())
+        bump(Alert._meta.label_lower)
         self.message_user(request, f'{updated} alerte(s) marquée(s) comme non lue(s)')
     marquer_comme_non_lues.short_description = "Marquer les alertes sélectionnées comme non lues"
 
@@ -3,4 +3,11 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
-    verbose_name = '📊 Tableaux de Bord IPMF'
\ No newline at end of file
+    verbose_name = '📊 Tableaux de Bord IPMF'
+
+    def ready(self):
+        # Versions des données servant aux ETag (le tableau de bord agrège toutes les apps)
+        # et traces de suppression des flux de changements
+        from ipmf import etags, sync
+        etags.connect_signals()
+        sync.connect_signals()
@@ -0,0 +1,95 @@
+"""
+Variantes asynchrones des endpoints de tableau de bord (déploiement ASGI).
+
+Les sections indépendantes sont exécutées en parallèle (dashboard.concurrency)
+sans bloquer la boucle d'événements ; sous WSGI ces vues restent utilisables
+(Django les exécute via async_to_sync).
+
+Vues Django simples (hors DRF), contrôles de la variante synchrone :
+- authentification JWT identique (CachedJWTAuthentication) ;
+- ETag / 304 : même calcul (ipmf/etags.py, portées suivies, date du jour) ;
+- limitation de débit : aucune, comme /api/dashboard/donnees/overview/ ;
+- budget de requêtes (ipmf/query_budget.py) : non appliqué ; les sections
+  s'exécutent dans les threads du pool, hors des connexions comptées par le
+  middleware. Les budgets sont vérifiés sur la variante synchrone.
+"""
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException
+
+from ipmf import etags
+from ipmf.db_routers import is_sticky, replica_alias, replica_reads
+from users.authentication import CachedJWTAuthentication
+from .concurrency import arun_sections
+from .services import DashboardService
+
+
+# Mêmes portées que DashboardDataViewSet
+ETAG_SCOPES = [label.lower() for label in etags.TRACKED_MODELS]
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+
+
+def _with_etag(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization', 'Accept'))
+    return response
+
+
+@sync_to_async
+def _authenticate(request):
+    """Authentification JWT identique à l'API DRF ; (utilisateur, erreur)"""
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException as e:
+        return None, e.detail
+    if result is None:
+        return None, "Informations d'authentification non fournies."
+    return result[0], None
+
+
+async def _dashboard_data(user):
+    now = timezone.now()
+    if user.role == 'dg':
+        sections, incompletes = await arun_sections(DashboardService.dg_sections(now))
+        return DashboardService.build_dg_dashboard(sections, incompletes)
+    if user.role == 'comptable':
+        return await sync_to_async(DashboardService.get_comptable_dashboard_data)(user)
+    if user.role == 'caisse':
+        return await sync_to_async(DashboardService.get_caisse_dashboard_data)(user)
+    sections, incompletes = await arun_sections(DashboardService.agent_sections(user, now))
+    return DashboardService.build_agent_dashboard(sections, incompletes)
+
+
+async def overview(request):
+    """Équivalent asynchrone de /api/dashboard/donnees/overview/"""
+    if request.method != 'GET':
+        return _json({'detail': 'Méthode non autorisée.'}, status=405)
+
+    user, erreur = await _authenticate(request)
+    if user is None:
+        return _json({'detail': erreur}, status=401)
+
+    etag = await sync_to_async(etags.compute_etag)(
+        user.pk, request.get_full_path(), 'application/json', ETAG_SCOPES, daily=True
+    )
+    if etags.etag_matches(request.headers.get('If-None-Match'), etag):
+        return _with_etag(HttpResponseNotModified(), etag)
+
+    # Lectures sur le réplica, sauf écriture récente de l'utilisateur
+    use_replica = replica_alias() is not None and not await sync_to_async(is_sticky)(user.pk)
+    try:
+        with replica_reads(use_replica):
+            data = await _dashboard_data(user)
+    except Exception as e:
+        return _json({'error': f'Erreur lors du chargement du dashboard: {str(e)}'}, status=500)
+
+    if 'error' in data:
+        return _json(data, status=403)
+    return _with_etag(_json(data), etag)
@@ -0,0 +1,133 @@
+"""
+Exécution concurrente des sections indépendantes d'un tableau de bord.
+
+Chaque section (KPIs, courbes, budgets, retards, activité...) est une
+fonction sans argument exécutée dans un pool de threads borné : la latence
+tend vers celle de la requête la plus lente au lieu de leur somme.
+
+- Connexions par thread : chaque thread du pool ouvre sa propre connexion,
+  fermée/recyclée après la section (close_old_connections).
+- Contexte propagé (contextvars) : le routage vers le réplica s'applique aussi
+  aux sections.
+- Budget de temps par requête (DASHBOARD_TIME_BUDGET) : une section non
+  terminée à l'échéance est abandonnée et signalée comme incomplète ; les
+  autres sont renvoyées (résultat partiel).
+- Exécution séquentielle dans le thread appelant si DASHBOARD_MAX_WORKERS <= 1
+  ou à l'intérieur d'une transaction : les autres connexions ne verraient pas
+  les données non validées.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _max_workers():
+    return getattr(settings, 'DASHBOARD_MAX_WORKERS', 4)
+
+
+def _time_budget():
+    return getattr(settings, 'DASHBOARD_TIME_BUDGET', 2.0)
+
+
+def get_executor():
+    """Pool partagé, créé à la première utilisation"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers(), thread_name_prefix='dashboard')
+    return _executor
+
+
+def _run_isolated(fn):
+    """Exécute une section dans un thread du pool puis libère sa connexion"""
+    try:
+        return fn()
+    finally:
+        close_old_connections()
+
+
+def _sequential(sections, budget):
+    results, incomplete = {}, []
+    deadline = time.monotonic() + budget
+    for name, fn in sections.items():
+        if time.monotonic() > deadline:
+            incomplete.append(name)
+            continue
+        try:
+            results[name] = fn()
+        except Exception:
+            logger.exception("Section de tableau de bord en échec : %s", name)
+            incomplete.append(name)
+    return results, sorted(incomplete)
+
+
+def run_sections(sections, budget=None):
+    """
+    Exécute les sections ({nom: callable}) et retourne (résultats, sections_incomplètes).
+    """
+    budget = _time_budget() if budget is None else budget
+    if _max_workers() <= 1 or connection.in_atomic_block:
+        return _sequential(sections, budget)
+
+    executor = get_executor()
+    futures = {
+        executor.submit(contextvars.copy_context().run, _run_isolated, fn): name
+        for name, fn in sections.items()
+    }
+    done, pending = wait(futures, timeout=budget)
+
+    results, incomplete = {}, []
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception:
+            logger.exception("Section de tableau de bord en échec : %s", name)
+            incomplete.append(name)
+    for future in pending:
+        # La requête en cours se termine en arrière-plan ; son résultat est ignoré
+        future.cancel()
+        incomplete.append(futures[future])
+        logger.warning("Section de tableau de bord hors budget (%.1fs) : %s", budget, futures[future])
+    return results, sorted(incomplete)
+
+
+async def arun_sections(sections, budget=None):
+    """Variante asynchrone (vues ASGI) : mêmes garanties, sans bloquer la boucle"""
+    budget = _time_budget() if budget is None else budget
+    # Lu dans le thread « sensible » (celui des appels synchrones de la requête)
+    in_atomic_block = await sync_to_async(lambda: connection.in_atomic_block)()
+    if _max_workers() <= 1 or in_atomic_block:
+        return await sync_to_async(_sequential)(sections, budget)
+
+    executor = get_executor()
+    tasks = {
+        asyncio.ensure_future(
+            sync_to_async(_run_isolated, thread_sensitive=False, executor=executor)(fn)
+        ): name
+        for name, fn in sections.items()
+    }
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+
+    results, incomplete = {}, []
+    for task in done:
+        name = tasks[task]
+        if task.exception() is not None:
+            logger.error("Section de tableau de bord en échec : %s", name, exc_info=task.exception())
+            incomplete.append(name)
+        else:
+            results[name] = task.result()
+    for task in pending:
+        task.cancel()
+        incomplete.append(tasks[task])
+        logger.warning("Section de tableau de bord hors budget (%.1fs) : %s", budget, tasks[task])
+    return results, sorted(incomplete)
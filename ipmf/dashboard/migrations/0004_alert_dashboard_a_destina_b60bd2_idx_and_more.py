@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_alter_alert_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['destinataire', '-date_creation'], name='dashboard_a_destina_b60bd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['lue', 'date_creation'], name='dashboard_a_lue_24466d_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_alert_dashboard_a_destina_b60bd2_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['destinataire', 'updated_at', 'id'], name='dashboard_a_destina_a8717b_idx'),
+        ),
+    ]
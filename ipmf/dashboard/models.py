@@ -1,7 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.utils import timezone
+
+from ipmf.dirty import DirtyFieldsMixin
+
 User = get_user_model()
 
 class DashboardPreferences(models.Model):
@@ -39,7 +41,7 @@ class DashboardPreferences(models.Model):
     def __str__(self):
         return f"Préférences Dashboard - {self.user.username}"
 
-class Alert(models.Model):
+class Alert(DirtyFieldsMixin, models.Model):
     """Système d'alertes"""
     TYPE_CHOICES = [
         ('depense_attente', 'Depense en attente'),
@@ -66,6 +68,7 @@ class Alert(models.Model):
     lue = models.BooleanField(default=False, verbose_name="Lue")
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     date_lecture = models.DateTimeField(null=True, blank=True, verbose_name="Date de lecture")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
     lien_objet = models.CharField(max_length=500, blank=True, verbose_name="Lien vers l'objet")
     donnees_contexte = models.JSONField(default=dict, blank=True, verbose_name="Données de contexte")
     
@@ -75,8 +78,13 @@ class Alert(models.Model):
         ordering = ['-date_creation']
         indexes = [
             models.Index(fields=['destinataire', 'lue']),
+            models.Index(fields=['destinataire', '-date_creation']),
             models.Index(fields=['date_creation']),
             models.Index(fields=['type_alerte']),
+            # Parcours de rétention (alertes lues les plus anciennes)
+            models.Index(fields=['lue', 'date_creation']),
+            # Flux de changements par utilisateur (ipmf/sync.py)
+            models.Index(fields=['destinataire', 'updated_at', 'id']),
         ]
     
     def __str__(self):
@@ -84,9 +92,11 @@ class Alert(models.Model):
     
     def marquer_comme_lue(self):
         """Marque l'alerte comme lue"""
+        if self.lue:
+            return
         self.lue = True
         self.date_lecture = timezone.now()
-        self.save()
+        self.save_dirty()
     
     @classmethod
     def creer_alerte(cls, type_alerte, titre, message, destinataire, niveau='moyen', lien_objet='', donnees_contexte=None):
@@ -101,7 +111,7 @@ class Alert(models.Model):
             donnees_contexte=donnees_contexte or {}
         )
 
-class WidgetConfig(models.Model):
+class WidgetConfig(DirtyFieldsMixin, models.Model):
     """Configuration des widgets pour le dashboard"""
     WIDGET_TYPES = [
         ('financial_summary', 'Resume financier'),
@@ -1,72 +1,88 @@
 from django.db.models import Q, Sum, Count, Avg
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta, datetime
 from finances.models import EntreeArgent, Depense
 from tasks.models import Tache
 from users.models import CustomUser
 from .models import Alert
+from .concurrency import run_sections
 
 class DashboardService:
     """Service pour le calcul des données du dashboard"""
     
     @staticmethod
-    def get_dg_dashboard_data(user):
-        """Données du dashboard stratégique pour le Directeur Général"""
-        if user.role != 'dg':
-            return {'error': 'Accès non autorisé'}
-        
-        try:
-            now = timezone.now()
-            debut_mois = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            fin_mois = (debut_mois + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            # Mois précédent pour calcul de tendance
-            debut_mois_prec = (debut_mois - timedelta(days=1)).replace(day=1)
-            fin_mois_prec = debut_mois - timedelta(seconds=1)
+    def _sparkline_points(now, valeurs_par_jour):
+        """31 points quotidiens (J-30 à J) à partir d'un dictionnaire {date: valeur}"""
+        points = []
+        for i in range(30, -1, -1):
+            date_point = (now - timedelta(days=i)).date()
+            points.append({
+                'date': date_point.strftime('%d/%m'),
+                'valeur': valeurs_par_jour.get(date_point, 0)
+            })
+        return points
+
+    @staticmethod
+    def dg_sections(now):
+        """
+        Sections indépendantes du dashboard DG ({nom: callable}).
+        Chaque section n'exécute qu'une ou deux requêtes agrégées.
+        """
+        debut_mois = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        fin_mois = (debut_mois + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+        # Mois précédent pour calcul de tendance
+        debut_mois_prec = (debut_mois - timedelta(days=1)).replace(day=1)
+        fin_mois_prec = debut_mois - timedelta(seconds=1)
+        debut_courbes = (now - timedelta(days=30)).date()
 
-            # --- 1. KPIs & TRENDS ---
+        def kpis():
             # Entrées (Réalité : Confirmées)
-            entrees_mois = float(EntreeArgent.objects.filter(date_entree__range=[debut_mois, fin_mois], statut='confirmee').aggregate(Sum('montant'))['montant__sum'] or 0)
-            entrees_prec = float(EntreeArgent.objects.filter(date_entree__range=[debut_mois_prec, fin_mois_prec], statut='confirmee').aggregate(Sum('montant'))['montant__sum'] or 0)
-            
+            entrees = EntreeArgent.objects.filter(statut='confirmee').aggregate(
+                mois=Sum('montant', filter=Q(date_entree__range=[debut_mois, fin_mois])),
+                prec=Sum('montant', filter=Q(date_entree__range=[debut_mois_prec, fin_mois_prec])),
+            )
             # Dépenses (Réalité : Payées - Impact sur la trésorerie)
-            depenses_mois = float(Depense.objects.filter(date_paiement__range=[debut_mois, fin_mois], statut='payee').aggregate(Sum('montant'))['montant__sum'] or 0)
-            depenses_prec = float(Depense.objects.filter(date_paiement__range=[debut_mois_prec, fin_mois_prec], statut='payee').aggregate(Sum('montant'))['montant__sum'] or 0)
-            
+            depenses = Depense.objects.filter(statut='payee').aggregate(
+                mois=Sum('montant', filter=Q(date_paiement__range=[debut_mois, fin_mois])),
+                prec=Sum('montant', filter=Q(date_paiement__range=[debut_mois_prec, fin_mois_prec])),
+            )
             # Tâches (Missions)
-            missions_actives = int(Tache.objects.filter(statut__in=['creee', 'en_cours']).count())
-            missions_prec = int(Tache.objects.filter(date_creation__range=[debut_mois_prec, fin_mois_prec]).count())
+            missions = Tache.objects.aggregate(
+                actives=Count('id', filter=Q(statut__in=['creee', 'en_cours'])),
+                prec=Count('id', filter=Q(date_creation__range=[debut_mois_prec, fin_mois_prec])),
+            )
+            return {
+                'entrees_mois': float(entrees['mois'] or 0),
+                'entrees_prec': float(entrees['prec'] or 0),
+                'depenses_mois': float(depenses['mois'] or 0),
+                'depenses_prec': float(depenses['prec'] or 0),
+                'missions_actives': int(missions['actives']),
+                'missions_prec': int(missions['prec']),
+            }
 
-            def calc_trend(current, previous):
-                if not previous or previous == 0: return 0
-                return round(((current - previous) / previous) * 100, 1)
+        def sparkline_depenses():
+            totaux = Depense.objects.filter(
+                statut='payee', date_paiement__date__gte=debut_courbes
+            ).annotate(jour=TruncDate('date_paiement')).values('jour').annotate(total=Sum('montant'))
+            return DashboardService._sparkline_points(now, {t['jour']: float(t['total']) for t in totaux})
 
-            # --- 2. SPARKLINE DATA (Last 30 days) ---
-            sparklines = {
-                'depenses': [],
-                'entrees': []
-            }
-            for i in range(30, -1, -1):
-                date_point = (now - timedelta(days=i)).date()
-                sparklines['depenses'].append({
-                    'date': date_point.strftime('%d/%m'),
-                    'valeur': float(Depense.objects.filter(date_paiement__date=date_point, statut='payee').aggregate(Sum('montant'))['montant__sum'] or 0)
-                })
-                sparklines['entrees'].append({
-                    'date': date_point.strftime('%d/%m'),
-                    'valeur': float(EntreeArgent.objects.filter(date_entree=date_point, statut='confirmee').aggregate(Sum('montant'))['montant__sum'] or 0)
-                })
+        def sparkline_entrees():
+            totaux = EntreeArgent.objects.filter(
+                statut='confirmee', date_entree__gte=debut_courbes
+            ).values('date_entree').annotate(total=Sum('montant'))
+            return DashboardService._sparkline_points(now, {t['date_entree']: float(t['total']) for t in totaux})
 
-            # --- 3. MISSIONS BUDGET ANALYSIS (Consommation budgétaire = Validé + Payé) ---
-            missions_budget = []
+        def missions_budget():
             # On ne montre au DG que les missions réellement "en cours" (non terminées)
-            active_taches = Tache.objects.filter(statut__in=['creee', 'en_cours'])[:5]
-            for t in active_taches:
-                # Pour le budget, on compte tout ce qui est validé (engagé) + payé
-                spent = float(Depense.objects.filter(tache=t, statut__in=['payee', 'validee']).aggregate(Sum('montant'))['montant__sum'] or 0)
+            lignes = []
+            for t in Tache.objects.filter(statut__in=['creee', 'en_cours'])[:5]:
+                # Montant engagé maintenu sur la mission (dépenses non rejetées)
+                spent = float(t.montant_engage)
                 budget = float(t.budget_alloue or 1)
                 percent = round((spent / budget) * 100, 1)
-                missions_budget.append({
+                lignes.append({
                     'id': t.id,
                     'numero': t.numero,
                     'titre': t.titre,
@@ -75,36 +91,17 @@ class DashboardService:
                     'percent': percent,
                     'status': 'warning' if percent > 90 else 'success'
                 })
+            return lignes
 
-            # Strategic alerts logic
-            alerts = []
-            # Retard critique
-            retards = Tache.objects.filter(
-                date_echeance__lt=now, 
+        def retards():
+            return Tache.objects.filter(
+                date_echeance__lt=now,
                 statut__in=['creee', 'en_cours']
             ).count()
-            if retards > 0:
-                alerts.append({
-                    'type': 'danger',
-                    'title': f'{retards} Missions en retard',
-                    'description': 'Risque de pénalités ou blocage opérationnel.',
-                    'action': '/tasks'
-                })
-            
-            # Dépassement budget mission
-            overbudgets = [m for m in missions_budget if m['percent'] > 100]
-            if overbudgets:
-                alerts.append({
-                    'type': 'warning',
-                    'title': 'Dépassement de budget',
-                    'description': f'{len(overbudgets)} mission(s) ont dépassé leur budget alloué.',
-                    'action': '/finances/analytics'
-                })
 
-            # --- 5. ACTIVITY FEED ---
+        def activite():
             recent_activity = []
-            latest_tasks = Tache.objects.order_by('-date_creation')[:3]
-            for lt in latest_tasks:
+            for lt in Tache.objects.order_by('-date_creation')[:3]:
                 recent_activity.append({
                     'type': 'task',
                     'title': lt.titre,
@@ -112,9 +109,7 @@ class DashboardService:
                     'status': lt.statut,
                     'time': lt.date_creation.isoformat() if lt.date_creation else None
                 })
-            
-            latest_depenses = Depense.objects.order_by('-created_at')[:3]
-            for ld in latest_depenses:
+            for ld in Depense.objects.order_by('-created_at')[:3]:
                 recent_activity.append({
                     'type': 'expense',
                     'title': ld.motif,
@@ -123,95 +118,163 @@ class DashboardService:
                     'time': ld.created_at.isoformat() if ld.created_at else None
                 })
             recent_activity.sort(key=lambda x: x['time'] or '', reverse=True)
+            return recent_activity[:5]
 
-            return {
-                'kpis': [
-                    {
-                        'label': 'Missions en cours',
-                        'value': missions_actives,
-                        'trend': calc_trend(missions_actives, missions_prec),
-                        'sparkline': sparklines['depenses'],
-                        'color': 'blue'
-                    },
-                    {
-                        'label': 'Dépenses (Mois)',
-                        'value': f"{depenses_mois:,.0f} Ar".replace(',', ' '),
-                        'trend': calc_trend(depenses_mois, depenses_prec),
-                        'sparkline': sparklines['depenses'],
-                        'color': 'orange'
-                    },
-                    {
-                        'label': 'Trésorerie',
-                        'value': f"{(entrees_mois - depenses_mois):,.0f} Ar".replace(',', ' '),
-                        'trend': calc_trend(entrees_mois - depenses_mois, entrees_prec - depenses_prec),
-                        'sparkline': sparklines['entrees'],
-                        'color': 'emerald'
-                    },
-                    {
-                        'label': 'Marge Bénéficiaire',
-                        'value': f"{((entrees_mois - depenses_mois) / entrees_mois * 100 if entrees_mois > 0 else 0):.1f}%",
-                        'trend': calc_trend(
-                            (entrees_mois - depenses_mois) / entrees_mois * 100 if entrees_mois > 0 else 0,
-                            (entrees_prec - depenses_prec) / entrees_prec * 100 if entrees_prec > 0 else 0
-                        ),
-                        'sparkline': None,
-                        'color': 'indigo'
-                    },
-                ],
-                'charts': {
-                    'budget_distribution': missions_budget,
-                    'cashflow_history': sparklines['entrees']
+        return {
+            'kpis': kpis,
+            'sparkline_depenses': sparkline_depenses,
+            'sparkline_entrees': sparkline_entrees,
+            'missions_budget': missions_budget,
+            'retards': retards,
+            'activite': activite,
+        }
+
+    @staticmethod
+    def build_dg_dashboard(sections, incompletes):
+        """Assemble le dashboard DG ; les sections manquantes (hors budget) sont omises"""
+        def calc_trend(current, previous):
+            if not previous or previous == 0: return 0
+            return round(((current - previous) / previous) * 100, 1)
+
+        spark_depenses = sections.get('sparkline_depenses')
+        spark_entrees = sections.get('sparkline_entrees')
+        missions_budget = sections.get('missions_budget', [])
+
+        kpis = []
+        k = sections.get('kpis')
+        if k:
+            entrees_mois, entrees_prec = k['entrees_mois'], k['entrees_prec']
+            depenses_mois, depenses_prec = k['depenses_mois'], k['depenses_prec']
+            kpis = [
+                {
+                    'label': 'Missions en cours',
+                    'value': k['missions_actives'],
+                    'trend': calc_trend(k['missions_actives'], k['missions_prec']),
+                    'sparkline': spark_depenses,
+                    'color': 'blue'
                 },
-                'strategic_alerts': alerts,
-                'recent_activity': recent_activity[:5]
-            }
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return {'error': str(e)}
-    
+                {
+                    'label': 'Dépenses (Mois)',
+                    'value': f"{depenses_mois:,.0f} Ar".replace(',', ' '),
+                    'trend': calc_trend(depenses_mois, depenses_prec),
+                    'sparkline': spark_depenses,
+                    'color': 'orange'
+                },
+                {
+                    'label': 'Trésorerie',
+                    'value': f"{(entrees_mois - depenses_mois):,.0f} Ar".replace(',', ' '),
+                    'trend': calc_trend(entrees_mois - depenses_mois, entrees_prec - depenses_prec),
+                    'sparkline': spark_entrees,
+                    'color': 'emerald'
+                },
+                {
+                    'label': 'Marge Bénéficiaire',
+                    'value': f"{((entrees_mois - depenses_mois) / entrees_mois * 100 if entrees_mois > 0 else 0):.1f}%",
+                    'trend': calc_trend(
+                        (entrees_mois - depenses_mois) / entrees_mois * 100 if entrees_mois > 0 else 0,
+                        (entrees_prec - depenses_prec) / entrees_prec * 100 if entrees_prec > 0 else 0
+                    ),
+                    'sparkline': None,
+                    'color': 'indigo'
+                },
+            ]
+
+        # Strategic alerts logic
+        alerts = []
+        # Retard critique
+        retards = sections.get('retards', 0)
+        if retards > 0:
+            alerts.append({
+                'type': 'danger',
+                'title': f'{retards} Missions en retard',
+                'description': 'Risque de pénalités ou blocage opérationnel.',
+                'action': '/tasks'
+            })
+
+        # Dépassement budget mission
+        overbudgets = [m for m in missions_budget if m['percent'] > 100]
+        if overbudgets:
+            alerts.append({
+                'type': 'warning',
+                'title': 'Dépassement de budget',
+                'description': f'{len(overbudgets)} mission(s) ont dépassé leur budget alloué.',
+                'action': '/finances/analytics'
+            })
+
+        return {
+            'kpis': kpis,
+            'charts': {
+                'budget_distribution': missions_budget,
+                'cashflow_history': spark_entrees or []
+            },
+            'strategic_alerts': alerts,
+            'recent_activity': sections.get('activite', []),
+            'sections_incompletes': incompletes,
+        }
+
     @staticmethod
-    def get_agent_dashboard_data(user):
-        """Données du dashboard pour les Agents"""
-        now = timezone.now()
+    def get_dg_dashboard_data(user):
+        """Données du dashboard stratégique pour le Directeur Général"""
+        if user.role != 'dg':
+            return {'error': 'Accès non autorisé'}
+
+        # Sections exécutées en parallèle, dans la limite du budget de temps
+        sections, incompletes = run_sections(DashboardService.dg_sections(timezone.now()))
+        return DashboardService.build_dg_dashboard(sections, incompletes)
+
+    @staticmethod
+    def agent_sections(user, now):
+        """Sections indépendantes du dashboard Agent ({nom: callable})"""
         debut_mois = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Mes demandes de dépenses
-        mes_demandes = Depense.objects.filter(created_by=user).aggregate(
-            total=Count('id'),
-            en_attente=Count('id', filter=Q(statut='en_attente')),
-            validees=Count('id', filter=Q(statut__in=['validee', 'payee'])),
-            rejetees=Count('id', filter=Q(statut='rejetee'))
-        )
-        
-        # Mes tâches
-        mes_taches = Tache.objects.filter(agents_assignes=user).aggregate(
-            total=Count('id'),
-            en_cours=Count('id', filter=Q(statut='en_cours')),
-            terminees=Count('id', filter=Q(statut='terminee')),
-            validees=Count('id', filter=Q(statut='validee')),
-            en_retard=Count('id', filter=Q(date_echeance__lt=now, statut__in=['creee', 'en_cours']))
-        )
-        
-        # Dépenses du mois
-        mes_depenses_mois = float(Depense.objects.filter(
-            created_by=user,
-            date_paiement__gte=debut_mois,
-            statut='payee'
-        ).aggregate(total=Sum('montant'))['total'] or 0)
-        
-        # --- 2. SPARKLINE DATA (Last 30 days) ---
-        sparkline_tasks = []
-        for i in range(30, -1, -1):
-            date_point = (now - timedelta(days=i)).date()
-            sparkline_tasks.append({
-                'date': date_point.strftime('%d/%m'),
-                'valeur': Tache.objects.filter(agents_assignes=user, date_creation__date=date_point).count()
-            })
+
+        def demandes():
+            # Mes demandes de dépenses
+            return Depense.objects.filter(created_by=user).aggregate(
+                total=Count('id'),
+                en_attente=Count('id', filter=Q(statut='en_attente')),
+                validees=Count('id', filter=Q(statut__in=['validee', 'payee'])),
+                rejetees=Count('id', filter=Q(statut='rejetee')),
+                # Dépenses du mois
+                payees_mois=Sum('montant', filter=Q(date_paiement__gte=debut_mois, statut='payee')),
+            )
+
+        def taches():
+            # Mes tâches
+            return Tache.objects.filter(agents_assignes=user).aggregate(
+                total=Count('id'),
+                en_cours=Count('id', filter=Q(statut='en_cours')),
+                terminees=Count('id', filter=Q(statut='terminee')),
+                validees=Count('id', filter=Q(statut='validee')),
+                en_retard=Count('id', filter=Q(date_echeance__lt=now, statut__in=['creee', 'en_cours']))
+            )
+
+        def sparkline_taches():
+            totaux = Tache.objects.filter(
+                agents_assignes=user, date_creation__date__gte=(now - timedelta(days=30)).date()
+            ).annotate(jour=TruncDate('date_creation')).values('jour').annotate(total=Count('id', distinct=True))
+            return DashboardService._sparkline_points(now, {t['jour']: t['total'] for t in totaux})
+
+        def activite():
+            return list(Tache.objects.filter(agents_assignes=user).order_by('-date_creation')[:5].values(
+                'id', 'numero', 'titre', 'statut', 'date_creation'
+            ))
+
+        return {
+            'demandes': demandes,
+            'taches': taches,
+            'sparkline_taches': sparkline_taches,
+            'activite': activite,
+        }
+
+    @staticmethod
+    def build_agent_dashboard(sections, incompletes):
+        """Assemble le dashboard Agent ; les sections manquantes sont omises"""
+        mes_taches = sections.get('taches')
+        demandes = sections.get('demandes')
 
         # Alerte si retard
         alerts = []
-        if mes_taches['en_retard'] > 0:
+        if mes_taches and mes_taches['en_retard'] > 0:
             alerts.append({
                 'type': 'danger',
                 'title': 'Missions en retard',
@@ -219,13 +282,14 @@ class DashboardService:
                 'action': '/tasks'
             })
 
-        return {
-            'kpis': [
+        kpis = []
+        if mes_taches:
+            kpis += [
                 {
                     'label': 'Mes Missions',
                     'value': f"{mes_taches['en_cours']} en cours",
                     'trend': 100 if mes_taches['total'] > 0 else 0,
-                    'sparkline': sparkline_tasks,
+                    'sparkline': sections.get('sparkline_taches'),
                     'color': 'blue'
                 },
                 {
@@ -235,19 +299,29 @@ class DashboardService:
                     'sparkline': None,
                     'color': 'emerald'
                 },
-                {
-                    'label': 'Dépenses Perso (Mois)',
-                    'value': f"{mes_depenses_mois:,.0f} Ar".replace(',', ' '),
-                    'trend': 0,
-                    'sparkline': None,
-                    'color': 'orange'
-                }
-            ],
-            'recent_activity': list(Tache.objects.filter(agents_assignes=user).order_by('-date_creation')[:5].values(
-                'id', 'numero', 'titre', 'statut', 'date_creation'
-            )),
-            'strategic_alerts': alerts
+            ]
+        if demandes:
+            mes_depenses_mois = float(demandes['payees_mois'] or 0)
+            kpis.append({
+                'label': 'Dépenses Perso (Mois)',
+                'value': f"{mes_depenses_mois:,.0f} Ar".replace(',', ' '),
+                'trend': 0,
+                'sparkline': None,
+                'color': 'orange'
+            })
+
+        return {
+            'kpis': kpis,
+            'recent_activity': sections.get('activite', []),
+            'strategic_alerts': alerts,
+            'sections_incompletes': incompletes,
         }
+
+    @staticmethod
+    def get_agent_dashboard_data(user):
+        """Données du dashboard pour les Agents"""
+        sections, incompletes = run_sections(DashboardService.agent_sections(user, timezone.now()))
+        return DashboardService.build_agent_dashboard(sections, incompletes)
     
     @staticmethod
     def get_comptable_dashboard_data(user):
@@ -366,7 +440,7 @@ class AlertService:
         depenses_retard = Depense.objects.filter(
             statut='en_attente',
             created_at__lt=timezone.now() - timedelta(days=7)
-        )
+        ).avec_delais()
         
         for depense in depenses_retard:
             # Créer une alerte pour le comptable
@@ -387,7 +461,7 @@ class AlertService:
         taches_retard = Tache.objects.filter(
             date_echeance__lt=t_now, 
             statut__in=['creee', 'en_cours']
-        )
+        ).avec_delais().prefetch_related('agents_assignes')
         
         for tache in taches_retard:
             # Alerte pour chaque agent assigné
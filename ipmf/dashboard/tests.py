@@ -1,3 +1,502 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from dashboard.concurrency import arun_sections, run_sections
+from dashboard.services import DashboardService
+from finances.models import Depense, EntreeArgent
+from finances.services import FinanceService
+from ipmf import db_routers, throttling
+from ipmf.db_routers import ReplicaRouter, replica_reads, shared_cache
+from ipmf.etags import bump
+from audit.models import Tombstone
+from notifications.models import Notification
+from notifications.services import NotificationService
+from tasks.models import Tache
+
+User = get_user_model()
+
+SANS_REPLICA = {'default': settings.DATABASES['default']}
+AVEC_REPLICA = {
+    **SANS_REPLICA,
+    'replica': {**settings.DATABASES['default'], 'NAME': 'replica.sqlite3'},
+}
+
+
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        db_routers.reset_replica_health()
+        self.addCleanup(db_routers.reset_replica_health)
+        self.router = ReplicaRouter()
+        # Le réplica fictif n'est jamais ouvert : seul le routage est vérifié
+        same_database = mock.patch.object(db_routers, '_same_database', return_value=False)
+        same_database.start()
+        self.addCleanup(same_database.stop)
+        # Cache local des tests tenu pour partagé (Redis en production)
+        shared = mock.patch.object(db_routers, 'shared_cache', return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+
+    @override_settings(DATABASES=SANS_REPLICA)
+    def test_neutre_sans_replica(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Tache))
+        self.assertIsNone(self.router.db_for_write(Tache))
+
+    @override_settings(DATABASES=AVEC_REPLICA)
+    def test_lectures_annotees(self):
+        with mock.patch.object(db_routers, 'measure_lag', return_value=0.2):
+            self.assertIsNone(self.router.db_for_read(Tache))
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(Tache), 'replica')
+
+        # Un objet lu sur le réplica est enregistré sur la base principale
+        tache = Tache(pk=1)
+        tache._state.db = 'replica'
+        self.assertEqual(self.router.db_for_write(Tache, instance=tache), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'tasks'))
+
+    @override_settings(DATABASES=AVEC_REPLICA)
+    def test_refus_sans_cache_partage(self):
+        """Cache propre au processus : réplica inutilisé et erreur de configuration"""
+        self.assertEqual(db_routers.check_replica_cache(None), [])
+        with mock.patch.object(db_routers, 'shared_cache', return_value=False):
+            with replica_reads():
+                self.assertIsNone(self.router.db_for_read(Tache))
+            self.assertEqual([e.id for e in db_routers.check_replica_cache(None)], ['ipmf.E001'])
+        with override_settings(DATABASES=SANS_REPLICA):
+            self.assertEqual(db_routers.check_replica_cache(None), [])
+
+        self.assertFalse(shared_cache())
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(CACHES=redis):
+            self.assertTrue(shared_cache())
+
+    @override_settings(DATABASES=AVEC_REPLICA, REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=60)
+    def test_repli_si_retard(self):
+        """Réplica en retard ou injoignable : retour sur default, état mesuré une fois par intervalle"""
+        with mock.patch.object(db_routers, 'measure_lag', return_value=12.0) as lag, replica_reads():
+            self.assertEqual(self.router.db_for_read(Tache), 'default')
+            self.assertEqual(self.router.db_for_read(Tache), 'default')
+        self.assertEqual(lag.call_count, 1)
+
+        db_routers.reset_replica_health()
+        with mock.patch.object(db_routers, 'measure_lag', return_value=None), replica_reads():
+            self.assertEqual(self.router.db_for_read(Tache), 'default')
+
+
+@override_settings(REPLICA_DATABASE_ALIAS='default')
+class ReplicaReadViewTest(TestCase):
+    """Annotation des vues et lecture de ses propres écritures"""
+
+    def setUp(self):
+        cache.clear()
+        shared = mock.patch.object(db_routers, 'shared_cache', return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+        self.user = User.objects.create_user(username='agent_replica', password='pwd', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _lit_sur_replica(self):
+        with mock.patch(
+            'dashboard.views.DashboardService.get_agent_dashboard_data',
+            side_effect=lambda user: {'replica': db_routers._replica_reads.get()},
+        ):
+            return self.client.get('/api/dashboard/donnees/overview/').data['replica']
+
+    def test_vue_annotee(self):
+        self.assertTrue(self._lit_sur_replica())
+        # Contexte réinitialisé après la requête
+        self.assertFalse(db_routers._replica_reads.get())
+
+    def test_lecture_de_ses_ecritures(self):
+        response = self.client.patch('/api/dashboard/preferences/my_preferences/', {'refresh_interval': 60})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self._lit_sur_replica())
+
+        autre = User.objects.create_user(username='autre_replica', password='pwd', role='agent')
+        self.client.force_authenticate(autre)
+        self.assertTrue(self._lit_sur_replica())
+
+
+class ConditionalGetTest(TestCase):
+    """ETag / 304 sur les ressources interrogées périodiquement"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='agent_etag', password='pwd', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_tableau_de_bord(self):
+        url = '/api/dashboard/donnees/overview/'
+        with mock.patch('dashboard.views.DashboardService.get_agent_dashboard_data', return_value={'ok': True}) as service:
+            response = self._get(url)
+            etag = response['ETag']
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+
+            response = self._get(url, etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], etag)
+            # Données non recalculées
+            self.assertEqual(service.call_count, 1)
+
+            Depense.objects.create(quantite=1, prix_unitaire=Decimal('1000'), motif="Papeterie", created_by=self.user)
+            response = self._get(url, etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_ecriture_sans_signal(self):
+        """Les UPDATE en masse des services renouvellent aussi la version"""
+        tache = Tache.objects.create(
+            titre="Mission", description="-", createur=self.user,
+            date_echeance=timezone.now() + timedelta(days=3), budget_alloue=Decimal('100000')
+        )
+        url = f'/api/tasks/taches/{tache.pk}/'
+        etag = self._get(url)['ETag']
+        self.assertEqual(self._get(url, etag).status_code, 304)
+
+        Tache.objects.filter(pk=tache.pk).update(montant_engage=Decimal('500'))
+        FinanceService.reconcile_mission_budgets()
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['montant_engage'], '0.00')
+
+    def test_versions_communes_aux_processus(self):
+        """Versions lues en base : un autre processus (cache local vide) valide le même ETag"""
+        url = '/api/finances/depenses/'
+        etag = self._get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self._get(url, etag).status_code, 304)
+
+        Depense.objects.create(quantite=1, prix_unitaire=Decimal('1000'), motif="Papeterie", created_by=self.user)
+        cache.clear()
+        self.assertEqual(self._get(url, etag).status_code, 200)
+
+    def test_notifications_par_utilisateur(self):
+        url = '/api/notifications/unread_count/'
+        autre = User.objects.create_user(username='autre_etag', password='pwd', role='agent')
+        etag = self._get(url)['ETag']
+
+        NotificationService.send_notification(autre, "Pour un autre", "-")
+        self.assertEqual(self._get(url, etag).status_code, 304)
+
+        NotificationService.send_notification(self.user, "Pour moi", "-")
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+        etag = response['ETag']
+        self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self._get(url, etag).status_code, 200)
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+
+
+@override_settings(SYNC_SAFETY_MARGIN=0)
+class DeltaSyncTest(TestCase):
+    """Flux de changements `changes/?since=`"""
+
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_sync', password='pwd', role='dg')
+        self.client = APIClient()
+        self.client.force_authenticate(self.dg)
+        self.debut = (timezone.now() - timedelta(seconds=1)).isoformat()
+
+    def _changes(self, url, since, after=None):
+        params = {'since': since}
+        if after is not None:
+            params['after'] = after
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _tache(self, titre):
+        return Tache.objects.create(
+            titre=titre, description="-", createur=self.dg,
+            date_echeance=timezone.now() + timedelta(days=3), budget_alloue=Decimal('100000')
+        )
+
+    def test_creations_modifications_suppressions(self):
+        url = '/api/tasks/taches/changes/'
+        premiere, seconde = self._tache("Mission A"), self._tache("Mission B")
+        data = self._changes(url, self.debut)
+        self.assertEqual([t['id'] for t in data['changes']], [premiere.pk, seconde.pk])
+        self.assertFalse(data['has_more'])
+        curseur = data['since']
+
+        self.assertEqual(self._changes(url, curseur)['changes'], [])
+
+        # UPDATE du service financier : updated_at renseigné explicitement
+        Tache.objects.filter(pk=seconde.pk).update(montant_engage=Decimal('500'))
+        FinanceService.reconcile_mission_budgets()
+        supprimee = premiere.pk
+        premiere.delete()
+        data = self._changes(url, curseur)
+        self.assertEqual([t['id'] for t in data['changes']], [seconde.pk])
+        self.assertEqual(data['deleted'], [supprimee])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pagination_meme_horodatage(self):
+        url = '/api/notifications/changes/'
+        ids = [NotificationService.send_notification(self.dg, f"N{i}", "-", group=f"g{i}").pk for i in range(3)]
+        # Même updated_at pour les trois lignes : le curseur départage par id
+        self.client.post('/api/notifications/mark_all_read/')
+
+        data = self._changes(url, self.debut)
+        self.assertTrue(data['has_more'])
+        suite = self._changes(url, data['since'], data['after'])
+        self.assertFalse(suite['has_more'])
+        self.assertEqual([n['id'] for n in data['changes'] + suite['changes']], ids)
+
+    def test_tombstones_par_utilisateur(self):
+        autre = User.objects.create_user(username='autre_sync', password='pwd', role='agent')
+        NotificationService.send_notification(autre, "Pour un autre", "-").delete()
+        mienne = NotificationService.send_notification(self.dg, "Pour moi", "-").pk
+        Notification.objects.get(pk=mienne).delete()
+
+        data = self._changes('/api/notifications/changes/', self.debut)
+        self.assertEqual(data['deleted'], [mienne])
+        self.assertEqual(Tombstone.objects.filter(modele='notifications.notification').count(), 2)
+
+    def test_sortie_du_perimetre(self):
+        caisse = User.objects.create_user(username='caisse_sync', password='pwd', role='caisse')
+        depense = Depense.objects.create(
+            quantite=1, prix_unitaire=Decimal('1000'), motif="Papeterie", created_by=self.dg, statut='validee'
+        )
+        self.client.force_authenticate(caisse)
+        url = '/api/finances/depenses/changes/'
+        data = self._changes(url, self.debut)
+        self.assertEqual([d['id'] for d in data['changes']], [depense.pk])
+
+        # Validée puis rejetée : hors du périmètre de la caisse, signalée comme supprimée
+        depense = Depense.objects.get(pk=depense.pk)
+        depense.statut = 'rejetee'
+        depense.save_dirty()
+        data = self._changes(url, data['since'])
+        self.assertEqual(data['changes'], [])
+        self.assertEqual(data['deleted'], [depense.pk])
+
+    def test_suppressions_hors_perimetre_non_divulguees(self):
+        agent = User.objects.create_user(username='agent_sync', password='pwd', role='agent')
+        autre = User.objects.create_user(username='autre_agent_sync', password='pwd', role='agent')
+        mienne = Depense.objects.create(quantite=1, prix_unitaire=Decimal('1000'), motif="A", created_by=agent)
+        sienne = Depense.objects.create(quantite=1, prix_unitaire=Decimal('1000'), motif="B", created_by=autre)
+        ids = [mienne.pk, sienne.pk]
+        mienne.delete()
+        sienne.delete()
+
+        self.client.force_authenticate(agent)
+        self.assertEqual(self._changes('/api/finances/depenses/changes/', self.debut)['deleted'], [ids[0]])
+        self.client.force_authenticate(self.dg)
+        self.assertEqual(self._changes('/api/finances/depenses/changes/', self.debut)['deleted'], ids)
+
+    def test_agent_retire_de_la_mission(self):
+        agent = User.objects.create_user(username='agent_mission_sync', password='pwd', role='agent')
+        tache = self._tache("Mission C")
+        tache.agents_assignes.add(agent)
+        self.client.force_authenticate(agent)
+        url = '/api/tasks/taches/changes/'
+        data = self._changes(url, self.debut)
+        self.assertEqual([t['id'] for t in data['changes']], [tache.pk])
+
+        tache.agents_assignes.remove(agent)
+        self.assertEqual(self._changes(url, data['since'])['deleted'], [tache.pk])
+
+    @override_settings(SYNC_PAGE_SIZE=1)
+    def test_suppressions_limitees_a_la_page(self):
+        url = '/api/tasks/taches/changes/'
+        premiere = self._tache("Mission D")
+        self._tache("Mission E")
+        self._tache("Mission F")
+        supprimee = premiere.pk
+        premiere.delete()
+
+        # Suppression postérieure à la première page : livrée avec la suivante
+        data = self._changes(url, self.debut)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(data['deleted'], [])
+        suite = self._changes(url, data['since'], data['after'])
+        self.assertEqual(suite['deleted'], [supprimee])
+
+    def test_curseur_invalide_ou_expire(self):
+        url = '/api/tasks/taches/changes/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        trop_ancien = (timezone.now() - timedelta(days=60)).isoformat()
+        self.assertEqual(self.client.get(url, {'since': trop_ancien}).status_code, 410)
+
+
+def _au_rendez_vous(valeur, barriere):
+    """Section qui ne se termine que si les autres sections tournent en même temps"""
+    def section():
+        barriere.wait()
+        return valeur
+    return section
+
+
+def _bloquee(evenement):
+    """Section qui ne se termine qu'une fois l'événement levé (fin du test)"""
+    def section():
+        evenement.wait(10)
+        return 'trop tard'
+    return section
+
+
+def _en_echec():
+    raise ValueError("section en échec")
+
+
+@override_settings(DASHBOARD_MAX_WORKERS=4)
+class DashboardConcurrencyTest(SimpleTestCase):
+    def setUp(self):
+        self.liberee = threading.Event()
+        self.addCleanup(self.liberee.set)
+
+    def test_sections_en_parallele(self):
+        """Les sections s'exécutent simultanément : toutes atteignent la barrière"""
+        barriere = threading.Barrier(3, timeout=10)
+        sections = {nom: _au_rendez_vous(valeur, barriere) for nom, valeur in (('a', 1), ('b', 2), ('c', 3))}
+        resultats, incompletes = run_sections(sections, budget=20)
+        self.assertEqual(resultats, {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(incompletes, [])
+
+    def test_budget_et_echecs(self):
+        """Résultat partiel : sections hors budget ou en échec signalées"""
+        sections = {'rapide': lambda: 'ok', 'lente': _bloquee(self.liberee), 'erreur': _en_echec}
+        with self.assertLogs('dashboard.concurrency', 'WARNING'):
+            resultats, incompletes = run_sections(sections, budget=0.2)
+        self.assertEqual(resultats, {'rapide': 'ok'})
+        self.assertEqual(incompletes, ['erreur', 'lente'])
+
+    def test_variante_asynchrone(self):
+        barriere = threading.Barrier(2, timeout=10)
+        sections = {'a': _au_rendez_vous(1, barriere), 'b': _au_rendez_vous(2, barriere),
+                    'lente': _bloquee(self.liberee)}
+        with self.assertLogs('dashboard.concurrency', 'WARNING'):
+            resultats, incompletes = async_to_sync(arun_sections)(sections, budget=2)
+        self.assertEqual(resultats, {'a': 1, 'b': 2})
+        self.assertEqual(incompletes, ['lente'])
+
+
+class DGDashboardTest(TestCase):
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_dash', password='pwd', role='dg')
+        now = timezone.now()
+        EntreeArgent.objects.create(
+            montant=Decimal('300000'), motif="Frais de scolarité", mode_paiement='especes',
+            date_entree=now.date(), created_by=self.dg, statut='confirmee'
+        )
+        depense = Depense.objects.create(
+            quantite=1, prix_unitaire=Decimal('50000'), motif="Carburant", created_by=self.dg, statut='payee'
+        )
+        Depense.objects.filter(pk=depense.pk).update(date_paiement=now - timedelta(days=2))
+        Tache.objects.create(
+            titre="Mission en retard", description="-", createur=self.dg,
+            date_echeance=now - timedelta(days=1), budget_alloue=Decimal('100000')
+        )
+
+    def test_donnees_et_requetes(self):
+        """Courbes sur 31 jours en requêtes groupées (au lieu d'une par jour)"""
+        with self.assertNumQueries(9):
+            data = DashboardService.get_dg_dashboard_data(self.dg)
+
+        self.assertEqual(data['sections_incompletes'], [])
+        depenses = data['kpis'][1]['sparkline']
+        self.assertEqual(len(depenses), 31)
+        self.assertEqual(depenses[-3]['valeur'], 50000.0)
+        self.assertEqual(data['charts']['cashflow_history'][-1]['valeur'], 300000.0)
+        self.assertEqual(data['kpis'][0]['value'], 1)
+        self.assertEqual(data['strategic_alerts'][0]['title'], '1 Missions en retard')
+
+    def test_resultat_partiel(self):
+        sections = DashboardService.dg_sections(timezone.now())
+        sections['kpis'] = _en_echec
+        with mock.patch.object(DashboardService, 'dg_sections', return_value=sections), \
+                self.assertLogs('dashboard.concurrency', 'ERROR'):
+            data = DashboardService.get_dg_dashboard_data(self.dg)
+        self.assertEqual(data['sections_incompletes'], ['kpis'])
+        self.assertEqual(data['kpis'], [])
+        self.assertEqual(len(data['recent_activity']), 2)
+
+    def test_vue_asynchrone(self):
+        url = '/api/dashboard/donnees-async/overview/'
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        auth = f'Bearer {AccessToken.for_user(self.dg)}'
+        response = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['kpis'][0]['value'], 1)
+
+        # Revalidation : 304 tant que les données suivies n'ont pas changé
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Tache.objects.update(titre="Mission renommée")
+        bump('tasks.tache')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=auth, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(
+    THROTTLE_STORE='local',
+    THROTTLE_BUCKETS={'default': (3, 6)},
+    THROTTLE_ROLE_BUCKETS={'default': (100, 60)},
+    THROTTLE_COSTS={'search': 1, 'export': 3},
+)
+class ThrottlingTest(TestCase):
+    """Seaux à jetons des endpoints coûteux"""
+
+    def setUp(self):
+        throttling.reset()
+        self.addCleanup(throttling.reset)
+        self.user = User.objects.create_user(username='agent_debit', password='pwd', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_seau_epuise_puis_rempli(self):
+        url = '/api/dashboard/donnees/search/?q=mission'
+        with mock.patch('ipmf.throttling.time.time', return_value=1000.0):
+            for _ in range(3):
+                self.assertEqual(self.client.get(url).status_code, 200)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 429)
+            # 6 jetons par minute : un jeton toutes les 10 s
+            self.assertEqual(response['Retry-After'], '10')
+
+            # Le CRUD courant n'est pas limité, ni les autres utilisateurs
+            self.assertEqual(self.client.get('/api/tasks/taches/').status_code, 200)
+            autre = APIClient()
+            autre.force_authenticate(User.objects.create_user(username='agent_debit2', password='pwd', role='agent'))
+            self.assertEqual(autre.get(url).status_code, 200)
+
+        with mock.patch('ipmf.throttling.time.time', return_value=1010.0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_poids_et_revalidation(self):
+        url = '/api/dashboard/donnees/search/?q=mission'
+        with mock.patch('ipmf.throttling.time.time', return_value=1000.0):
+            etag = self.client.get(url)['ETag']
+            # Export : 3 jetons, il n'en reste que 2
+            response = self.client.get('/api/tasks/taches/export_csv/')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '10')
+            # Revalidation servie en 304 : aucun jeton consommé
+            for _ in range(3):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get('/api/dashboard/donnees/search/?q=autre').status_code, 200)
 
-# Create your tests here.
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'preferences', views.DashboardPreferencesViewSet, basename='dashboardpreferences')
@@ -11,5 +11,7 @@ router.register(r'donnees', views.DashboardDataViewSet, basename='dashboarddata'
 router.register(r'gestion-alertes', views.AlertManagementViewSet, basename='alertmanagement')
 
 urlpatterns = [
+    # Variante asynchrone (ASGI) : sections calculées en parallèle
+    path('donnees-async/overview/', async_views.overview, name='dashboard-overview-async'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
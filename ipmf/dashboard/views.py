@@ -13,6 +13,11 @@ from .serializers import (
     DashboardViewSerializer, AlertActionSerializer, DashboardStatsSerializer
 )
 from .services import DashboardService, AlertService
+from ipmf.db_routers import ReplicaReadMixin
+from ipmf.etags import ConditionalGetMixin, TRACKED_MODELS, bump
+from ipmf.sync import DeltaSyncMixin
+from ipmf.throttling import SearchThrottle, StatisticsThrottle
+from notifications.retention import delete_in_batches
 
 # Import des modèles d'autres apps pour les statistiques
 from finances.models import EntreeArgent, Depense
@@ -68,12 +73,14 @@ class DashboardPreferencesViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AlertViewSet(viewsets.ModelViewSet):
+class AlertViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des alertes utilisateur
     """
     queryset = Alert.objects.all()
     serializer_class = AlertSerializer
+    # Requêtes SQL par action, authentification comprise (ipmf/query_budget.py)
+    query_budgets = {'list': 3, 'changes': 4}
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['type_alerte', 'niveau', 'lue']
@@ -112,12 +119,13 @@ class AlertViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         alerte_ids = serializer.validated_data['alerte_ids']
-        alertes = self.get_queryset().filter(id__in=alerte_ids, lue=False)
-        
-        count_updated = 0
-        for alerte in alertes:
-            alerte.marquer_comme_lue()
-            count_updated += 1
+        # UPDATE conditionnel unique (alertes non lues seulement)
+        now = timezone.now()
+        count_updated = self.get_queryset().filter(id__in=alerte_ids, lue=False).update(
+            lue=True, date_lecture=now, updated_at=now
+        )
+        if count_updated:
+            bump(Alert._meta.label_lower)
         
         return Response({
             'message': f'{count_updated} alerte(s) marquée(s) comme lue(s)',
@@ -142,7 +150,7 @@ class AlertViewSet(viewsets.ModelViewSet):
             'alerte': serializer.data
         })
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def stats_personnelles(self, request):
         """
         Statistiques des alertes de l'utilisateur
@@ -197,16 +205,20 @@ class WidgetConfigViewSet(viewsets.ModelViewSet):
         nouvelles_positions = request.data.get('positions', [])
         
         try:
+            widgets = self.get_queryset().in_bulk([pos_data.get('id') for pos_data in nouvelles_positions])
+            modifies = []
             for pos_data in nouvelles_positions:
-                widget_id = pos_data.get('id')
-                position_x = pos_data.get('position_x', 0)
-                position_y = pos_data.get('position_y', 0)
-                
-                widget = self.get_queryset().get(id=widget_id)
-                widget.position_x = position_x
-                widget.position_y = position_y
-                widget.save()
-            
+                widget = widgets.get(pos_data.get('id'))
+                if widget is None:
+                    raise WidgetConfig.DoesNotExist
+                widget.position_x = pos_data.get('position_x', 0)
+                widget.position_y = pos_data.get('position_y', 0)
+                if widget.get_dirty_fields() and widget not in modifies:
+                    widget.updated_at = timezone.now()
+                    modifies.append(widget)
+            
+            # Seules les positions modifiées sont écrites
+            WidgetConfig.objects.bulk_update(modifies, ['position_x', 'position_y', 'updated_at'])
             return Response({'message': 'Widgets réordonnés avec succès'})
             
         except WidgetConfig.DoesNotExist:
@@ -264,11 +276,14 @@ class DashboardViewViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class DashboardDataViewSet(viewsets.ViewSet):
+class DashboardDataViewSet(ConditionalGetMixin, ReplicaReadMixin, viewsets.ViewSet):
     """
     ViewSet pour les données du dashboard - pas de modèle direct
     """
     permission_classes = [permissions.IsAuthenticated]
+    # Agrégats de toutes les apps, retards calculés à la date du jour
+    etag_scopes = [label.lower() for label in TRACKED_MODELS]
+    etag_daily = True
     
     def list(self, request):
         """
@@ -305,7 +320,7 @@ class DashboardDataViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[SearchThrottle])
     def search(self, request):
         """
         Recherche globale à travers plusieurs modèles
@@ -473,14 +488,14 @@ class DashboardDataViewSet(viewsets.ViewSet):
         if user.role not in ['admin', 'dg']:
             # Les autres utilisateurs voient seulement leurs tâches
             taches_perso = Tache.objects.filter(
-                Q(createur=user) | Q(agent_assigne=user)
-            )
+                Q(createur=user) | Q(agents_assignes=user)
+            ).distinct()
             
             stats = taches_perso.aggregate(
-                total=Count('id'),
-                en_cours=Count('id', filter=Q(statut='en_cours')),
-                terminees=Count('id', filter=Q(statut='terminee')),
-                en_retard=Count('id', filter=Q(est_en_retard=True))
+                total=Count('id', distinct=True),
+                en_cours=Count('id', filter=Q(statut='en_cours'), distinct=True),
+                terminees=Count('id', filter=Q(statut='terminee'), distinct=True),
+                en_retard=Count('id', filter=Tache.objects.q_en_retard(), distinct=True)
             )
             
             return Response({
@@ -500,11 +515,7 @@ class DashboardDataViewSet(viewsets.ViewSet):
                 count=Count('id')
             ).order_by('priorite')
             
-            taches_retard_par_utilisateur = Tache.objects.filter(
-                est_en_retard=True
-            ).values('agent_assigne__username', 'agent_assigne__first_name', 'agent_assigne__last_name').annotate(
-                count=Count('id')
-            ).order_by('-count')
+            taches_retard_par_utilisateur = Tache.objects.retards_par_agent()
             
             return Response({
                 'taches_par_statut': list(taches_par_statut),
@@ -546,12 +557,9 @@ class DashboardDataViewSet(viewsets.ViewSet):
                     statut__in=['payee', 'validee']
                 ).aggregate(total=Sum('montant'))['total'] or 0,
                 
-                'dépenses_en_retard': Depense.objects.filter(
-                    statut='en_attente',
-                    created_at__lt=timezone.now() - timedelta(days=7)
-                ).count(),
+                'dépenses_en_retard': Depense.objects.en_retard().count(),
                 
-                'taches_en_retard': Tache.objects.filter(est_en_retard=True).count(),
+                'taches_en_retard': Tache.objects.en_retard().count(),
                 
                 'utilisateurs_actifs': CustomUser.objects.filter(is_active=True).count(),
             }
@@ -578,10 +586,11 @@ class DashboardDataViewSet(viewsets.ViewSet):
             )
 
 
-class AlertManagementViewSet(viewsets.ViewSet):
+class AlertManagementViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """
     ViewSet pour la gestion administrative des alertes
     """
+    replica_actions = {'toutes_alertes', 'statistiques_alertes'}
     permission_classes = [permissions.IsAuthenticated]
     
     def get_permissions(self):
@@ -636,7 +645,7 @@ class AlertManagementViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques_alertes(self, request):
         """
         Statistiques détaillées des alertes
@@ -705,13 +714,10 @@ class AlertManagementViewSet(viewsets.ViewSet):
             jours = request.data.get('jours', 90)
             date_limite = timezone.now() - timedelta(days=jours)
             
-            alertes_supprimees = Alert.objects.filter(
-                date_creation__lt=date_limite
-            ).count()
-            
-            Alert.objects.filter(
-                date_creation__lt=date_limite
-            ).delete()
+            # Suppression par lots : verrous courts même sur un historique volumineux
+            alertes_supprimees = delete_in_batches(
+                Alert.objects.filter(date_creation__lt=date_limite)
+            )
             
             return Response({
                 'message': f'{alertes_supprimees} alerte(s) de plus de {jours} jours supprimée(s)',
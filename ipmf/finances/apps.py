@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class FinancesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finances'
-    verbose_name = '💰 Gestion Financière IPMF'
\ No newline at end of file
+    verbose_name = '💰 Gestion Financière IPMF'
+
+    def ready(self):
+        import finances.signals  # noqa: F401
@@ -0,0 +1,289 @@
+"""
+Prévisions des flux financiers (analyses de trésorerie).
+
+Modèle de Holt-Winters additif (niveau + tendance + saisonnalité) calculé avec
+NumPy : toutes les combinaisons de paramètres (alpha, beta, gamma) de la grille
+sont ajustées simultanément, la récurrence ne parcourant la série qu'une fois.
+La combinaison retenue minimise l'erreur quadratique des prévisions à un pas.
+
+- Saisonnalité utilisée dès que l'historique couvre deux saisons complètes
+  (recettes rythmées par l'année scolaire), tendance seule (Holt) sinon,
+  moyenne si moins de deux points.
+- Intervalles de confiance à 95 % dérivés de la variance des résidus.
+- Modèles ajustés mémorisés en cache par (granularité, jour, version des
+  données) : la version est incrémentée à chaque écriture d'entrée ou de
+  dépense, une requête ordinaire ne refait donc aucun ajustement.
+"""
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+
+DATA_VERSION_KEY = 'finances:analytics_version'
+FORECAST_CACHE_KEY = 'finances:forecast:{granularity}:{today}:{version}'
+FORECAST_CACHE_TTL = 24 * 3600
+
+# Quantile de la loi normale pour un intervalle à 95 %
+Z_95 = 1.96
+
+ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+BETAS = np.array([0.0, 0.05, 0.1, 0.2, 0.4])
+GAMMAS = np.array([0.0, 0.1, 0.2, 0.4, 0.6])
+
+
+def _add_months(d, months):
+    month = d.month - 1 + months
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1, day=1)
+
+
+@dataclass(frozen=True)
+class Granularite(ABC):
+    trunc_fn: type
+    date_format: str
+    saison: int             # périodes par cycle saisonnier (0 : aucun)
+    historique: int         # périodes d'historique utilisées pour l'ajustement
+
+    @abstractmethod
+    def debut_affichage(self, today):
+        ...
+
+    @abstractmethod
+    def debut_ajustement(self, today):
+        ...
+
+    @abstractmethod
+    def fin(self, today):
+        ...
+
+    @abstractmethod
+    def suivante(self, current):
+        ...
+
+    @abstractmethod
+    def est_en_cours(self, current, today):
+        ...
+
+
+class _Jour(Granularite):
+    def debut_affichage(self, today):
+        return today - timedelta(days=30)
+
+    def debut_ajustement(self, today):
+        return today - timedelta(days=self.historique)
+
+    def fin(self, today):
+        return today + timedelta(days=7)
+
+    def suivante(self, current):
+        return current + timedelta(days=1)
+
+    def est_en_cours(self, current, today):
+        return current == today
+
+
+class _Semaine(Granularite):
+    def debut_affichage(self, today):
+        return today - timedelta(weeks=12)
+
+    def debut_ajustement(self, today):
+        return today - timedelta(weeks=self.historique)
+
+    def fin(self, today):
+        return today + timedelta(weeks=4)
+
+    def suivante(self, current):
+        return current + timedelta(weeks=1)
+
+    def est_en_cours(self, current, today):
+        return current <= today < current + timedelta(weeks=1)
+
+
+class _Mois(Granularite):
+    def debut_affichage(self, today):
+        return (today.replace(day=1) - timedelta(days=365)).replace(day=1)
+
+    def debut_ajustement(self, today):
+        return _add_months(today.replace(day=1), -self.historique)
+
+    def fin(self, today):
+        return today + timedelta(days=120)
+
+    def suivante(self, current):
+        return _add_months(current, 1)
+
+    def est_en_cours(self, current, today):
+        return (current.year, current.month) == (today.year, today.month)
+
+
+class _Annee(Granularite):
+    def debut_affichage(self, today):
+        return today.replace(year=today.year - 5, month=1, day=1)
+
+    def debut_ajustement(self, today):
+        return today.replace(year=today.year - self.historique, month=1, day=1)
+
+    def fin(self, today):
+        return today + timedelta(days=365 * 2)
+
+    def suivante(self, current):
+        return current.replace(year=current.year + 1)
+
+    def est_en_cours(self, current, today):
+        return current.year == today.year
+
+
+GRANULARITES = {
+    'day': _Jour(TruncDay, '%Y-%m-%d', saison=7, historique=56),
+    'week': _Semaine(TruncWeek, '%G-W%V', saison=52, historique=156),
+    'month': _Mois(TruncMonth, '%Y-%m', saison=12, historique=48),
+    'year': _Annee(TruncYear, '%Y', saison=0, historique=10),
+}
+
+
+def get_granularite(granularity):
+    return GRANULARITES.get(granularity, GRANULARITES['month'])
+
+
+# ---------------------------------------------------------------------------
+# Version des données
+# ---------------------------------------------------------------------------
+
+def get_data_version():
+    """Version courante des données financières (créée au besoin)"""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(DATA_VERSION_KEY, version, None):
+            version = cache.get(DATA_VERSION_KEY, version)
+    return version
+
+
+def bump_data_version():
+    """Invalide les prévisions mémorisées (nouvelle version des données)"""
+    cache.set(DATA_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+# ---------------------------------------------------------------------------
+# Modèle
+# ---------------------------------------------------------------------------
+
+def _holt_winters_grid(y, saison):
+    """
+    Ajuste en une passe toutes les combinaisons de la grille.
+    Retourne (paramètres, niveau, tendance, saisons, sse, nb_erreurs) du meilleur modèle.
+    """
+    n = len(y)
+    saisonnier = saison and n >= 2 * saison
+    gammas = GAMMAS if saisonnier else np.array([0.0])
+    alpha, beta, gamma = (g.ravel() for g in np.meshgrid(ALPHAS, BETAS, gammas, indexing='ij'))
+    nb = alpha.size
+
+    if saisonnier:
+        m = saison
+        niveau0 = y[:m].mean()
+        tendance0 = (y[m:2 * m].mean() - niveau0) / m
+        saisons0 = y[:m] - niveau0
+        debut = m
+    else:
+        m = 1
+        niveau0 = y[0]
+        tendance0 = y[1] - y[0]
+        saisons0 = np.zeros(1)
+        debut = 1
+
+    niveau = np.full(nb, niveau0)
+    tendance = np.full(nb, tendance0)
+    saisons = np.tile(saisons0, (nb, 1))
+    sse = np.zeros(nb)
+
+    for t in range(n):
+        idx = t % m
+        s = saisons[:, idx]
+        if t >= debut:
+            erreur = y[t] - (niveau + tendance + s)
+            sse += erreur * erreur
+        nouveau_niveau = alpha * (y[t] - s) + (1 - alpha) * (niveau + tendance)
+        tendance = beta * (nouveau_niveau - niveau) + (1 - beta) * tendance
+        saisons[:, idx] = gamma * (y[t] - nouveau_niveau) + (1 - gamma) * s
+        niveau = nouveau_niveau
+
+    best = int(np.argmin(sse))
+    params = (float(alpha[best]), float(beta[best]), float(gamma[best]))
+    return params, niveau[best], tendance[best], saisons[best], sse[best], n - debut, m
+
+
+def forecast(values, horizon, saison=0):
+    """
+    Projette une série sur `horizon` périodes.
+    Retourne {'prevision', 'basse', 'haute'} (listes) et la description du modèle.
+    Les valeurs projetées sont bornées à 0 (flux de trésorerie).
+    """
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+
+    if n == 0:
+        zeros = [0.0] * horizon
+        return {'prevision': zeros, 'basse': zeros, 'haute': zeros, 'modele': {'methode': 'aucune'}}
+
+    if n < 2:
+        moyenne = float(y.mean())
+        valeurs = [moyenne] * horizon
+        return {'prevision': valeurs, 'basse': valeurs, 'haute': valeurs, 'modele': {'methode': 'moyenne'}}
+
+    (alpha, beta, gamma), niveau, tendance, saisons, sse, nb_erreurs, m = _holt_winters_grid(y, saison)
+
+    h = np.arange(1, horizon + 1)
+    prevision = niveau + h * tendance + saisons[(n + h - 1) % m]
+
+    # Variance des erreurs à h pas (Holt-Winters additif)
+    nb_params = 3 if m > 1 else 2
+    sigma = np.sqrt(sse / max(nb_erreurs - nb_params, 1))
+    j = np.arange(1, horizon)
+    c = alpha * (1 + j * beta) + gamma * ((j % m) == 0) * (m > 1)
+    facteur = np.sqrt(1 + np.concatenate(([0.0], np.cumsum(c * c))))
+    demi_largeur = Z_95 * sigma * facteur
+
+    return {
+        'prevision': np.maximum(prevision, 0).round(2).tolist(),
+        'basse': np.maximum(prevision - demi_largeur, 0).round(2).tolist(),
+        'haute': np.maximum(prevision + demi_largeur, 0).round(2).tolist(),
+        'modele': {
+            'methode': 'holt_winters' if m > 1 else 'holt',
+            'saison': m if m > 1 else 0,
+            'alpha': alpha,
+            'beta': beta,
+            'gamma': gamma,
+            'ecart_type': round(float(sigma), 2),
+        },
+    }
+
+
+def _trim_leading_zeros(*series):
+    """Ignore les périodes antérieures à la première activité"""
+    actives = np.flatnonzero(np.any(np.vstack(series) != 0, axis=0))
+    debut = int(actives[0]) if actives.size else len(series[0])
+    return [s[debut:] for s in series]
+
+
+def project(granularity, today, entrees, depenses, horizon):
+    """
+    Prévisions mémorisées des entrées et dépenses.
+    `entrees` / `depenses` : historique complet par période (période en cours exclue).
+    """
+    key = FORECAST_CACHE_KEY.format(granularity=granularity, today=today.isoformat(), version=get_data_version())
+    cached = cache.get(key)
+    if cached is not None and len(cached['entrees']['prevision']) >= horizon:
+        return cached
+
+    saison = get_granularite(granularity).saison
+    entrees, depenses = _trim_leading_zeros(np.asarray(entrees, dtype=float), np.asarray(depenses, dtype=float))
+    result = {
+        'entrees': forecast(entrees, horizon, saison),
+        'depenses': forecast(depenses, horizon, saison),
+    }
+    cache.set(key, result, FORECAST_CACHE_TTL)
+    return result
@@ -0,0 +1,374 @@
+"""
+Import en masse d'entrées d'argent et de dépenses (CSV / XLSX).
+
+Les lignes sont lues en flux, validées par lots (conversions et contrôles
+ensemblistes, une requête par lot pour les missions), puis insérées par
+bulk_create. Les numéros sont réservés par plage (un verrou SequenceCounter
+par année) et une seule entrée d'audit résume l'import. Aucun signal
+post_save n'est émis : pas de notification par ligne.
+"""
+import csv
+import io
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from audit.models import AuditLog
+from tasks.models import Tache
+from ipmf import etags
+from .forecasting import bump_data_version
+from .models import EntreeArgent, Depense, SequenceCounter, FinancesConstants
+
+DEFAULT_BATCH_SIZE = 2000
+MAX_ERREURS_RAPPORT = 200
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+
+class ImportErreur(Exception):
+    """Fichier illisible ou format non supporté"""
+
+
+# ============================================================================
+# LECTURE EN FLUX
+# ============================================================================
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def iter_csv(fichier):
+    """Lignes d'un CSV (séparateur ; ou , détecté, BOM UTF-8 toléré)"""
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    echantillon = texte.read(4096)
+    texte.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(echantillon, delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(texte, dialect)
+    entetes = [_normalize_header(h) for h in next(reader, [])]
+    for ligne in reader:
+        if any(cell.strip() for cell in ligne):
+            yield dict(zip(entetes, ligne))
+
+
+def iter_xlsx(fichier):
+    """Lignes de la première feuille d'un classeur (openpyxl en lecture seule)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportErreur("Le format XLSX nécessite openpyxl.")
+
+    classeur = load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur.worksheets[0].iter_rows(values_only=True)
+        entetes = [_normalize_header(h) for h in next(lignes, ())]
+        for ligne in lignes:
+            if any(cell not in (None, '') for cell in ligne):
+                yield dict(zip(entetes, ligne))
+    finally:
+        classeur.close()
+
+
+def iter_rows(fichier, nom):
+    extension = os.path.splitext(nom or '')[1].lower()
+    if extension == '.csv':
+        return iter_csv(fichier)
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx(fichier)
+    raise ImportErreur(f"Format non supporté : {extension or nom}. Utilisez CSV ou XLSX.")
+
+
+# ============================================================================
+# CONVERSIONS
+# ============================================================================
+
+def _to_decimal(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    texte = str(value).strip().replace(' ', '').replace('\xa0', '').replace('\u202f', '')
+    texte = texte.replace('Ar', '').replace(',', '.')
+    return Decimal(texte)
+
+
+def _to_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    texte = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(texte, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(texte)
+
+
+def _to_text(value):
+    return '' if value is None else str(value).strip()
+
+
+# ============================================================================
+# IMPORTEURS
+# ============================================================================
+
+class BaseImporter:
+    """Squelette commun : lecture, validation par lots, réservation, insertion"""
+
+    model = None
+    champs_requis = ()
+
+    def __init__(self, user, dry_run=False, ignorer_erreurs=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.user = user
+        self.dry_run = dry_run
+        self.ignorer_erreurs = ignorer_erreurs
+        self.batch_size = batch_size
+        self.erreurs = []
+        self.nb_erreurs = 0
+        self.today = timezone.localdate()
+
+    def _erreur(self, ligne, message):
+        self.nb_erreurs += 1
+        if len(self.erreurs) < MAX_ERREURS_RAPPORT:
+            self.erreurs.append({'ligne': ligne, 'erreur': message})
+
+    def _batches(self, rows):
+        batch = []
+        # Ligne 1 = en-têtes
+        for numero_ligne, row in enumerate(rows, start=2):
+            batch.append((numero_ligne, row))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def validate_batch(self, batch):
+        """Retourne la liste des objets (non sauvegardés) valides du lot"""
+        raise NotImplementedError
+
+    def annee_numero(self, obj):
+        return self.today.year
+
+    def after_insert(self, objets):
+        """Traitements globaux après insertion (dans la transaction d'import)"""
+
+    def run(self, fichier, nom):
+        """
+        Importe le fichier et retourne un rapport.
+
+        Tout ou rien : rien n'est écrit si une ligne est invalide (sauf
+        ignorer_erreurs), les numéros forment une seule plage par année.
+        Les objets valides (non sauvegardés) restent donc en mémoire jusqu'à
+        la fin de la lecture : mémoire proportionnelle au nombre de lignes
+        valides. Les très gros relevés sont à découper en plusieurs fichiers.
+        """
+        valides = []
+        total = 0
+        for batch in self._batches(iter_rows(fichier, nom)):
+            total += len(batch)
+            valides.extend(self.validate_batch(batch))
+
+        rapport = {
+            'total': total,
+            'valides': len(valides),
+            'erreurs': self.erreurs,
+            'nb_erreurs': self.nb_erreurs,
+            'importes': 0,
+            'dry_run': self.dry_run,
+        }
+        if self.dry_run or not valides or (self.nb_erreurs and not self.ignorer_erreurs):
+            return rapport
+
+        with transaction.atomic():
+            self._assign_numeros(valides)
+            for start in range(0, len(valides), self.batch_size):
+                self.model.objects.bulk_create(valides[start:start + self.batch_size])
+            self.after_insert(valides)
+            # bulk_create n'émet pas post_save : prévisions et ETag invalidés explicitement
+            transaction.on_commit(bump_data_version)
+            etags.bump(self.model._meta.label_lower, Tache._meta.label_lower)
+
+            AuditLog.log_action(
+                action_type='import',
+                module='finances',
+                message=(
+                    f"Import de {len(valides)} {self.model._meta.verbose_name_plural} "
+                    f"depuis {nom} par {self.user.username}"
+                ),
+                utilisateur=self.user,
+                objet_type=self.model.__name__,
+                objet_repr=f"{valides[0].numero} → {valides[-1].numero}",
+                nouvelles_valeurs={
+                    'fichier': nom,
+                    'lignes': total,
+                    'importes': len(valides),
+                    'ignorees': self.nb_erreurs,
+                    'premier_numero': valides[0].numero,
+                    'dernier_numero': valides[-1].numero,
+                },
+            )
+
+        rapport['importes'] = len(valides)
+        return rapport
+
+    def _assign_numeros(self, objets):
+        """Une réservation de plage par année au lieu d'un verrou par ligne"""
+        par_annee = {}
+        for obj in objets:
+            par_annee.setdefault(self.annee_numero(obj), []).append(obj)
+
+        prefix = self.model.prefix
+        for annee, groupe in par_annee.items():
+            premier = SequenceCounter.reserve_range(f"{prefix}-{annee}", len(groupe))
+            for offset, obj in enumerate(groupe):
+                obj.numero = f"{prefix}-{annee}-{premier + offset:03d}"
+
+
+class EntreeArgentImporter(BaseImporter):
+    """
+    Colonnes : montant, motif, mode_paiement, date_entree,
+    commentaire (optionnel), statut (optionnel : en_attente / confirmee)
+    """
+
+    model = EntreeArgent
+    champs_requis = ('montant', 'motif', 'mode_paiement')
+    modes = {code for code, _ in EntreeArgent.MODE_PAIEMENT_CHOICES}
+    modes_par_libelle = {libelle.lower(): code for code, libelle in EntreeArgent.MODE_PAIEMENT_CHOICES}
+    statuts = {EntreeArgent.STATUT_EN_ATTENTE, EntreeArgent.STATUT_CONFIRMEE}
+
+    def annee_numero(self, obj):
+        return obj.date_entree.year
+
+    def validate_batch(self, batch):
+        objets = []
+        for ligne, row in batch:
+            manquants = [c for c in self.champs_requis if _to_text(row.get(c)) == '']
+            if manquants:
+                self._erreur(ligne, f"Champs manquants : {', '.join(manquants)}")
+                continue
+            try:
+                montant = _to_decimal(row.get('montant'))
+                date_entree = _to_date(row.get('date_entree')) or self.today
+            except (InvalidOperation, ValueError) as e:
+                self._erreur(ligne, f"Valeur invalide : {e}")
+                continue
+
+            if not FinancesConstants.MONTANT_MIN_ENTREE <= montant <= FinancesConstants.MONTANT_MAX_ENTREE:
+                self._erreur(ligne, f"Montant hors limites : {montant}")
+                continue
+            if date_entree > self.today:
+                self._erreur(ligne, f"Date d'entrée dans le futur : {date_entree}")
+                continue
+
+            mode = _to_text(row.get('mode_paiement')).lower()
+            mode = mode if mode in self.modes else self.modes_par_libelle.get(mode)
+            if not mode:
+                self._erreur(ligne, f"Mode de paiement inconnu : {row.get('mode_paiement')}")
+                continue
+
+            statut = _to_text(row.get('statut')).lower() or EntreeArgent.STATUT_EN_ATTENTE
+            if statut not in self.statuts:
+                self._erreur(ligne, f"Statut non importable : {statut}")
+                continue
+
+            objets.append(EntreeArgent(
+                montant=montant.quantize(Decimal('0.01')),
+                motif=_to_text(row.get('motif'))[:200],
+                mode_paiement=mode,
+                date_entree=date_entree,
+                statut=statut,
+                commentaire=_to_text(row.get('commentaire')),
+                created_by=self.user,
+            ))
+        return objets
+
+
+class DepenseImporter(BaseImporter):
+    """
+    Colonnes : motif, prix_unitaire (ou montant), quantite (défaut 1),
+    categorie (défaut fonctionnement), tache (numéro de mission, optionnel),
+    commentaire (optionnel). Les dépenses sont créées en attente.
+    """
+
+    model = Depense
+    champs_requis = ('motif',)
+    categories = {code for code, _ in Depense.CATEGORIE_CHOICES}
+
+    def validate_batch(self, batch):
+        # Une seule requête par lot pour résoudre les missions
+        numeros = {_to_text(row.get('tache')) for _, row in batch} - {''}
+        taches = dict(Tache.objects.filter(numero__in=numeros).values_list('numero', 'id')) if numeros else {}
+
+        objets = []
+        for ligne, row in batch:
+            if _to_text(row.get('motif')) == '':
+                self._erreur(ligne, "Champs manquants : motif")
+                continue
+            try:
+                quantite = _to_decimal(row.get('quantite')) or Decimal(1)
+                if quantite != quantite.to_integral_value():
+                    self._erreur(ligne, f"Quantité non entière : {quantite}")
+                    continue
+                quantite = int(quantite)
+                prix_unitaire = _to_decimal(row.get('prix_unitaire'))
+                if prix_unitaire is None:
+                    montant = _to_decimal(row.get('montant'))
+                    prix_unitaire = montant / quantite if montant is not None else None
+            except (InvalidOperation, ValueError, ZeroDivisionError) as e:
+                self._erreur(ligne, f"Valeur invalide : {e}")
+                continue
+
+            if prix_unitaire is None or prix_unitaire <= 0 or quantite <= 0:
+                self._erreur(ligne, "Prix unitaire et quantité doivent être positifs")
+                continue
+            prix_unitaire = prix_unitaire.quantize(Decimal('0.01'))
+            if prix_unitaire >= Decimal('100000000') or quantite * prix_unitaire >= Decimal('10000000000'):
+                self._erreur(ligne, f"Montant trop élevé : {quantite} × {prix_unitaire}")
+                continue
+
+            categorie = _to_text(row.get('categorie')).lower() or Depense.CATEGORIE_FONCTIONNEMENT
+            if categorie not in self.categories:
+                self._erreur(ligne, f"Catégorie inconnue : {categorie}")
+                continue
+
+            numero_tache = _to_text(row.get('tache'))
+            tache_id = taches.get(numero_tache) if numero_tache else None
+            if numero_tache and tache_id is None:
+                self._erreur(ligne, f"Mission introuvable : {numero_tache}")
+                continue
+
+            objets.append(Depense(
+                motif=_to_text(row.get('motif'))[:200],
+                categorie=categorie,
+                quantite=quantite,
+                prix_unitaire=prix_unitaire,
+                montant=quantite * prix_unitaire,
+                commentaire=_to_text(row.get('commentaire')),
+                tache_id=tache_id,
+                created_by=self.user,
+            ))
+        return objets
+
+    def after_insert(self, objets):
+        # bulk_create contourne FinanceService : on recalcule les missions touchées
+        from .services import FinanceService
+
+        tache_ids = {obj.tache_id for obj in objets if obj.tache_id}
+        if tache_ids:
+            FinanceService.reconcile_mission_budgets(Tache.objects.filter(pk__in=tache_ids))
+
+
+IMPORTERS = {
+    'entrees': EntreeArgentImporter,
+    'depenses': DepenseImporter,
+}
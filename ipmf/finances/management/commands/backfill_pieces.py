@@ -0,0 +1,64 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from finances.models import EntreeArgent, Depense
+from finances.storage import hash_file, guess_mime, content_addressed_name
+
+
+class Command(BaseCommand):
+    help = 'Calcule les métadonnées des pièces justificatives existantes (et les range par empreinte)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deplacer', action='store_true',
+            help="Copie aussi chaque pièce sous son chemin adressé par contenu"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="N'écrit rien")
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in (EntreeArgent, Depense):
+            pending = (
+                model.objects.filter(piece_hash='')
+                .exclude(piece_justificative='')
+                .exclude(piece_justificative__isnull=True)
+            )
+            for obj in pending.iterator():
+                total += self._backfill(model, obj, options)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} pièce(s) traitée(s)."))
+
+    def _backfill(self, model, obj, options):
+        piece = obj.piece_justificative
+        storage = piece.storage
+        try:
+            with storage.open(piece.name, 'rb') as fichier:
+                digest = hash_file(fichier)
+                taille = storage.size(piece.name)
+
+                nom = os.path.basename(piece.name)
+                updates = {
+                    'piece_hash': digest,
+                    'piece_taille': taille,
+                    'piece_mime': guess_mime(nom),
+                    'piece_nom_original': nom[:255],
+                    'piece_valide': obj._piece_conforme(nom, taille),
+                }
+
+                if options['deplacer']:
+                    cible = content_addressed_name(digest, nom)
+                    if not options['dry_run']:
+                        cible = storage.save(cible, fichier)
+                    updates['piece_justificative'] = cible
+                    # URL de la pièce modifiée : ligne renvoyée par le flux de changements
+                    updates['updated_at'] = timezone.now()
+        except (OSError, ValueError) as e:
+            self.stderr.write(f"{obj.numero}: pièce illisible ({e})")
+            return 0
+
+        self.stdout.write(f"{obj.numero}: {updates['piece_hash'][:12]} ({updates['piece_taille']} octets)")
+        if not options['dry_run']:
+            # update() : ni full_clean ni signaux pour une simple mise à niveau
+            model.objects.filter(pk=obj.pk).update(**updates)
+        return 1
@@ -0,0 +1,74 @@
+import time
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from finances import forecasting
+
+
+def _tendance_lineaire(values, horizon):
+    """Ancienne implémentation (régression linéaire en Python pur), pour comparaison"""
+    n = len(values)
+    x = list(range(n))
+    sum_x = sum(x)
+    sum_y = sum(values)
+    sum_xy = sum(i * values[i] for i in range(n))
+    sum_x2 = sum(i ** 2 for i in range(n))
+    denominator = n * sum_x2 - sum_x ** 2
+    if denominator == 0:
+        return [sum_y / n] * horizon
+    slope = (n * sum_xy - sum_x * sum_y) / denominator
+    intercept = (sum_y - slope * sum_x) / n
+    return [max(0, slope * (n + h) + intercept) for h in range(horizon)]
+
+
+class Command(BaseCommand):
+    help = "Compare la précision et le coût des prévisions (régression linéaire vs Holt-Winters)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodes', type=int, default=48, help="Longueur de l'historique (mois)")
+        parser.add_argument('--horizon', type=int, default=12)
+        parser.add_argument('--repetitions', type=int, default=50)
+        parser.add_argument('--graine', type=int, default=0)
+
+    def _mesurer(self, fn, repetitions):
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            fn()
+        return (time.perf_counter() - debut) / repetitions * 1000
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['graine'])
+        n, horizon, repetitions = options['periodes'], options['horizon'], options['repetitions']
+
+        # Recettes mensuelles : tendance, pics de rentrée scolaire, bruit
+        t = np.arange(n + horizon)
+        serie = 2_000_000 + 15_000 * t + 900_000 * np.isin(t % 12, (8, 9)) + rng.normal(0, 80_000, t.size)
+        historique, reel = serie[:n], serie[n:]
+
+        lineaire = np.array(_tendance_lineaire(historique.tolist(), horizon))
+        hw = forecasting.forecast(historique, horizon, saison=12)
+        prevision = np.array(hw['prevision'])
+        couverture = np.mean((reel >= hw['basse']) & (reel <= hw['haute'])) * 100
+
+        temps_lineaire = self._mesurer(lambda: _tendance_lineaire(historique.tolist(), horizon), repetitions)
+        temps_hw = self._mesurer(lambda: forecasting.forecast(historique, horizon, saison=12), repetitions)
+
+        today = date.today()
+        forecasting.project('month', today, historique, historique, horizon)
+        temps_cache = self._mesurer(
+            lambda: forecasting.project('month', today, historique, historique, horizon), repetitions
+        )
+
+        self.stdout.write(f"Historique : {n} périodes, horizon : {horizon}, {repetitions} répétitions")
+        self.stdout.write(
+            f"Régression linéaire : EAM {np.abs(lineaire - reel).mean():,.0f} | {temps_lineaire:.3f} ms/série"
+        )
+        self.stdout.write(
+            f"Holt-Winters ({hw['modele']['methode']}, alpha={hw['modele']['alpha']}, "
+            f"beta={hw['modele']['beta']}, gamma={hw['modele']['gamma']}) : "
+            f"EAM {np.abs(prevision - reel).mean():,.0f} | {temps_hw:.3f} ms/série | "
+            f"couverture IC95 {couverture:.0f} %"
+        )
+        self.stdout.write(f"Modèle mémorisé (requête courante) : {temps_cache:.3f} ms pour deux séries")
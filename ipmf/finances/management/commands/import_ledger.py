@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from finances.importers import IMPORTERS, ImportErreur
+
+
+class Command(BaseCommand):
+    help = "Importe en masse des entrées d'argent ou des dépenses depuis un fichier CSV/XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument('type', choices=sorted(IMPORTERS), help="Type de données importées")
+        parser.add_argument('fichier', help="Chemin du fichier CSV ou XLSX")
+        parser.add_argument('--user', required=True, help="Nom d'utilisateur créateur des lignes")
+        parser.add_argument('--dry-run', action='store_true', help="Valide sans rien enregistrer")
+        parser.add_argument('--ignorer-erreurs', action='store_true', help="Importe les lignes valides malgré les erreurs")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {options['user']}")
+
+        importer = IMPORTERS[options['type']](
+            user,
+            dry_run=options['dry_run'],
+            ignorer_erreurs=options['ignorer_erreurs'],
+            batch_size=options['batch_size'],
+        )
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importer.run(fichier, options['fichier'])
+        except (OSError, ImportErreur) as e:
+            raise CommandError(str(e))
+
+        for erreur in rapport['erreurs']:
+            self.stderr.write(f"Ligne {erreur['ligne']} : {erreur['erreur']}")
+        if rapport['nb_erreurs'] > len(rapport['erreurs']):
+            self.stderr.write(f"... {rapport['nb_erreurs'] - len(rapport['erreurs'])} autre(s) erreur(s)")
+
+        resume = f"{rapport['total']} ligne(s), {rapport['valides']} valide(s), {rapport['importes']} importée(s)"
+        if rapport['dry_run']:
+            self.stdout.write(self.style.WARNING(f"[dry-run] {resume}"))
+        elif rapport['nb_erreurs'] and not rapport['importes']:
+            raise CommandError(f"Import annulé ({rapport['nb_erreurs']} erreur(s)) : {resume}")
+        else:
+            self.stdout.write(self.style.SUCCESS(resume))
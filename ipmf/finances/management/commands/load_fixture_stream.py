@@ -0,0 +1,47 @@
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError
+
+from ipmf.fixtures import BATCH_SIZE, FixtureErreur, FixtureLoader
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge des fixtures JSON en flux (UTF-8 ou UTF-16) par insertions en masse, "
+        "sans déclencher les signaux du projet, puis recale les séquences"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='+', help="Chemins des fichiers JSON (ex. data_migration.json)")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--ignorenonexistent', '-i', action='store_true',
+            help="Ignore les champs absents des modèles actuels"
+        )
+
+    def handle(self, *args, **options):
+        loader = FixtureLoader(
+            using=options['database'],
+            batch_size=options['batch_size'],
+            ignorenonexistent=options['ignorenonexistent'],
+        )
+        debut = time.monotonic()
+        try:
+            with ExitStack() as stack:
+                fichiers = [stack.enter_context(open(chemin, 'rb')) for chemin in options['fixtures']]
+                counts = loader.load(fichiers)
+        except (OSError, FixtureErreur, DeserializationError, FieldDoesNotExist, ObjectDoesNotExist,
+                IntegrityError, DatabaseError) as e:
+            raise CommandError(f"Chargement annulé : {e}")
+
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(counts.values())} objet(s) chargé(s) depuis {len(options['fixtures'])} fichier(s) "
+            f"en {time.monotonic() - debut:.2f}s."
+        ))
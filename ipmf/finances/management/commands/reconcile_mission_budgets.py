@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from tasks.models import Tache
+from finances.services import FinanceService
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les montants engagés/payés des missions et corrige les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les écarts sans les corriger")
+        parser.add_argument('--tache', action='append', dest='numeros', help="Numéro de mission à vérifier (répétable)")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        taches = Tache.objects.all()
+        if options['numeros']:
+            taches = taches.filter(numero__in=options['numeros'])
+
+        ecarts = FinanceService.reconcile_mission_budgets(taches, dry_run=dry_run)
+
+        for ecart in ecarts:
+            ancien_engage, nouvel_engage = ecart['montant_engage']
+            ancien_paye, nouveau_paye = ecart['montant_paye']
+            self.stdout.write(
+                f"{ecart['tache']}: engagé {ancien_engage} -> {nouvel_engage}, payé {ancien_paye} -> {nouveau_paye}"
+            )
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Aucun écart détecté."))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f"{len(ecarts)} mission(s) à corriger (dry-run, aucune modification)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} mission(s) corrigée(s)."))
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:39
+
+import finances.storage
+import finances.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0007_alter_depense_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='entreeargent',
+            name='date_entree_non_future',
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='piece_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Empreinte SHA-256 de la pièce'),
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='piece_mime',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Type MIME de la pièce'),
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='piece_nom_original',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name="Nom d'origine de la pièce"),
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='piece_taille',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Taille de la pièce (octets)'),
+        ),
+        migrations.AddField(
+            model_name='depense',
+            name='piece_valide',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Pièce valide'),
+        ),
+        migrations.AddField(
+            model_name='entreeargent',
+            name='piece_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Empreinte SHA-256 de la pièce'),
+        ),
+        migrations.AddField(
+            model_name='entreeargent',
+            name='piece_mime',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Type MIME de la pièce'),
+        ),
+        migrations.AddField(
+            model_name='entreeargent',
+            name='piece_nom_original',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name="Nom d'origine de la pièce"),
+        ),
+        migrations.AddField(
+            model_name='entreeargent',
+            name='piece_taille',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Taille de la pièce (octets)'),
+        ),
+        migrations.AddField(
+            model_name='entreeargent',
+            name='piece_valide',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Pièce valide'),
+        ),
+        migrations.AlterField(
+            model_name='depense',
+            name='piece_justificative',
+            field=models.FileField(blank=True, help_text='Justificatif de la dépense (max 5MB)', max_length=255, null=True, storage=finances.storage.ContentAddressedStorage(), upload_to=finances.storage.ContentHashUploadTo('depenses/pieces_justificatives'), validators=[finances.validators.validate_file_size, finances.validators.validate_file_extension], verbose_name='Pièce justificative'),
+        ),
+        migrations.AlterField(
+            model_name='entreeargent',
+            name='piece_justificative',
+            field=models.FileField(blank=True, help_text='Fichier PDF, JPG, PNG ou DOC (max 5MB)', max_length=255, null=True, storage=finances.storage.ContentAddressedStorage(), upload_to=finances.storage.ContentHashUploadTo('entrees/pieces_justificatives'), validators=[finances.validators.validate_file_size, finances.validators.validate_file_extension], verbose_name='Pièce justificative'),
+        ),
+    ]
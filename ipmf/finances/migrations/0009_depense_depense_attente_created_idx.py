@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0008_piece_justificative_content_addressed'),
+        ('tasks', '0011_tache_tache_echeance_ouverte_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(condition=models.Q(('statut', 'en_attente')), fields=['created_at'], name='depense_attente_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0009_depense_depense_attente_created_idx'),
+        ('tasks', '0012_tache_updated_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['updated_at', 'id'], name='finances_de_updated_084b63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entreeargent',
+            index=models.Index(fields=['updated_at', 'id'], name='finances_en_updated_9a5c20_idx'),
+        ),
+    ]
@@ -23,6 +23,9 @@ from .validators import (
     validate_entree_montant,
     validate_file_extension
 )
+from ipmf.db_functions import JoursEcoules
+from ipmf.dirty import DirtyFieldsMixin
+from .storage import ContentHashUploadTo, piece_storage, hash_file, guess_mime
 
 User = get_user_model()
 
@@ -92,6 +95,21 @@ class SequenceCounter(models.Model):
         counter.save()
         return counter.last_value
 
+    @classmethod
+    @transaction.atomic
+    def reserve_range(cls, sequence_name: str, count: int) -> int:
+        """
+        Réserve `count` valeurs consécutives en un seul verrou.
+        Retourne la première valeur de la plage réservée.
+        """
+        counter, created = cls.objects.select_for_update().get_or_create(
+            name=sequence_name
+        )
+        first = counter.last_value + 1
+        counter.last_value += count
+        counter.save()
+        return first
+
 
 class NumeroAutoMixin:
     """
@@ -125,37 +143,101 @@ class NumeroAutoMixin:
             self.numero = f"{self.prefix}-{annee}-{next_val:03d}"
 
 
-class PieceJustificativeMixin:
-    """Mixin pour la gestion des pièces justificatives"""
+class PieceJustificativeMixin(models.Model):
+    """
+    Mixin pour la gestion des pièces justificatives.
+    Les métadonnées du fichier sont figées à l'envoi (stockage adressé par
+    contenu) : l'affichage des listes ne consulte jamais le stockage.
+    """
     
     ALLOWED_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png', '.doc', '.docx']
     MAX_FILE_SIZE_MB = 5
+
+    piece_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name="Empreinte SHA-256 de la pièce"
+    )
+    piece_taille = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Taille de la pièce (octets)"
+    )
+    piece_mime = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name="Type MIME de la pièce"
+    )
+    piece_nom_original = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name="Nom d'origine de la pièce"
+    )
+    piece_valide = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Pièce valide"
+    )
+
+    class Meta:
+        abstract = True
+
+    def update_piece_metadata(self):
+        """
+        Calcule empreinte, taille, type MIME et validité d'une pièce
+        nouvellement envoyée (fichier non encore enregistré).
+        """
+        piece = self.piece_justificative
+        if not piece:
+            self.piece_hash = ''
+            self.piece_taille = None
+            self.piece_mime = ''
+            self.piece_nom_original = ''
+            self.piece_valide = False
+            return
+
+        if piece._committed:
+            return
+
+        nom = os.path.basename(piece.name)
+        self.piece_hash = hash_file(piece.file)
+        self.piece_taille = piece.file.size
+        self.piece_mime = guess_mime(nom)
+        self.piece_nom_original = nom[:255]
+        self.piece_valide = self._piece_conforme(nom, self.piece_taille)
+
+    def _piece_conforme(self, filename, taille) -> bool:
+        if not any(filename.lower().endswith(ext) for ext in self.ALLOWED_EXTENSIONS):
+            return False
+        return taille is not None and taille <= self.MAX_FILE_SIZE_MB * 1024 * 1024
     
     def get_piece_filename(self) -> str:
         """Retourne le nom du fichier sans le chemin"""
         if self.piece_justificative:
             return os.path.basename(self.piece_justificative.name)
         return ""
+
+    def get_piece_justificative_name(self) -> str:
+        """Nom d'origine du fichier (le nom stocké est une empreinte)"""
+        return self.piece_nom_original or self.get_piece_filename()
     
     def has_valid_piece(self) -> bool:
-        """Vérifie si la pièce existe et est valide"""
+        """Vérifie si la pièce existe et est valide (métadonnées persistées)"""
         if not self.piece_justificative:
             return False
-        
-        # Vérifier l'extension
-        filename = self.piece_justificative.name.lower()
-        if not any(filename.endswith(ext) for ext in self.ALLOWED_EXTENSIONS):
-            return False
-        
-        # Vérifier la taille (si le fichier est déjà uploadé)
+        if self.piece_hash:
+            return self.piece_valide
+        # Pièce antérieure au stockage adressé par contenu (voir backfill_pieces)
         try:
-            if self.piece_justificative.size > self.MAX_FILE_SIZE_MB * 1024 * 1024:
-                return False
+            return self._piece_conforme(self.piece_justificative.name, self.piece_justificative.size)
         except (ValueError, OSError):
             # Le fichier n'existe pas encore ou erreur d'accès
             return False
-        
-        return True
     
     def get_piece_download_url(self) -> Optional[str]:
         """Retourne l'URL de téléchargement si disponible"""
@@ -164,9 +246,6 @@ class PieceJustificativeMixin:
         return None
 
 
-
-
-
 # ============================================================================
 # MODÈLE ENTREE_ARGENT
 # ============================================================================
@@ -209,7 +288,7 @@ class EntreeArgentQuerySet(models.QuerySet):
         ).order_by('statut')
 
 
-class EntreeArgent(NumeroAutoMixin, PieceJustificativeMixin, 
+class EntreeArgent(DirtyFieldsMixin, NumeroAutoMixin, PieceJustificativeMixin, 
                    TimestampMixin, models.Model):
     """
     Entrée d'argent dans le système.
@@ -301,7 +380,9 @@ class EntreeArgent(NumeroAutoMixin, PieceJustificativeMixin,
     )
     
     piece_justificative = models.FileField(
-        upload_to='entrees/pieces_justificatives/%Y/%m/',
+        upload_to=ContentHashUploadTo('entrees/pieces_justificatives'),
+        storage=piece_storage,
+        max_length=255,
         null=True,
         blank=True,
         validators=[validate_file_size, validate_file_extension],
@@ -342,6 +423,8 @@ class EntreeArgent(NumeroAutoMixin, PieceJustificativeMixin,
             models.Index(fields=['created_by', 'statut']),
             models.Index(fields=['montant']),
             models.Index(fields=['mode_paiement']),
+            # Flux de changements (ipmf/sync.py)
+            models.Index(fields=['updated_at', 'id']),
         ]
         
         constraints = [
@@ -375,9 +458,12 @@ class EntreeArgent(NumeroAutoMixin, PieceJustificativeMixin,
         # Génération du numéro pour les nouvelles entrées
         if is_new and not self.numero:
             self.assign_numero_if_missing()
+
+        # Métadonnées de la pièce (empreinte = chemin de stockage)
+        self.update_piece_metadata()
         
-        # Validation complète avant sauvegarde
-        self.full_clean()
+        # Validation avant sauvegarde (champs lus et inchangés exclus)
+        self.full_clean(exclude=self.unchanged_fields())
         
         # Mise à jour de updated_at (géré par TimestampMixin)
         super().save(*args, **kwargs)
@@ -515,13 +601,42 @@ class DepenseQuerySet(models.QuerySet):
         else:
             return self.filter(created_by=user)
     
-    def en_retard(self):
+    @staticmethod
+    def q_en_retard(now=None):
+        """
+        Condition indexable équivalente à Depense.est_en_retard :
+        en attente depuis plus de DELAI_RETARD_DEPENSE jours entiers.
+        """
+        now = now or timezone.now()
+        date_limite = now - timedelta(days=FinancesConstants.DELAI_RETARD_DEPENSE + 1)
+        return models.Q(statut=Depense.STATUT_EN_ATTENTE, created_at__lte=date_limite)
+
+    def en_retard(self, now=None):
         """Dépenses en attente depuis plus de 7 jours"""
-        date_limite = timezone.now() - timedelta(days=FinancesConstants.DELAI_RETARD_DEPENSE)
-        return self.filter(
-            statut=Depense.STATUT_EN_ATTENTE,
-            created_at__lt=date_limite
+        return self.filter(self.q_en_retard(now))
+
+    def avec_delais(self, now=None):
+        """Annote delai_attente et est_en_retard (lus par les propriétés du modèle)"""
+        now = now or timezone.now()
+        return self.annotate(
+            delai_attente=models.Case(
+                models.When(
+                    statut=Depense.STATUT_EN_ATTENTE,
+                    then=JoursEcoules('created_at', models.Value(now, models.DateTimeField())),
+                ),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            ),
+            est_en_retard=models.Case(
+                models.When(self.q_en_retard(now), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
         )
+
+    def en_attente_plus_anciennes(self):
+        """File de traitement : dépenses en attente, les plus anciennes d'abord"""
+        return self.filter(statut=Depense.STATUT_EN_ATTENTE).order_by('created_at', 'id')
     
     def necessitant_validation_dg(self):
         """Dépenses nécessitant validation DG"""
@@ -542,7 +657,7 @@ class DepenseQuerySet(models.QuerySet):
         return self.aggregate(total=models.Sum('montant'))['total'] or Decimal('0.00')
 
 
-class Depense(NumeroAutoMixin, PieceJustificativeMixin, 
+class Depense(DirtyFieldsMixin, NumeroAutoMixin, PieceJustificativeMixin, 
               TimestampMixin, models.Model):
     """
     Dépense avec workflow de validation multi-niveaux.
@@ -648,7 +763,9 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
     )
     
     piece_justificative = models.FileField(
-        upload_to='depenses/pieces_justificatives/%Y/%m/',
+        upload_to=ContentHashUploadTo('depenses/pieces_justificatives'),
+        storage=piece_storage,
+        max_length=255,
         null=True,
         blank=True,
         validators=[validate_file_size, validate_file_extension],
@@ -764,6 +881,14 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
             models.Index(fields=['montant']),
             models.Index(fields=['created_at']),
             models.Index(fields=['verifie_par']),
+            # Ancienneté des dépenses en attente (retards, file de vérification)
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(statut='en_attente'),
+                name='depense_attente_created_idx',
+            ),
+            # Flux de changements (ipmf/sync.py)
+            models.Index(fields=['updated_at', 'id']),
         ]
         
         constraints = [
@@ -802,6 +927,9 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
     def save(self, *args, **kwargs):
         """Surcharge avec calcul automatique du montant"""
         is_new = self._state.adding
+        # Délais annotés : recalculés après un changement de statut
+        self.__dict__.pop('_delai_attente', None)
+        self.__dict__.pop('_est_en_retard', None)
         
         # Calculer le montant avant validation
         self._calculer_montant()
@@ -809,9 +937,12 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
         # Générer le numéro pour les nouvelles dépenses
         if is_new and not self.numero:
             self.assign_numero_if_missing()
+
+        # Métadonnées de la pièce (empreinte = chemin de stockage)
+        self.update_piece_metadata()
         
-        # Validation complète
-        self.full_clean()
+        # Validation (champs lus et inchangés exclus)
+        self.full_clean(exclude=self.unchanged_fields())
         
         super().save(*args, **kwargs)
     
@@ -825,10 +956,10 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
         # donc pas besoin de le valider ici
         
         # Validation: workflow cohérent
-        if self.valide_par_dg and not self.valide_par_comptable:
+        if self.valide_par_dg_id and not self.valide_par_comptable_id:
             errors['valide_par_dg'] = "Doit d'abord être validé par le comptable"
         
-        if self.date_validation_dg and not self.valide_par_dg:
+        if self.date_validation_dg and not self.valide_par_dg_id:
             errors['date_validation_dg'] = "Le validateur DG doit être défini"
         
         # Validation: dates cohérentes
@@ -850,21 +981,36 @@ class Depense(NumeroAutoMixin, PieceJustificativeMixin,
         """Vérifie si la dépense nécessite validation DG"""
         return self.montant >= FinancesConstants.SEUIL_VALIDATION_DG
     
+    # delai_attente / est_en_retard : valeur annotée par DepenseQuerySet.avec_delais()
+    # si elle est présente, sinon calcul en Python.
+
     @property
     def delai_attente(self) -> int:
         """Délai d'attente en jours pour les dépenses en attente"""
+        if '_delai_attente' in self.__dict__:
+            return self._delai_attente
         if self.statut == self.STATUT_EN_ATTENTE:
             delta = timezone.now() - self.created_at
             return delta.days
         return 0
+
+    @delai_attente.setter
+    def delai_attente(self, value):
+        self._delai_attente = value
     
     @property
     def est_en_retard(self) -> bool:
         """Vérifie si la dépense est en retard"""
+        if '_est_en_retard' in self.__dict__:
+            return self._est_en_retard
         return (
             self.statut == self.STATUT_EN_ATTENTE and
             self.delai_attente > FinancesConstants.DELAI_RETARD_DEPENSE
         )
+
+    @est_en_retard.setter
+    def est_en_retard(self, value):
+        self._est_en_retard = value
     
     @property
     def est_en_alerte(self) -> bool:
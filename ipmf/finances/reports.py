@@ -0,0 +1,43 @@
+"""
+Relevés financiers exportés (Excel, PDF, CSV, JSON) : voir audit/reports.py.
+Le montant est totalisé en fin de relevé.
+"""
+from audit.reports import Colonne, Rapport
+
+
+def _auteur(obj):
+    user = obj.created_by
+    return (user.get_full_name() or user.username) if user else ''
+
+
+class RapportEntrees(Rapport):
+    titre = "Relevé des entrées d'argent"
+    module = 'finances'
+    nom_fichier = 'entrees'
+    colonnes = (
+        Colonne('numero', 'Numéro'),
+        Colonne('date_entree', 'Date', largeur=0.8),
+        Colonne('motif', 'Motif', largeur=3),
+        Colonne('mode_paiement', 'Mode Paiement', lambda e: e.get_mode_paiement_display()),
+        Colonne('statut', 'Statut', lambda e: e.get_statut_display(), largeur=0.8),
+        Colonne('created_by', 'Créé par', _auteur, largeur=1.3),
+        Colonne('montant', 'Montant (Ar)', largeur=1.2, total=True),
+    )
+
+
+class RapportDepenses(Rapport):
+    titre = "Relevé des dépenses"
+    module = 'finances'
+    nom_fichier = 'depenses'
+    colonnes = (
+        Colonne('numero', 'Numéro'),
+        Colonne('created_at', 'Date Création', largeur=1.1),
+        Colonne('motif', 'Motif', largeur=3),
+        Colonne('categorie', 'Catégorie', lambda d: d.get_categorie_display()),
+        Colonne('statut', 'Statut', lambda d: d.get_statut_display(), largeur=0.8),
+        Colonne('quantite', 'Qté', largeur=0.4),
+        Colonne('prix_unitaire', 'Prix Unitaire', largeur=1.1),
+        Colonne('date_paiement', 'Date Paiement', largeur=1.1),
+        Colonne('created_by', 'Créé par', _auteur, largeur=1.3),
+        Colonne('montant', 'Montant (Ar)', largeur=1.2, total=True),
+    )
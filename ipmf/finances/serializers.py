@@ -18,9 +18,13 @@ class EntreeArgentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'numero', 'montant', 'montant_format', 'motif', 'mode_paiement', 'mode_paiement_display',
             'date_entree', 'created_by', 'created_by_name', 'created_at', 'statut', 'statut_display',
-            'piece_justificative', 'piece_justificative_name', 'commentaire', 'can_confirm', 'can_cancel'
+            'piece_justificative', 'piece_justificative_name', 'piece_taille', 'piece_mime', 'piece_valide',
+            'commentaire', 'can_confirm', 'can_cancel'
         ]
-        read_only_fields = ('numero', 'created_by', 'created_at', 'montant_format', 'statut')
+        read_only_fields = (
+            'numero', 'created_by', 'created_at', 'montant_format', 'statut',
+            'piece_taille', 'piece_mime', 'piece_valide'
+        )
     
     def get_montant_format(self, obj):
         try:
@@ -80,7 +84,8 @@ class DepenseSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'numero', 'montant', 'montant_format', 'motif', 'categorie', 'categorie_display',
             'quantite', 'prix_unitaire', 'created_by', 'created_by_name', 'created_at', 'statut', 'statut_display',
-            'piece_justificative', 'piece_justificative_name', 'commentaire', 'necessite_validation_dg',
+            'piece_justificative', 'piece_justificative_name', 'piece_taille', 'piece_mime', 'piece_valide',
+            'commentaire', 'necessite_validation_dg',
             'delai_attente', 'est_en_retard', 'can_verify', 'can_validate', 'can_pay', 'can_reject',
             'valide_par_comptable', 'valide_par_comptable_name', 'valide_par_dg', 'valide_par_dg_name',
             'date_validation_comptable', 'date_validation_dg', 'commentaire_validation',
@@ -89,7 +94,8 @@ class DepenseSerializer(serializers.ModelSerializer):
         read_only_fields = (
             'numero', 'created_by', 'created_at', 'montant_format', 'statut',
             'necessite_validation_dg', 'delai_attente', 'est_en_retard',
-            'valide_par_comptable', 'valide_par_dg', 'date_validation_comptable', 'date_validation_dg'
+            'valide_par_comptable', 'valide_par_dg', 'date_validation_comptable', 'date_validation_dg',
+            'piece_taille', 'piece_mime', 'piece_valide'
         )
     
     def get_montant_format(self, obj):
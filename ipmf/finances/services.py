@@ -1,15 +1,25 @@
-from django.contrib.auth import get_user_model
-from django.db import transaction, models
+import copy
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Q, Sum
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from .models import EntreeArgent, Depense, FinancesConstants
+from tasks.models import Tache
+from audit import tracking
 from audit.models import AuditLog
-from notifications.services import NotificationService
+from ipmf import etags, events
+
+logger = logging.getLogger(__name__)
+
 
 class FinanceService:
     """
     Couche de service pour la gestion financière.
     Centralise la logique métier, les transactions et l'audit.
+    Les transitions n'écrivent que les champs modifiés, sous condition du
+    statut lu (save_dirty, ipmf/dirty.py).
     """
 
     @staticmethod
@@ -24,9 +34,129 @@ class FinanceService:
             objet_id=str(obj.pk),
             objet_repr=str(obj),
             nouvelles_valeurs=details or {},
+            differences=tracking.pop_changes(obj) or None,
             niveau='info'
         )
 
+    # =========================================================================
+    # CONSOMMATION BUDGÉTAIRE DES MISSIONS
+    # =========================================================================
+
+    @staticmethod
+    def _reserver_budget(depense: Depense) -> bool:
+        """
+        Engage le montant d'une dépense sur le budget de sa mission.
+
+        La réservation est gardée par un UPDATE conditionnel : deux dépenses
+        soumises simultanément ne peuvent pas toutes deux passer sous le budget.
+        Retourne True si le montant tient dans le budget alloué. Sinon le montant
+        est tout de même engagé (la dépense existe) mais False est retourné.
+        """
+        if not depense.tache_id:
+            return False
+
+        montant = depense.montant
+        reserve = Tache.objects.filter(
+            pk=depense.tache_id,
+            budget_alloue__isnull=False,
+            budget_alloue__gte=F('montant_engage') + montant,
+        ).update(montant_engage=F('montant_engage') + montant, updated_at=timezone.now())
+
+        if not reserve:
+            Tache.objects.filter(pk=depense.tache_id).update(
+                montant_engage=F('montant_engage') + montant, updated_at=timezone.now()
+            )
+        # UPDATE sans signal : version des tâches renouvelée explicitement (ETag)
+        etags.bump(Tache._meta.label_lower)
+        return bool(reserve)
+
+    @staticmethod
+    def _liberer_budget(depense: Depense):
+        """Restitue le montant d'une dépense au budget de sa mission"""
+        if not depense.tache_id:
+            return
+        Tache.objects.filter(pk=depense.tache_id).update(
+            montant_engage=F('montant_engage') - depense.montant, updated_at=timezone.now()
+        )
+        etags.bump(Tache._meta.label_lower)
+
+    @staticmethod
+    def _enregistrer_paiement(depense: Depense):
+        """Ajoute le montant d'une dépense payée au cumul payé de sa mission"""
+        if not depense.tache_id:
+            return
+        Tache.objects.filter(pk=depense.tache_id).update(
+            montant_paye=F('montant_paye') + depense.montant, updated_at=timezone.now()
+        )
+        etags.bump(Tache._meta.label_lower)
+
+    @classmethod
+    @transaction.atomic
+    def release_depense(cls, depense: Depense):
+        """Libère le budget engagé par une dépense (rejet ou suppression)"""
+        if depense.statut in [Depense.STATUT_REJETEE, 'annulee']:
+            return
+        cls._liberer_budget(depense)
+        if depense.statut == Depense.STATUT_PAYEE and depense.tache_id:
+            Tache.objects.filter(pk=depense.tache_id).update(
+                montant_paye=F('montant_paye') - depense.montant, updated_at=timezone.now()
+            )
+
+    @classmethod
+    @transaction.atomic
+    def update_depense(cls, depense: Depense, donnees) -> Depense:
+        """
+        Modification d'une dépense (API) : si le montant ou la mission change,
+        l'ancien montant est restitué à l'ancienne mission et le nouveau engagé
+        (et payé, le cas échéant) sur la nouvelle. L'écriture est conditionnée
+        aux valeurs lues : une modification concurrente est refusée.
+        """
+        ancienne = copy.copy(depense)
+        for champ, valeur in donnees.items():
+            setattr(depense, champ, valeur)
+        depense.save_dirty(condition={
+            'statut': ancienne.statut, 'montant': ancienne.montant, 'tache_id': ancienne.tache_id,
+        })
+
+        if (depense.tache_id, depense.montant) != (ancienne.tache_id, ancienne.montant):
+            cls.release_depense(ancienne)
+            if depense.statut not in [Depense.STATUT_REJETEE, 'annulee']:
+                cls._reserver_budget(depense)
+                if depense.statut == Depense.STATUT_PAYEE:
+                    cls._enregistrer_paiement(depense)
+        return depense
+
+    @staticmethod
+    def reconcile_mission_budgets(taches=None, dry_run=False):
+        """
+        Recalcule montant_engage / montant_paye depuis les dépenses et corrige
+        les écarts. Retourne la liste des missions corrigées (ou à corriger).
+        """
+        taches = taches if taches is not None else Tache.objects.all()
+        taches = taches.annotate(
+            engage_reel=Sum('depenses__montant', filter=~Q(depenses__statut__in=['rejetee', 'annulee'])),
+            paye_reel=Sum('depenses__montant', filter=Q(depenses__statut='payee')),
+        )
+
+        ecarts = []
+        for tache in taches:
+            engage = tache.engage_reel or Decimal('0.00')
+            paye = tache.paye_reel or Decimal('0.00')
+            if engage == tache.montant_engage and paye == tache.montant_paye:
+                continue
+            ecarts.append({
+                'tache': tache.numero,
+                'montant_engage': (tache.montant_engage, engage),
+                'montant_paye': (tache.montant_paye, paye),
+            })
+            if not dry_run:
+                Tache.objects.filter(pk=tache.pk).update(
+                    montant_engage=engage, montant_paye=paye, updated_at=timezone.now()
+                )
+        if ecarts and not dry_run:
+            etags.bump(Tache._meta.label_lower)
+        return ecarts
+
     # =========================================================================
     # GESTION DES ENTRÉES D'ARGENT
     # =========================================================================
@@ -43,7 +173,8 @@ class FinanceService:
 
         ancienne_valeur = entree.statut
         entree.statut = EntreeArgent.STATUT_CONFIRMEE
-        entree.save()
+        entree.save_dirty(condition={'statut': ancienne_valeur})
+        events.transition('entree.confirmee', entree, user, de=ancienne_valeur, vers=entree.statut)
 
         cls._log_audit(
             action='validation',
@@ -67,7 +198,8 @@ class FinanceService:
         ancienne_valeur = entree.statut
         entree.statut = EntreeArgent.STATUT_ANNULEE
         entree.commentaire += f"\n[Annulation {timezone.now().strftime('%Y-%m-%d')}] {comment}"
-        entree.save()
+        entree.save_dirty(condition={'statut': ancienne_valeur})
+        events.transition('entree.annulee', entree, user, de=ancienne_valeur, vers=entree.statut)
 
         cls._log_audit(
             action='rejet',
@@ -84,28 +216,58 @@ class FinanceService:
 
     @classmethod
     @transaction.atomic
-    def process_auto_approval(cls, depense: Depense, user) -> Depense:
-        """Tente d'auto-approuver une dépense si elle est éligible"""
+    def submit_depense(cls, depense: Depense, user) -> Depense:
+        """Soumission d'une nouvelle dépense : événement puis validations automatiques"""
+        events.publish('depense.soumise', depense, user, montant=str(depense.montant), tache=depense.tache_id)
+        # Engagement sur la mission hors du point de sauvegarde des validations
+        # automatiques : leur échec laisse la dépense en attente, toujours engagée
+        dans_budget = cls._reserver_budget(depense)
+        try:
+            if user.role == FinancesConstants.ROLE_DG:
+                # 1. DG Auto-Validation (Haute Priorité)
+                cls.process_dg_direct_validation(depense, user, dans_budget=dans_budget)
+            else:
+                # 2. Tentative d'auto-approbation (Workflow Mission)
+                cls.process_auto_approval(depense, user, dans_budget=dans_budget)
+        except ValidationError:
+            # La dépense reste soumise (en attente) : validation manuelle
+            logger.exception("Échec de la validation automatique de la dépense %s", depense.numero)
+            depense.refresh_from_db()
+        return depense
+
+    @classmethod
+    @transaction.atomic
+    def process_auto_approval(cls, depense: Depense, user, dans_budget=None) -> Depense:
+        """
+        Tente d'auto-approuver une dépense si elle est éligible.
+        dans_budget : résultat de la réservation faite par l'appelant
+        (submit_depense) ; None : montant engagé ici.
+        """
         
         # Vérification Auto-Approval Mission
         if depense.tache:
             tache = depense.tache
+
+            # Engagement du montant sur la mission (réservation gardée)
+            if dans_budget is None:
+                dans_budget = cls._reserver_budget(depense)
             
             # Conditions d'auto-approbation
             # a) Tâche active et User assigné
             if tache.statut in ['en_cours', 'validee'] and tache.agents_assignes.filter(id=user.id).exists():
                 
-                # b) Budget check
-                # Calcul montant total engagé sur la tâche (incluant la nouvelle dépense)
-                total_engague = tache.depenses.exclude(statut__in=['rejetee', 'annulee']).aggregate(total=models.Sum('montant'))['total'] or 0
-                
-                if tache.budget_alloue and total_engague <= tache.budget_alloue:
+                # b) Budget check (résultat de la réservation atomique)
+                if dans_budget:
                     # AUTO APPROVAL
                     depense.statut = Depense.STATUT_VALIDEE
                     depense.approved_by_system = True
                     depense.date_validation_comptable = timezone.now()
                     depense.commentaire_validation = f"[AUTO] Validé via Budget Mission {tache.numero}"
-                    depense.save()
+                    depense.save_dirty()
+                    events.transition(
+                        'depense.validee', depense, user,
+                        de=Depense.STATUT_EN_ATTENTE, vers=depense.statut, auto=True,
+                    )
                     
                     cls._log_audit(
                         action='auto_validation',
@@ -119,16 +281,18 @@ class FinanceService:
 
     @classmethod
     @transaction.atomic
-    def process_dg_direct_validation(cls, depense: Depense, user) -> Depense:
+    def process_dg_direct_validation(cls, depense: Depense, user, dans_budget=None) -> Depense:
         """
         Validation automatique pour les dépenses créées par le DG.
         Passe directement au statut 'validée' (prêt pour paiement).
+        dans_budget : réservation déjà faite par l'appelant ; None : montant engagé ici.
         """
         # Vérification double sécurité
         if user.role != 'dg':
             return depense
 
         # Mise à jour des statuts
+        ancien_statut = depense.statut
         depense.statut = Depense.STATUT_VALIDEE
         depense.approved_by_system = True
         
@@ -145,7 +309,11 @@ class FinanceService:
         depense.date_validation_comptable = now
         
         depense.commentaire_validation = "[AUTO-DG] Validé directement par le Directeur Général"
-        depense.save()
+        depense.save_dirty()
+        events.transition('depense.validee', depense, user, de=ancien_statut, vers=depense.statut, auto=True)
+
+        if dans_budget is None:
+            cls._reserver_budget(depense)
 
         cls._log_audit(
             action='auto_validation_dg',
@@ -183,7 +351,12 @@ class FinanceService:
         
         if comment:
             depense.commentaire_validation = comment
-        depense.save()
+        depense.save_dirty(condition={'statut': Depense.STATUT_EN_ATTENTE})
+        # DG notifié par le consommateur d'événements (seuil de validation DG)
+        events.transition(
+            'depense.verifiee', depense, user,
+            de=Depense.STATUT_EN_ATTENTE, vers=depense.statut, montant=str(depense.montant),
+        )
 
         cls._log_audit(
             action='validation',
@@ -192,13 +365,6 @@ class FinanceService:
             obj=depense,
             details={'etape': 'verification_comptable'}
         )
-        # Notifier le DG si nécessaire
-        if depense.montant >= FinancesConstants.SEUIL_VALIDATION_DG:
-            User = get_user_model()
-            dgs = User.objects.filter(role=FinancesConstants.ROLE_DG)
-            for dg in dgs:
-                NotificationService.notify_expense_validation_needed(depense, dg)
-        
         return depense
 
 
@@ -236,10 +402,12 @@ class FinanceService:
             depense.valide_par_comptable = user
             depense.date_validation_comptable = timezone.now()
 
+        ancien_statut = depense.statut
         depense.statut = Depense.STATUT_VALIDEE
         if comment:
             depense.commentaire_validation = comment
-        depense.save()
+        depense.save_dirty(condition={'statut': ancien_statut})
+        events.transition('depense.validee', depense, user, de=ancien_statut, vers=depense.statut)
 
         cls._log_audit(
             action='validation',
@@ -268,7 +436,10 @@ class FinanceService:
         depense.date_paiement = timezone.now()
         if comment:
             depense.commentaire_validation = comment
-        depense.save()
+        depense.save_dirty(condition={'statut': Depense.STATUT_VALIDEE})
+        events.transition('depense.payee', depense, user, de=Depense.STATUT_VALIDEE, vers=depense.statut)
+
+        cls._enregistrer_paiement(depense)
 
         cls._log_audit(
             action='payment', # Action custom, mappée sur 'validation' ou 'update' dans AuditLog si 'payment' non existant, mais 'validation' est ok
@@ -289,6 +460,9 @@ class FinanceService:
         if not comment:
             raise ValidationError("Un commentaire est requis pour le rejet.")
 
+        cls.release_depense(depense)
+
+        ancien_statut = depense.statut
         depense.statut = Depense.STATUT_REJETEE
         depense.commentaire_validation = comment
         
@@ -300,7 +474,8 @@ class FinanceService:
         depense.valide_par_dg = None
         depense.date_validation_dg = None
         
-        depense.save()
+        depense.save_dirty(condition={'statut': ancien_statut})
+        events.transition('depense.rejetee', depense, user, de=ancien_statut, vers=depense.statut)
 
         cls._log_audit(
             action='rejet',
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .forecasting import bump_data_version
+from .models import EntreeArgent, Depense
+
+
+@receiver(post_save, sender=EntreeArgent)
+@receiver(post_delete, sender=EntreeArgent)
+@receiver(post_save, sender=Depense)
+@receiver(post_delete, sender=Depense)
+def invalidate_forecasts(sender, **kwargs):
+    """Nouvelle version des données financières : prévisions à recalculer"""
+    bump_data_version()
+    # Second incrément au commit : une requête concurrente a pu mémoriser
+    # un modèle calculé sur les données d'avant la transaction
+    transaction.on_commit(bump_data_version)
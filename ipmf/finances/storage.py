@@ -0,0 +1,96 @@
+"""
+Stockage adressé par contenu des pièces justificatives.
+
+Chaque fichier est rangé sous l'empreinte SHA-256 de son contenu : un même
+reçu joint à plusieurs dépenses n'est écrit qu'une fois, et le chemin d'un
+fichier ne change jamais de contenu (cache HTTP immuable possible).
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PIECES_ROOT = 'pieces_justificatives'
+HASH_CHUNK_SIZE = 64 * 1024
+
+_CONTENT_ADDRESSED_RE = re.compile(
+    rf'^{PIECES_ROOT}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[\w]+)?$'
+)
+
+
+def hash_file(file) -> str:
+    """Empreinte SHA-256 d'un fichier (lecture par blocs, position restaurée)"""
+    sha = hashlib.sha256()
+    position = file.tell() if hasattr(file, 'tell') else None
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        sha.update(chunk)
+    file.seek(position or 0)
+    return sha.hexdigest()
+
+
+def guess_mime(filename: str) -> str:
+    """Type MIME déduit de l'extension du nom d'origine"""
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def content_addressed_name(digest: str, filename: str) -> str:
+    """Chemin relatif d'un contenu : pieces_justificatives/ab/cd/<sha256>.ext"""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{PIECES_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_content_addressed(name: str) -> bool:
+    """Vrai si le chemin désigne un contenu immuable (nommé par son empreinte)"""
+    return bool(name and _CONTENT_ADDRESSED_RE.match(name.replace('\\', '/')))
+
+
+@deconstructible
+class ContentHashUploadTo:
+    """
+    upload_to basé sur l'empreinte calculée par le modèle (attribut `piece_hash`).
+    Repli sur `fallback` (chemin daté) si l'empreinte est absente.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def __call__(self, instance, filename):
+        digest = getattr(instance, 'piece_hash', '')
+        if digest:
+            return content_addressed_name(digest, filename)
+        return os.path.join(self.fallback, filename)
+
+    def __eq__(self, other):
+        return isinstance(other, ContentHashUploadTo) and self.fallback == other.fallback
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage qui déduplique les chemins adressés par contenu :
+    un fichier déjà présent sous son empreinte n'est ni réécrit ni renommé.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # Écriture sous un nom temporaire puis renommage atomique : deux envois
+        # simultanés du même contenu produisent le même fichier final.
+        tmp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+piece_storage = ContentAddressedStorage()
@@ -1,3 +1,106 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from audit.models import ExportHistory
+from finances.models import Depense
+from finances.services import FinanceService
+from ipmf import throttling
+
+User = get_user_model()
+
+
+class DirtySaveTest(TestCase):
+    """Transitions : seuls les champs modifiés sont écrits, sous condition du statut lu"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent_dirty', password='pwd', role='agent')
+        self.comptable = User.objects.create_user(username='comptable_dirty', password='pwd', role='comptable')
+        depense = Depense.objects.create(
+            quantite=1, prix_unitaire=Decimal('20000'), motif="Carburant",
+            historique="x" * 5000, created_by=self.agent,
+        )
+        self.pk = depense.pk
+
+    def test_transition_ecrit_les_champs_modifies(self):
+        depense = Depense.objects.get(pk=self.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            FinanceService.verify_depense(depense, self.comptable)
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "finances_depense"'))
+        self.assertIn('"statut"', update)
+        self.assertIn('"updated_at"', update)
+        self.assertNotIn('"historique"', update)
+        self.assertNotIn('"motif"', update)
+        self.assertIn('"statut" = ', update.split('WHERE')[1])
+
+    def test_sans_modification(self):
+        depense = Depense.objects.get(pk=self.pk)
+        depense.motif = "Carburant"
+        with self.assertNumQueries(0):
+            self.assertFalse(depense.save_dirty())
+
+    def test_transition_concurrente(self):
+        premiere = Depense.objects.get(pk=self.pk)
+        seconde = Depense.objects.get(pk=self.pk)
+        FinanceService.verify_depense(premiere, self.comptable)
+
+        # La seconde copie a lu 'en_attente' : la ligne a changé depuis
+        with self.assertRaises(ValidationError):
+            FinanceService.reject_depense(seconde, self.comptable, "Doublon")
+        self.assertEqual(Depense.objects.get(pk=self.pk).statut, Depense.STATUT_VERIFIEE)
+
+
+class RapportDepensesTest(TestCase):
+    """Relevé des dépenses : périmètre de l'utilisateur, montant totalisé"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        # Exports limités (ExportThrottle) : seaux propres au test
+        throttling.reset()
+        self.addCleanup(throttling.reset)
+
+        self.agent = User.objects.create_user(username='agent_releve', password='pwd', role='agent')
+        self.comptable = User.objects.create_user(username='comptable_releve', password='pwd', role='comptable')
+        for auteur, prix in ((self.agent, '15000'), (self.agent, '2500.50'), (self.comptable, '40000')):
+            Depense.objects.create(quantite=2, prix_unitaire=Decimal(prix), motif="Fournitures", created_by=auteur)
+        self.client = APIClient()
+
+    def _exporter(self, user, **donnees):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/finances/depenses/exporter/', donnees, format='json')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_excel_totalise(self):
+        feuille = load_workbook(BytesIO(self._exporter(self.comptable))).active
+        lignes = [ligne for ligne in feuille.values if any(ligne)]
+        self.assertEqual(lignes[0][-1], 'Montant (Ar)')
+        self.assertEqual(len(lignes), 5)
+        self.assertEqual(lignes[-1][0], 'Total')
+        self.assertEqual(lignes[-1][-1], 115001)
+
+    def test_perimetre_agent(self):
+        self._exporter(self.agent, format='pdf', date_debut='2000-01-01')
+        export = ExportHistory.objects.get()
+        self.assertEqual((export.utilisateur, export.format, export.module), (self.agent, 'pdf', 'finances'))
+        self.assertEqual(export.nombre_lignes, 2)
+        self.assertEqual(export.parametres, {'date_debut': '2000-01-01'})
 
-# Create your tests here.
+    def test_date_invalide(self):
+        self.client.force_authenticate(self.comptable)
+        response = self.client.post('/api/finances/depenses/exporter/', {'date_fin': '31/12/2026'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -49,7 +49,7 @@ class FinanceAnalyticsTests(TestCase):
         response = self.client.get(self.url, {'granularity': 'month'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-        data = response.data
+        data = response.data['data']
         
         # Find January data
         jan_data = next((item for item in data if item['label'] == '2026-01'), None)
@@ -82,7 +82,7 @@ class FinanceAnalyticsTests(TestCase):
         )
         
         # Feb: -50k
-        feb_date = timezone.datetime(2026, 2, 5, tzinfo=timezone.utc)
+        feb_date = timezone.datetime(2026, 2, 5, tzinfo=datetime.timezone.utc)
         expense = Depense.objects.create(
             motif="Transport",
             montant=50000,
@@ -94,7 +94,7 @@ class FinanceAnalyticsTests(TestCase):
         Depense.objects.filter(pk=expense.pk).update(date_paiement=feb_date)
         
         response = self.client.get(self.url, {'granularity': 'month'})
-        data = response.data
+        data = response.data['data']
         
         jan_data = next((item for item in data if item['label'] == '2026-01'), None)
         feb_data = next((item for item in data if item['label'] == '2026-02'), None)
@@ -105,3 +105,58 @@ class FinanceAnalyticsTests(TestCase):
         if feb_data:
             # 200k - 50k = 150k
             self.assertEqual(feb_data['solde_cumule'], 150000)
+
+
+class ForecastingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_saisonnalite(self):
+        """Une série saisonnière (année scolaire) est projetée avec son cycle"""
+        import numpy as np
+        from finances import forecasting
+
+        mois = np.arange(48)
+        serie = 1_000_000 + 5_000 * mois + 400_000 * (mois % 12 < 2)  # rentrées scolaires
+        result = forecasting.forecast(serie[:36], 12, saison=12)
+
+        self.assertEqual(result['modele']['methode'], 'holt_winters')
+        erreur = np.abs(np.array(result['prevision']) - serie[36:]).mean()
+        self.assertLess(erreur, 60_000)
+        # Pic de rentrée retrouvé, intervalles croissants avec l'horizon
+        self.assertGreater(result['prevision'][0], result['prevision'][5])
+        largeurs = np.array(result['haute']) - np.array(result['basse'])
+        self.assertTrue(np.all(np.diff(largeurs) >= -0.01))
+
+    def test_historique_court(self):
+        from finances import forecasting
+
+        self.assertEqual(forecasting.forecast([100, 200, 300], 2)['modele']['methode'], 'holt')
+        self.assertEqual(forecasting.forecast([150], 2)['prevision'], [150.0, 150.0])
+
+    def test_modele_memorise(self):
+        """Le modèle n'est ajusté qu'une fois par version des données"""
+        from unittest import mock
+        from finances import forecasting
+
+        admin = User.objects.create_superuser(username='admin_prev', email='p@test.com', password='pwd', role='admin')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = reverse('analytics-list')
+
+        with mock.patch.object(forecasting, 'forecast', wraps=forecasting.forecast) as fit:
+            response = client.get(url, {'granularity': 'month'})
+            client.get(url, {'granularity': 'month'})
+            self.assertEqual(fit.call_count, 2)  # entrées + dépenses, une seule fois
+
+            EntreeArgent.objects.create(
+                motif="Frais de scolarité", montant=300000, date_entree=timezone.now().date(),
+                mode_paiement='especes', created_by=admin, statut='confirmee'
+            )
+            client.get(url, {'granularity': 'month'})
+            self.assertEqual(fit.call_count, 4)
+
+        prevue = next(item for item in response.data['data'] if item['is_forecast'])
+        self.assertIn('entrees_prevues_haute', prevue)
+        self.assertIn('entrees', response.data['modele_prevision'])
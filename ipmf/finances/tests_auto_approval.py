@@ -1,3 +1,6 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -102,3 +105,118 @@ class AutoApprovalTest(TestCase):
         
         depense.refresh_from_db()
         self.assertEqual(depense.statut, Depense.STATUT_EN_ATTENTE)
+
+class MissionBudgetTest(TestCase):
+    """Consommation budgétaire dénormalisée sur la mission"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent_budget', password='pwd', role='agent')
+        self.comptable = User.objects.create_user(username='comptable_budget', password='pwd', role='comptable')
+        self.tache = Tache.objects.create(
+            titre="Mission Budget",
+            description="Description",
+            createur=self.comptable,
+            statut='en_cours',
+            date_echeance=timezone.now() + timezone.timedelta(days=5),
+            budget_alloue=Decimal('100000.00')
+        )
+        self.tache.agents_assignes.add(self.agent)
+
+    def _depense(self, montant):
+        depense = Depense.objects.create(
+            quantite=1,
+            prix_unitaire=Decimal(montant),
+            motif="Frais",
+            categorie="mission",
+            created_by=self.agent,
+            tache=self.tache
+        )
+        return FinanceService.process_auto_approval(depense, self.agent)
+
+    def test_reservation_cumulative(self):
+        """Deux dépenses cumulées au-delà du budget : seule la première passe"""
+        premiere = self._depense('60000.00')
+        seconde = self._depense('60000.00')
+
+        self.assertEqual(premiere.statut, Depense.STATUT_VALIDEE)
+        self.assertEqual(seconde.statut, Depense.STATUT_EN_ATTENTE)
+
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('120000.00'))
+        self.assertEqual(self.tache.budget_restant, Decimal('-20000.00'))
+
+    def test_rejet_et_paiement(self):
+        """Le rejet libère le budget, le paiement alimente le cumul payé"""
+        caisse = User.objects.create_user(username='caisse_budget', password='pwd', role='caisse')
+        validee = self._depense('30000.00')
+        en_attente = self._depense('90000.00')
+
+        FinanceService.reject_depense(en_attente, self.comptable, "Hors budget")
+        FinanceService.pay_depense(validee, caisse)
+
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('30000.00'))
+        self.assertEqual(self.tache.montant_paye, Decimal('30000.00'))
+
+    def test_echec_auto_approbation(self):
+        """Auto-approbation en échec : dépense en attente, montant toujours engagé"""
+        depense = Depense.objects.create(
+            quantite=1, prix_unitaire=Decimal('40000.00'), motif="Frais", categorie="mission",
+            created_by=self.agent, tache=self.tache
+        )
+        with mock.patch.object(Depense, 'save_dirty', side_effect=ValidationError("Dépense modifiée entre-temps")), \
+                self.assertLogs('finances.services', 'ERROR'):
+            FinanceService.submit_depense(depense, self.agent)
+
+        self.assertEqual(depense.statut, Depense.STATUT_EN_ATTENTE)
+        self.assertEqual(Depense.objects.get(pk=depense.pk).statut, Depense.STATUT_EN_ATTENTE)
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('40000.00'))
+        self.assertEqual(FinanceService.reconcile_mission_budgets(dry_run=True), [])
+
+    def test_reconciliation(self):
+        """La réconciliation corrige une dérive des colonnes dénormalisées"""
+        self._depense('40000.00')
+        Tache.objects.filter(pk=self.tache.pk).update(montant_engage=Decimal('0.00'))
+
+        ecarts = FinanceService.reconcile_mission_budgets(dry_run=True)
+        self.assertEqual(len(ecarts), 1)
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('0.00'))
+
+        FinanceService.reconcile_mission_budgets()
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('40000.00'))
+        self.assertEqual(FinanceService.reconcile_mission_budgets(), [])
+
+    def test_modification_montant_et_mission(self):
+        """Modifier le montant ou la mission d'une dépense déplace le montant engagé"""
+        autre = Tache.objects.create(
+            titre="Autre mission", description="Description", createur=self.comptable, statut='en_cours',
+            date_echeance=timezone.now() + timezone.timedelta(days=5), budget_alloue=Decimal('50000.00')
+        )
+        depense = self._depense('30000.00')
+
+        FinanceService.update_depense(depense, {'quantite': 2})
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('60000.00'))
+
+        FinanceService.update_depense(depense, {'tache': autre, 'prix_unitaire': Decimal('10000.00')})
+        self.tache.refresh_from_db()
+        autre.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('0.00'))
+        self.assertEqual(autre.montant_engage, Decimal('20000.00'))
+        self.assertEqual(FinanceService.reconcile_mission_budgets(dry_run=True), [])
+
+    def test_modification_api(self):
+        """PATCH d'une dépense engagée : compteurs de la mission à jour"""
+        from rest_framework.test import APIClient
+
+        depense = self._depense('30000.00')
+        client = APIClient()
+        client.force_authenticate(self.comptable)
+        response = client.patch(f'/api/finances/depenses/{depense.pk}/', {'quantite': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.tache.refresh_from_db()
+        self.assertEqual(self.tache.montant_engage, Decimal('90000.00'))
+        self.assertEqual(FinanceService.reconcile_mission_budgets(dry_run=True), [])
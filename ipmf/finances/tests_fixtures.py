@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from finances.models import Depense, EntreeArgent, SequenceCounter
+from ipmf.fixtures import FixtureErreur, iter_fixture
+from notifications.models import Notification
+from tasks.models import Tache
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+FIXTURE = [
+    {"model": "users.customuser", "pk": 10, "fields": {
+        "password": "!", "username": "agent_fixture", "email": "agent@ipmf.mg", "role": "agent",
+        "is_active": True, "date_joined": "2025-10-30T20:15:35Z",
+        "date_created": "2025-10-30T20:15:36Z", "date_updated": "2025-10-30T20:15:36Z",
+        "groups": [], "user_permissions": [],
+    }},
+    {"model": "users.userprofile", "pk": 10, "fields": {"user": 10}},
+    {"model": "tasks.tache", "pk": 7, "fields": {
+        "numero": "TSK-2026-007", "titre": "Mission terrain", "description": "Élevage — café",
+        "createur": 10, "date_echeance": "2026-02-01T08:00:00Z", "statut": "creee",
+        "agents_assignes": [10],
+    }},
+    {"model": "finances.entreeargent", "pk": 3, "fields": {
+        "numero": "ENT-2026-041", "montant": "150000.00", "motif": "Versement",
+        "mode_paiement": "especes", "date_entree": "2026-01-05", "created_by": 10,
+    }},
+]
+
+
+class StreamingFixtureLoaderTest(TestCase):
+    def _ecrire(self, objets, encoding):
+        fd, chemin = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, chemin)
+        with open(chemin, 'w', encoding=encoding) as fichier:
+            json.dump(objets, fichier, indent=2, ensure_ascii=False)
+        return chemin
+
+    def test_lecture_incrementale(self):
+        """UTF-16 avec BOM, objets coupés entre deux blocs de lecture"""
+        contenu = json.dumps(FIXTURE, ensure_ascii=False).encode('utf-16')
+        objets = list(iter_fixture(BytesIO(contenu), chunk_size=7))
+        self.assertEqual(objets, FIXTURE)
+
+        with self.assertRaises(FixtureErreur):
+            list(iter_fixture(BytesIO(b'{"model": "x"}')))
+        with self.assertRaises(FixtureErreur):
+            list(iter_fixture(BytesIO(b'[{"model": "x"},')))
+
+    def test_chargement(self):
+        """Insertion en masse sans signaux, dates et m2m conservées, séquences recalées"""
+        SequenceCounter.objects.create(name='ENT-2026', last_value=2)
+        chemin = self._ecrire(FIXTURE, 'utf-16')
+
+        call_command('load_fixture_stream', chemin, stdout=open(os.devnull, 'w'))
+
+        user = User.objects.get(pk=10)
+        self.assertEqual(user.date_updated, datetime(2025, 10, 30, 20, 15, 36, tzinfo=dt_timezone.utc))
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+
+        tache = Tache.objects.get(pk=7)
+        self.assertEqual(list(tache.agents_assignes.all()), [user])
+        self.assertEqual(tache.description, "Élevage — café")
+        # Aucune notification d'assignation rejouée
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(SequenceCounter.objects.get(name='ENT-2026').last_value, 41)
+        nouvelle = EntreeArgent.objects.create(
+            montant=20000, motif="Suivante", mode_paiement='especes', created_by=user,
+            date_entree=datetime(2026, 1, 6).date()
+        )
+        self.assertEqual(nouvelle.numero, 'ENT-2026-042')
+        self.assertGreater(User.objects.create_user(username='suivant', password='pwd').pk, 10)
+
+    def test_rechargement_met_a_jour(self):
+        """Recharger une fixture met à jour les lignes existantes (comme loaddata)"""
+        chemin = self._ecrire(FIXTURE, 'utf-8')
+        call_command('load_fixture_stream', chemin, stdout=open(os.devnull, 'w'))
+
+        modifiee = json.loads(json.dumps(FIXTURE))
+        modifiee[2]['fields']['titre'] = "Mission corrigée"
+        modifiee[2]['fields']['agents_assignes'] = []
+        call_command('load_fixture_stream', self._ecrire(modifiee, 'utf-8'), stdout=open(os.devnull, 'w'))
+
+        tache = Tache.objects.get(pk=7)
+        self.assertEqual(tache.titre, "Mission corrigée")
+        self.assertFalse(tache.agents_assignes.exists())
+        self.assertEqual(Tache.objects.count(), 1)
+
+    def test_compteurs_budgetaires_recalcules(self):
+        """Dépenses chargées en masse : montant_engage / montant_paye des missions recalculés"""
+        depenses = [
+            {"model": "finances.depense", "pk": pk, "fields": {
+                "numero": f"DEP-2026-00{pk}", "motif": "Carburant", "quantite": 1, "prix_unitaire": montant,
+                "montant": montant, "statut": statut, "created_by": 10, "tache": 7,
+            }}
+            for pk, montant, statut in ((1, "20000.00", "payee"), (2, "5000.00", "en_attente"), (3, "900.00", "rejetee"))
+        ]
+        call_command('load_fixture_stream', self._ecrire(FIXTURE + depenses, 'utf-8'), stdout=open(os.devnull, 'w'))
+
+        tache = Tache.objects.get(pk=7)
+        self.assertEqual((tache.montant_engage, tache.montant_paye), (Decimal('25000.00'), Decimal('20000.00')))
+
+        # Dépense déplacée vers une autre mission au rechargement : l'ancienne est recalculée
+        autre = {"model": "tasks.tache", "pk": 8, "fields": {
+            "numero": "TSK-2026-008", "titre": "Autre mission", "description": "-",
+            "createur": 10, "date_echeance": "2026-02-01T08:00:00Z", "statut": "creee",
+        }}
+        depenses[0]['fields']['tache'] = 8
+        call_command('load_fixture_stream', self._ecrire([autre, depenses[0]], 'utf-8'), stdout=open(os.devnull, 'w'))
+        self.assertEqual(Tache.objects.get(pk=7).montant_engage, Decimal('5000.00'))
+        self.assertEqual(Depense.objects.get(pk=1).tache.montant_paye, Decimal('20000.00'))
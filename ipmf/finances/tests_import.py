@@ -0,0 +1,111 @@
+import time
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from audit.models import AuditLog
+from finances.importers import EntreeArgentImporter
+from finances.models import EntreeArgent, Depense
+from tasks.models import Tache
+
+User = get_user_model()
+
+
+class LedgerImportTest(TestCase):
+    def setUp(self):
+        self.comptable = User.objects.create_user(username='comptable_import', password='pwd', role='comptable')
+        self.client = APIClient()
+        self.client.force_authenticate(self.comptable)
+
+    def _csv(self, lignes, entetes='montant;motif;mode_paiement;date_entree'):
+        contenu = '\n'.join([entetes] + lignes).encode('utf-8-sig')
+        return SimpleUploadedFile('releve.csv', contenu, content_type='text/csv')
+
+    def test_dry_run_rapport(self):
+        """Le dry-run rapporte les erreurs sans rien écrire"""
+        fichier = self._csv([
+            '150000;Virement client;virement;05/01/2026',
+            '500;Trop petit;especes;2026-01-06',
+            '20000;Mode inconnu;troc;2026-01-06',
+        ])
+        response = self.client.post('/api/finances/entrees/importer/', {'fichier': fichier, 'dry_run': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['valides'], 1)
+        self.assertEqual([e['ligne'] for e in response.data['erreurs']], [3, 4])
+        self.assertFalse(EntreeArgent.objects.exists())
+
+    def test_erreurs_bloquent_import(self):
+        fichier = self._csv(['150000;Virement;virement;2026-01-05', '500;Trop petit;especes;2026-01-06'])
+        response = self.client.post('/api/finances/entrees/importer/', {'fichier': fichier})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EntreeArgent.objects.exists())
+
+    def test_import_entrees(self):
+        """Numéros réservés par plage et une seule entrée d'audit"""
+        EntreeArgent.objects.create(
+            montant=Decimal('5000'), motif="Existante", mode_paiement='especes',
+            date_entree=date(2026, 1, 2), created_by=self.comptable
+        )
+        fichier = self._csv([
+            '150 000,50;Virement client;Virement bancaire;2026-01-05',
+            '20000;Versement;especes;2026-01-06',
+        ])
+        # Nombre de requêtes indépendant du nombre de lignes
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/finances/entrees/importer/', {'fichier': fichier})
+
+        self.assertEqual(response.data['importes'], 2)
+        numeros = list(EntreeArgent.objects.order_by('numero').values_list('numero', flat=True))
+        self.assertEqual(numeros, ['ENT-2026-001', 'ENT-2026-002', 'ENT-2026-003'])
+        self.assertEqual(EntreeArgent.objects.get(numero='ENT-2026-002').montant, Decimal('150000.50'))
+        self.assertEqual(AuditLog.objects.filter(action_type='import').count(), 1)
+
+    def test_import_depenses_xlsx(self):
+        """Import XLSX de dépenses rattachées à une mission (budget recalculé)"""
+        tache = Tache.objects.create(
+            titre="Mission", description="-", createur=self.comptable,
+            date_echeance=timezone.now() + timezone.timedelta(days=3), budget_alloue=Decimal('100000')
+        )
+        classeur = Workbook()
+        feuille = classeur.active
+        feuille.append(['Motif', 'Quantite', 'Prix unitaire', 'Categorie', 'Tache'])
+        feuille.append(['Carburant', 2, 15000, 'mission', tache.numero])
+        feuille.append(['Papeterie', 1, 3000.5, None, None])
+        buffer = BytesIO()
+        classeur.save(buffer)
+
+        fichier = SimpleUploadedFile('depenses.xlsx', buffer.getvalue())
+        response = self.client.post('/api/finances/depenses/importer/', {'fichier': fichier})
+
+        self.assertEqual(response.data['importes'], 2)
+        self.assertEqual(Depense.objects.get(motif='Papeterie').montant, Decimal('3000.50'))
+        tache.refresh_from_db()
+        self.assertEqual(tache.montant_engage, Decimal('30000.00'))
+
+    def test_quantite_non_entiere(self):
+        """Une quantité fractionnaire est une erreur de ligne, pas une troncature"""
+        fichier = SimpleUploadedFile('depenses.csv', 'motif;quantite;prix_unitaire\nCarburant;2,5;1000\nPapeterie;3.0;500'.encode())
+        response = self.client.post('/api/finances/depenses/importer/', {'fichier': fichier, 'dry_run': 'true'})
+        self.assertEqual(response.data['valides'], 1)
+        self.assertEqual(response.data['erreurs'], [{'ligne': 2, 'erreur': "Quantité non entière : 2.5"}])
+
+    def test_volume(self):
+        """Un import volumineux reste rapide (bulk_create par lots)"""
+        lignes = '\n'.join(
+            f"{1000 + i};Ligne {i};especes;2026-01-{1 + i % 28:02d}" for i in range(5000)
+        )
+        contenu = ('montant;motif;mode_paiement;date_entree\n' + lignes).encode()
+
+        debut = time.monotonic()
+        rapport = EntreeArgentImporter(self.comptable).run(BytesIO(contenu), 'volume.csv')
+        self.assertEqual(rapport['importes'], 5000)
+        self.assertLess(time.monotonic() - debut, 10)
@@ -0,0 +1,135 @@
+import hashlib
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from finances.models import Depense
+from finances.storage import piece_storage, is_content_addressed
+
+User = get_user_model()
+
+
+class PieceJustificativeStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.agent = User.objects.create_user(username='agent_pieces', password='pwd', role='agent')
+
+    def _depense(self, contenu, nom='recu.pdf'):
+        return Depense.objects.create(
+            quantite=1,
+            prix_unitaire=Decimal('10000.00'),
+            motif="Achat fournitures",
+            created_by=self.agent,
+            piece_justificative=SimpleUploadedFile(nom, contenu, content_type='application/pdf'),
+        )
+
+    def test_metadonnees_persistees(self):
+        """Empreinte, taille, type MIME et validité sont calculés à l'envoi"""
+        contenu = b'%PDF-1.4 recu'
+        depense = self._depense(contenu)
+
+        self.assertEqual(depense.piece_hash, hashlib.sha256(contenu).hexdigest())
+        self.assertEqual(depense.piece_taille, len(contenu))
+        self.assertEqual(depense.piece_mime, 'application/pdf')
+        self.assertEqual(depense.get_piece_justificative_name(), 'recu.pdf')
+        self.assertTrue(depense.piece_valide)
+        self.assertTrue(is_content_addressed(depense.piece_justificative.name))
+
+    def test_deduplication(self):
+        """Un même reçu joint à deux dépenses n'est stocké qu'une fois"""
+        premiere = self._depense(b'%PDF-1.4 meme recu', nom='a.pdf')
+        seconde = self._depense(b'%PDF-1.4 meme recu', nom='b.pdf')
+
+        self.assertEqual(premiere.piece_justificative.name, seconde.piece_justificative.name)
+        self.assertEqual(seconde.get_piece_justificative_name(), 'b.pdf')
+
+    def test_validite_sans_acces_stockage(self):
+        """has_valid_piece et les sauvegardes suivantes n'interrogent pas le stockage"""
+        depense = Depense.objects.get(pk=self._depense(b'%PDF-1.4').pk)
+
+        with mock.patch.object(type(piece_storage), 'size', side_effect=AssertionError("stat")):
+            self.assertTrue(depense.has_valid_piece())
+            self.assertIsNotNone(depense.get_piece_download_url())
+            depense.motif = "Achat fournitures (corrigé)"
+            depense.save()
+
+
+class PieceDownloadTest(TestCase):
+    """Téléchargement en flux avec Range / ETag"""
+
+    contenu = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.agent = User.objects.create_user(username='agent_dl', password='pwd', role='agent')
+        self.depense = Depense.objects.create(
+            quantite=1,
+            prix_unitaire=Decimal('10000.00'),
+            motif="Achat",
+            created_by=self.agent,
+            piece_justificative=SimpleUploadedFile('facture.pdf', self.contenu),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        self.url = f'/api/finances/depenses/{self.depense.pk}/piece/'
+
+    def test_telechargement_complet(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.contenu)
+        self.assertEqual(response['ETag'], f'"{self.depense.piece_hash}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('facture.pdf', response['Content-Disposition'])
+
+    def test_requete_partielle(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=9-18')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.contenu[9:19])
+        self.assertEqual(response['Content-Range'], f'bytes 9-18/{len(self.contenu)}')
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.contenu)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.depense.piece_hash}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_permissions(self):
+        """Un agent ne télécharge pas la pièce d'une dépense d'autrui"""
+        autre = User.objects.create_user(username='autre_dl', password='pwd', role='agent')
+        self.client.force_authenticate(autre)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_offload_x_accel(self):
+        with self.settings(DOWNLOADS_OFFLOAD='x-accel'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'/protected-media/{self.depense.piece_justificative.name}'
+        )
+
+    def test_if_range_comparaison_forte(self):
+        """If-Range : la plage n'est servie que pour l'ETag fort identique"""
+        etag = f'"{self.depense.piece_hash}"'
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        for if_range in (f'W/{etag}', '"autre"', 'Wed, 21 Oct 2015 07:28:00 GMT'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=if_range)
+            self.assertEqual(response.status_code, 200)
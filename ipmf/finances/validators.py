@@ -16,6 +16,9 @@ def validate_future_date(value):
 
 def validate_file_size(value):
     """Valide la taille du fichier (max 10MB)"""
+    # Fichier déjà enregistré : validé à l'envoi, inutile d'interroger le stockage
+    if getattr(value, '_committed', False):
+        return
     max_size = 10 * 1024 * 1024  # 10MB
     if value.size > max_size:
         raise ValidationError(_(f"La taille du fichier ne peut pas dépasser {max_size//1024//1024}MB"))
@@ -1,9 +1,12 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Sum, Count, Avg, Max, Min, DateField, DateTimeField
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear, Coalesce, Cast
+from django.db.models.functions import Coalesce, Cast
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta, datetime
 import csv
@@ -17,12 +20,93 @@ from .permissions import (
     CanVerifyDepense, CanValidateDepense, CanPayDepense, CanViewAllFinances
 )
 from .services import FinanceService
+from .importers import EntreeArgentImporter, DepenseImporter, ImportErreur
+from .reports import RapportEntrees, RapportDepenses
+from . import forecasting
+from .storage import is_content_addressed
+from ipmf.downloads import serve_file
+from ipmf.db_routers import ReplicaReadMixin
+from ipmf.etags import ConditionalGetMixin
+from ipmf.sync import DeltaSyncMixin
+from ipmf.throttling import AnalyticsThrottle, ExportThrottle, StatisticsThrottle
 from audit.models import AuditLog
+from audit.reports import ExportErreur, generer, periode, servir
 from django.core.exceptions import ValidationError
 
-class EntreeArgentViewSet(viewsets.ModelViewSet):
+def _serve_piece(request, obj):
+    """Sert une pièce justificative à partir des métadonnées persistées (aucun stat)"""
+    piece = obj.piece_justificative
+    if not piece:
+        return Response({'error': 'Aucune pièce justificative'}, status=status.HTTP_404_NOT_FOUND)
+    return serve_file(
+        request, piece,
+        filename=obj.get_piece_justificative_name(),
+        content_type=obj.piece_mime or None,
+        etag=obj.piece_hash or None,
+        size=obj.piece_taille,
+        immutable=is_content_addressed(piece.name),
+    )
+
+
+def _run_import(request, importer_class):
+    """Import CSV/XLSX (champ 'fichier') ; 'dry_run' et 'ignorer_erreurs' optionnels"""
+    fichier = request.FILES.get('fichier')
+    if not fichier:
+        return Response({'error': "Le champ 'fichier' est requis"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def _flag(name):
+        return str(request.data.get(name, '')).lower() in ('1', 'true', 'oui', 'on')
+
+    importer = importer_class(
+        request.user,
+        dry_run=_flag('dry_run'),
+        ignorer_erreurs=_flag('ignorer_erreurs'),
+    )
+    try:
+        rapport = importer.run(fichier, fichier.name)
+    except ImportErreur as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    bloque = rapport['nb_erreurs'] and not rapport['importes'] and not rapport['dry_run']
+    return Response(rapport, status=status.HTTP_400_BAD_REQUEST if bloque else status.HTTP_200_OK)
+
+
+def _run_export(request, queryset, rapport_class, champ_date):
+    """
+    Relevé Excel/PDF/CSV/JSON ('format', défaut 'excel') du queryset filtré,
+    borné par 'date_debut' / 'date_fin' (AAAA-MM-JJ) sur champ_date
+    """
+    format_export = request.data.get('format', 'excel')
+    bornes = {}
+    for nom, lookup in (('date_debut', 'gte'), ('date_fin', 'lte')):
+        valeur = request.data.get(nom)
+        if not valeur:
+            continue
+        try:
+            bornes[nom] = datetime.strptime(valeur, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return Response({'error': f"{nom} : date attendue au format AAAA-MM-JJ"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.filter(**{f'{champ_date}__{lookup}': bornes[nom]})
+
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    try:
+        export = generer(
+            rapport_class(queryset, periode=periode(bornes.get('date_debut'), bornes.get('date_fin'))),
+            format_export, request.user,
+            parametres={**{nom: str(valeur) for nom, valeur in bornes.items()}, **request.query_params.dict()},
+            ip_address=x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR'),
+        )
+    except ExportErreur as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return servir(request, export)
+
+
+class EntreeArgentViewSet(DeltaSyncMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    replica_actions = {'statistiques', 'export_csv', 'exporter'}
     queryset = EntreeArgent.objects.all()
     serializer_class = EntreeArgentSerializer
+    # Requêtes SQL par action, authentification comprise (ipmf/query_budget.py)
+    query_budgets = {'list': 3, 'retrieve': 2, 'changes': 4}
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['statut', 'mode_paiement', 'date_entree']
     search_fields = ['numero', 'motif', 'commentaire']
@@ -30,7 +114,7 @@ class EntreeArgentViewSet(viewsets.ModelViewSet):
     ordering = ['-date_entree']
     
     def get_permissions(self):
-        if self.action in ['create']:
+        if self.action in ['create', 'importer']:
             permission_classes = [permissions.IsAuthenticated, CanCreateEntree]
         elif self.action in ['confirmer', 'annuler']:
             permission_classes = [permissions.IsAuthenticated, CanConfirmEntree]
@@ -49,6 +133,9 @@ class EntreeArgentViewSet(viewsets.ModelViewSet):
         else:
             # Les autres utilisateurs ne voient que les entrÃ©es confirmÃ©es
             return queryset.filter(statut='confirmee')
+
+    def sync_perimetres(self, user):
+        return None if user.role in ['admin', 'comptable', 'caisse', 'dg'] else ['public']
     
     def perform_create(self, serializer):
         entree = serializer.save(created_by=self.request.user)
@@ -88,7 +175,18 @@ class EntreeArgentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(entree)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=True, methods=['get'], url_path='piece')
+    def telecharger_piece(self, request, pk=None):
+        """Télécharge la pièce justificative (entrée d'argent)"""
+        obj = self.get_object()
+        return _serve_piece(request, obj)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def importer(self, request):
+        """Import en masse depuis un fichier CSV ou XLSX"""
+        return _run_import(request, EntreeArgentImporter)
+
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques(self, request):
         """Statistiques des entrées d'argent"""
         user = request.user
@@ -154,7 +252,7 @@ class EntreeArgentViewSet(viewsets.ModelViewSet):
         }
         return Response(stats_data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[ExportThrottle])
     def export_csv(self, request):
         """Exporter les entrées d'argent en CSV"""
         response = HttpResponse(content_type='text/csv')
@@ -177,35 +275,28 @@ class EntreeArgentViewSet(viewsets.ModelViewSet):
             
         return response
 
-class FinanceAnalyticsViewSet(viewsets.ViewSet):
+    @action(detail=False, methods=['post'], throttle_classes=[ExportThrottle])
+    def exporter(self, request):
+        """Relevé des entrées (Excel, PDF, CSV ou JSON), enregistré dans l'historique des exports"""
+        return _run_export(request, self.filter_queryset(self.get_queryset()), RapportEntrees, 'date_entree')
+
+class FinanceAnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """ViewSet pour les analyses financières"""
     permission_classes = [permissions.IsAuthenticated, CanViewAllFinances]
+    throttle_classes = [AnalyticsThrottle]
 
     def list(self, request):
         granularity = request.query_params.get('granularity', 'month')
+        if granularity not in forecasting.GRANULARITES:
+            granularity = 'month'
         today = timezone.now().date()
-        
-        # Déterminer la période et la fonction de troncature selon la granularité
-        if granularity == 'day':
-            date_debut = today - timedelta(days=30)
-            trunc_fn = TruncDay
-            date_format = '%Y-%m-%d'
-            forecast_delta = timedelta(days=7)
-        elif granularity == 'week':
-            date_debut = today - timedelta(weeks=12)
-            trunc_fn = TruncWeek
-            date_format = '%G-W%V'  # Format ISO week
-            forecast_delta = timedelta(weeks=4)
-        elif granularity == 'year':
-            date_debut = today.replace(year=today.year - 5, month=1, day=1)
-            trunc_fn = TruncYear
-            date_format = '%Y'
-            forecast_delta = timedelta(days=365*2)
-        else:  # month (default)
-            date_debut = (today.replace(day=1) - timedelta(days=365)).replace(day=1)
-            trunc_fn = TruncMonth
-            date_format = '%Y-%m'
-            forecast_delta = timedelta(days=120)
+
+        # Période affichée, historique plus long pour l'ajustement des prévisions
+        gran = forecasting.get_granularite(granularity)
+        trunc_fn = gran.trunc_fn
+        date_format = gran.date_format
+        date_debut = gran.debut_affichage(today)
+        debut_ajustement = min(gran.debut_ajustement(today), date_debut)
 
         # Récupérer les données réelles (Entrées) - Confirmées uniquement
         entrees_qs = EntreeArgent.objects.filter(
@@ -215,7 +306,7 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
             ref_date=Coalesce('date_entree', Cast('created_at', output_field=DateField())),
             period=trunc_fn('ref_date')
         ).filter(
-            ref_date__gte=date_debut
+            ref_date__gte=debut_ajustement
         ).values('period').annotate(
             total=Sum('montant')
         ).order_by('period')
@@ -228,7 +319,7 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
             ref_date=Coalesce('date_paiement', 'created_at'),
             period=trunc_fn('ref_date')
         ).filter(
-            ref_date__gte=date_debut
+            ref_date__gte=debut_ajustement
         ).values('period').annotate(
             total=Sum('montant')
         ).order_by('period')
@@ -257,37 +348,26 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
         
         running_balance = float(somme_entrees_init) - float(somme_depenses_init)
 
-        # Mapper les données par période
+        # Mapper les données par période (historique d'ajustement inclus)
         data_by_period = {}
+        affichees = set()
         
         # Initialiser les périodes
-        current = date_debut
-        end_date = today + forecast_delta
+        current = debut_ajustement
+        end_date = gran.fin(today)
         
         while current <= end_date:
             key = current.strftime(date_format)
-            # Détecter si c'est la période en cours
-            is_ongoing = False
-            if granularity == 'day' and current == today: is_ongoing = True
-            elif granularity == 'week' and current <= today < current + timedelta(weeks=1): is_ongoing = True
-            elif granularity == 'month' and current.year == today.year and current.month == today.month: is_ongoing = True
-            elif granularity == 'year' and current.year == today.year: is_ongoing = True
-
             data_by_period[key] = {
                 'label': key,
                 'entrees': 0,
                 'depenses': 0,
                 'is_forecast': current > today,
-                'is_ongoing': is_ongoing
+                'is_ongoing': gran.est_en_cours(current, today)
             }
-            
-            # Incrémenter selon la granularité
-            if granularity == 'day': current += timedelta(days=1)
-            elif granularity == 'week': current += timedelta(weeks=1)
-            elif granularity == 'year': current = current.replace(year=current.year + 1)
-            else: # month
-                if current.month == 12: current = current.replace(year=current.year + 1, month=1)
-                else: current = current.replace(month=current.month + 1)
+            if current >= date_debut:
+                affichees.add(key)
+            current = gran.suivante(current)
 
         for e in entrees_qs:
             key = e['period'].strftime(date_format)
@@ -299,8 +379,15 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
             if key in data_by_period:
                 data_by_period[key]['depenses'] = float(d['total'])
 
+        # Historique complet (périodes terminées) pour le modèle de prévision
+        all_keys = sorted(data_by_period.keys())
+        historique = [
+            data_by_period[k] for k in all_keys
+            if not data_by_period[k]['is_forecast'] and not data_by_period[k]['is_ongoing']
+        ]
+
         # Calculer le solde cumulé
-        sorted_keys = sorted(data_by_period.keys())
+        sorted_keys = [k for k in all_keys if k in affichees]
         for key in sorted_keys:
             val = data_by_period[key]
             if not val['is_forecast']:
@@ -312,66 +399,38 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
                     val['entrees'] = None
                     val['depenses'] = None
 
-        # Calcul des prévisions - Modèle de Tendance Linéaire (Semi-Intelligent)
-        historical_data = [(v['entrees'] or 0, v['depenses'] or 0) for k, v in data_by_period.items() if not v['is_forecast']]
-        
-        if len(historical_data) >= 2:
-            n = len(historical_data)
-            x = list(range(n))
-            
-            # Fonction interne pour calculer la régression linéaire simple
-            def get_trend(values):
-                sum_x = sum(x)
-                sum_y = sum(values)
-                sum_xy = sum(i * values[i] for i in range(n))
-                sum_x2 = sum(i**2 for i in range(n))
-                
-                denominator = (n * sum_x2 - sum_x**2)
-                if denominator == 0: return 0, sum_y / n
-                
-                slope = (n * sum_xy - sum_x * sum_y) / denominator
-                intercept = (sum_y - slope * sum_x) / n
-                return slope, intercept
+        # Calcul des prévisions - Holt-Winters (tendance + saisonnalité), modèle mémorisé
+        forecast_keys = [k for k in sorted_keys if data_by_period[k]['is_forecast']]
+        modele = None
+        if forecast_keys and historique:
+            # Le premier pas projeté correspond à la période en cours
+            horizon = len(forecast_keys) + 1
+            projections = forecasting.project(
+                granularity, today,
+                [h['entrees'] for h in historique],
+                [h['depenses'] for h in historique],
+                horizon,
+            )
+            prev_e, prev_d = projections['entrees'], projections['depenses']
+            modele = {'entrees': prev_e['modele'], 'depenses': prev_d['modele']}
 
-            slope_e, intercept_e = get_trend([h[0] for h in historical_data])
-            slope_d, intercept_d = get_trend([h[1] for h in historical_data])
-            
-            # Projeter le solde cumulé pour les prévisions
             temp_balance = running_balance
-            forecast_count = 1
-            for key in sorted_keys:
+            for pas, key in enumerate(forecast_keys, start=1):
                 val = data_by_period[key]
-                if val['is_forecast']:
-                    # Projection x = n + offset
-                    proj_x = n + forecast_count - 1
-                    
-                    e_proj = max(0, slope_e * proj_x + intercept_e)
-                    d_proj = max(0, slope_d * proj_x + intercept_d)
-                    
-                    val['entrees_prevues'] = float(round(e_proj, 2))
-                    val['depenses_prevues'] = float(round(d_proj, 2))
-                    val['prevision'] = val['entrees_prevues'] - val['depenses_prevues']
-                    
-                    temp_balance += val['prevision']
-                    val['solde_cumule_prevu'] = float(round(temp_balance, 2))
-                    forecast_count += 1
-        elif historical_data:
-            # Fallback sur moyenne simple si pas assez de points
-            avg_e = sum(h[0] for h in historical_data) / len(historical_data)
-            avg_d = sum(h[1] for h in historical_data) / len(historical_data)
-            
-            temp_balance = running_balance
-            for key in sorted_keys:
-                val = data_by_period[key]
-                if val['is_forecast']:
-                    val['entrees_prevues'] = float(round(avg_e, 2))
-                    val['depenses_prevues'] = float(round(avg_d, 2))
-                    val['prevision'] = avg_e - avg_d
-                    temp_balance += val['prevision']
-                    val['solde_cumule_prevu'] = float(round(temp_balance, 2))
+                val['entrees_prevues'] = prev_e['prevision'][pas]
+                val['entrees_prevues_basse'] = prev_e['basse'][pas]
+                val['entrees_prevues_haute'] = prev_e['haute'][pas]
+                val['depenses_prevues'] = prev_d['prevision'][pas]
+                val['depenses_prevues_basse'] = prev_d['basse'][pas]
+                val['depenses_prevues_haute'] = prev_d['haute'][pas]
+                val['prevision'] = val['entrees_prevues'] - val['depenses_prevues']
+
+                temp_balance += val['prevision']
+                val['solde_cumule_prevu'] = float(round(temp_balance, 2))
 
         return Response({
             'data': [data_by_period[k] for k in sorted_keys],
+            'modele_prevision': modele,
             'overall_totals': {
                 'total_entrees': float(overall_entrees),
                 'total_depenses': float(overall_depenses),
@@ -379,9 +438,15 @@ class FinanceAnalyticsViewSet(viewsets.ViewSet):
             }
         })
 
-class DepenseViewSet(viewsets.ModelViewSet):
+class DepenseViewSet(ConditionalGetMixin, DeltaSyncMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    replica_actions = {'export_csv', 'exporter'}
+    etag_scopes = ['finances.depense']
+    etag_actions = {'list', 'retrieve'}
+    etag_daily = True
     queryset = Depense.objects.all()
     serializer_class = DepenseSerializer
+    # Requêtes SQL par action, authentification comprise (ipmf/query_budget.py)
+    query_budgets = {'list': 3, 'retrieve': 2, 'changes': 4}
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['statut', 'categorie', 'created_by']
     search_fields = ['numero', 'motif', 'commentaire']
@@ -391,6 +456,8 @@ class DepenseViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['create']:
             permission_classes = [permissions.IsAuthenticated, CanCreateDepense]
+        elif self.action in ['importer']:
+            permission_classes = [permissions.IsAuthenticated, CanViewAllFinances]
         elif self.action in ['verifier']:
             permission_classes = [permissions.IsAuthenticated, CanVerifyDepense]
         elif self.action in ['valider']:
@@ -406,6 +473,9 @@ class DepenseViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         queryset = Depense.objects.all().select_related('created_by', 'verifie_par', 'valide_par_comptable', 'valide_par_dg')
+        if self.action in ('list', 'changes'):
+            # Délais d'attente calculés par la base pour toute la page
+            queryset = queryset.avec_delais()
         
         if user.role in ['admin', 'comptable', 'dg']:
             return queryset
@@ -414,23 +484,17 @@ class DepenseViewSet(viewsets.ModelViewSet):
         else:
             # Les agents voient seulement leurs propres dÃ©penses
             return queryset.filter(created_by=user)
+
+    def sync_perimetres(self, user):
+        if user.role in ['admin', 'comptable', 'dg']:
+            return None
+        return ['role:caisse'] if user.role == 'caisse' else [f'user:{user.pk}']
     
     def perform_create(self, serializer):
-        depense = serializer.save(created_by=self.request.user)
-        
-        # 1. DG Auto-Validation (Haute Priorité)
-        if self.request.user.role == 'dg':
-            try:
-                FinanceService.process_dg_direct_validation(depense, self.request.user)
-            except Exception as e:
-                print(f"Auto-validation DG failed: {e}")
-        else:
-            # 2. Tentative d'auto-approbation (Workflow Mission)
-            try:
-                FinanceService.process_auto_approval(depense, self.request.user)
-            except Exception as e:
-                print(f"Auto-approval failed: {e}")
-            
+        with transaction.atomic():
+            depense = serializer.save(created_by=self.request.user)
+            FinanceService.submit_depense(depense, self.request.user)
+
         AuditLog.log_action(
             action_type='create',
             module='finances',
@@ -441,6 +505,24 @@ class DepenseViewSet(viewsets.ModelViewSet):
             objet_repr=str(depense)
         )
     
+    def perform_update(self, serializer):
+        # Montant engagé et payé des missions ajustés avec la modification
+        try:
+            FinanceService.update_depense(serializer.instance, serializer.validated_data)
+        except ValidationError as e:
+            raise DRFValidationError({'error': e.messages})
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            FinanceService.release_depense(instance)
+            instance.delete()
+
+    @action(detail=True, methods=['get'], url_path='piece')
+    def telecharger_piece(self, request, pk=None):
+        """Télécharge la pièce justificative (dépense)"""
+        obj = self.get_object()
+        return _serve_piece(request, obj)
+
     @action(detail=True, methods=['post'])
     def verifier(self, request, pk=None):
         """Action pour vérifier une dépense (comptable)"""
@@ -538,7 +620,7 @@ class DepenseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(depenses_retard, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[ExportThrottle])
     def export_csv(self, request):
         """Exporter les dépenses en CSV"""
         response = HttpResponse(content_type='text/csv')
@@ -562,6 +644,16 @@ class DepenseViewSet(viewsets.ModelViewSet):
             
         return response
     
+    @action(detail=False, methods=['post'], throttle_classes=[ExportThrottle])
+    def exporter(self, request):
+        """Relevé des dépenses (Excel, PDF, CSV ou JSON), enregistré dans l'historique des exports"""
+        return _run_export(request, self.filter_queryset(self.get_queryset()), RapportDepenses, 'created_at__date')
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def importer(self, request):
+        """Import en masse depuis un fichier CSV ou XLSX"""
+        return _run_import(request, DepenseImporter)
+
     @action(detail=False, methods=['get'])
     def a_valider(self, request):
         """
@@ -0,0 +1,37 @@
+"""
+Configuration gunicorn (Procfile : gunicorn ipmf.wsgi:application -c gunicorn.conf.py).
+
+L'application est chargée et préchauffée une seule fois dans le processus
+maître (preload_app) : les workers forkés démarrent avec les imports, le
+résolveur d'URL et les caches déjà prêts, puis ouvrent leurs propres
+connexions. Voir ipmf/warmup.py ; `manage.py profile_startup` mesure les coûts.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+# Recyclage progressif des workers (fuites mémoire) sans redémarrages simultanés
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+
+def when_ready(server):
+    """Maître : préchauffage avant le fork des workers"""
+    if not preload_app:
+        return
+    from ipmf.warmup import warm_up
+
+    timings = warm_up()
+    server.log.info("Préchauffage : %.0f ms", sum(timings.values()) * 1000)
+
+
+def post_worker_init(worker):
+    """Worker : préchauffage local si l'application n'est pas préchargée, puis connexions"""
+    from ipmf.warmup import warm_connections, warm_up
+
+    if not preload_app:
+        warm_up()
+    warm_connections()
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.core import checks
+
+class IpmfConfig(AppConfig):
+    """Socle du projet : démarrage et préchauffage des workers (warmup.py, profile_startup), contrôles de configuration"""
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'ipmf'
+    verbose_name = 'Socle IPMF'
+
+    def ready(self):
+        from .db_routers import check_replica_cache
+
+        checks.register(check_replica_cache, checks.Tags.caches)
@@ -3,6 +3,10 @@ ASGI config for ipmf project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Les vues asynchrones (ex. /api/dashboard/donnees-async/overview/) y calculent
+leurs sections en parallèle sans bloquer la boucle d'événements :
+    gunicorn ipmf.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
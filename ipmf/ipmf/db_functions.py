@@ -0,0 +1,59 @@
+"""
+Fonctions SQL d'écart en jours, pour calculer échéances et délais d'attente
+dans la base (filtres, tris, agrégats) plutôt qu'en Python ligne par ligne.
+
+Mêmes résultats que les propriétés Python correspondantes :
+- DiffJours(fin, debut) : (fin - debut).days entre deux dates ;
+- JoursEcoules(debut, fin) : (fin - debut).days entre deux instants, pour
+  fin >= debut (jours entiers écoulés).
+"""
+from django.db import NotSupportedError
+from django.db.models import Func, IntegerField
+
+
+class _EcartJours(Func):
+    arity = 2
+    output_field = IntegerField()
+
+    def _compile(self, compiler, connection):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, sql_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(sql_params)
+        return sqls, params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"{self.__class__.__name__} n'est pas disponible pour {connection.vendor}")
+
+
+class DiffJours(_EcartJours):
+    """Jours calendaires entre deux dates : fin - debut"""
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (fin, debut), params = self._compile(compiler, connection)
+        return f"(({fin})::date - ({debut})::date)", params
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        (fin, debut), params = self._compile(compiler, connection)
+        return f"CAST(julianday({fin}) - julianday({debut}) AS INTEGER)", params
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        (fin, debut), params = self._compile(compiler, connection)
+        return f"DATEDIFF({fin}, {debut})", params
+
+
+class JoursEcoules(_EcartJours):
+    """Jours entiers écoulés entre deux instants : debut -> fin"""
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (debut, fin), params = self._compile(compiler, connection)
+        return f"FLOOR(EXTRACT(EPOCH FROM ({fin} - {debut})) / 86400)::integer", params
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        (debut, fin), params = self._compile(compiler, connection)
+        return f"CAST(julianday({fin}) - julianday({debut}) AS INTEGER)", params
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        (debut, fin), params = self._compile(compiler, connection)
+        return f"TIMESTAMPDIFF(DAY, {debut}, {fin})", params
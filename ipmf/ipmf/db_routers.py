@@ -0,0 +1,252 @@
+"""
+Routage des lectures analytiques vers un réplica en lecture seule.
+
+- Seules les vues annotées (ReplicaReadMixin, replica_reads()) lisent sur le
+  réplica ; tout le reste, et toutes les écritures, vont sur `default`.
+- Lecture de ses propres écritures : après une requête d'écriture réussie,
+  l'utilisateur reste sur `default` pendant REPLICA_STICKY_SECONDS. Le
+  marqueur est dans le cache, qui doit être commun à tous les workers
+  (Redis) : avec un cache par processus, le réplica reste désactivé
+  (check ipmf.E001).
+- Retard de réplication mesuré périodiquement (REPLICA_LAG_CHECK_INTERVAL) :
+  au-delà de REPLICA_MAX_LAG secondes, ou si le réplica est injoignable,
+  les lectures reviennent automatiquement sur `default`.
+
+Sans alias de réplica configuré (DB_REPLICA_NAME), le routeur est neutre.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+STICKY_KEY = 'db:sticky:{}'
+
+# Caches propres à chaque processus : un marqueur posé par un worker serait
+# invisible des autres
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+# État du réplica par processus : {alias: (vérifié à, disponible)}
+_health = {}
+_health_lock = threading.Lock()
+
+
+def shared_cache():
+    """Le cache par défaut est-il commun à tous les processus ?"""
+    return settings.CACHES.get('default', {}).get('BACKEND') not in LOCAL_CACHE_BACKENDS
+
+
+def _configured_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def replica_alias():
+    """Alias du réplica s'il est configuré et utilisable (cache partagé), sinon None"""
+    alias = _configured_alias()
+    return alias if alias and shared_cache() else None
+
+
+def check_replica_cache(app_configs, **kwargs):
+    """Réplica configuré sans cache partagé : lecture de ses écritures impossible"""
+    if _configured_alias() is None or shared_cache():
+        return []
+    return [checks.Error(
+        "Réplica configuré avec un cache propre à chaque processus : lectures sur le réplica désactivées.",
+        hint=(
+            "Définir REDIS_URL : le marqueur de lecture de ses écritures (REPLICA_STICKY_SECONDS) "
+            "doit être visible de tous les workers."
+        ),
+        id='ipmf.E001',
+    )]
+
+
+def _same_database(alias):
+    """
+    L'alias désigne-t-il la base principale elle-même ? C'est le cas des
+    miroirs de test (TEST['MIRROR']) : lire via `default` garde la visibilité
+    des données de la transaction en cours.
+    """
+    keys = ('ENGINE', 'NAME', 'HOST', 'PORT')
+    try:
+        replica = connections[alias].settings_dict
+    except ConnectionDoesNotExist:
+        replica = settings.DATABASES[alias]
+    default = connections[DEFAULT_DB_ALIAS].settings_dict
+    return all(replica.get(k) == default.get(k) for k in keys)
+
+
+# ---------------------------------------------------------------------------
+# Lecture de ses propres écritures
+# ---------------------------------------------------------------------------
+
+def mark_sticky(user_id):
+    """Force les lectures de l'utilisateur sur `default` pendant la fenêtre"""
+    cache.set(STICKY_KEY.format(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def is_sticky(user_id):
+    return bool(user_id) and cache.get(STICKY_KEY.format(user_id), False)
+
+
+# ---------------------------------------------------------------------------
+# Retard de réplication
+# ---------------------------------------------------------------------------
+
+def measure_lag(alias):
+    """
+    Retard du réplica en secondes, None s'il est injoignable.
+    PostgreSQL : écart de rejeu des WAL (0 si tout le flux reçu est rejoué).
+    Autres moteurs (copie SQLite locale, miroir de test) : 0.
+    """
+    connection = connections[alias]
+    try:
+        if connection.vendor != 'postgresql':
+            connection.ensure_connection()
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE "
+                "WHEN NOT pg_is_in_recovery() THEN 0 "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning("Réplica %s injoignable, lectures redirigées vers %s", alias, DEFAULT_DB_ALIAS)
+        return None
+
+
+def replica_available(alias):
+    """Réplica utilisable (état mis en cache REPLICA_LAG_CHECK_INTERVAL secondes)"""
+    now = time.monotonic()
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    checked_at, available = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < interval:
+        return available
+
+    with _health_lock:
+        checked_at, available = _health.get(alias, (None, False))
+        if checked_at is None or now - checked_at >= interval:
+            lag = measure_lag(alias)
+            available = lag is not None and lag <= getattr(settings, 'REPLICA_MAX_LAG', 5)
+            if lag is not None and not available:
+                logger.warning("Réplica %s en retard de %.1fs, lectures redirigées vers %s", alias, lag, DEFAULT_DB_ALIAS)
+            _health[alias] = (now, available)
+    return available
+
+
+def reset_replica_health():
+    """Oublie l'état mesuré des réplicas (tests, reconfiguration)"""
+    with _health_lock:
+        _health.clear()
+
+
+# ---------------------------------------------------------------------------
+# Routeur et annotations de vues
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Active les lectures sur le réplica dans le bloc (commandes, services)"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Lectures annotées vers le réplica, écritures toujours sur `default`"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        alias = replica_alias()
+        if not alias:
+            return None
+        if alias != DEFAULT_DB_ALIAS and not _same_database(alias) and replica_available(alias):
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Un objet lu sur le réplica est enregistré sur la base principale
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == replica_alias():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Même données de part et d'autre
+        alias = replica_alias()
+        if alias and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, alias}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Vues DRF dont les lectures peuvent être servies par le réplica.
+
+    replica_actions : actions concernées ; None = toutes les requêtes en
+    lecture (GET/HEAD/OPTIONS). Les écritures éventuelles de ces actions
+    (historique d'export...) restent sur `default`.
+    """
+
+    replica_actions = None
+
+    def _use_replica(self, request):
+        if not replica_alias():
+            return False
+        if self.replica_actions is None:
+            if request.method not in SAFE_METHODS:
+                return False
+        elif getattr(self, 'action', None) not in self.replica_actions:
+            return False
+        return not is_sticky(getattr(request.user, 'pk', None))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self._use_replica(request):
+            self._replica_token = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class StickyWritesMiddleware:
+    """Marque l'utilisateur après une écriture réussie (lecture de ses écritures)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_alias():
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_sticky(user.pk)
+        return response
@@ -0,0 +1,126 @@
+"""
+Enregistrements limités aux champs modifiés.
+
+DirtyFieldsMixin mémorise les valeurs chargées depuis la base (from_db) et
+les renouvelle après chaque save(). save_dirty() n'écrit que les colonnes
+modifiées depuis (plus les champs auto_now) et n'écrit rien si aucun champ
+n'a changé : pas de réécriture des grands TextField, verrou de ligne plus
+court.
+
+Convention des services : modifier l'instance puis save_dirty() ; save()
+reste l'écriture complète (création, formulaires, serializers).
+
+Écriture conditionnelle : save_dirty(condition={'statut': ancien}) ajoute la
+condition à l'UPDATE ; si la ligne a changé entre-temps (transition
+concurrente), rien n'est écrit et ValidationError est levée.
+
+Le suivi des modifications d'audit (audit/tracking.py) compare à ce même
+instantané.
+"""
+import copy
+
+from django.core.exceptions import ValidationError
+from django.db.models.fields.files import FieldFile
+
+# Valeur de update_fields : champs modifiés, calculés au dernier moment
+# (après les champs dérivés du save() du modèle)
+DIRTY = object()
+
+
+def field_value(value):
+    """Valeur comparable d'un champ (nom du fichier, copie des JSON mutables)"""
+    if isinstance(value, FieldFile):
+        return value.name or ''
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin:
+    """À placer avant models.Model dans les bases du modèle"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def _take_snapshot(self, fields=None):
+        values = self.__dict__
+        snapshot = {} if fields is None else values.get('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in values and (fields is None or field.name in fields or field.attname in fields):
+                snapshot[field.attname] = field_value(values[field.attname])
+        self._loaded_values = snapshot
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._take_snapshot(fields)
+
+    @property
+    def loaded_values(self):
+        """Valeurs à la lecture {attname: valeur} ; None pour une instance non chargée"""
+        return self.__dict__.get('_loaded_values')
+
+    def get_dirty_fields(self):
+        """
+        Noms des champs modifiés depuis la lecture. Un champ différé puis
+        affecté est considéré comme modifié.
+        """
+        snapshot = self.loaded_values or {}
+        values = self.__dict__
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in values and (
+                field.attname not in snapshot or field_value(values[field.attname]) != snapshot[field.attname]
+            )
+        ]
+
+    def unchanged_fields(self):
+        """Champs lus et non modifiés (exclus des validations du save())"""
+        if self._state.adding or self.loaded_values is None:
+            return []
+        dirty = set(self.get_dirty_fields())
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in self.loaded_values and field.name not in dirty
+        ]
+
+    def save_dirty(self, condition=None, **kwargs):
+        """
+        Enregistre les seuls champs modifiés ; retourne False si rien n'a
+        été écrit. Instance nouvelle ou non chargée : save() complet.
+        """
+        if self._state.adding or self.loaded_values is None:
+            self.save(**kwargs)
+            return True
+        if not self.get_dirty_fields():
+            return False
+        self._save_condition = condition
+        try:
+            self.save(update_fields=DIRTY, **kwargs)
+        finally:
+            del self._save_condition
+        return True
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is DIRTY:
+            update_fields = self.get_dirty_fields()
+            if update_fields:
+                update_fields += [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in update_fields
+                ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+        self._take_snapshot(update_fields)
+
+    def _do_update(self, base_qs, *args, **kwargs):
+        condition = self.__dict__.get('_save_condition')
+        if condition:
+            base_qs = base_qs.filter(**condition)
+        updated = super()._do_update(base_qs, *args, **kwargs)
+        if condition and not updated:
+            raise ValidationError(
+                f"{self._meta.verbose_name.capitalize()} modifié(e) entre-temps : rechargez avant de réessayer."
+            )
+        return updated
@@ -0,0 +1,190 @@
+"""
+Service de téléchargement des fichiers stockés (exports, pièces, pièces jointes).
+
+- Réponse en flux (FileResponse : wsgi.file_wrapper / sendfile si disponible),
+  jamais de lecture complète en mémoire du worker.
+- Requêtes partielles HTTP Range (une plage) : 206 / 416.
+- ETag + If-None-Match (304) et If-Range. ETag fort pour un contenu
+  identifié (empreinte, chemin adressé par contenu), faible sinon : If-Range
+  n'accepte que la comparaison forte, un ETag faible renvoie le fichier entier.
+- Délégation optionnelle au serveur frontal (DOWNLOADS_OFFLOAD) :
+  'x-accel' (nginx, X-Accel-Redirect) ou 'x-sendfile' (Apache/lighttpd).
+
+Les contrôles d'accès restent ceux des vues appelantes (get_object()).
+"""
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _quote_etag(value):
+    return value if value.startswith(('"', 'W/"')) else f'"{value}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Comparaison faible (RFC 9110 §13.1.2) : on ignore le préfixe W/
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def _if_range_matches(header, etag):
+    """
+    If-Range (RFC 9110 §13.1.5) : comparaison forte, les deux ETags doivent
+    être forts et identiques. Une date n'est jamais acceptée (pas de
+    Last-Modified émis) : la plage est alors ignorée.
+    """
+    header = header.strip()
+    return not etag.startswith('W/') and not header.startswith('W/') and header == etag
+
+
+def parse_range(header, size):
+    """
+    Interprète un en-tête Range à plage unique.
+    Retourne (début, fin incluse), None si l'en-tête est ignoré
+    (absent, multi-plages, syntaxe inconnue) ou 'unsatisfiable'.
+    """
+    if not header or ',' in header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffixe : les N derniers octets
+        length = int(end)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def _iter_range(fichier, start, length):
+    try:
+        fichier.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fichier.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fichier.close()
+
+
+def _offload_response(field_file):
+    """Réponse vide déléguant l'envoi au serveur frontal, ou None"""
+    mode = getattr(settings, 'DOWNLOADS_OFFLOAD', '')
+    if not mode:
+        return None
+    response = HttpResponse()
+    if mode == 'x-accel':
+        prefix = getattr(settings, 'DOWNLOADS_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name.lstrip('/')
+    elif mode == 'x-sendfile':
+        try:
+            response['X-Sendfile'] = field_file.path
+        except NotImplementedError:
+            # Stockage distant : pas de chemin local à déléguer
+            return None
+    else:
+        return None
+    # Le type MIME est fixé par le serveur frontal
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, field_file, filename=None, content_type=None, etag=None,
+               size=None, immutable=False, as_attachment=True):
+    """
+    Sert un FieldFile en flux.
+
+    - etag : identifiant stable du contenu (ex. empreinte SHA-256) ; à défaut,
+      dérivé du chemin (fort si immutable) ou du chemin et de la taille (faible).
+    - size : taille connue (évite un stat du stockage).
+    - immutable : le chemin désigne un contenu qui ne change jamais
+      (stockage adressé par contenu) : cache navigateur longue durée.
+    """
+    if not field_file:
+        raise Http404("Fichier non disponible")
+
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if size is None:
+        try:
+            size = field_file.size
+        except (OSError, FileNotFoundError):
+            raise Http404("Fichier introuvable")
+    if etag is None and immutable:
+        # Le chemin adressé par contenu identifie les octets : validateur fort
+        etag = hashlib.sha256(field_file.name.encode()).hexdigest()
+    elif etag is None:
+        etag = 'W/"%s"' % hashlib.md5(f"{field_file.name}:{size}".encode()).hexdigest()
+    etag = _quote_etag(etag)
+
+    cache_control = (
+        f'private, max-age={IMMUTABLE_MAX_AGE}, immutable' if immutable
+        else 'private, no-cache'
+    )
+
+    def _finalize(response):
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        if 'Content-Disposition' not in response:
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        return _finalize(HttpResponse(status=304))
+
+    offloaded = _offload_response(field_file)
+    if offloaded is not None:
+        # Le frontal gère lui-même Range / If-Range
+        offloaded['Content-Type'] = content_type
+        return _finalize(offloaded)
+
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and not _if_range_matches(if_range, etag):
+        byte_range = None
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _finalize(response)
+
+    fichier = field_file.storage.open(field_file.name, 'rb')
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_range(fichier, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return _finalize(response)
+
+    response = FileResponse(fichier, content_type=content_type, as_attachment=as_attachment, filename=filename)
+    response['Content-Length'] = str(size)
+    return _finalize(response)
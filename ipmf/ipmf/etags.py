@@ -0,0 +1,180 @@
+"""
+ETag et GET conditionnels pour les ressources interrogées périodiquement.
+
+L'ETag d'une réponse est dérivé, sans exécuter la requête ni les
+sérialiseurs, de :
+- la version de chaque portée de données utilisée par la vue : un jeton
+  renouvelé à chaque écriture (signaux des modèles suivis, appels explicites
+  à bump() pour les écritures en masse ou via .update()) ;
+- l'utilisateur, l'URL complète et le type de contenu négocié ;
+- la date du jour pour les vues dont le contenu dépend de la date (retards).
+
+Si l'en-tête If-None-Match correspond, la vue répond 304 Not Modified
+immédiatement. Les versions sont des lignes de base (audit.VersionPortee)
+renouvelées dans la transaction de l'écriture : tous les processus (workers
+web, répartiteur, consommateur d'événements) voient la nouvelle version en
+même temps que les données. Une ligne de version reste verrouillée jusqu'à
+la validation : les écritures d'une même portée sont sérialisées.
+
+Portées : libellé du modèle ('finances.depense') ou portée par utilisateur
+(user_scope('notifications.notification', user_id)).
+"""
+import hashlib
+import uuid
+
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+# Modèles dont toute écriture (save/delete/m2m) renouvelle la version
+TRACKED_MODELS = [
+    'finances.Depense',
+    'finances.EntreeArgent',
+    'tasks.Tache',
+    'tasks.CommentaireTache',
+    'tasks.SousTache',
+    'tasks.DemandeReport',
+    'dashboard.Alert',
+]
+
+
+def user_scope(label, user_id):
+    return f"{label}:user:{user_id}"
+
+
+def get_versions(scopes):
+    """Versions courantes des portées, dans l'ordre des portées ('' : jamais écrite)"""
+    from audit.models import VersionPortee
+
+    versions = dict(VersionPortee.objects.filter(portee__in=scopes).values_list('portee', 'jeton'))
+    return [versions.get(scope, '') for scope in scopes]
+
+
+def bump(*scopes):
+    """
+    Renouvelle la version des portées dans la transaction courante : un
+    lecteur ne voit la nouvelle version qu'avec les données validées.
+    """
+    from audit.models import VersionPortee
+
+    if not scopes:
+        return
+    jeton = uuid.uuid4().hex
+    # Ordre fixe des verrous entre écritures concurrentes
+    VersionPortee.objects.bulk_create(
+        [VersionPortee(portee=scope, jeton=jeton) for scope in sorted(set(scopes))],
+        update_conflicts=True, unique_fields=['portee'], update_fields=['jeton'],
+    )
+
+
+def bump_tracked():
+    """Toutes les portées suivies (chargements en masse, signaux suspendus)"""
+    bump(*(apps.get_model(label)._meta.label_lower for label in TRACKED_MODELS))
+
+
+def _on_change(sender, **kwargs):
+    bump(sender._meta.label_lower)
+
+
+def _on_m2m_change(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        bump(instance._meta.label_lower)
+
+
+def connect_signals():
+    """Branche les signaux des modèles suivis (AppConfig.ready)"""
+    for label in TRACKED_MODELS:
+        model = apps.get_model(label)
+        uid = f'etag:{model._meta.label_lower}'
+        post_save.connect(_on_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_change, sender=model, dispatch_uid=uid)
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(_on_m2m_change, sender=field.remote_field.through, dispatch_uid=f'{uid}:{field.name}')
+
+
+# ---------------------------------------------------------------------------
+# Vues
+# ---------------------------------------------------------------------------
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def compute_etag(user_pk, full_path, media_type, scopes, daily=False):
+    """ETag faible d'une réponse (utilisateur, URL, type de contenu, versions des portées)"""
+    parts = [str(user_pk or ''), full_path, media_type or '', *get_versions(scopes)]
+    if daily:
+        parts.append(timezone.localdate().isoformat())
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Comparaison faible (RFC 9110) : préfixe W/ ignoré
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in header.split(','))
+
+
+class ConditionalGetMixin:
+    """
+    Vues DRF en lecture servies avec ETag / 304.
+
+    etag_scopes : portées dont dépend la réponse ; get_etag_scopes() pour des
+    portées dépendant de l'utilisateur.
+    etag_daily : inclut la date du jour (contenu dépendant de la date).
+    etag_actions : actions concernées ; None = toutes les requêtes GET/HEAD.
+    """
+
+    etag_scopes = ()
+    etag_daily = False
+    etag_actions = None
+
+    def get_etag_scopes(self, request):
+        return list(self.etag_scopes)
+
+    def compute_etag(self, request):
+        return compute_etag(
+            getattr(request.user, 'pk', None), request.get_full_path(), request.accepted_media_type,
+            self.get_etag_scopes(request), daily=self.etag_daily,
+        )
+
+    def _conditional(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return self.etag_actions is None or getattr(self, 'action', None) in self.etag_actions
+
+    def not_modified(self, request):
+        """La requête revalide-t-elle la version courante ? (calcule l'ETag)"""
+        self._etag = None
+        if self._conditional(request):
+            self._etag = self.compute_etag(request)
+            return etag_matches(request.headers.get('If-None-Match'), self._etag)
+        return False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.not_modified(request):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, '_etag', None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            # Le navigateur revalide à chaque appel (If-None-Match automatique)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Authorization', 'Accept'))
+        return response
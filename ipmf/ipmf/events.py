@@ -0,0 +1,160 @@
+"""
+Outbox transactionnelle des événements métier.
+
+- publish() : appelé par les services (FinanceService, TacheService) dans la
+  transaction de la transition ; insère une ligne DomainEvent, rien d'autre.
+- @handles('type', ...) : déclare un traitant, appelé avec une liste
+  d'événements du même type (traitement par lots).
+- process_pending() : exécuté par le consommateur (process_events). Réserve
+  un lot d'événements dus (SKIP LOCKED : plusieurs consommateurs possibles),
+  les regroupe par type et exécute chaque traitant dans sa propre
+  transaction, dans l'ordre de création.
+
+Livraison au moins une fois : un traitant réussi est noté dans
+`handlers_done` dans la même transaction que ses effets et n'est pas rejoué ;
+un traitant en échec est retenté avec délai exponentiel, puis l'événement
+est abandonné (statut 'failed') après DOMAIN_EVENTS_MAX_ATTEMPTS.
+
+DOMAIN_EVENTS_EAGER (développement) : les événements sont traités dans le
+processus web, à la validation de la transaction.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+LEASE = timedelta(minutes=5)
+
+_handlers = defaultdict(list)
+
+
+def handles(*types):
+    """Enregistre un traitant pour les types d'événements donnés"""
+    def decorator(func):
+        for type_ in types:
+            if func not in _handlers[type_]:
+                _handlers[type_].append(func)
+        return func
+    return decorator
+
+
+def handler_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def publish(type, obj, actor=None, **payload):
+    """Ajoute un événement à l'outbox (transaction courante)"""
+    from audit.models import DomainEvent
+
+    event = DomainEvent.objects.create(
+        type=type,
+        aggregate=obj._meta.label_lower,
+        aggregate_id=obj.pk,
+        actor=actor if getattr(actor, 'pk', None) else None,
+        payload=payload,
+    )
+    if getattr(settings, 'DOMAIN_EVENTS_EAGER', False):
+        transaction.on_commit(process_pending)
+    return event
+
+
+def transition(type, obj, actor, de, vers, **payload):
+    """Événement de changement d'état : ancien et nouveau statut dans les données"""
+    return publish(type, obj, actor, de=de, vers=vers, **payload)
+
+
+def backoff(attempts):
+    base = getattr(settings, 'DOMAIN_EVENTS_BACKOFF', 30)
+    plafond = getattr(settings, 'DOMAIN_EVENTS_MAX_BACKOFF', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), plafond))
+
+
+def _claim(limit, now):
+    """Réserve jusqu'à `limit` événements dus (transaction courte)"""
+    from audit.models import DomainEvent
+
+    with transaction.atomic():
+        ids = list(
+            DomainEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=DomainEvent.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        DomainEvent.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, next_attempt_at=now + LEASE)
+    return list(DomainEvent.objects.filter(id__in=ids).select_related('actor').order_by('id'))
+
+
+def _run(handler, events):
+    """Exécute le traitant sur les événements ; effets et marquage dans une transaction"""
+    from audit.models import DomainEvent
+
+    name = handler_name(handler)
+    with transaction.atomic():
+        handler(events)
+        for event in events:
+            event.handlers_done = event.handlers_done + [name]
+        DomainEvent.objects.bulk_update(events, ['handlers_done'])
+
+
+def _dispatch(type_, events, errors):
+    for handler in _handlers.get(type_, []):
+        name = handler_name(handler)
+        todo = [e for e in events if e.pk not in errors and name not in e.handlers_done]
+        if not todo:
+            continue
+        try:
+            _run(handler, todo)
+        except Exception:
+            # Lot en échec : rejoué événement par événement pour isoler le fautif
+            for event in todo:
+                try:
+                    _run(handler, [event])
+                except Exception as exc:
+                    errors[event.pk] = exc
+                    logger.warning("Traitant %s en échec pour l'événement %s : %s", name, event.pk, exc)
+
+
+def process_pending(batch_size=BATCH_SIZE, now=None):
+    """Un passage du consommateur ; retourne le nombre d'événements par issue"""
+    from audit.models import DomainEvent
+
+    now = now or timezone.now()
+    events = _claim(batch_size, now)
+    if not events:
+        return Counter()
+
+    par_type = defaultdict(list)
+    for event in events:
+        par_type[event.type].append(event)
+    errors = {}
+    for type_, groupe in par_type.items():
+        _dispatch(type_, groupe, errors)
+
+    max_attempts = getattr(settings, 'DOMAIN_EVENTS_MAX_ATTEMPTS', 8)
+    processed_at = timezone.now()
+    results = Counter()
+    for event in events:
+        error = errors.get(event.pk)
+        if error is None:
+            event.status = DomainEvent.STATUS_DONE
+            event.processed_at = processed_at
+            event.last_error = ''
+            results['traites'] += 1
+            continue
+        event.last_error = str(error)[:1000]
+        if event.attempts >= max_attempts:
+            event.status = DomainEvent.STATUS_FAILED
+            results['echecs'] += 1
+            logger.error("Événement %s (%s) abandonné après %d tentatives : %s", event.pk, event.type, event.attempts, error)
+        else:
+            event.next_attempt_at = processed_at + backoff(event.attempts)
+            results['reportes'] += 1
+    DomainEvent.objects.bulk_update(events, ['status', 'processed_at', 'last_error', 'next_attempt_at'])
+    return results
@@ -0,0 +1,333 @@
+"""
+Chargement en flux des fixtures JSON (data_migration.json, dumps dumpdata).
+
+- Lecture incrémentale : le tableau JSON est décodé objet par objet
+  (JSONDecoder.raw_decode sur un tampon glissant), jamais chargé en entier.
+- Encodage détecté par BOM (UTF-8, UTF-16 LE/BE) : les exports Windows
+  (PowerShell `>`) produisent de l'UTF-16.
+- Objets regroupés par modèle et insérés par bulk_create (upsert sur la clé
+  primaire, comme loaddata qui met à jour les lignes existantes).
+- Les récepteurs de signaux du projet sont suspendus pendant le chargement :
+  audit, profils et notifications ne sont pas rejoués pour des données
+  historiques.
+- En fin de chargement : séquences de clés primaires et compteurs
+  SequenceCounter recalés sur les données chargées, compteurs budgétaires
+  des missions touchées (montant_engage, montant_paye) recalculés depuis
+  leurs dépenses.
+"""
+import codecs
+import json
+import re
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import signals
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 500
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Applications dont les récepteurs sont suspendus pendant le chargement
+PROJECT_APPS = ('users', 'finances', 'tasks', 'dashboard', 'audit', 'notifications')
+
+MODEL_SIGNALS = (
+    signals.pre_save, signals.post_save,
+    signals.pre_delete, signals.post_delete,
+    signals.m2m_changed,
+)
+
+NUMERO_RE = re.compile(r'^([A-Z]+)-(\d{4})-(\d+)$')
+
+
+class FixtureErreur(Exception):
+    """Fixture illisible ou mal formée"""
+
+
+def detect_encoding(head):
+    """Encodage d'après la marque d'ordre des octets (UTF-8 par défaut)"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return 'utf-8'
+
+
+def iter_fixture(fichier, chunk_size=CHUNK_SIZE):
+    """
+    Itère sur les objets d'un tableau JSON lu en flux depuis un fichier binaire.
+    La mémoire utilisée est bornée par la taille du plus gros objet.
+    """
+    head = fichier.read(chunk_size)
+    decoder = codecs.getincrementaldecoder(detect_encoding(head))()
+    json_decoder = json.JSONDecoder()
+
+    buffer = decoder.decode(head)
+    pos = 0
+    started = False
+    eof = not head
+
+    def _skip(chars):
+        nonlocal pos
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in chars):
+            pos += 1
+
+    while True:
+        _skip(',' if started else '')
+        if not started and pos < len(buffer):
+            if buffer[pos] != '[':
+                raise FixtureErreur("La fixture doit être un tableau JSON")
+            started = True
+            pos += 1
+            continue
+        if started and pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        try:
+            obj, end = json_decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if started and pos >= len(buffer):
+                    raise FixtureErreur("Fin de fichier inattendue (']' manquant)")
+                if not started:
+                    return
+                raise FixtureErreur(f"JSON invalide près du caractère {pos}")
+            chunk = fichier.read(chunk_size)
+            eof = not chunk
+            # Le tampon est compacté pour ne garder que l'objet en cours
+            buffer = buffer[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+            continue
+
+        if not started:
+            raise FixtureErreur("La fixture doit être un tableau JSON")
+        pos = end
+        yield obj
+
+
+def _is_project_receiver(receiver):
+    target = receiver() if isinstance(receiver, weakref.ReferenceType) else receiver
+    module = getattr(target, '__module__', '') or ''
+    return module.split('.')[0] in PROJECT_APPS
+
+
+@contextmanager
+def project_signals_suspended():
+    """
+    Déconnecte temporairement les récepteurs de signaux de modèle définis par
+    le projet. Les récepteurs de Django et des paquets tiers restent actifs.
+    """
+    saved = []
+    for signal in MODEL_SIGNALS:
+        with signal.lock:
+            saved.append((signal, signal.receivers))
+            signal.receivers = [r for r in signal.receivers if not _is_project_receiver(r[1])]
+            signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            with signal.lock:
+                signal.receivers = receivers
+                signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def raw_timestamps(model, objets):
+    """
+    Désactive auto_now / auto_now_add le temps d'une insertion en masse :
+    bulk_create appelle pre_save() et écraserait les dates de la fixture
+    (loaddata les conserve via save(raw=True)). Les dates absentes de la
+    fixture restent renseignées par pre_save().
+    """
+    fields = [
+        f for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+    for f in fields:
+        for obj in objets:
+            if getattr(obj, f.attname) is None:
+                f.pre_save(obj, add=True)
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class FixtureLoader:
+    """
+    Charge une ou plusieurs fixtures en flux.
+
+    Les contraintes de clés étrangères étant différées jusqu'au commit
+    (PostgreSQL, SQLite), l'ordre d'insertion entre modèles n'a pas
+    d'importance à l'intérieur de la transaction.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE, ignorenonexistent=False):
+        self.using = using
+        self.batch_size = batch_size
+        self.ignorenonexistent = ignorenonexistent
+        self.counts = Counter()
+        self._buffers = {}
+        self._m2m = []
+        self._deferred = []
+        # Missions dont les compteurs budgétaires sont à recalculer
+        self._missions = set()
+
+    def load(self, fichiers):
+        """Charge les fichiers (binaires) ; retourne le nombre d'objets par modèle"""
+        with transaction.atomic(using=self.using), project_signals_suspended():
+            for fichier in fichiers:
+                objets = Deserializer(
+                    iter_fixture(fichier),
+                    using=self.using,
+                    ignorenonexistent=self.ignorenonexistent,
+                    handle_forward_references=True,
+                )
+                for deserialized in objets:
+                    self._add(deserialized)
+            self._flush_all()
+            self._save_m2m()
+            self._save_deferred()
+            self.reset_sequences()
+            self._reconcile_missions()
+            self._invalidate_caches()
+        return dict(self.counts)
+
+    def _add(self, deserialized):
+        model = deserialized.object.__class__
+        buffer = self._buffers.setdefault(model, [])
+        buffer.append(deserialized.object)
+        if deserialized.m2m_data:
+            self._m2m.append((deserialized.object, deserialized.m2m_data))
+        if deserialized.deferred_fields:
+            self._deferred.append(deserialized)
+        if len(buffer) >= self.batch_size:
+            self._flush(model)
+
+    def _flush(self, model):
+        objets = self._buffers.pop(model, [])
+        if not objets:
+            return
+        opts = model._meta
+        update_fields = [
+            f.name for f in opts.concrete_fields if not f.primary_key
+        ]
+        self._note_missions(model, objets)
+        with raw_timestamps(model, objets):
+            model._base_manager.using(self.using).bulk_create(
+                objets,
+                batch_size=self.batch_size,
+                update_conflicts=bool(update_fields),
+                unique_fields=[opts.pk.name] if update_fields else None,
+                update_fields=update_fields or None,
+            )
+        self.counts[opts.label] += len(objets)
+
+    def _flush_all(self):
+        for model in list(self._buffers):
+            self._flush(model)
+
+    def _save_m2m(self):
+        """Tables de liaison remplies en masse, sans m2m_changed"""
+        lignes = {}
+        for obj, m2m_data in self._m2m:
+            for field_name, valeurs in m2m_data.items():
+                field = obj._meta.get_field(field_name)
+                through = field.remote_field.through
+                source = field.m2m_field_name() + '_id'
+                cible = field.m2m_reverse_field_name() + '_id'
+                # Remplacement complet, comme loaddata (ManyRelatedManager.set)
+                through._base_manager.using(self.using).filter(**{source: obj.pk}).delete()
+                lignes.setdefault(through, []).extend(
+                    through(**{source: obj.pk, cible: valeur}) for valeur in valeurs
+                )
+        for through, objets in lignes.items():
+            through._base_manager.using(self.using).bulk_create(
+                objets, batch_size=self.batch_size, ignore_conflicts=True
+            )
+
+    def _save_deferred(self):
+        """Références naturelles vers des objets apparus plus loin dans la fixture"""
+        for deserialized in self._deferred:
+            deserialized.save_deferred_fields(using=self.using)
+
+    def _note_missions(self, model, objets):
+        """Missions chargées, et missions des dépenses chargées (avant et après l'upsert)"""
+        from finances.models import Depense
+        from tasks.models import Tache
+
+        if model is Tache:
+            self._missions.update(obj.pk for obj in objets)
+        elif model is Depense:
+            self._missions.update(obj.tache_id for obj in objets)
+            self._missions.update(
+                Depense._base_manager.using(self.using)
+                .filter(pk__in=[obj.pk for obj in objets]).values_list('tache_id', flat=True)
+            )
+
+    def _reconcile_missions(self):
+        """bulk_create contourne FinanceService : compteurs budgétaires recalculés"""
+        from finances.services import FinanceService
+        from tasks.models import Tache
+
+        self._missions.discard(None)
+        if self._missions:
+            FinanceService.reconcile_mission_budgets(
+                Tache._base_manager.using(self.using).filter(pk__in=self._missions)
+            )
+
+    def _invalidate_caches(self):
+        """Les signaux suspendus n'ont pas invalidé les caches dérivés des données"""
+        from finances.forecasting import bump_data_version
+        from ipmf.etags import bump_tracked
+
+        transaction.on_commit(bump_data_version, using=self.using)
+        transaction.on_commit(bump_tracked, using=self.using)
+
+    def reset_sequences(self):
+        """Recale les séquences de clés primaires et les compteurs de numéros"""
+        models = [apps.get_model(label) for label in self.counts]
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        self._reset_sequence_counters(models)
+
+    def _reset_sequence_counters(self, models):
+        from finances.models import NumeroAutoMixin, SequenceCounter
+
+        maxima = {}
+        for model in models:
+            if not issubclass(model, NumeroAutoMixin):
+                continue
+            numeros = model._base_manager.using(self.using).filter(
+                numero__startswith=f"{model.prefix}-"
+            ).values_list('numero', flat=True).iterator()
+            for numero in numeros:
+                match = NUMERO_RE.match(numero or '')
+                if not match:
+                    continue
+                prefix, annee, valeur = match.groups()
+                nom = f"{prefix}-{annee}"
+                maxima[nom] = max(maxima.get(nom, 0), int(valeur))
+
+        for nom, valeur in maxima.items():
+            counter, _ = SequenceCounter.objects.using(self.using).select_for_update().get_or_create(name=nom)
+            if counter.last_value < valeur:
+                counter.last_value = valeur
+                counter.save(using=self.using)
@@ -0,0 +1,87 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Exécuté dans un interpréteur neuf : mesure un démarrage réellement à froid
+SCRIPT = """
+import json, os, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+debut = time.perf_counter()
+import django
+django.setup()
+phases = {{'setup': time.perf_counter() - debut}}
+from ipmf.warmup import warm_up
+phases.update(warm_up(database=False))
+print(json.dumps(phases))
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(lines):
+    """
+    Lignes `-X importtime` -> [(module, propre µs, cumulé µs)].
+    Chaque module n'apparaît qu'une fois (premier import).
+    """
+    modules = []
+    for line in lines:
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            own, cumulative, _, name = match.groups()
+            modules.append((name, int(own), int(cumulative)))
+    return modules
+
+
+def group_by_package(modules):
+    """Temps propre cumulé par paquet de premier niveau"""
+    totals = defaultdict(int)
+    for name, own, _ in modules:
+        totals[name.split('.')[0]] += own
+    return sorted(((name, own, own) for name, own in totals.items()), key=lambda m: m[1], reverse=True)
+
+
+class Command(BaseCommand):
+    help = "Profile le démarrage d'un worker (imports, django.setup, préchauffage)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25, help="Nombre de modules affichés")
+        parser.add_argument('--tri', choices=['cumule', 'propre'], default='cumule')
+        parser.add_argument('--par-paquet', action='store_true', help="Regroupe par paquet de premier niveau")
+        parser.add_argument('--seuil', type=float, default=0, help="Ignore les modules sous ce seuil (ms)")
+
+    def handle(self, *args, **options):
+        script = SCRIPT.format(settings_module=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Démarrage en échec :\n{result.stderr[-2000:]}")
+
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(result.stderr.splitlines())
+        total_imports = sum(own for _, own, _ in modules) / 1000
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Phases"))
+        self.stdout.write(f"  {'imports (total)':<30} {total_imports:9.1f} ms  ({len(modules)} modules)")
+        for name, duree in phases.items():
+            self.stdout.write(f"  {name:<30} {duree * 1000:9.1f} ms")
+
+        if options['par_paquet']:
+            modules = group_by_package(modules)
+        else:
+            index = 2 if options['tri'] == 'cumule' else 1
+            modules = sorted(modules, key=lambda m: m[index], reverse=True)
+        seuil = options['seuil'] * 1000
+        modules = [m for m in modules if max(m[1], m[2]) >= seuil][:options['limit']]
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Imports les plus coûteux"))
+        self.stdout.write(f"  {'module':<50} {'propre':>10} {'cumulé':>10}")
+        for name, own, cumulative in modules:
+            self.stdout.write(f"  {name:<50} {own / 1000:8.1f} ms {cumulative / 1000:8.1f} ms")
@@ -0,0 +1,138 @@
+"""
+Budgets de requêtes SQL par action de vue.
+
+Les vues déclarent un plafond par action, indépendant du volume de données :
+
+    class DepenseViewSet(...):
+        query_budgets = {'list': 6, 'retrieve': 5}
+
+QueryBudgetMiddleware compte les requêtes de chaque requête HTTP (toutes les
+bases) et compare au budget de l'action servie. Selon QUERY_BUDGET_MODE :
+- 'raise' (tests) : QueryBudgetExceeded avec le SQL fautif et la pile ;
+- 'log' (DEBUG) : même rapport dans les logs, en-tête X-Query-Count ;
+- 'off' (production) : middleware retiré au démarrage.
+
+QueryBudgetTestMixin.assertQueryBudget() vérifie en plus que le nombre de
+requêtes ne dépend pas du volume (N+1).
+"""
+import logging
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# Instructions de gestion de transaction : non comptées
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+STACK_DEPTH = 8
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def budget_for(view_func, method):
+    """(nom de l'action, budget) de la vue résolue ; budget None si non déclaré"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return None, None
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{cls.__name__}.{action}", getattr(cls, 'query_budgets', {}).get(action)
+
+
+def _project_stack():
+    """Cadres de la pile appartenant au projet (hors Django et bibliothèques)"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('query_budget.py')
+    ]
+    return ''.join(traceback.format_list(frames[-STACK_DEPTH:]))
+
+
+class QueryRecorder:
+    """execute_wrapper : SQL et pile d'appel de chaque requête exécutée"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+            self.queries.append((sql, _project_stack()))
+        return execute(sql, params, many, context)
+
+    def report(self, name, budget):
+        groupes = defaultdict(list)
+        for sql, stack in self.queries:
+            groupes[sql].append(stack)
+        lignes = [f"Budget de requêtes dépassé : {name} a exécuté {len(self.queries)} requêtes (budget {budget})"]
+        for sql, stacks in sorted(groupes.items(), key=lambda item: -len(item[1])):
+            lignes.append(f"\n×{len(stacks)} {sql[:500]}\n{stacks[0]}")
+        return '\n'.join(lignes)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if getattr(settings, 'QUERY_BUDGET_MODE', 'off') == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            name, budget = budget_for(resolve(request.path_info).func, request.method)
+        except Exception:
+            name, budget = None, None
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if budget is None or mode == 'off':
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        count = len(recorder.queries)
+        response['X-Query-Count'] = str(count)
+        if count > budget:
+            report = recorder.report(name, budget)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(report)
+            logger.error(report)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Assertions de budget pour les TestCase (client DRF ou Django)"""
+
+    def assertQueryBudget(self, url, grow, sizes=(1, 5, 20), client=None, budget=None):
+        """
+        Pour chaque taille n, grow(n) complète les données puis GET url :
+        statut 200, nombre de requêtes identique pour toutes les tailles et
+        au plus égal au budget (par défaut celui déclaré par la vue).
+        """
+        client = client or self.client
+        if budget is None:
+            name, budget = budget_for(resolve(url.split('?')[0]).func, 'GET')
+            self.assertIsNotNone(budget, f"Aucun budget déclaré pour {url}")
+        counts = {}
+        for size in sizes:
+            grow(size)
+            with CaptureQueriesContext(connections['default']) as ctx:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[size] = sum(
+                1 for query in ctx.captured_queries
+                if not query['sql'].lstrip().upper().startswith(IGNORED_PREFIXES)
+            )
+        self.assertEqual(len(set(counts.values())), 1, f"Requêtes selon le volume (N+1) pour {url} : {counts}")
+        self.assertLessEqual(max(counts.values()), budget, f"{url} : {counts} > budget {budget}")
+        return counts
@@ -8,6 +8,7 @@ Configuration pour Madagascar - Environnements Développement et Production
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 from decouple import config
 
 # =============================================================================
@@ -20,6 +21,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # =============================================================================
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-dev-key-change-in-production')
 DEBUG = config('DEBUG', default=True, cast=bool)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 ALLOWED_HOSTS = config(
     'ALLOWED_HOSTS',
     default='localhost,127.0.0.1,0.0.0.0,.localhost,.onrender.com,.vercel.app',
@@ -47,6 +49,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'ipmf.apps.IpmfConfig',  # Démarrage et préchauffage (commande profile_startup)
     'users.apps.UsersConfig',
     'finances',
     'tasks',
@@ -70,6 +73,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ipmf.db_routers.StickyWritesMiddleware',
+    'audit.tracking.TrackingMiddleware',
+    'ipmf.query_budget.QueryBudgetMiddleware',  # Retiré si QUERY_BUDGET_MODE = 'off'
 ]
 
 ROOT_URLCONF = 'ipmf.urls'
@@ -106,9 +112,58 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default=''),
         'PORT': config('DB_PORT', default=''),
+        # Connexions persistantes par worker (ouvertes au démarrage, voir ipmf.warmup)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Réplica en lecture seule (optionnel) : tableaux de bord, analyses, statistiques
+# d'audit et exports y lisent via ipmf.db_routers. En local, une copie SQLite
+# (DB_REPLICA_NAME=replica.sqlite3) ou un second alias PostgreSQL suffit.
+# Requiert un cache partagé (REDIS_URL) : sinon le réplica reste inutilisé
+# (check ipmf.E001).
+_replica_name = config('DB_REPLICA_NAME', default='')
+if _replica_name:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': _replica_name,
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': config('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['ipmf.db_routers.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# Fenêtre (s) pendant laquelle un utilisateur qui vient d'écrire lit sur `default`
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+# Retard maximal toléré (s) et intervalle de mesure du retard
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5, cast=float)
+
+# =============================================================================
+# CACHE
+# =============================================================================
+# Cache partagé entre workers (Redis) si REDIS_URL est défini, sinon cache
+# mémoire local : les invalidations ne se propagent alors qu'au processus courant.
+_redis_url = config('REDIS_URL', default='')
+if _redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ipmf-default',
+        }
+    }
+
 # =============================================================================
 # VALIDATION DES MOTS DE PASSE
 # =============================================================================
@@ -138,6 +193,20 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Déclinaisons d'images (avatars, signatures) : générées dans un pool de threads
+# après commit ; True pour les générer immédiatement (tests, scripts)
+IMAGE_RENDITIONS_SYNC = config('IMAGE_RENDITIONS_SYNC', default=False, cast=bool)
+
+# Téléchargements protégés : '' (servis par Django en flux), 'x-accel' (nginx,
+# location interne DOWNLOADS_ACCEL_PREFIX -> MEDIA_ROOT) ou 'x-sendfile'
+DOWNLOADS_OFFLOAD = config('DOWNLOADS_OFFLOAD', default='')
+DOWNLOADS_ACCEL_PREFIX = config('DOWNLOADS_ACCEL_PREFIX', default='/protected-media/')
+
+# Tableaux de bord : sections calculées en parallèle (threads, une connexion
+# chacun) dans la limite d'un budget de temps (s) ; 1 = exécution séquentielle
+DASHBOARD_MAX_WORKERS = config('DASHBOARD_MAX_WORKERS', default=4, cast=int)
+DASHBOARD_TIME_BUDGET = config('DASHBOARD_TIME_BUDGET', default=2.0, cast=float)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # =============================================================================
@@ -159,7 +228,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 # =============================================================================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -185,14 +254,19 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': False,  # UPDATE différé dans IPMFTokenObtainPairSerializer
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.IPMFTokenObtainPairSerializer',
 }
 
+# Durée de vie (secondes) d'un utilisateur dans le cache local d'authentification.
+# Sans cache partagé, c'est aussi le délai maximal de propagation entre workers.
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=300 if _redis_url else 60, cast=int)
+
 # =============================================================================
 # CORS
 # =============================================================================
@@ -229,6 +303,89 @@ SEUIL_VALIDATION_DG = 500_000
 SEUIL_ALERTE_BUDGET = 0.8
 DELAI_ALERTE_DEPENSE = 7
 
+# Rétention des notifications et alertes (politiques : notifications/retention.py,
+# commande purge_notifications) : taille des lots de suppression et durée de
+# conservation (jours) des résumés quotidiens
+NOTIFICATION_RETENTION_BATCH_SIZE = config('NOTIFICATION_RETENTION_BATCH_SIZE', default=500, cast=int)
+NOTIFICATION_DIGEST_RETENTION_DAYS = config('NOTIFICATION_DIGEST_RETENTION_DAYS', default=730, cast=int)
+
+# Fenêtre (s) de regroupement des notifications de même groupe non lues
+# (ex. « 5 nouvelles dépenses à vérifier ») ; 0 = une notification par événement
+NOTIFICATION_COALESCE_WINDOW = config('NOTIFICATION_COALESCE_WINDOW', default=900, cast=int)
+
+# Synchronisation incrémentale (ipmf/sync.py, actions `changes/?since=`) :
+# lignes par page, recul du curseur en fin de flux (s, transactions en cours)
+# et conservation des traces de suppression (jours, purge_notifications)
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_SAFETY_MARGIN = config('SYNC_SAFETY_MARGIN', default=5, cast=int)
+SYNC_TOMBSTONE_DAYS = config('SYNC_TOMBSTONE_DAYS', default=30, cast=int)
+
+# Diffusion externe des notifications (notifications/channels.py) : file d'envoi
+# vidée par `manage.py dispatch_notifications --loop` (processus worker).
+# Backends locaux par défaut : e-mails et SMS affichés sur la console.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='IPMF <noreply@ipmf.mg>')
+NOTIFICATION_SMS_BACKEND = config('NOTIFICATION_SMS_BACKEND', default='notifications.channels.ConsoleSmsBackend')
+NOTIFICATION_SMS_FILE_PATH = config('NOTIFICATION_SMS_FILE_PATH', default=str(BASE_DIR / 'logs' / 'sms.log'))
+NOTIFICATION_CHANNELS = {
+    'email': {
+        'BACKEND': 'notifications.channels.EmailChannel',
+        'PRIORITIES': ['high', 'critical'],
+        'RATE_LIMIT': config('NOTIFICATION_EMAIL_RATE_LIMIT', default=120, cast=int),
+        'ENABLED_BY_DEFAULT': True,
+    },
+    'sms': {
+        'BACKEND': 'notifications.channels.SmsChannel',
+        'PRIORITIES': ['critical'],
+        'RATE_LIMIT': config('NOTIFICATION_SMS_RATE_LIMIT', default=30, cast=int),
+        'ENABLED_BY_DEFAULT': False,
+    },
+}
+# Nouvelles tentatives : délai initial (s) doublé à chaque échec, plafonné
+NOTIFICATION_DELIVERY_MAX_ATTEMPTS = 5
+NOTIFICATION_DELIVERY_BACKOFF = 60
+NOTIFICATION_DELIVERY_MAX_BACKOFF = 6 * 3600
+
+# Événements métier (outbox, ipmf/events.py) : traités par
+# `manage.py process_events --loop` (processus events du Procfile).
+# DOMAIN_EVENTS_EAGER : traitement dans le processus web au commit (développement
+# sans consommateur). Nouvelles tentatives comme pour les envois.
+DOMAIN_EVENTS_EAGER = config('DOMAIN_EVENTS_EAGER', default=False, cast=bool)
+DOMAIN_EVENTS_MAX_ATTEMPTS = 8
+DOMAIN_EVENTS_BACKOFF = 30
+DOMAIN_EVENTS_MAX_BACKOFF = 3600
+
+# Limitation des endpoints coûteux (ipmf/throttling.py) : seaux à jetons
+# rôle -> (capacité, jetons regagnés par minute) ; poids par type d'endpoint.
+# THROTTLE_STORE : 'local' (par processus) ou 'cache' (partagé, Redis)
+THROTTLE_STORE = config('THROTTLE_STORE', default='local')
+THROTTLE_BUCKETS = {
+    'default': (30, 20),
+    'comptable': (60, 40),
+    'dg': (60, 40),
+    'admin': (60, 40),
+}
+THROTTLE_ROLE_BUCKETS = {
+    'default': (120, 90),
+}
+THROTTLE_COSTS = {
+    'export': 10,
+    'analytics': 5,
+    'statistics': 2,
+    'search': 1,
+}
+
+# Budgets de requêtes SQL par action (query_budgets des vues, ipmf/query_budget.py) :
+# 'raise' en test, 'log' en DEBUG, 'off' en production
+QUERY_BUDGET_MODE = config(
+    'QUERY_BUDGET_MODE', default='raise' if TESTING else ('log' if DEBUG else 'off')
+)
+
 # =============================================================================
 # LOGGING
 # =============================================================================
@@ -256,14 +413,9 @@ LOGGING = {
 # =============================================================================
 # CRÉATION DES DOSSIERS REQUIS
 # =============================================================================
-required_dirs = [
-    BASE_DIR / 'logs',
-    BASE_DIR / 'media/entrees/pieces',
-    BASE_DIR / 'media/depenses/pieces',
-    BASE_DIR / 'media/taches/documents',
-    BASE_DIR / 'media/signatures',
-    BASE_DIR / 'staticfiles',
-]
-
-for directory in required_dirs:
-    os.makedirs(directory, exist_ok=True)
+# Seul le dossier des logs doit exister avant la configuration du logging ;
+# les sous-dossiers de MEDIA_ROOT sont créés par le stockage à l'enregistrement
+# et STATIC_ROOT par collectstatic.
+_logs_dir = BASE_DIR / 'logs'
+if not _logs_dir.is_dir():
+    os.makedirs(_logs_dir, exist_ok=True)
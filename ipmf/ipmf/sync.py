@@ -0,0 +1,267 @@
+"""
+Synchronisation incrémentale (flux de changements) des ressources principales.
+
+GET <ressource>/changes/?since=<horodatage ISO>[&after=<id>] retourne :
+- changes : lignes créées ou modifiées depuis `since` (updated_at), triées
+  par (updated_at, id), au plus SYNC_PAGE_SIZE ;
+- deleted : identifiants supprimés ou sortis du périmètre visible de
+  l'utilisateur (Tombstone) dans la fenêtre de la page ;
+- since / after : curseur à renvoyer tel quel à l'appel suivant ;
+- has_more : page incomplète, rappeler immédiatement avec le curseur.
+
+En fin de flux, le curseur recule de SYNC_SAFETY_MARGIN secondes : une
+transaction validée après la lecture mais horodatée avant reste visible au
+prochain appel. Des lignes peuvent donc être renvoyées deux fois ; le client
+les fusionne par identifiant.
+
+Un `since` antérieur à la conservation des tombstones (SYNC_TOMBSTONE_DAYS)
+répond 410 : le client doit refaire un chargement complet.
+
+Ressources partagées (dépenses, entrées, missions) : chaque ligne est visible
+de tous les rôles privilégiés et de périmètres restreints ('user:<id>',
+'role:caisse', 'public') selon son état (PERIMETRES, PERIMETRES_M2M ; mêmes
+règles que get_queryset des vues, sync_perimetres() côté vue). Une suppression
+ou une sortie de périmètre (changement d'état, agent retiré) écrit une
+tombstone par périmètre concerné : un utilisateur restreint ne reçoit que les
+identifiants de lignes qu'il a pu détenir.
+
+Les écritures par .update() / bulk_update doivent renseigner updated_at
+elles-mêmes (auto_now n'y est pas appliqué) et ne produisent pas de
+tombstone de sortie de périmètre.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+# Modèles synchronisés : champ propriétaire (tombstones filtrées par
+# utilisateur) ou None pour les ressources partagées
+SYNC_MODELS = {
+    'finances.Depense': None,
+    'finances.EntreeArgent': None,
+    'tasks.Tache': None,
+    'dashboard.Alert': 'destinataire_id',
+    'notifications.Notification': 'recipient_id',
+}
+
+# Ressources partagées : périmètres restreints voyant une ligne dans un état
+# donné ({attname: valeur}) ; les rôles privilégiés voient toutes les lignes
+PERIMETRES = {
+    # Agents : leurs dépenses ; caisse : dépenses validées ou payées
+    'finances.Depense': lambda v: {f"user:{v['created_by_id']}"} | (
+        {'role:caisse'} if v['statut'] in ('validee', 'payee') else set()
+    ),
+    # Hors rôles financiers : entrées confirmées
+    'finances.EntreeArgent': lambda v: {'public'} if v['statut'] == 'confirmee' else set(),
+    # Créateur et agents assignés (PERIMETRES_M2M)
+    'tasks.Tache': lambda v: {f"user:{v['createur_id']}"},
+}
+
+# Relations donnant la visibilité aux utilisateurs liés (périmètre user:<id>)
+PERIMETRES_M2M = {
+    'tasks.Tache': 'agents_assignes',
+}
+
+# Notifications : supprimées en masse par la rétention, un signal post_delete
+# désactiverait la suppression rapide ; tombstones écrites par
+# Notification.delete() et delete_in_batches()
+SANS_SIGNAL = {'notifications.Notification'}
+
+
+def record_deletions(model, rows):
+    """Enregistre les tombstones de lignes supprimées : [(id, propriétaire), ...]"""
+    from audit.models import Tombstone
+
+    label = model._meta.label_lower
+    now = timezone.now()
+    Tombstone.objects.bulk_create([
+        Tombstone(modele=label, objet_id=pk, proprietaire_id=owner, date_suppression=now)
+        for pk, owner in rows
+    ])
+
+
+def record_exits(model, pk, perimetres):
+    """Tombstones d'une ligne (supprimée ou sortie) pour chaque périmètre"""
+    from audit.models import Tombstone
+
+    if not perimetres:
+        return
+    label = model._meta.label_lower
+    now = timezone.now()
+    Tombstone.objects.bulk_create([
+        Tombstone(modele=label, objet_id=pk, perimetre=perimetre, date_suppression=now)
+        for perimetre in sorted(perimetres)
+    ])
+
+
+def owner_field(model):
+    return SYNC_MODELS.get(model._meta.label)
+
+
+def perimetres(model, valeurs):
+    """Périmètres restreints voyant une ligne dans l'état `valeurs` ({attname: valeur})"""
+    regle = PERIMETRES.get(model._meta.label)
+    return regle(valeurs) if regle else set()
+
+
+def _etat(instance):
+    return {field.attname: instance.__dict__.get(field.attname) for field in instance._meta.concrete_fields}
+
+
+def _on_pre_delete(sender, instance, **kwargs):
+    # Liens m2m supprimés avant post_delete : relevés ici
+    field = PERIMETRES_M2M.get(sender._meta.label)
+    if field:
+        instance._sync_lies = set(getattr(instance, field).values_list('pk', flat=True))
+
+
+def _on_delete(sender, instance, **kwargs):
+    field = owner_field(sender)
+    if field:
+        record_deletions(sender, [(instance.pk, getattr(instance, field))])
+        return
+    lies = instance.__dict__.pop('_sync_lies', set())
+    # Périmètre vide : rôles privilégiés
+    record_exits(sender, instance.pk, {''} | perimetres(sender, _etat(instance)) | {f'user:{pk}' for pk in lies})
+
+
+def _on_save(sender, instance, created, **kwargs):
+    """Sortie de périmètre par changement d'état (instantané DirtyFieldsMixin)"""
+    snapshot = getattr(instance, 'loaded_values', None)
+    if created or not snapshot:
+        return
+    actuel = _etat(instance)
+    sorties = perimetres(sender, {**actuel, **snapshot}) - perimetres(sender, actuel)
+    record_exits(sender, instance.pk, sorties)
+
+
+def _on_m2m_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Sortie de périmètre des utilisateurs retirés d'une relation de visibilité"""
+    if action == 'post_remove' and not reverse:
+        record_exits(type(instance), instance.pk, {f'user:{pk}' for pk in pk_set})
+    elif action == 'post_remove':
+        for pk in pk_set:
+            record_exits(model, pk, {f'user:{instance.pk}'})
+    elif action == 'pre_clear':
+        field = PERIMETRES_M2M[(model if reverse else type(instance))._meta.label]
+        if reverse:
+            for pk in model._default_manager.filter(**{field: instance}).values_list('pk', flat=True):
+                record_exits(model, pk, {f'user:{instance.pk}'})
+        else:
+            record_exits(type(instance), instance.pk, {
+                f'user:{pk}' for pk in getattr(instance, field).values_list('pk', flat=True)
+            })
+
+
+def connect_signals():
+    """Branche l'enregistrement des suppressions et sorties de périmètre (AppConfig.ready)"""
+    for label in SYNC_MODELS:
+        if label in SANS_SIGNAL:
+            continue
+        model = apps.get_model(label)
+        uid = f'sync:{model._meta.label_lower}'
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=uid)
+        if label in PERIMETRES:
+            post_save.connect(_on_save, sender=model, dispatch_uid=uid)
+        if label in PERIMETRES_M2M:
+            pre_delete.connect(_on_pre_delete, sender=model, dispatch_uid=uid)
+            through = model._meta.get_field(PERIMETRES_M2M[label]).remote_field.through
+            m2m_changed.connect(_on_m2m_change, sender=through, dispatch_uid=f'{uid}:m2m')
+
+
+def tombstone_horizon(now=None):
+    return (now or timezone.now()) - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+
+def expired_tombstones(now=None):
+    """Tombstones au-delà de la conservation (supprimées par la rétention)"""
+    from audit.models import Tombstone
+
+    return Tombstone.objects.filter(date_suppression__lt=tombstone_horizon(now))
+
+
+class DeltaSyncMixin:
+    """
+    Action `changes` des ViewSets : flux de changements du queryset de la vue
+    (mêmes règles de visibilité que la liste).
+    """
+
+    def get_sync_queryset(self):
+        return self.get_queryset()
+
+    def sync_perimetres(self, user):
+        """Périmètres (PERIMETRES) de l'utilisateur ; None : toutes les lignes"""
+        return None
+
+    def _sync_cursor(self, request):
+        since = parse_datetime(request.query_params.get('since') or '')
+        if since is None:
+            return None, None
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        after = request.query_params.get('after')
+        return since, int(after) if after and after.isdigit() else None
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        since, after = self._sync_cursor(request)
+        if since is None:
+            return Response({'error': 'since requis (horodatage ISO 8601)'}, status=status.HTTP_400_BAD_REQUEST)
+        now = timezone.now()
+        if since < tombstone_horizon(now):
+            return Response({'error': 'Historique expiré : rechargement complet requis'}, status=status.HTTP_410_GONE)
+
+        page_size = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+        if after is None:
+            fenetre = Q(updated_at__gte=since)
+        else:
+            fenetre = Q(updated_at__gt=since) | Q(updated_at=since, pk__gt=after)
+
+        queryset = self.get_sync_queryset()
+        rows = list(queryset.filter(fenetre).order_by('updated_at', 'pk')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        model = queryset.model
+        # Suppressions limitées à la fenêtre de la page : les suivantes
+        # arrivent avec la page du curseur
+        jusqu_a = rows[-1].updated_at if has_more else None
+        deleted = self._deleted_ids(model, queryset, since, jusqu_a)
+
+        if has_more:
+            cursor = {'since': rows[-1].updated_at.isoformat(), 'after': rows[-1].pk}
+        else:
+            margin = timedelta(seconds=getattr(settings, 'SYNC_SAFETY_MARGIN', 5))
+            cursor = {'since': max(since, now - margin).isoformat(), 'after': None}
+
+        return Response({
+            'changes': self.get_serializer(rows, many=True).data,
+            'deleted': deleted,
+            'has_more': has_more,
+            **cursor,
+        })
+
+    def _deleted_ids(self, model, queryset, since, jusqu_a=None):
+        from audit.models import Tombstone
+
+        user = self.request.user
+        tombstones = Tombstone.objects.filter(modele=model._meta.label_lower, date_suppression__gte=since)
+        if jusqu_a is not None:
+            tombstones = tombstones.filter(date_suppression__lte=jusqu_a)
+        if owner_field(model):
+            tombstones = tombstones.filter(proprietaire_id=user.pk)
+        else:
+            scopes = self.sync_perimetres(user)
+            if scopes is not None:
+                tombstones = tombstones.filter(perimetre__in=scopes)
+        ids = set(tombstones.values_list('objet_id', flat=True))
+        # Lignes revenues dans le périmètre depuis : pas supprimées côté client
+        ids.difference_update(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+        return sorted(ids)
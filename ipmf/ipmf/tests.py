@@ -0,0 +1,43 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ipmf.management.commands.profile_startup import group_by_package, parse_importtime
+from ipmf.warmup import warm_up
+
+
+class WarmUpTest(TransactionTestCase):
+    def test_etapes_et_connexions(self):
+        # La base SQLite en mémoire des tests n'est jamais réellement fermée : appel vérifié
+        with mock.patch.object(connections, 'close_all') as close_all:
+            timings = warm_up()
+        self.assertEqual(set(timings), {'modeles', 'urls', 'serializers', 'auth', 'content_types'})
+        # Rien d'ouvert ne doit être hérité par les workers forkés
+        close_all.assert_called_once()
+
+    def test_sans_base(self):
+        self.assertNotIn('content_types', warm_up(database=False))
+
+
+class ProfileStartupTest(SimpleTestCase):
+    LIGNES = [
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:      2000 |       5000 |     django.db.models",
+        "import time:      3000 |       3000 |   django.urls",
+        "warning sans rapport",
+    ]
+
+    def test_analyse(self):
+        modules = parse_importtime(self.LIGNES)
+        self.assertEqual(modules[1], ('django.db.models', 2000, 5000))
+        self.assertEqual(group_by_package(modules)[0], ('django', 5000, 5000))
+
+    def test_commande(self):
+        out = StringIO()
+        call_command('profile_startup', '--limit', '3', stdout=out)
+        self.assertIn('setup', out.getvalue())
+        self.assertIn('serializers', out.getvalue())
@@ -0,0 +1,137 @@
+"""
+Limitation de débit des endpoints coûteux (seaux à jetons).
+
+Chaque requête coûteuse (export, recherche globale, analyses, statistiques)
+consomme des jetons selon son poids (THROTTLE_COSTS) dans deux seaux :
+- le seau de l'utilisateur, dimensionné selon son rôle (THROTTLE_BUCKETS) ;
+- le seau partagé par tous les utilisateurs du rôle (THROTTLE_ROLE_BUCKETS),
+  qui borne la charge d'un rôle sur les workers.
+Les deux seaux doivent contenir assez de jetons ; sinon 429 avec Retry-After
+(secondes avant que la requête puisse passer).
+
+Seuls les endpoints déclarés sont limités (throttle_classes de la vue ou de
+l'action) : le CRUD courant n'est pas concerné. Une revalidation servie en 304
+(ConditionalGetMixin) ne consomme pas de jetons.
+
+Stockage (THROTTLE_STORE) :
+- 'local' : mémoire du processus (chaque worker a ses seaux) ;
+- 'cache' : cache Django partagé (Redis), approximatif entre workers
+  (lecture puis écriture, sans verrou distribué).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+CACHE_KEY = 'throttle:{}'
+
+_lock = threading.Lock()
+_local = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _spec(table, role):
+    """(capacité, jetons par seconde) du rôle, sinon du défaut"""
+    capacity, per_minute = table.get(role) or table['default']
+    return capacity, per_minute / 60
+
+
+def _refill(state, capacity, rate, now):
+    tokens, updated = state if state else (capacity, now)
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def take(buckets, cost, now=None):
+    """
+    Consomme `cost` jetons dans chacun des seaux [(clé, capacité, débit/s)],
+    tous ou aucun. Retourne 0 si la requête passe, sinon le délai d'attente (s).
+    """
+    now = time.time() if now is None else now
+    shared = _setting('THROTTLE_STORE', 'local') == 'cache'
+    with _lock:
+        if shared:
+            states = cache.get_many([CACHE_KEY.format(key) for key, _, _ in buckets])
+            state = lambda key: states.get(CACHE_KEY.format(key))
+        else:
+            state = _local.get
+
+        levels = []
+        wait = 0
+        for key, capacity, rate in buckets:
+            tokens = _refill(state(key), capacity, rate, now)
+            besoin = min(cost, capacity)
+            if tokens < besoin:
+                wait = max(wait, (besoin - tokens) / rate)
+            levels.append((key, tokens - besoin, capacity / rate))
+        if wait:
+            return wait
+
+        if shared:
+            for key, tokens, ttl in levels:
+                cache.set(CACHE_KEY.format(key), (tokens, now), timeout=math.ceil(ttl) + 60)
+        else:
+            _local.update({key: (tokens, now) for key, tokens, _ in levels})
+    return 0
+
+
+def reset():
+    """Vide les seaux du processus (tests)"""
+    with _lock:
+        _local.clear()
+
+
+class CostThrottle(BaseThrottle):
+    """
+    Seau à jetons par utilisateur et par rôle ; le poids de la requête est
+    THROTTLE_COSTS[scope]. Sous-classes par type d'endpoint ci-dessous.
+    """
+
+    scope = None
+
+    def get_cost(self, request, view):
+        return _setting('THROTTLE_COSTS', {}).get(self.scope, 1)
+
+    def get_buckets(self, request):
+        user = request.user
+        if user and user.is_authenticated:
+            role = getattr(user, 'role', '') or 'default'
+            ident = f'user:{user.pk}'
+        else:
+            role = 'default'
+            ident = f'ip:{self.get_ident(request)}'
+        capacity, rate = _spec(_setting('THROTTLE_BUCKETS', {'default': (30, 20)}), role)
+        role_capacity, role_rate = _spec(_setting('THROTTLE_ROLE_BUCKETS', {'default': (120, 90)}), role)
+        return [(ident, capacity, rate), (f'role:{role}', role_capacity, role_rate)]
+
+    def allow_request(self, request, view):
+        self._wait = 0
+        not_modified = getattr(view, 'not_modified', None)
+        if not_modified is not None and not_modified(request):
+            return True
+        self._wait = take(self.get_buckets(request), self.get_cost(request, view))
+        return not self._wait
+
+    def wait(self):
+        return math.ceil(self._wait)
+
+
+class ExportThrottle(CostThrottle):
+    scope = 'export'
+
+
+class SearchThrottle(CostThrottle):
+    scope = 'search'
+
+
+class AnalyticsThrottle(CostThrottle):
+    scope = 'analytics'
+
+
+class StatisticsThrottle(CostThrottle):
+    scope = 'statistics'
@@ -0,0 +1,140 @@
+"""
+Préchauffage des workers (démarrage à froid).
+
+Sans préchauffage, la première requête de chaque worker paie l'import des
+modules tardifs, la construction du résolveur d'URL, des caches `_meta` des
+modèles, des champs des sérialiseurs et du cache ContentType.
+
+warm_up() est appelé une fois dans le processus maître gunicorn (preload_app,
+voir gunicorn.conf.py) : les workers forkés héritent de l'état préchauffé.
+Les connexions (base, cache) ouvertes pendant le préchauffage sont fermées
+avant le fork ; chaque worker ouvre ensuite les siennes (warm_connections).
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _prime_models():
+    """Caches `_meta` (champs, relations inverses) de tous les modèles"""
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.fields_map
+        model._meta.related_objects
+
+
+def _prime_urls():
+    """Import des vues et construction du résolveur (reverse et resolve)"""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+    resolver.namespace_dict
+    return resolver
+
+
+def _iter_viewsets(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from _iter_viewsets(pattern.url_patterns)
+            continue
+        view = getattr(pattern.callback, 'cls', None)
+        if view is not None:
+            yield view
+
+
+def _prime_serializers(resolver):
+    """Instancie une fois les sérialiseurs des vues (imports tardifs, validateurs)"""
+    seen = set()
+    for view in _iter_viewsets(resolver.url_patterns):
+        serializer_class = getattr(view, 'serializer_class', None)
+        if serializer_class is None or serializer_class in seen:
+            continue
+        seen.add(serializer_class)
+        try:
+            serializer_class().fields
+        except Exception:
+            # Sérialiseur dépendant du contexte de requête : ignoré ici
+            logger.debug("Préchauffage ignoré pour %s", serializer_class.__name__, exc_info=True)
+    return len(seen)
+
+
+def _prime_auth():
+    from django.contrib.auth import get_backends
+    from django.contrib.auth.hashers import get_hashers
+    from rest_framework.settings import api_settings
+
+    get_backends()
+    get_hashers()
+    # Authentification, permissions et rendus par défaut de DRF
+    api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    api_settings.DEFAULT_PERMISSION_CLASSES
+    api_settings.DEFAULT_RENDERER_CLASSES
+    api_settings.DEFAULT_PARSER_CLASSES
+
+
+def _prime_content_types():
+    """Cache ContentType complet en une requête"""
+    from django.contrib.contenttypes.models import ContentType
+
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def release_connections():
+    """Ferme base et cache : rien ne doit être partagé entre processus forkés"""
+    connections.close_all()
+    caches.close_all()
+
+
+def warm_up(database=True):
+    """
+    Préchauffe le processus courant ; retourne la durée (s) de chaque étape.
+    database=False : aucune requête (profilage, environnement sans base).
+    """
+    timings = {}
+
+    def step(name, fn, *args):
+        debut = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - debut
+        return result
+
+    step('modeles', _prime_models)
+    resolver = step('urls', _prime_urls)
+    step('serializers', _prime_serializers, resolver)
+    step('auth', _prime_auth)
+    if database:
+        try:
+            step('content_types', _prime_content_types)
+        except Exception:
+            # Base indisponible au démarrage : le cache se remplira à la demande
+            logger.warning("Préchauffage du cache ContentType impossible", exc_info=True)
+        finally:
+            release_connections()
+
+    logger.info(
+        "Préchauffage terminé en %.0f ms (%s)",
+        sum(timings.values()) * 1000,
+        ', '.join(f"{k} {v * 1000:.0f} ms" for k, v in timings.items()),
+    )
+    return timings
+
+
+def warm_connections():
+    """
+    Ouvre les connexions du worker (après fork) avant sa première requête.
+    Sans connexions persistantes (CONN_MAX_AGE = 0), elles seraient fermées
+    dès le début de la requête : rien à faire.
+    """
+    for connection in connections.all(initialized_only=False):
+        if not connection.settings_dict.get('CONN_MAX_AGE'):
+            continue
+        try:
+            connection.ensure_connection()
+        except Exception:
+            logger.warning("Connexion %s indisponible au démarrage du worker", connection.alias, exc_info=True)
@@ -6,4 +6,5 @@ class NotificationsConfig(AppConfig):
     verbose_name = 'Notifications'
 
     def ready(self):
-        import notifications.signals
+        import notifications.signals  # noqa: F401
+        import notifications.handlers  # noqa: F401
@@ -0,0 +1,167 @@
+"""
+Canaux de diffusion externes des notifications (e-mail, SMS).
+
+Les canaux sont déclarés dans NOTIFICATION_CHANNELS :
+
+    {'email': {'BACKEND': 'notifications.channels.EmailChannel',
+               'PRIORITIES': ['high', 'critical'],   # priorités diffusées
+               'RATE_LIMIT': 120,                    # envois par minute (0 : illimité)
+               'ENABLED_BY_DEFAULT': True}}          # sans préférence de l'utilisateur
+
+- E-mail : backend Django (EMAIL_BACKEND) ; console ou fichier en local.
+- SMS : backend NOTIFICATION_SMS_BACKEND (ConsoleSmsBackend, FileSmsBackend
+  en local ; fournisseur réel en production, même interface send_messages).
+
+Un canal envoie un lot de messages sur une seule connexion et retourne, pour
+chaque message, None (envoyé) ou l'erreur rencontrée.
+"""
+import json
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+@dataclass(frozen=True)
+class SmsMessage:
+    to: str
+    body: str
+
+
+# ---------------------------------------------------------------------------
+# Backends SMS
+# ---------------------------------------------------------------------------
+
+class BaseSmsBackend:
+    """Interface des fournisseurs SMS"""
+
+    def send_messages(self, messages):
+        """Envoie les messages ; retourne une liste d'erreurs (None si envoyé)"""
+        raise NotImplementedError
+
+
+class ConsoleSmsBackend(BaseSmsBackend):
+    """Affiche les SMS sur la sortie standard (développement)"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_messages(self, messages):
+        for message in messages:
+            self.stream.write(f"SMS -> {message.to} : {message.body}\n")
+        self.stream.flush()
+        return [None] * len(messages)
+
+
+class FileSmsBackend(BaseSmsBackend):
+    """Ajoute les SMS (une ligne JSON chacun) à NOTIFICATION_SMS_FILE_PATH (tests, recette)"""
+
+    _lock = threading.Lock()
+
+    def send_messages(self, messages):
+        path = Path(settings.NOTIFICATION_SMS_FILE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, path.open('a', encoding='utf-8') as fichier:
+            for message in messages:
+                fichier.write(json.dumps({
+                    'to': message.to, 'body': message.body, 'date': timezone.now().isoformat(),
+                }, ensure_ascii=False) + '\n')
+        return [None] * len(messages)
+
+
+# ---------------------------------------------------------------------------
+# Canaux
+# ---------------------------------------------------------------------------
+
+class BaseChannel:
+    name = None
+
+    def __init__(self, name, options):
+        self.name = name
+        self.priorities = set(options.get('PRIORITIES', ['high', 'critical']))
+        self.rate_limit = options.get('RATE_LIMIT', 0)
+        self.enabled_by_default = options.get('ENABLED_BY_DEFAULT', True)
+
+    def address_for(self, user):
+        """Adresse du destinataire sur ce canal ('' : non joignable)"""
+        raise NotImplementedError
+
+    def send_batch(self, deliveries):
+        """Envoie un lot de Delivery ; retourne une liste d'erreurs (None si envoyé)"""
+        raise NotImplementedError
+
+
+class EmailChannel(BaseChannel):
+    def address_for(self, user):
+        return user.email
+
+    def send_batch(self, deliveries):
+        connection = get_connection()
+        errors = []
+        # Une seule connexion SMTP pour tout le lot ; échecs isolés par message
+        with connection:
+            for delivery in deliveries:
+                notification = delivery.notification
+                message = EmailMessage(
+                    subject=f"[IPMF] {notification.title}",
+                    body=notification.message,
+                    to=[delivery.address],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                    errors.append(None)
+                except Exception as exc:
+                    errors.append(exc)
+        return errors
+
+
+class SmsChannel(BaseChannel):
+    # Longueur maximale d'un SMS concaténé raisonnable
+    MAX_LENGTH = 320
+
+    def __init__(self, name, options):
+        super().__init__(name, options)
+        self.backend = import_string(
+            options.get('SMS_BACKEND') or getattr(settings, 'NOTIFICATION_SMS_BACKEND', 'notifications.channels.ConsoleSmsBackend')
+        )()
+
+    def address_for(self, user):
+        return user.telephone
+
+    def send_batch(self, deliveries):
+        messages = [
+            SmsMessage(
+                to=delivery.address,
+                body=f"{delivery.notification.title} : {delivery.notification.message}"[:self.MAX_LENGTH],
+            )
+            for delivery in deliveries
+        ]
+        try:
+            return self.backend.send_messages(messages)
+        except Exception as exc:
+            return [exc] * len(messages)
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def get_channels():
+    """Canaux configurés {nom: instance}, construits une fois par processus"""
+    config = getattr(settings, 'NOTIFICATION_CHANNELS', {})
+    # Reconstruits si la configuration change (tests, override_settings)
+    key = json.dumps([config, getattr(settings, 'NOTIFICATION_SMS_BACKEND', '')], sort_keys=True, default=str)
+    with _channels_lock:
+        if key not in _channels:
+            _channels.clear()
+            _channels[key] = {
+                name: import_string(options['BACKEND'])(name, options)
+                for name, options in config.items()
+            }
+        return _channels[key]
@@ -0,0 +1,133 @@
+"""
+File d'envoi des notifications vers les canaux externes.
+
+- enqueue() : appelé par NotificationService dans la transaction de la
+  notification ; ne fait qu'insérer des lignes Delivery (aucun appel réseau).
+- dispatch_pending() : exécuté par le worker (dispatch_notifications). Par
+  canal, réserve un lot de livraisons dues (SKIP LOCKED : plusieurs workers
+  possibles), l'envoie hors transaction sur une seule connexion, puis
+  enregistre le résultat.
+- Échec : nouvelle tentative avec délai exponentiel, abandon après
+  NOTIFICATION_DELIVERY_MAX_ATTEMPTS.
+- Débit : au plus RATE_LIMIT envois par minute et par canal, tous workers
+  confondus (compté sur les envois récents).
+- Une livraison réservée par un worker interrompu redevient due à
+  l'expiration de sa réservation (LEASE).
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .channels import get_channels
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+LEASE = timedelta(minutes=5)
+
+
+def _preferences(user):
+    """(notifications actives, préférences par canal) du profil de l'utilisateur"""
+    from users.models import UserProfile
+
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        return True, {}
+    return profile.notifications_active, profile.notification_channels or {}
+
+
+def enqueue(notification):
+    """Crée les livraisons externes de la notification selon sa priorité et les préférences"""
+    channels = [c for c in get_channels().values() if notification.priority in c.priorities]
+    if not channels:
+        return []
+
+    user = notification.recipient
+    active, preferences = _preferences(user)
+    if not active:
+        return []
+
+    deliveries = []
+    for channel in channels:
+        if not preferences.get(channel.name, channel.enabled_by_default):
+            continue
+        address = channel.address_for(user)
+        if address:
+            deliveries.append(Delivery(notification=notification, channel=channel.name, address=address))
+    return Delivery.objects.bulk_create(deliveries)
+
+
+def backoff(attempts):
+    base = getattr(settings, 'NOTIFICATION_DELIVERY_BACKOFF', 60)
+    plafond = getattr(settings, 'NOTIFICATION_DELIVERY_MAX_BACKOFF', 6 * 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), plafond))
+
+
+def _claim(channel, limit, now):
+    """Réserve jusqu'à `limit` livraisons dues du canal (transaction courte)"""
+    with transaction.atomic():
+        ids = list(
+            Delivery.objects.select_for_update(skip_locked=True)
+            .filter(channel=channel.name, status=Delivery.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        Delivery.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, next_attempt_at=now + LEASE)
+    return list(Delivery.objects.filter(id__in=ids).select_related('notification'))
+
+
+def dispatch_channel(channel, batch_size=BATCH_SIZE, now=None):
+    """Envoie un lot du canal ; retourne le nombre de livraisons par issue"""
+    now = now or timezone.now()
+    limit = batch_size
+    if channel.rate_limit:
+        recent = Delivery.objects.filter(
+            channel=channel.name, status=Delivery.STATUS_SENT, sent_at__gte=now - timedelta(minutes=1)
+        ).count()
+        limit = min(limit, channel.rate_limit - recent)
+    if limit <= 0:
+        return Counter()
+
+    deliveries = _claim(channel, limit, now)
+    if not deliveries:
+        return Counter()
+
+    # Hors transaction : la latence du fournisseur ne bloque aucun verrou
+    errors = channel.send_batch(deliveries)
+
+    max_attempts = getattr(settings, 'NOTIFICATION_DELIVERY_MAX_ATTEMPTS', 5)
+    sent_at = timezone.now()
+    results = Counter()
+    for delivery, error in zip(deliveries, errors):
+        if error is None:
+            delivery.status = Delivery.STATUS_SENT
+            delivery.sent_at = sent_at
+            delivery.last_error = ''
+            results['envoyes'] += 1
+            continue
+        delivery.last_error = str(error)[:1000]
+        if delivery.attempts >= max_attempts:
+            delivery.status = Delivery.STATUS_FAILED
+            results['echecs'] += 1
+            logger.error("Envoi %s abandonné après %d tentatives : %s", delivery.pk, delivery.attempts, error)
+        else:
+            delivery.next_attempt_at = sent_at + backoff(delivery.attempts)
+            results['reportes'] += 1
+            logger.warning("Envoi %s en échec (tentative %d) : %s", delivery.pk, delivery.attempts, error)
+    Delivery.objects.bulk_update(deliveries, ['status', 'sent_at', 'last_error', 'next_attempt_at'])
+    return results
+
+
+def dispatch_pending(batch_size=BATCH_SIZE, now=None):
+    """Un passage sur tous les canaux ; retourne {canal: Counter(issue: nombre)}"""
+    return {
+        name: dispatch_channel(channel, batch_size, now)
+        for name, channel in get_channels().items()
+    }
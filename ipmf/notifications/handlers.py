@@ -0,0 +1,206 @@
+"""
+Notifications envoyées par le consommateur d'événements métier (ipmf/events.py).
+
+Chaque traitant reçoit un lot d'événements du même type ; les objets et les
+destinataires sont chargés en une requête par lot plutôt qu'un par événement.
+Les transitions de statut sont publiées une fois par changement effectif
+(services) : un nouvel enregistrement sans changement de statut ne notifie
+plus.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+
+from finances.models import Depense, FinancesConstants
+from ipmf.events import handles
+from tasks.models import CommentaireTache, DemandeReport, Tache
+from .services import NotificationService
+
+User = get_user_model()
+
+
+def _objets(model, events, related=(), prefetch=()):
+    """Objets des événements {id: objet} (supprimés depuis : absents)"""
+    return (
+        model.objects.select_related(*related).prefetch_related(*prefetch)
+        .in_bulk({event.aggregate_id for event in events})
+    )
+
+
+@handles('tache.agents_assignes')
+def notifier_affectations(events):
+    """Agents ajoutés à une mission (seulement les nouveaux assignés)"""
+    taches = _objets(Tache, events)
+    agents = User.objects.in_bulk({pk for event in events for pk in event.payload['agents']})
+    for event in events:
+        tache = taches.get(event.aggregate_id)
+        if tache is None:
+            continue
+        nouveaux = [agents[pk] for pk in event.payload['agents'] if pk in agents]
+        NotificationService.notify_task_assigned(tache, agents=nouveaux)
+
+
+@handles('tache.commentee')
+def notifier_commentaires(events):
+    commentaires = CommentaireTache.objects.select_related('auteur', 'tache__createur').in_bulk(
+        {event.payload['commentaire'] for event in events}
+    )
+    for event in events:
+        commentaire = commentaires.get(event.payload['commentaire'])
+        if commentaire is not None:
+            NotificationService.notify_comment_added(commentaire)
+
+
+@handles('depense.soumise')
+def notifier_depenses_soumises(events):
+    """Nouvelles dépenses encore en attente (non auto-validées) : comptables"""
+    depenses = _objets(Depense, events, related=('created_by',))
+    a_verifier = [
+        depense for depense in (depenses.get(event.aggregate_id) for event in events)
+        if depense is not None and depense.statut == Depense.STATUT_EN_ATTENTE
+    ]
+    if not a_verifier:
+        return
+    comptables = list(User.objects.filter(role=FinancesConstants.ROLE_COMPTABLE, is_active=True))
+    for depense in a_verifier:
+        for comptable in comptables:
+            NotificationService.send_notification(
+                recipient=comptable,
+                title="Nouvelle dépense à vérifier",
+                message=f"Une nouvelle dépense {depense.numero} ({depense.montant} Ar) a été soumise par {depense.created_by.get_full_name()}.",
+                type='finance',
+                priority='high',
+                link=f"/expenses/{depense.id}",
+                obj=depense,
+                group='depenses:a_verifier',
+                group_title="{count} nouvelles dépenses à vérifier"
+            )
+
+
+@handles('depense.verifiee')
+def notifier_validation_dg(events):
+    """Dépenses au-dessus du seuil : validation DG requise"""
+    a_valider = [
+        event for event in events
+        if Decimal(event.payload.get('montant', '0')) >= FinancesConstants.SEUIL_VALIDATION_DG
+    ]
+    if not a_valider:
+        return
+    depenses = _objets(Depense, a_valider)
+    dgs = list(User.objects.filter(role=FinancesConstants.ROLE_DG, is_active=True))
+    for event in a_valider:
+        depense = depenses.get(event.aggregate_id)
+        if depense is None:
+            continue
+        for dg in dgs:
+            NotificationService.notify_expense_validation_needed(depense, dg)
+
+
+@handles('depense.validee', 'depense.rejetee')
+def notifier_decisions_depense(events):
+    """Dépense approuvée (y compris auto-validation) ou rejetée : son auteur"""
+    depenses = _objets(Depense, events, related=('created_by',))
+    for event in events:
+        depense = depenses.get(event.aggregate_id)
+        if depense is None:
+            continue
+        if event.type == 'depense.validee':
+            NotificationService.send_notification(
+                recipient=depense.created_by,
+                title="Dépense approuvée",
+                message=f"Votre demande de dépense {depense.numero} a été approuvée.",
+                type='success',
+                priority='medium',
+                link=f"/expenses/{depense.id}",
+                obj=depense
+            )
+        else:
+            NotificationService.send_notification(
+                recipient=depense.created_by,
+                title="Dépense rejetée",
+                message=f"Votre demande de dépense {depense.numero} a été rejetée. Motif: {depense.commentaire_validation}",
+                type='error',
+                priority='high',
+                link=f"/expenses/{depense.id}",
+                obj=depense
+            )
+
+
+@handles('tache.terminee')
+def notifier_taches_terminees(events):
+    """Mission terminée par un agent : son créateur (validation attendue)"""
+    taches = _objets(Tache, events, related=('createur',))
+    for event in events:
+        tache = taches.get(event.aggregate_id)
+        if tache is None:
+            continue
+        NotificationService.send_notification(
+            recipient=tache.createur,
+            title="Tâche terminée",
+            message=f"L'agent a marqué la tâche {tache.numero} comme terminée. Elle attend votre validation.",
+            type='task',
+            priority='high',
+            link=f"/tasks/{tache.id}",
+            obj=tache
+        )
+
+
+@handles('tache.validee')
+def notifier_taches_validees(events):
+    """Mission validée : agents assignés"""
+    taches = _objets(Tache, events, prefetch=('agents_assignes',))
+    for event in events:
+        tache = taches.get(event.aggregate_id)
+        if tache is None:
+            continue
+        validateur = event.actor.get_full_name() if event.actor else 'un administrateur'
+        for agent in tache.agents_assignes.all():
+            NotificationService.send_notification(
+                recipient=agent,
+                title="Tâche validée",
+                message=f"Félicitations ! La tâche {tache.numero} a été validée par {validateur}.",
+                type='success',
+                priority='medium',
+                link=f"/tasks/{tache.id}",
+                obj=tache
+            )
+
+
+@handles('report.demande')
+def notifier_demandes_report(events):
+    demandes = _objets(DemandeReport, events, related=('tache__createur', 'demandeur'))
+    for event in events:
+        demande = demandes.get(event.aggregate_id)
+        if demande is None or demande.tache.createur_id == demande.demandeur_id:
+            continue
+        tache = demande.tache
+        NotificationService.send_notification(
+            recipient=tache.createur,
+            title="Demande de report",
+            message=f"Demande de report pour votre tâche {tache.numero}",
+            type='warning',
+            link=f"/tasks/{tache.id}",
+        )
+
+
+@handles('report.approuvee', 'report.rejetee')
+def notifier_reponses_report(events):
+    demandes = _objets(DemandeReport, events, related=('tache', 'demandeur'))
+    for event in events:
+        demande = demandes.get(event.aggregate_id)
+        if demande is None:
+            continue
+        tache = demande.tache
+        if event.type == 'report.approuvee':
+            title, type_ = "Demande de report approuvée", 'success'
+            message = f"Votre demande pour la tâche {tache.numero} a été approuvée."
+        else:
+            title, type_ = "Demande de report rejetée", 'error'
+            message = f"Votre demande pour la tâche {tache.numero} a été rejetée."
+        NotificationService.send_notification(
+            recipient=demande.demandeur,
+            title=title,
+            message=message,
+            type=type_,
+            link=f"/tasks/{tache.id}",
+        )
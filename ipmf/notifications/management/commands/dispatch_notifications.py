@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.delivery import BATCH_SIZE, dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Envoie les notifications en attente sur les canaux externes (e-mail, SMS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Tourne en continu (processus worker)")
+        parser.add_argument('--interval', type=float, default=10, help="Pause (s) quand la file est vide")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Envois par canal et par passage")
+
+    def handle(self, *args, **options):
+        while True:
+            results = dispatch_pending(options['batch_size'])
+            for channel, counts in results.items():
+                if counts:
+                    details = ', '.join(f"{issue} {nombre}" for issue, nombre in sorted(counts.items()))
+                    self.stdout.write(f"{channel} : {details}")
+            if not options['loop']:
+                return
+            close_old_connections()
+            if not any(results.values()):
+                time.sleep(options['interval'])
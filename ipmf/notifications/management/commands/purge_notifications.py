@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import appliquer_retention
+
+
+class Command(BaseCommand):
+    help = "Applique la rétention : résumés quotidiens des notifications lues, purge des alertes (tâche planifiée quotidienne)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Lignes supprimées par transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Compte les lignes concernées sans rien modifier")
+
+    def handle(self, *args, **options):
+        resultats = appliquer_retention(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        prefixe = "[simulation] " if options['dry_run'] else ""
+        for operation, nombre in resultats.items():
+            self.stdout.write(f"{prefixe}{operation.replace('_', ' ')} : {nombre}")
+        self.stdout.write(self.style.SUCCESS(f"{prefixe}Rétention terminée"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0003_notification_metadata_notification_priority'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('info', 'Information'), ('success', 'Succes'), ('warning', 'Avertissement'), ('error', 'Erreur'), ('task', 'Tache'), ('finance', 'Finance'), ('digest', 'Résumé')], default='info', max_length=20, verbose_name='Type'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notificatio_recipie_a972ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'created_at'], name='notificatio_is_read_3a06ff_idx'),
+        ),
+    ]
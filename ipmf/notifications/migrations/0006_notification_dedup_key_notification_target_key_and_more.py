@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0005_notification_group_key_notification_occurrences_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_key',
+            field=models.CharField(blank=True, default='', max_length=150, verbose_name='Clé de déduplication'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_key',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Cible'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'target_key', 'is_read'], name='notificatio_recipie_981f2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'dedup_key', '-created_at'], name='notificatio_recipie_5dbb4f_idx'),
+        ),
+    ]
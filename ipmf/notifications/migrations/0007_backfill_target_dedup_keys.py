@@ -0,0 +1,46 @@
+import re
+
+from django.db import migrations
+
+# Copie figée de notifications.models.LINK_TARGET_RE
+LINK_TARGET_RE = re.compile(r'^/?([\w-]+)/(\d+)(?:[/?#]|$)')
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    """Renseigne target_key depuis `link` et dedup_key des alertes de retard existantes"""
+    Notification = apps.get_model('notifications', 'Notification')
+    queryset = (
+        Notification.objects.using(schema_editor.connection.alias)
+        .filter(target_key='')
+        .exclude(link='')
+        .only('id', 'link', 'title', 'type')
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not rows:
+            return
+        modifies = []
+        for row in rows:
+            match = LINK_TARGET_RE.match(row.link)
+            if not match:
+                continue
+            row.target_key = f"{match.group(1)}:{match.group(2)}"
+            if row.type == 'error' and row.title == "Tâche en retard" and match.group(1) == 'tasks':
+                row.dedup_key = f"tache_retard:{match.group(2)}"
+            modifies.append(row)
+        Notification.objects.using(schema_editor.connection.alias).bulk_update(modifies, ['target_key', 'dedup_key'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_dedup_key_notification_target_key_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_backfill_target_dedup_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=20, verbose_name='Canal')),
+                ('address', models.CharField(max_length=254, verbose_name='Adresse')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sent', 'Envoyé'), ('failed', 'Échec')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='notifications.notification', verbose_name='Notification')),
+            ],
+            options={
+                'verbose_name': 'Envoi de notification',
+                'verbose_name_plural': 'Envois de notifications',
+                'indexes': [models.Index(fields=['status', 'channel', 'next_attempt_at'], name='notificatio_status_bc3b41_idx'), models.Index(fields=['channel', 'sent_at'], name='notificatio_channel_4e93af_idx')],
+            },
+        ),
+    ]
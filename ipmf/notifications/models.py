@@ -1,12 +1,45 @@
+import re
+from datetime import datetime, time
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+from ipmf.dirty import DirtyFieldsMixin
+from ipmf.etags import bump, user_scope
+from ipmf.sync import record_deletions
+
 User = get_user_model()
 
-class Notification(models.Model):
+# "/tasks/12", "tasks/12/commentaires", "/expenses/3?tab=pieces" -> "tasks:12"
+LINK_TARGET_RE = re.compile(r'^/?([\w-]+)/(\d+)(?:[/?#]|$)')
+
+
+def target_key_from_link(link):
+    """Clé de la ressource désignée par un lien front (vide si non reconnue)"""
+    match = LINK_TARGET_RE.match(link or '')
+    return f"{match.group(1)}:{match.group(2)}" if match else ''
+
+
+class NotificationQuerySet(models.QuerySet):
+    """Requêtes indexées par cible et par clé de déduplication"""
+
+    def unread_for(self, recipient, target_key):
+        """Notifications non lues du destinataire concernant une ressource"""
+        return self.filter(recipient=recipient, target_key=target_key, is_read=False)
+
+    def sent_since(self, recipient, dedup_key, since):
+        return self.filter(recipient=recipient, dedup_key=dedup_key, created_at__gte=since)
+
+    def already_sent_today(self, recipient, dedup_key):
+        """Notification de même clé déjà envoyée aujourd'hui (jour local)"""
+        debut = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        return self.sent_since(recipient, dedup_key, debut).exists()
+
+
+class Notification(DirtyFieldsMixin, models.Model):
     """
     Modèle de notification pour les utilisateurs
     """
@@ -17,6 +50,7 @@ class Notification(models.Model):
         ('error', 'Erreur'),
         ('task', 'Tache'),
         ('finance', 'Finance'),
+        ('digest', 'Résumé'),
     ]
     
     recipient = models.ForeignKey(
@@ -52,13 +86,24 @@ class Notification(models.Model):
         verbose_name="Priorité"
     )
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Métadonnées")
+    # Regroupement : événements de même (destinataire, type, groupe) fusionnés dans
+    # une fenêtre de temps (NotificationService, NOTIFICATION_COALESCE_WINDOW)
+    group_key = models.CharField(max_length=100, blank=True, default='', verbose_name="Groupe")
+    occurrences = models.PositiveIntegerField(default=1, verbose_name="Occurrences")
+    # Ressource concernée ("tasks:12", dérivée du lien) et clé de déduplication
+    # d'un événement ("tache_retard:12") : recherches indexées au lieu de LIKE
+    target_key = models.CharField(max_length=100, blank=True, default='', verbose_name="Cible")
+    dedup_key = models.CharField(max_length=150, blank=True, default='', verbose_name="Clé de déduplication")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     read_at = models.DateTimeField(null=True, blank=True, verbose_name="Date de lecture")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
     
     # Support pour liens génériques (Generic Foreign Key)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
     object_id = models.PositiveIntegerField(null=True, blank=True)
     content_object = GenericForeignKey('content_type', 'object_id')
+
+    objects = NotificationQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Notification"
@@ -66,15 +111,84 @@ class Notification(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', 'is_read', '-created_at']),
+            # Liste paginée par utilisateur (lues et non lues)
+            models.Index(fields=['recipient', '-created_at']),
+            models.Index(fields=['recipient', 'group_key', '-created_at']),
+            models.Index(fields=['recipient', 'target_key', 'is_read']),
+            models.Index(fields=['recipient', 'dedup_key', '-created_at']),
             models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['created_at']),
+            # Parcours de rétention (notifications lues les plus anciennes)
+            models.Index(fields=['is_read', 'created_at']),
+            # Flux de changements par utilisateur (ipmf/sync.py)
+            models.Index(fields=['recipient', 'updated_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
+
+    def save(self, *args, **kwargs):
+        if self.link and not self.target_key:
+            self.target_key = target_key_from_link(self.link)
+        super().save(*args, **kwargs)
+        self.bump_etag(self.recipient_id)
+
+    def delete(self, *args, **kwargs):
+        pk, recipient_id = self.pk, self.recipient_id
+        result = super().delete(*args, **kwargs)
+        record_deletions(type(self), [(pk, recipient_id)])
+        self.bump_etag(recipient_id)
+        return result
+
+    @classmethod
+    def bump_etag(cls, recipient_id=None):
+        """Renouvelle l'ETag des notifications d'un utilisateur (tous si None)"""
+        label = cls._meta.label_lower
+        bump(user_scope(label, recipient_id) if recipient_id else label)
     
     def mark_as_read(self):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
+            self.save_dirty()
+
+
+class Delivery(models.Model):
+    """
+    Envoi d'une notification sur un canal externe (file d'attente « outbox »).
+    Créé dans la transaction de la notification ; envoyé plus tard par le
+    répartiteur (notifications.delivery, commande dispatch_notifications).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_SENT, 'Envoyé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name='deliveries', verbose_name="Notification"
+    )
+    channel = models.CharField(max_length=20, verbose_name="Canal")
+    address = models.CharField(max_length=254, verbose_name="Adresse")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Statut")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Date d'envoi")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+
+    class Meta:
+        verbose_name = "Envoi de notification"
+        verbose_name_plural = "Envois de notifications"
+        indexes = [
+            # File d'attente par canal
+            models.Index(fields=['status', 'channel', 'next_attempt_at']),
+            # Limite de débit (envois de la dernière minute)
+            models.Index(fields=['channel', 'sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} -> {self.address} ({self.get_status_display()})"
@@ -0,0 +1,263 @@
+"""
+Rétention des notifications et des alertes.
+
+Chaque destinataire reçoit une ligne par événement : sans purge, les tables
+croissent indéfiniment et les listes par utilisateur ralentissent.
+
+- Notifications lues : au-delà du délai de leur politique (type, priorité),
+  regroupées en un résumé quotidien par utilisateur (type 'digest', nombre de
+  notifications par type et par priorité, aperçu des titres) puis supprimées.
+  Le total historique reste donc calculable (somme des résumés + lignes).
+- Notifications non lues : conservées, sauf politique d'expiration explicite
+  (faible priorité). Le compteur de non lues n'est jamais modifié par la
+  compaction (les résumés sont créés lus).
+- Résumés : supprimés après NOTIFICATION_DIGEST_RETENTION_DAYS jours.
+- Alertes : supprimées selon leur niveau (lues, puis non lues expirées).
+
+Les suppressions se font par lots de NOTIFICATION_RETENTION_BATCH_SIZE lignes,
+chacun dans sa propre transaction : verrous courts, reprise possible après
+interruption. Point d'entrée : appliquer_retention() (commande
+purge_notifications).
+"""
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dashboard.models import Alert
+from ipmf import sync
+from ipmf.fixtures import raw_timestamps
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TYPE = 'digest'
+APERCU_MAX = 5
+
+
+@dataclass(frozen=True)
+class Politique:
+    compacter_apres: int | None = None          # lues : résumé quotidien après N jours
+    supprimer_apres: int | None = None          # lues : suppression après N jours
+    expirer_non_lues_apres: int | None = None   # non lues : suppression après N jours
+
+
+# Clés (type, priorité) ; '*' pour toute valeur. Recherche du plus précis au
+# plus général : (type, priorité), (type, '*'), ('*', priorité), ('*', '*').
+POLITIQUES_NOTIFICATIONS = {
+    ('*', 'low'): Politique(compacter_apres=7, expirer_non_lues_apres=90),
+    ('*', 'medium'): Politique(compacter_apres=30),
+    ('*', 'high'): Politique(compacter_apres=60),
+    ('*', 'critical'): Politique(compacter_apres=180),
+    # Traçabilité financière : détail conservé plus longtemps
+    ('finance', '*'): Politique(compacter_apres=90),
+    ('*', '*'): Politique(compacter_apres=30),
+}
+
+POLITIQUES_ALERTES = {
+    'faible': Politique(supprimer_apres=30, expirer_non_lues_apres=90),
+    'moyen': Politique(supprimer_apres=90),
+    'eleve': Politique(supprimer_apres=180),
+    'critique': Politique(supprimer_apres=365),
+}
+
+
+def politique_notification(type_, priority):
+    for key in ((type_, priority), (type_, '*'), ('*', priority), ('*', '*')):
+        if key in POLITIQUES_NOTIFICATIONS:
+            return POLITIQUES_NOTIFICATIONS[key]
+    return Politique()
+
+
+def _batch_size(batch_size=None):
+    return batch_size or getattr(settings, 'NOTIFICATION_RETENTION_BATCH_SIZE', 500)
+
+
+def delete_in_batches(queryset, batch_size=None):
+    """Supprime les lignes du queryset par lots (une transaction par lot)"""
+    batch_size = _batch_size(batch_size)
+    model = queryset.model
+    queryset = queryset.order_by()
+    # Modèles synchronisés sans signal post_delete : tombstones écrites ici
+    owner = sync.owner_field(model) if model._meta.label in sync.SANS_SIGNAL else None
+    total = 0
+    while True:
+        if owner:
+            rows = list(queryset.values_list('pk', owner)[:batch_size])
+            pks = [pk for pk, _ in rows]
+        else:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        with transaction.atomic():
+            model.objects.filter(pk__in=pks).delete()
+            if owner:
+                sync.record_deletions(model, rows)
+        total += len(pks)
+
+
+# ---------------------------------------------------------------------------
+# Notifications
+# ---------------------------------------------------------------------------
+
+def _filtre_notifications(attr, now):
+    """Q des notifications dont la politique (type, priorité) a expiré pour `attr`"""
+    q = Q(pk__in=[])
+    priorities = [value for value, _ in Notification._meta.get_field('priority').choices]
+    for type_, _ in Notification.TYPE_CHOICES:
+        if type_ == DIGEST_TYPE:
+            continue
+        for priority in priorities:
+            jours = getattr(politique_notification(type_, priority), attr)
+            if jours is not None:
+                q |= Q(type=type_, priority=priority, created_at__lt=now - timedelta(days=jours))
+    return q
+
+
+def _message_resume(metadata):
+    libelles = dict(Notification.TYPE_CHOICES)
+    detail = ', '.join(
+        f"{nombre} {libelles.get(type_, type_).lower()}"
+        for type_, nombre in sorted(metadata['par_type'].items(), key=lambda item: -item[1])
+    )
+    return f"{metadata['total']} notification(s) lue(s) : {detail}"
+
+
+def _cumuler(metadata, rows):
+    # Une notification regroupée compte pour ses `occurrences` événements
+    par_type = Counter(metadata.get('par_type', {}))
+    par_priorite = Counter(metadata.get('par_priorite', {}))
+    for row in rows:
+        par_type[row['type']] += row['occurrences']
+        par_priorite[row['priority']] += row['occurrences']
+    apercu = metadata.get('apercu', [])
+    apercu = apercu + [row['title'] for row in rows[:max(APERCU_MAX - len(apercu), 0)]]
+    return {
+        **metadata,
+        'total': metadata.get('total', 0) + sum(row['occurrences'] for row in rows),
+        'par_type': dict(par_type),
+        'par_priorite': dict(par_priorite),
+        'apercu': apercu,
+    }
+
+
+def _fusionner_resumes(rows, now):
+    """Ajoute les lignes aux résumés quotidiens de leurs destinataires (créés au besoin)"""
+    groupes = defaultdict(list)
+    for row in rows:
+        groupes[(row['recipient_id'], timezone.localdate(row['created_at']))].append(row)
+
+    debuts = {jour: timezone.make_aware(datetime.combine(jour, time.min)) for _, jour in groupes}
+    existants = {
+        (resume.recipient_id, timezone.localdate(resume.created_at)): resume
+        for resume in Notification.objects.select_for_update().filter(
+            type=DIGEST_TYPE,
+            recipient_id__in={recipient_id for recipient_id, _ in groupes},
+            created_at__in=set(debuts.values()),
+        )
+    }
+
+    nouveaux, modifies = [], []
+    for (recipient_id, jour), lignes in groupes.items():
+        resume = existants.get((recipient_id, jour))
+        if resume is None:
+            metadata = _cumuler({'jour': jour.isoformat()}, lignes)
+            nouveaux.append(Notification(
+                recipient_id=recipient_id,
+                title=f"Résumé du {jour:%d/%m/%Y}",
+                message=_message_resume(metadata),
+                type=DIGEST_TYPE,
+                priority='low',
+                is_read=True,
+                read_at=now,
+                created_at=debuts[jour],
+                metadata=metadata,
+            ))
+        else:
+            resume.metadata = _cumuler(resume.metadata, lignes)
+            resume.message = _message_resume(resume.metadata)
+            modifies.append(resume)
+
+    if nouveaux:
+        # Résumé daté du jour résumé, pas du jour de la compaction
+        with raw_timestamps(Notification, nouveaux):
+            Notification.objects.bulk_create(nouveaux)
+    if modifies:
+        # bulk_update n'applique pas auto_now (flux de changements)
+        for resume in modifies:
+            resume.updated_at = now
+        Notification.objects.bulk_update(modifies, ['metadata', 'message', 'updated_at'])
+
+
+def compacter_notifications(now=None, batch_size=None, dry_run=False):
+    """Regroupe les notifications lues expirées en résumés quotidiens ; retourne le nombre traité"""
+    now = now or timezone.now()
+    queryset = Notification.objects.filter(
+        _filtre_notifications('compacter_apres', now), is_read=True
+    ).exclude(type=DIGEST_TYPE)
+    if dry_run:
+        return queryset.count()
+
+    batch_size = _batch_size(batch_size)
+    total = 0
+    while True:
+        # Les lignes traitées sont supprimées : chaque tour relit les plus anciennes restantes
+        rows = list(
+            queryset.order_by('created_at', 'id')
+            .values('id', 'recipient_id', 'created_at', 'type', 'priority', 'title', 'occurrences')[:batch_size]
+        )
+        if not rows:
+            return total
+        with transaction.atomic():
+            _fusionner_resumes(rows, now)
+            Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            sync.record_deletions(Notification, [(row['id'], row['recipient_id']) for row in rows])
+        total += len(rows)
+
+
+def _compter_ou_supprimer(queryset, batch_size, dry_run):
+    return queryset.count() if dry_run else delete_in_batches(queryset, batch_size)
+
+
+def appliquer_retention(now=None, batch_size=None, dry_run=False):
+    """Applique toutes les politiques ; retourne le nombre de lignes par opération"""
+    now = now or timezone.now()
+    digest_days = getattr(settings, 'NOTIFICATION_DIGEST_RETENTION_DAYS', 730)
+
+    alertes = Q(pk__in=[])
+    for niveau, politique in POLITIQUES_ALERTES.items():
+        if politique.supprimer_apres is not None:
+            alertes |= Q(niveau=niveau, lue=True, date_creation__lt=now - timedelta(days=politique.supprimer_apres))
+        if politique.expirer_non_lues_apres is not None:
+            alertes |= Q(niveau=niveau, lue=False, date_creation__lt=now - timedelta(days=politique.expirer_non_lues_apres))
+
+    resultats = {
+        'notifications_expirees': _compter_ou_supprimer(
+            Notification.objects.filter(_filtre_notifications('expirer_non_lues_apres', now), is_read=False)
+            .exclude(type=DIGEST_TYPE),
+            batch_size, dry_run,
+        ),
+        'notifications_supprimees': _compter_ou_supprimer(
+            Notification.objects.filter(_filtre_notifications('supprimer_apres', now), is_read=True)
+            .exclude(type=DIGEST_TYPE),
+            batch_size, dry_run,
+        ),
+        'notifications_compactees': compacter_notifications(now, batch_size, dry_run),
+        'resumes_supprimes': _compter_ou_supprimer(
+            Notification.objects.filter(type=DIGEST_TYPE, created_at__lt=now - timedelta(days=digest_days)),
+            batch_size, dry_run,
+        ),
+        'alertes_supprimees': _compter_ou_supprimer(Alert.objects.filter(alertes), batch_size, dry_run),
+        'tombstones_supprimees': _compter_ou_supprimer(sync.expired_tombstones(now), batch_size, dry_run),
+    }
+    if not dry_run:
+        # Suppressions et résumés en masse : ETag de toutes les notifications
+        Notification.bump_etag()
+        logger.info("Rétention appliquée : %s", resultats)
+    return resultats
@@ -4,5 +4,5 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = ['id', 'title', 'message', 'type', 'priority', 'link', 'metadata', 'is_read', 'created_at', 'read_at']
-        read_only_fields = ['created_at', 'read_at']
+        fields = ['id', 'title', 'message', 'type', 'priority', 'link', 'metadata', 'occurrences', 'is_read', 'created_at', 'read_at']
+        read_only_fields = ['created_at', 'read_at', 'occurrences']
@@ -1,29 +1,109 @@
-from notifications.models import Notification
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from notifications import delivery
+from notifications.models import Notification, target_key_from_link
+
+PRIORITY_ORDER = ['low', 'medium', 'high', 'critical']
+# Références d'objets conservées dans une notification regroupée
+MAX_GROUP_OBJECTS = 50
+
+
+def _object_ref(obj, link):
+    if obj is None:
+        return {'link': link}
+    return {'type': obj._meta.label_lower, 'id': obj.pk, 'link': link}
+
 
 class NotificationService:
     @staticmethod
-    def send_notification(recipient, title, message, type='info', priority='medium', link='', metadata=None, obj=None):
+    def send_notification(recipient, title, message, type='info', priority='medium', link='', metadata=None, obj=None,
+                          group=None, group_title=None, dedup_key=''):
         """
-        Crée une notification pour un utilisateur
+        Crée une notification pour un utilisateur.
+
+        group : clé de regroupement ; un événement de même (destinataire, type,
+        groupe) qu'une notification non lue créée dans la fenêtre
+        NOTIFICATION_COALESCE_WINDOW y est fusionné (compteur `occurrences`,
+        références dans metadata['objets']) au lieu de créer une ligne.
+        group_title : titre de la notification regroupée, formaté avec {count}.
+        dedup_key : clé de l'événement (voir Notification.objects.already_sent_today).
         """
         if not recipient:
             return None
-            
-        return Notification.objects.create(
-            recipient=recipient,
-            title=title,
-            message=message,
-            type=type,
-            priority=priority,
-            link=link,
-            metadata=metadata or {},
-            content_object=obj
-        )
-    
+
+        metadata = dict(metadata or {})
+        if group:
+            metadata['objets'] = [_object_ref(obj, link)]
+            notification = NotificationService._coalesce(
+                recipient, type, group, group_title, title, message, priority, link, obj
+            )
+            if notification is not None:
+                return notification
+
+        # Notification et envois en file écrits ensemble : pas de notification sans e-mail / SMS
+        with transaction.atomic():
+            notification = Notification.objects.create(
+                recipient=recipient,
+                title=title,
+                message=message,
+                type=type,
+                priority=priority,
+                link=link,
+                metadata=metadata,
+                content_object=obj,
+                group_key=group or '',
+                target_key=target_key_from_link(link),
+                dedup_key=dedup_key,
+            )
+            # E-mail / SMS : mis en file ici, envoyés par le worker (dispatch_notifications)
+            delivery.enqueue(notification)
+        return notification
+
     @staticmethod
-    def notify_task_assigned(task):
-        """Notifie les agents assignés à une nouvelle tâche"""
-        for agent in task.agents_assignes.all():
+    def _coalesce(recipient, type, group, group_title, title, message, priority, link, obj):
+        """Fusionne l'événement dans la notification ouverte du groupe ; None s'il n'y en a pas"""
+        window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 900)
+        if window <= 0:
+            return None
+
+        with transaction.atomic():
+            notification = (
+                Notification.objects.select_for_update()
+                .filter(
+                    recipient=recipient, type=type, group_key=group, is_read=False,
+                    created_at__gte=timezone.now() - timedelta(seconds=window),
+                )
+                .order_by('-created_at')
+                .first()
+            )
+            if notification is None:
+                return None
+
+            notification.occurrences += 1
+            notification.title = group_title.format(count=notification.occurrences) if group_title else title
+            # Le message et le lien décrivent le dernier événement
+            notification.message = message
+            notification.link = link
+            notification.target_key = target_key_from_link(link)
+            notification.priority = max(notification.priority, priority, key=PRIORITY_ORDER.index)
+            objets = notification.metadata.get('objets', [])
+            notification.metadata['objets'] = (objets + [_object_ref(obj, link)])[-MAX_GROUP_OBJECTS:]
+            if obj is not None:
+                notification.content_type = ContentType.objects.get_for_model(obj)
+                notification.object_id = obj.pk
+            # Champs modifiés et updated_at : la fusion apparaît dans le flux de changements
+            notification.save_dirty()
+            return notification
+
+    @staticmethod
+    def notify_task_assigned(task, agents=None):
+        """Notifie les agents assignés à une tâche (par défaut : tous les assignés)"""
+        for agent in (task.agents_assignes.all() if agents is None else agents):
             NotificationService.send_notification(
                 recipient=agent,
                 title="Nouvelle tâche assignée",
@@ -56,7 +136,9 @@ class NotificationService:
                 type='info',
                 priority='low',
                 link=f"/tasks/{task.id}",
-                obj=comment
+                obj=comment,
+                group=f"tache:{task.id}:commentaires",
+                group_title=f"{{count}} nouveaux commentaires sur {task.numero}"
             )
 
     @staticmethod
@@ -69,8 +151,13 @@ class NotificationService:
             type='error',
             priority='critical',
             link=f"/tasks/{task.id}",
-            obj=task
+            obj=task,
+            dedup_key=NotificationService.overdue_key(task)
         )
+
+    @staticmethod
+    def overdue_key(task):
+        return f"tache_retard:{task.id}"
             
     @staticmethod
     def notify_expense_validation_needed(depense, validator):
@@ -82,5 +169,7 @@ class NotificationService:
             type='finance',
             priority='high',
             link=f"/expenses/{depense.id}",
-            obj=depense
+            obj=depense,
+            group='depenses:a_valider',
+            group_title="{count} dépenses attendent votre validation"
         )
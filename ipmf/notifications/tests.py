@@ -0,0 +1,326 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dashboard.models import Alert
+from finances.models import Depense
+from finances.services import FinanceService
+from ipmf import events
+from notifications.delivery import dispatch_pending
+from notifications.models import Delivery, Notification, target_key_from_link
+from notifications.retention import DIGEST_TYPE, appliquer_retention
+from notifications.services import NotificationService
+from tasks.models import Tache
+
+User = get_user_model()
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username='agent_retention', password='pwd', role='agent')
+
+    def _notification(self, jours, is_read=True, type='task', priority='medium', title='Notification'):
+        notification = Notification.objects.create(
+            recipient=self.user, title=title, message='-', type=type, priority=priority, is_read=is_read
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - timedelta(days=jours))
+        return notification
+
+    def _alerte(self, jours, niveau, lue=True):
+        alerte = Alert.creer_alerte('systeme', 'Alerte', '-', self.user, niveau=niveau)
+        Alert.objects.filter(pk=alerte.pk).update(lue=lue, date_creation=self.now - timedelta(days=jours))
+        return alerte
+
+    def test_resumes_quotidiens(self):
+        self._notification(40, title='A')
+        self._notification(40, type='info', priority='low', title='B')
+        self._notification(41)
+        non_lue = self._notification(40, is_read=False)
+        recente = self._notification(3)
+        critique = self._notification(40, priority='critical')
+
+        resultats = appliquer_retention(now=self.now, batch_size=2)
+
+        self.assertEqual(resultats['notifications_compactees'], 3)
+        resumes = Notification.objects.filter(type=DIGEST_TYPE).order_by('created_at')
+        self.assertEqual(resumes.count(), 2)
+        jour = resumes.last()
+        self.assertTrue(jour.is_read)
+        self.assertEqual(timezone.localdate(jour.created_at), timezone.localdate(self.now - timedelta(days=40)))
+        self.assertEqual(jour.metadata['total'], 2)
+        self.assertEqual(jour.metadata['par_type'], {'task': 1, 'info': 1})
+        self.assertEqual(sorted(jour.metadata['apercu']), ['A', 'B'])
+        # Non lues, récentes et critiques conservées ; compteur de non lues inchangé
+        self.assertEqual(
+            set(Notification.objects.exclude(type=DIGEST_TYPE).values_list('pk', flat=True)),
+            {non_lue.pk, recente.pk, critique.pk},
+        )
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+        # Nouvelle notification expirée le même jour : cumulée dans le résumé existant
+        self._notification(40, title='C')
+        appliquer_retention(now=self.now)
+        jour.refresh_from_db()
+        self.assertEqual(jour.metadata['total'], 3)
+        self.assertEqual(Notification.objects.filter(type=DIGEST_TYPE).count(), 2)
+
+    def test_expirations_et_alertes(self):
+        self._notification(100, is_read=False, priority='low')
+        self._notification(100, is_read=False, priority='high')
+        ancien_resume = self._notification(800, type=DIGEST_TYPE)
+        self._alerte(40, 'faible')
+        critique = self._alerte(40, 'critique')
+        non_lue = self._alerte(40, 'moyen', lue=False)
+
+        simulation = appliquer_retention(now=self.now, dry_run=True)
+        self.assertEqual(simulation['notifications_expirees'], 1)
+        self.assertEqual(Notification.objects.count(), 3)
+
+        resultats = appliquer_retention(now=self.now)
+        self.assertEqual(resultats, {
+            'notifications_expirees': 1,
+            'notifications_supprimees': 0,
+            'notifications_compactees': 0,
+            'resumes_supprimes': 1,
+            'alertes_supprimees': 1,
+            'tombstones_supprimees': 0,
+        })
+        self.assertFalse(Notification.objects.filter(pk=ancien_resume.pk).exists())
+        self.assertEqual(set(Alert.objects.values_list('pk', flat=True)), {critique.pk, non_lue.pk})
+
+    def test_commande(self):
+        self._notification(40)
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+        self.assertIn('notifications compactees : 1', out.getvalue())
+        self.assertFalse(Notification.objects.filter(type=DIGEST_TYPE).exists())
+
+
+@override_settings(NOTIFICATION_COALESCE_WINDOW=900)
+class CoalescingTest(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent_groupe', password='pwd', role='agent')
+        self.comptable = User.objects.create_user(username='comptable_groupe', password='pwd', role='comptable')
+
+    def _depense(self):
+        depense = Depense.objects.create(
+            quantite=1, prix_unitaire=Decimal('10000'), motif="Fournitures", created_by=self.agent
+        )
+        return FinanceService.submit_depense(depense, self.agent)
+
+    def test_depenses_regroupees(self):
+        """Une ligne par comptable pour trois dépenses soumises dans la fenêtre"""
+        depenses = [self._depense() for _ in range(3)]
+        events.process_pending()
+
+        notifications = Notification.objects.filter(recipient=self.comptable)
+        self.assertEqual(notifications.count(), 1)
+        notification = notifications.get()
+        self.assertEqual(notification.occurrences, 3)
+        self.assertEqual(notification.title, "3 nouvelles dépenses à vérifier")
+        self.assertEqual(notification.link, f"/expenses/{depenses[-1].id}")
+        self.assertEqual([ref['id'] for ref in notification.metadata['objets']], [d.id for d in depenses])
+
+    def test_limites_du_regroupement(self):
+        envoyer = lambda **kwargs: NotificationService.send_notification(
+            self.agent, "Commentaire", "-", group='tache:1:commentaires', **kwargs
+        )
+        premiere = envoyer(priority='low')
+        self.assertEqual(envoyer(priority='high').pk, premiere.pk)
+        premiere.refresh_from_db()
+        self.assertEqual(premiere.priority, 'high')
+
+        # Autre type, notification lue ou hors fenêtre : nouvelle ligne
+        self.assertNotEqual(envoyer(type='task').pk, premiere.pk)
+        premiere.mark_as_read()
+        seconde = envoyer()
+        self.assertNotEqual(seconde.pk, premiere.pk)
+        Notification.objects.filter(pk=seconde.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertNotEqual(envoyer().pk, seconde.pk)
+
+    def test_une_notification_par_transition(self):
+        """Un nouvel enregistrement d'une dépense validée ne notifie plus"""
+        depense = self._depense()
+        events.process_pending()
+        FinanceService.validate_depense(depense, self.comptable)
+        events.process_pending()
+        approuvees = Notification.objects.filter(recipient=self.agent, title="Dépense approuvée")
+        self.assertEqual(approuvees.count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.comptable).count(), 1)
+
+        depense.commentaire = "Facture jointe"
+        depense.save()
+        events.process_pending()
+        self.assertEqual(approuvees.count(), 1)
+
+    @override_settings(SYNC_SAFETY_MARGIN=0)
+    def test_fusion_dans_le_flux_de_changements(self):
+        client = APIClient()
+        client.force_authenticate(self.agent)
+        envoyer = lambda: NotificationService.send_notification(
+            self.agent, "Commentaire", "-", group='tache:1:commentaires', group_title="{count} commentaires"
+        )
+        premiere = envoyer()
+        since = (premiere.updated_at - timedelta(seconds=1)).isoformat()
+        curseur = client.get('/api/notifications/changes/', {'since': since}).data['since']
+
+        envoyer()
+        data = client.get('/api/notifications/changes/', {'since': curseur}).data
+        self.assertEqual([(n['id'], n['title']) for n in data['changes']], [(premiere.pk, "2 commentaires")])
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+    def test_desactive(self):
+        self._depense()
+        self._depense()
+        events.process_pending()
+        self.assertEqual(Notification.objects.filter(recipient=self.comptable).count(), 2)
+
+
+class TargetKeyTest(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent_cible', password='pwd', role='agent')
+
+    def test_cle_depuis_le_lien(self):
+        self.assertEqual(target_key_from_link('/tasks/12'), 'tasks:12')
+        self.assertEqual(target_key_from_link('expenses/3?tab=pieces'), 'expenses:3')
+        self.assertEqual(target_key_from_link('/tasks/12abc'), '')
+        self.assertEqual(target_key_from_link(''), '')
+
+    def test_marquage_par_cible(self):
+        """/tasks/1 ne correspond plus à /tasks/12 (ancien filtre LIKE)"""
+        tache_1 = NotificationService.send_notification(self.agent, "T1", "-", link='/tasks/1')
+        tache_12 = NotificationService.send_notification(self.agent, "T12", "-", link='/tasks/12')
+        client = APIClient()
+        client.force_authenticate(self.agent)
+
+        response = client.post('/api/notifications/mark_related_read/', {'link_pattern': '/tasks/1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Notification.objects.get(pk=tache_1.pk).is_read)
+        self.assertFalse(Notification.objects.get(pk=tache_12.pk).is_read)
+        self.assertEqual(
+            client.post('/api/notifications/mark_related_read/', {'link_pattern': 'inconnu'}).status_code, 400
+        )
+
+    def test_retard_notifie_une_fois_par_jour(self):
+        tache = Tache.objects.create(
+            titre="Mission", description="-", createur=self.agent,
+            date_echeance=timezone.now() - timedelta(days=1),
+        )
+        tache.agents_assignes.add(self.agent)
+        call_command('check_overdue', stdout=StringIO())
+        call_command('check_overdue', stdout=StringIO())
+        self.assertEqual(Notification.objects.filter(dedup_key=f'tache_retard:{tache.id}').count(), 1)
+        self.assertTrue(Notification.objects.already_sent_today(self.agent, f'tache_retard:{tache.id}'))
+
+    def test_migration_de_reprise(self):
+        backfill = import_module('notifications.migrations.0007_backfill_target_dedup_keys').backfill
+        ancienne = NotificationService.send_notification(
+            self.agent, "Tâche en retard", "-", type='error', link='/tasks/7'
+        )
+        Notification.objects.filter(pk=ancienne.pk).update(target_key='', dedup_key='')
+
+        backfill(django_apps, mock.Mock(connection=connection))
+        ancienne.refresh_from_db()
+        self.assertEqual((ancienne.target_key, ancienne.dedup_key), ('tasks:7', 'tache_retard:7'))
+
+
+class DeliveryTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        sms = override_settings(
+            NOTIFICATION_SMS_BACKEND='notifications.channels.FileSmsBackend',
+            NOTIFICATION_SMS_FILE_PATH=os.path.join(self.tmp, 'sms.log'),
+        )
+        sms.enable()
+        self.addCleanup(sms.disable)
+        self.agent = User.objects.create_user(
+            username='agent_envoi', password='pwd', role='agent', email='agent@ipmf.mg', telephone='+261321234567'
+        )
+
+    def _envoyer(self, priority='critical'):
+        return NotificationService.send_notification(self.agent, "Tâche en retard", "Échéance dépassée", priority=priority)
+
+    def test_file_puis_envoi_par_lot(self):
+        self.agent.profile.notification_channels = {'sms': True}
+        self.agent.profile.save()
+        self._envoyer()
+        self._envoyer()
+        self._envoyer(priority='low')
+
+        # Rien n'est envoyé pendant la requête : seulement mis en file
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Delivery.objects.filter(channel='email').count(), 2)
+        self.assertEqual(Delivery.objects.filter(channel='sms').count(), 2)
+
+        resultats = dispatch_pending()
+        self.assertEqual(resultats['email']['envoyes'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['agent@ipmf.mg'])
+        with open(os.path.join(self.tmp, 'sms.log'), encoding='utf-8') as fichier:
+            self.assertEqual(len(fichier.readlines()), 2)
+        self.assertFalse(Delivery.objects.exclude(status=Delivery.STATUS_SENT).exists())
+        self.assertEqual(dispatch_pending(), {'email': Counter(), 'sms': Counter()})
+
+    def test_preferences(self):
+        """SMS désactivé par défaut ; plus aucun envoi si les notifications sont coupées"""
+        self._envoyer()
+        self.assertEqual(list(Delivery.objects.values_list('channel', flat=True)), ['email'])
+
+        self.agent.profile.notifications_active = False
+        self.agent.profile.save()
+        Delivery.objects.all().delete()
+        self._envoyer()
+        self.assertFalse(Delivery.objects.exists())
+
+    def test_notification_et_file_atomiques(self):
+        """Échec de la mise en file : la notification n'est pas créée non plus"""
+        with mock.patch('notifications.delivery.Delivery.objects.bulk_create', side_effect=RuntimeError("file")):
+            with self.assertRaises(RuntimeError):
+                self._envoyer()
+        self.assertFalse(Notification.objects.filter(recipient=self.agent).exists())
+
+    @override_settings(NOTIFICATION_DELIVERY_MAX_ATTEMPTS=2)
+    def test_nouvelles_tentatives(self):
+        self._envoyer()
+        livraison = Delivery.objects.get()
+        with mock.patch('notifications.channels.EmailMessage.send', side_effect=OSError("SMTP indisponible")), \
+                self.assertLogs('notifications.delivery', 'WARNING'):
+            self.assertEqual(dispatch_pending()['email']['reportes'], 1)
+            livraison.refresh_from_db()
+            self.assertEqual((livraison.status, livraison.attempts), (Delivery.STATUS_PENDING, 1))
+            self.assertGreater(livraison.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+            # Pas encore dû ; puis dernière tentative en échec
+            self.assertEqual(dispatch_pending()['email'], Counter())
+            self.assertEqual(dispatch_pending(now=livraison.next_attempt_at)['email']['echecs'], 1)
+        livraison.refresh_from_db()
+        self.assertEqual(livraison.status, Delivery.STATUS_FAILED)
+        self.assertIn("SMTP indisponible", livraison.last_error)
+
+    def test_limite_de_debit(self):
+        channels = {
+            'email': {'BACKEND': 'notifications.channels.EmailChannel', 'PRIORITIES': ['critical'], 'RATE_LIMIT': 2},
+        }
+        with override_settings(NOTIFICATION_CHANNELS=channels):
+            for _ in range(3):
+                self._envoyer()
+            self.assertEqual(dispatch_pending()['email']['envoyes'], 2)
+            self.assertEqual(dispatch_pending()['email'], Counter())
+            self.assertEqual(dispatch_pending(now=timezone.now() + timedelta(minutes=2))['email']['envoyes'], 1)
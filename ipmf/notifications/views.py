@@ -2,15 +2,24 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
-from .models import Notification
+from .models import Notification, target_key_from_link
 from .serializers import NotificationSerializer
+from ipmf.etags import ConditionalGetMixin, user_scope
+from ipmf.sync import DeltaSyncMixin
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalGetMixin, DeltaSyncMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Requêtes SQL par action, authentification comprise (ipmf/query_budget.py)
+    query_budgets = {'list': 3, 'changes': 4}
     
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user)
+
+    def get_etag_scopes(self, request):
+        # Notifications de l'utilisateur ; portée globale renouvelée par la rétention
+        label = Notification._meta.label_lower
+        return [user_scope(label, request.user.pk), label]
     
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -22,8 +31,10 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_all_read(self, request):
         self.get_queryset().filter(is_read=False).update(
             is_read=True,
-            read_at=timezone.now()
+            read_at=timezone.now(),
+            updated_at=timezone.now(),
         )
+        Notification.bump_etag(request.user.pk)
         return Response({'status': 'all marked as read'})
     
     @action(detail=False, methods=['get'])
@@ -33,16 +44,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def mark_related_read(self, request):
-        """Marque comme lues les notifications liées à un objet spécifique (ex: tâche X)"""
-        link_pattern = request.data.get('link_pattern')
-        if not link_pattern:
-            return Response({'error': 'link_pattern required'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        self.get_queryset().filter(
-            is_read=False,
-            link__contains=link_pattern
-        ).update(
+        """
+        Marque comme lues les notifications liées à un objet spécifique (ex: tâche X).
+        Cible : `target` ("tasks:12") ou `link_pattern` ("/tasks/12").
+        """
+        target = request.data.get('target') or target_key_from_link(request.data.get('link_pattern'))
+        if not target:
+            return Response({'error': 'target or link_pattern required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        Notification.objects.unread_for(request.user, target).update(
             is_read=True,
-            read_at=timezone.now()
+            read_at=timezone.now(),
+            updated_at=timezone.now(),
         )
+        Notification.bump_etag(request.user.pk)
         return Response({'status': 'related marked as read'})
@@ -6,7 +6,7 @@ class TacheAdmin(admin.ModelAdmin):
     list_display = ('numero', 'titre', 'createur', 'get_agents', 'statut', 'priorite', 'date_echeance', 'est_en_retard')
     list_filter = ('statut', 'priorite', 'date_creation', 'date_echeance', 'createur', 'agents_assignes')
     search_fields = ('numero', 'titre', 'description', 'resultat')
-    readonly_fields = ('numero', 'date_creation', 'jours_restants', 'est_en_retard', 'pourcentage_avancement')
+    readonly_fields = ('numero', 'date_creation', 'jours_restants', 'est_en_retard', 'pourcentage_avancement', 'montant_engage', 'montant_paye')
     date_hierarchy = 'date_creation'
     list_per_page = 25
     
@@ -18,7 +18,7 @@ class TacheAdmin(admin.ModelAdmin):
             'fields': ('createur', 'agents_assignes')
         }),
         ('Budget et résultats', {
-            'fields': ('budget_alloue', 'resultat', 'piece_jointe_resultat')
+            'fields': ('budget_alloue', 'montant_engage', 'montant_paye', 'resultat', 'piece_jointe_resultat')
         }),
         ('Statut et suivi', {
             'fields': ('statut', 'date_debut_reelle', 'date_fin_reelle', 'commentaire_validation', 'valide_par', 'date_validation')
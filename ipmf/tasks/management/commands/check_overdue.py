@@ -20,14 +20,10 @@ class Command(BaseCommand):
             # Pour chaque agent assigné
             for agent in task.agents_assignes.all():
                 # Vérifier si une notification pour cette tâche a déjà été envoyée AUJOURD'HUI
-                # On utilise created_at__date pour vérifier la date du jour
-                already_notified = Notification.objects.filter(
-                    recipient=agent,
-                    link=f"/tasks/{task.id}",
-                    type='error',
-                    title="Tâche en retard",
-                    created_at__date=now.date()
-                ).exists()
+                # (recherche indexée sur la clé de déduplication)
+                already_notified = Notification.objects.already_sent_today(
+                    agent, NotificationService.overdue_key(task)
+                )
                 
                 if not already_notified:
                     NotificationService.notify_task_overdue(task, agent)
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:33
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_montants(apps, schema_editor):
+    """Initialise les montants engagés/payés à partir des dépenses existantes"""
+    Tache = apps.get_model('tasks', 'Tache')
+    Depense = apps.get_model('finances', 'Depense')
+
+    totaux = (
+        Depense.objects.filter(tache__isnull=False)
+        .values('tache_id')
+        .annotate(
+            engage=Sum('montant', filter=~Q(statut__in=['rejetee', 'annulee'])),
+            paye=Sum('montant', filter=Q(statut='payee')),
+        )
+    )
+    for row in totaux:
+        Tache.objects.filter(pk=row['tache_id']).update(
+            montant_engage=row['engage'] or Decimal('0.00'),
+            montant_paye=row['paye'] or Decimal('0.00'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_soustache'),
+        ('finances', '0007_alter_depense_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='montant_engage',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name='Montant engagé (Ar)'),
+        ),
+        migrations.AddField(
+            model_name='tache',
+            name='montant_paye',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name='Montant payé (Ar)'),
+        ),
+        migrations.RunPython(backfill_montants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_tache_montant_engage_montant_paye'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tache',
+            index=models.Index(condition=models.Q(('statut__in', ['creee', 'en_cours'])), fields=['date_echeance'], name='tache_echeance_ouverte_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tache',
+            index=models.Index(fields=['statut', 'date_echeance'], name='tasks_tache_statut_a61f1e_idx'),
+        ),
+    ]
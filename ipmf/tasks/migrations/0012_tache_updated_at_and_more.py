@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_tache_tache_echeance_ouverte_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date de modification'),
+        ),
+        migrations.AddIndex(
+            model_name='tache',
+            index=models.Index(fields=['updated_at', 'id'], name='tasks_tache_updated_b006a1_idx'),
+        ),
+    ]
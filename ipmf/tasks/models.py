@@ -1,13 +1,74 @@
 from django.db import models
+from django.db.models.functions import TruncDate
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from datetime import datetime, time
 from decimal import Decimal
 import os
 
+from ipmf.db_functions import DiffJours
+from ipmf.dirty import DirtyFieldsMixin
+
 User = get_user_model()
 
-class Tache(models.Model):
+# Statuts pour lesquels une échéance dépassée signifie un retard
+STATUTS_OUVERTS = ['creee', 'en_cours']
+
+
+class TacheQuerySet(models.QuerySet):
+    """Échéances calculées par la base (mêmes règles que les propriétés du modèle)"""
+
+    @staticmethod
+    def q_en_retard(aujourdhui=None):
+        """Condition indexable : tâche ouverte dont l'échéance est antérieure à aujourd'hui"""
+        aujourdhui = aujourdhui or timezone.localdate()
+        debut_du_jour = timezone.make_aware(datetime.combine(aujourdhui, time.min))
+        return models.Q(statut__in=STATUTS_OUVERTS, date_echeance__lt=debut_du_jour)
+
+    def en_retard(self, aujourdhui=None):
+        return self.filter(self.q_en_retard(aujourdhui))
+
+    def avec_delais(self, aujourdhui=None):
+        """Annote jours_restants et est_en_retard (lus par les propriétés du modèle)"""
+        aujourdhui = aujourdhui or timezone.localdate()
+        return self.annotate(
+            jours_restants=DiffJours(TruncDate('date_echeance'), models.Value(aujourdhui, models.DateField())),
+            est_en_retard=models.Case(
+                models.When(self.q_en_retard(aujourdhui), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def pour_affichage(self):
+        """Relations lues par TacheSerializer : nombre de requêtes fixe quelle que soit la page"""
+        return self.select_related('createur', 'valide_par').prefetch_related(
+            'agents_assignes',
+            models.Prefetch('sous_taches', queryset=SousTache.objects.select_related('assigne_a')),
+            models.Prefetch(
+                'commentaires',
+                queryset=CommentaireTache.objects.select_related('auteur').order_by('date_creation'),
+            ),
+            models.Prefetch(
+                'demandes_report',
+                queryset=DemandeReport.objects.filter(statut='en_attente').select_related('tache', 'demandeur', 'repondu_par'),
+                to_attr='reports_en_attente',
+            ),
+        )
+
+    def retards_par_agent(self, aujourdhui=None):
+        """Nombre de tâches en retard par agent assigné (une requête groupée)"""
+        return (
+            self.en_retard(aujourdhui)
+            .filter(agents_assignes__isnull=False)
+            .values('agents_assignes', 'agents_assignes__username', 'agents_assignes__first_name', 'agents_assignes__last_name')
+            .annotate(count=models.Count('id', distinct=True))
+            .order_by('-count')
+        )
+
+
+class Tache(DirtyFieldsMixin, models.Model):
     STATUT_CHOICES = [
         ('creee', 'Créée'),
         ('en_cours', 'En cours'),
@@ -56,6 +117,21 @@ class Tache(models.Model):
         blank=True,
         verbose_name="Budget alloué (Ar)"
     )
+    # Consommation budgétaire maintenue par FinanceService (mises à jour F() atomiques)
+    montant_engage = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Montant engagé (Ar)"
+    )  # Somme des dépenses non rejetées rattachées à la mission
+    montant_paye = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Montant payé (Ar)"
+    )  # Somme des dépenses payées rattachées à la mission
     resultat = models.TextField(blank=True, verbose_name="Résultat")
     piece_jointe_resultat = models.FileField(
         upload_to='taches/resultats/%Y/%m/', 
@@ -77,11 +153,25 @@ class Tache(models.Model):
         verbose_name="Validé par"
     )
     date_validation = models.DateTimeField(null=True, blank=True, verbose_name="Date de validation")
+    # Synchronisation incrémentale (ipmf/sync.py) : renseigné aussi par les .update() des services
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
+
+    objects = TacheQuerySet.as_manager()
     
     class Meta:
         verbose_name = "📋 Tâche"
         verbose_name_plural = "📋 Tâches"
         ordering = ['-date_creation']
+        indexes = [
+            # Retards : index partiel limité aux tâches ouvertes
+            models.Index(
+                fields=['date_echeance'],
+                condition=models.Q(statut__in=STATUTS_OUVERTS),
+                name='tache_echeance_ouverte_idx',
+            ),
+            models.Index(fields=['statut', 'date_echeance']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
         permissions = [
             ("can_assign_tasks", "Peut assigner des tâches"),
             ("can_validate_tasks", "Peut valider des tâches"),
@@ -90,6 +180,9 @@ class Tache(models.Model):
     def save(self, *args, **kwargs):
         if not self.numero:
             self.numero = self.generate_numero()
+        # Délais annotés : recalculés après un changement de statut ou d'échéance
+        self.__dict__.pop('_jours_restants', None)
+        self.__dict__.pop('_est_en_retard', None)
         super().save(*args, **kwargs)
     
     def generate_numero(self):
@@ -112,21 +205,42 @@ class Tache(models.Model):
     def __str__(self):
         return f"{self.numero} - {self.titre}"
     
+    # Les propriétés suivantes reprennent la valeur annotée par
+    # TacheQuerySet.avec_delais() si elle est présente.
+
     @property
     def jours_restants(self):
-        """Calcule le nombre de jours restants jusqu'à l'échéance"""
-        aujourdhui = timezone.now().date()
+        """Calcule le nombre de jours restants jusqu'à l'échéance (jour local)"""
+        if '_jours_restants' in self.__dict__:
+            return self._jours_restants
         if self.date_echeance:
-            return (self.date_echeance.date() - aujourdhui).days
+            return (timezone.localdate(self.date_echeance) - timezone.localdate()).days
         return None
+
+    @jours_restants.setter
+    def jours_restants(self, value):
+        self._jours_restants = value
     
     @property
     def est_en_retard(self):
         """Vérifie si la tâche est en retard"""
-        if self.statut in ['terminee', 'validee', 'annulee']:
+        if '_est_en_retard' in self.__dict__:
+            return self._est_en_retard
+        if self.statut not in STATUTS_OUVERTS:
             return False
         return self.jours_restants < 0 if self.jours_restants is not None else False
+
+    @est_en_retard.setter
+    def est_en_retard(self, value):
+        self._est_en_retard = value
     
+    @property
+    def budget_restant(self):
+        """Budget encore disponible (None si aucun budget n'est alloué)"""
+        if not self.budget_alloue:
+            return None
+        return self.budget_alloue - self.montant_engage
+
     @property
     def pourcentage_avancement(self):
         """Calcule le pourcentage d'avancement basé sur le statut"""
@@ -139,13 +253,19 @@ class Tache(models.Model):
         }
         return avancement_map.get(self.statut, 0)
     
+    def est_assigne(self, user):
+        """L'utilisateur est-il assigné ? (agents préchargés : sans requête)"""
+        if 'agents_assignes' in getattr(self, '_prefetched_objects_cache', {}):
+            return any(agent.pk == user.pk for agent in self.agents_assignes.all())
+        return self.agents_assignes.filter(id=user.id).exists()
+
     def peut_demarrer(self, user):
         """Vérifie si l'utilisateur peut démarrer cette tâche"""
-        return self.agents_assignes.filter(id=user.id).exists() and self.statut == 'creee'
+        return self.statut == 'creee' and self.est_assigne(user)
     
     def peut_terminer(self, user):
         """Vérifie si l'utilisateur peut terminer cette tâche"""
-        return self.agents_assignes.filter(id=user.id).exists() and self.statut == 'en_cours'
+        return self.statut == 'en_cours' and self.est_assigne(user)
     
     def peut_valider(self, user):
         """Vérifie si l'utilisateur peut valider cette tâche"""
@@ -187,7 +307,7 @@ class CommentaireTache(models.Model):
     def __str__(self):
         return f"Commentaire par {self.auteur.username} sur {self.tache.numero}"
 
-class DemandeReport(models.Model):
+class DemandeReport(DirtyFieldsMixin, models.Model):
     STATUT_CHOICES = [
         ('en_attente', 'En attente'),
         ('approuvee', 'Approuvée'),
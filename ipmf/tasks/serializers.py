@@ -49,7 +49,7 @@ class TacheSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'numero', 'titre', 'description', 'date_creation', 'date_debut', 'date_echeance',
             'priorite', 'priorite_display', 'statut', 'statut_display', 'createur', 'createur_name',
-            'agents_assignes', 'agents_assignes_names', 'budget_alloue', 'resultat', 'piece_jointe_resultat', 'piece_jointe_name',
+            'agents_assignes', 'agents_assignes_names', 'budget_alloue', 'montant_engage', 'montant_paye', 'resultat', 'piece_jointe_resultat', 'piece_jointe_name',
             'date_debut_reelle', 'date_fin_reelle', 'commentaire_validation', 'valide_par', 'valide_par_name',
             'date_validation', 'jours_restants', 'est_en_retard', 'pourcentage_avancement',
             'peut_demarrer', 'peut_terminer', 'peut_valider', 'peut_annuler',
@@ -58,20 +58,22 @@ class TacheSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = (
             'numero', 'createur', 'date_creation', 'jours_restants', 'est_en_retard', 
-            'pourcentage_avancement', 'valide_par', 'date_validation', 'pending_report', 'budget_restant'
+            'pourcentage_avancement', 'valide_par', 'date_validation', 'pending_report', 'budget_restant',
+            'montant_engage', 'montant_paye'
         )
 
     def get_budget_restant(self, obj):
-        """Calcule le budget restant sur la tâche"""
-        if not obj.budget_alloue:
-            return None
-        from django.db.models import Sum
-        total_engague = obj.depenses.exclude(statut__in=['rejetee', 'annulee']).aggregate(total=Sum('montant'))['total'] or 0
-        return float(obj.budget_alloue - total_engague)
+        """Budget restant sur la tâche (montant engagé maintenu par FinanceService)"""
+        restant = obj.budget_restant
+        return float(restant) if restant is not None else None
 
     def get_pending_report(self, obj):
         """Retourne la demande de report en attente s'il y en a une."""
-        pending = obj.demandes_report.filter(statut='en_attente').first()
+        if hasattr(obj, 'reports_en_attente'):
+            # Préchargée par TacheQuerySet.pour_affichage()
+            pending = obj.reports_en_attente[0] if obj.reports_en_attente else None
+        else:
+            pending = obj.demandes_report.filter(statut='en_attente').first()
         if pending:
             return DemandeReportSerializer(pending).data
         return None
@@ -135,7 +137,9 @@ class TacheSerializer(serializers.ModelSerializer):
         """
         Récupère tous les commentaires associés à cette tâche, triés par date de création.
         """
-        commentaires = obj.commentaires.all().order_by('date_creation')
+        commentaires = obj.commentaires.all()
+        if 'commentaires' not in getattr(obj, '_prefetched_objects_cache', {}):
+            commentaires = commentaires.select_related('auteur').order_by('date_creation')
         return CommentaireTacheSerializer(commentaires, many=True, context=self.context).data
     
 class CommentaireTacheSerializer(serializers.ModelSerializer):
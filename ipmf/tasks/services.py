@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.utils import timezone
+
+from audit import tracking
+from audit.models import AuditLog
+from ipmf import events
+from .models import Tache, CommentaireTache, DemandeReport
+
+
+class TacheService:
+    """
+    Couche de service des missions : transitions de statut et reports.
+    Chaque transition est enregistrée (audit, événement métier) dans la même
+    transaction ; les notifications sont envoyées par le consommateur
+    d'événements (notifications/handlers.py).
+    Les contrôles de permission restent dans les vues. Les transitions
+    n'écrivent que les champs modifiés, sous condition du statut lu.
+    """
+
+    @staticmethod
+    def _log_audit(user, message, obj, action_type='update'):
+        AuditLog.log_action(
+            action_type=action_type,
+            module='tasks',
+            message=message,
+            utilisateur=user,
+            objet_type=obj.__class__.__name__,
+            objet_id=str(obj.pk),
+            objet_repr=str(obj),
+            **tracking.audit_values(tracking.pop_changes(obj)),
+        )
+
+    @staticmethod
+    def _commenter(tache, user, message, piece_jointe=None):
+        return CommentaireTache.objects.create(tache=tache, auteur=user, message=message, piece_jointe=piece_jointe)
+
+    @classmethod
+    def _transition(cls, tache, user, statut, **champs):
+        ancien = tache.statut
+        tache.statut = statut
+        for champ, valeur in champs.items():
+            setattr(tache, champ, valeur)
+        tache.save_dirty(condition={'statut': ancien})
+        events.transition(f'tache.{statut}', tache, user, de=ancien, vers=statut)
+
+    # =========================================================================
+    # TRANSITIONS
+    # =========================================================================
+
+    @classmethod
+    @transaction.atomic
+    def creer(cls, tache: Tache, user):
+        """Enregistre la création (l'affectation des agents est notifiée par m2m_changed)"""
+        cls._log_audit(user, f"Tache {tache.numero} creee", tache, action_type='create')
+        events.publish('tache.creee', tache, user)
+        return tache
+
+    @classmethod
+    @transaction.atomic
+    def demarrer(cls, tache: Tache, user, commentaire='', piece_jointe=None):
+        cls._transition(tache, user, 'en_cours', date_debut_reelle=timezone.now())
+        if commentaire or piece_jointe:
+            cls._commenter(tache, user, f"Début de la tâche: {commentaire}", piece_jointe)
+        cls._log_audit(user, f"Tache {tache.numero} demarree", tache)
+        return tache
+
+    @classmethod
+    @transaction.atomic
+    def terminer(cls, tache: Tache, user, resultat='', commentaire='', piece_jointe=None):
+        cls._transition(tache, user, 'terminee', date_fin_reelle=timezone.now(), resultat=resultat)
+        if commentaire or piece_jointe:
+            cls._commenter(tache, user, f"Tâche terminée: {commentaire}", piece_jointe)
+        cls._log_audit(user, f"Tache {tache.numero} terminee", tache)
+        return tache
+
+    @classmethod
+    @transaction.atomic
+    def valider(cls, tache: Tache, user, commentaire='', piece_jointe=None):
+        cls._transition(
+            tache, user, 'validee',
+            valide_par=user, date_validation=timezone.now(), commentaire_validation=commentaire,
+        )
+        cls._commenter(tache, user, f"Tâche validée: {commentaire or 'Validation effectuée'}", piece_jointe)
+        cls._log_audit(user, f"Tache {tache.numero} validee", tache, action_type='validation')
+        return tache
+
+    @classmethod
+    @transaction.atomic
+    def annuler(cls, tache: Tache, user, commentaire='', piece_jointe=None):
+        cls._transition(tache, user, 'annulee')
+        cls._commenter(tache, user, f"Tâche annulée: {commentaire or 'Annulation effectuée'}", piece_jointe)
+        cls._log_audit(user, f"Tache {tache.numero} annulee", tache)
+        return tache
+
+    # =========================================================================
+    # DEMANDES DE REPORT
+    # =========================================================================
+
+    @classmethod
+    @transaction.atomic
+    def demander_report(cls, demande: DemandeReport, user):
+        cls._log_audit(user, f"Report demandé pour tâche {demande.tache.numero}", demande, action_type='create')
+        events.publish('report.demande', demande, user, tache=demande.tache_id)
+        return demande
+
+    @classmethod
+    @transaction.atomic
+    def approuver_report(cls, demande: DemandeReport, user, commentaire=''):
+        tache = demande.tache
+        tache.date_echeance = demande.date_demandee
+        # Si la tâche était en échec/terminée, on la remet en cours
+        if tache.statut == 'terminee' or tache.resultat == "ECHEC_AUTOMATIQUE":
+            ancien = tache.statut
+            tache.statut = 'en_cours'
+            tache.resultat = ''
+            tache.date_fin_reelle = None
+            tache.save_dirty(condition={'statut': ancien})
+            if ancien != tache.statut:
+                events.transition('tache.en_cours', tache, user, de=ancien, vers=tache.statut, report=demande.pk)
+        else:
+            tache.save_dirty()
+
+        cls._repondre(demande, user, 'approuvee', commentaire)
+        cls._log_audit(
+            user, f"Report approuvé pour tâche {tache.numero}. Nouvelle échéance: {tache.date_echeance}", demande
+        )
+        return demande
+
+    @classmethod
+    @transaction.atomic
+    def rejeter_report(cls, demande: DemandeReport, user, commentaire=''):
+        cls._repondre(demande, user, 'rejetee', commentaire)
+        cls._log_audit(user, f"Report rejeté pour tâche {demande.tache.numero}", demande)
+        return demande
+
+    @staticmethod
+    def _repondre(demande, user, statut, commentaire):
+        ancien = demande.statut
+        demande.statut = statut
+        demande.repondu_par = user
+        demande.date_reponse = timezone.now()
+        demande.commentaire_reponse = commentaire
+        demande.save_dirty(condition={'statut': ancien})
+        events.transition(f'report.{statut}', demande, user, de=ancien, vers=statut, tache=demande.tache_id)
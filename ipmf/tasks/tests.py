@@ -1,3 +1,140 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from finances.models import Depense
+from ipmf.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin
+from tasks.models import CommentaireTache, DemandeReport, SousTache, Tache
+from tasks.views import TacheViewSet
+
+User = get_user_model()
+
+
+class DelaisEnBaseTest(TestCase):
+    """Annotations SQL identiques aux propriétés Python"""
+
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_delais', password='pwd', role='dg')
+        self.agent = User.objects.create_user(username='agent_delais', password='pwd', role='agent')
+        now = timezone.now()
+        self.taches = {}
+        for nom, jours, statut in [
+            ('retard', -3, 'en_cours'), ('hier', -1, 'creee'), ('aujourdhui', 0, 'creee'),
+            ('futur', 5, 'creee'), ('terminee', -10, 'terminee'),
+        ]:
+            tache = Tache.objects.create(
+                titre=nom, description='-', createur=self.dg, statut=statut, date_echeance=now + timedelta(days=jours)
+            )
+            tache.agents_assignes.add(self.agent)
+            self.taches[nom] = tache
+
+    def test_taches(self):
+        annotees = {t.titre: t for t in Tache.objects.avec_delais()}
+        for nom, tache in self.taches.items():
+            tache = Tache.objects.get(pk=tache.pk)
+            self.assertEqual(annotees[nom].jours_restants, tache.jours_restants, nom)
+            self.assertEqual(annotees[nom].est_en_retard, tache.est_en_retard, nom)
+        self.assertEqual(set(Tache.objects.en_retard().values_list('titre', flat=True)), {'retard', 'hier'})
+
+        par_agent = list(Tache.objects.retards_par_agent())
+        self.assertEqual(len(par_agent), 1)
+        self.assertEqual((par_agent[0]['agents_assignes__username'], par_agent[0]['count']), ('agent_delais', 2))
+
+    def test_depenses(self):
+        depenses = {}
+        for jours in (0, 3, 7, 8, 20):
+            depense = Depense.objects.create(
+                quantite=1, prix_unitaire=Decimal('1000'), motif=f"Attente {jours}j", created_by=self.agent
+            )
+            Depense.objects.filter(pk=depense.pk).update(created_at=timezone.now() - timedelta(days=jours, hours=1))
+            depenses[jours] = depense
+        Depense.objects.filter(pk=depenses[20].pk).update(statut='payee')
+
+        for depense in Depense.objects.avec_delais():
+            reference = Depense.objects.get(pk=depense.pk)
+            self.assertEqual(depense.delai_attente, reference.delai_attente, depense.motif)
+            self.assertEqual(depense.est_en_retard, reference.est_en_retard, depense.motif)
+        self.assertEqual(list(Depense.objects.en_retard()), [depenses[8]])
+        self.assertEqual(
+            [d.pk for d in Depense.objects.en_attente_plus_anciennes()],
+            [depenses[j].pk for j in (8, 7, 3, 0)],
+        )
+
+    def test_vues_filtres_retard(self):
+        """Les vues filtrant sur est_en_retard (non filtrable par l'ORM) répondent"""
+        client = APIClient()
+        client.force_authenticate(self.dg)
+        # Version ETag puis statuts, priorités, retards par agent : une requête groupée chacun
+        with self.assertNumQueries(4):
+            response = client.get('/api/dashboard/donnees/taches/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['taches_retard_par_utilisateur'][0]['count'], 2)
+
+        response = client.get('/api/dashboard/donnees/indicateurs_cles/')
+        self.assertEqual(response.data['taches_en_retard'], 2)
+        response = client.get('/api/tasks/taches/en_retard/')
+        self.assertEqual([t['titre'] for t in response.data], ['retard', 'hier'])
+        self.assertTrue(all(t['est_en_retard'] for t in response.data))
+
+        client.force_authenticate(self.agent)
+        response = client.get('/api/dashboard/donnees/taches/')
+        self.assertEqual(response.data['mes_taches']['en_retard'], 2)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """Listes de tâches : nombre de requêtes constant et borné par le budget déclaré"""
+
+    def setUp(self):
+        self.dg = User.objects.create_user(username='dg_budget', password='pwd', role='dg')
+        self.agent = User.objects.create_user(username='agent_budget', password='pwd', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.dg)
+        self.total = 0
+
+    def grow(self, size):
+        echeance = timezone.now() - timedelta(days=1)
+        while self.total < size:
+            self.total += 1
+            agent = User.objects.create(username=f'agent_budget_{self.total}', role='agent')
+            tache = Tache.objects.create(
+                titre=f"Tâche {self.total}", description='-', createur=self.dg, statut='en_cours',
+                date_echeance=echeance,
+            )
+            tache.agents_assignes.add(self.agent, agent)
+            CommentaireTache.objects.create(tache=tache, auteur=agent, message="Point d'étape")
+            SousTache.objects.create(tache=tache, titre="Rapport", assigne_a=agent)
+            DemandeReport.objects.create(
+                tache=tache, demandeur=agent, date_demandee=echeance + timedelta(days=7), motif="Retard fournisseur"
+            )
+
+    def test_listes_taches(self):
+        for url in ('/api/tasks/taches/', '/api/tasks/taches/en_retard/', '/api/tasks/demandes-report/',
+                    '/api/tasks/commentaires/'):
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, self.grow)
+
+    def test_taches_agent(self):
+        self.client.force_authenticate(self.agent)
+        for url in ('/api/tasks/taches/', '/api/tasks/taches/mes_taches/'):
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, self.grow)
+
+    def test_depassement(self):
+        self.grow(3)
+        with mock.patch.object(TacheViewSet, 'query_budgets', {'list': 2}):
+            with self.assertRaises(QueryBudgetExceeded) as ctx:
+                self.client.get('/api/tasks/taches/')
+        self.assertIn('TacheViewSet.list', str(ctx.exception))
+        self.assertIn('SELECT', str(ctx.exception))
 
-# Create your tests here.
+    def test_en_tete(self):
+        self.grow(1)
+        response = self.client.get(f'/api/tasks/taches/{Tache.objects.get().pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response['X-Query-Count']), TacheViewSet.query_budgets['retrieve'])
@@ -2,24 +2,33 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q, Count, Case, When, IntegerField
 from django.utils import timezone
 from datetime import timedelta
 import csv
 from django.http import HttpResponse
 from .models import Tache, CommentaireTache, DemandeReport, SousTache
-from audit.models import AuditLog
-from notifications.services import NotificationService
+from .services import TacheService
 from .serializers import (
     TacheSerializer, CommentaireTacheSerializer, TacheActionSerializer,
     DemandeReportSerializer, SousTacheSerializer
 )
 from rest_framework.exceptions import PermissionDenied
 from .permissions import CanAssignTasks, CanValidateTasks, IsTaskOwnerOrAssignee, CanViewAllTasks
+from ipmf.downloads import serve_file
+from ipmf.etags import ConditionalGetMixin
+from ipmf.sync import DeltaSyncMixin
+from ipmf.throttling import ExportThrottle, StatisticsThrottle
 
-class TacheViewSet(viewsets.ModelViewSet):
+class TacheViewSet(ConditionalGetMixin, DeltaSyncMixin, viewsets.ModelViewSet):
     queryset = Tache.objects.all()
+    etag_scopes = ['tasks.tache', 'tasks.commentairetache', 'tasks.soustache', 'tasks.demandereport']
+    etag_actions = {'list', 'retrieve', 'mes_taches', 'en_retard', 'statistiques'}
+    etag_daily = True
     serializer_class = TacheSerializer
+    # Requêtes SQL par action, authentification comprise (ipmf/query_budget.py)
+    query_budgets = {'list': 7, 'retrieve': 6, 'mes_taches': 6, 'en_retard': 6, 'changes': 8}
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['statut', 'priorite', 'createur', 'agents_assignes']
     search_fields = ['numero', 'titre', 'description']
@@ -40,18 +49,35 @@ class TacheViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role in ['admin', 'dg']:
-            return Tache.objects.all()
+            queryset = Tache.objects.all()
         else:
             # Les utilisateurs voient les tâches qu'ils ont créées ou qui leur sont assignées
-            return Tache.objects.filter(
+            queryset = Tache.objects.filter(
                 Q(createur=user) | Q(agents_assignes=user)
             ).distinct()
+        if self.action in ('list', 'mes_taches', 'en_retard', 'changes'):
+            # Échéances calculées par la base pour toute la page
+            queryset = queryset.avec_delais()
+        if self.action in ('list', 'retrieve', 'mes_taches', 'en_retard', 'changes'):
+            queryset = queryset.pour_affichage()
+        return queryset
+
+    def sync_perimetres(self, user):
+        return None if user.role in ['admin', 'dg'] else [f'user:{user.pk}']
     
     def perform_create(self, serializer):
-        tache = serializer.save(createur=self.request.user)
-        self.log_action(self.request.user, f"Tache {tache.numero} creee", tache, action_type='create')
-        # Notifier les agents assignés
-        NotificationService.notify_task_assigned(tache)
+        with transaction.atomic():
+            tache = serializer.save(createur=self.request.user)
+            # Agents notifiés via l'événement d'affectation (m2m_changed)
+            TacheService.creer(tache, self.request.user)
+
+    @action(detail=True, methods=['get'], url_path='piece-jointe')
+    def telecharger_piece_jointe(self, request, pk=None):
+        """Télécharge la pièce jointe du résultat"""
+        tache = self.get_object()
+        if not tache.piece_jointe_resultat:
+            return Response({'error': 'Aucune pièce jointe'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_file(request, tache.piece_jointe_resultat)
     
     @action(detail=True, methods=['post'])
     def demarrer(self, request, pk=None):
@@ -68,20 +94,11 @@ class TacheViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        tache.statut = 'en_cours'
-        tache.date_debut_reelle = timezone.now()
-        tache.save()
-        
-        # Créer un commentaire si fourni
-        if serializer.validated_data.get('commentaire') or serializer.validated_data.get('attachment'):
-            CommentaireTache.objects.create(
-                tache=tache,
-                auteur=request.user,
-                message=f"Début de la tâche: {serializer.validated_data.get('commentaire', '')}",
-                piece_jointe=serializer.validated_data.get('attachment')
-            )
-        
-        self.log_action(request.user, f"Tache {tache.numero} demarree", tache)
+        TacheService.demarrer(
+            tache, request.user,
+            commentaire=serializer.validated_data.get('commentaire', ''),
+            piece_jointe=serializer.validated_data.get('attachment'),
+        )
         
         return Response(TacheSerializer(tache).data)
     
@@ -100,21 +117,12 @@ class TacheViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        tache.statut = 'terminee'
-        tache.date_fin_reelle = timezone.now()
-        tache.resultat = serializer.validated_data.get('resultat', '')
-        tache.save()
-        
-        # Créer un commentaire si fourni
-        if serializer.validated_data.get('commentaire') or serializer.validated_data.get('attachment'):
-            CommentaireTache.objects.create(
-                tache=tache,
-                auteur=request.user,
-                message=f"Tâche terminée: {serializer.validated_data.get('commentaire', '')}",
-                piece_jointe=serializer.validated_data.get('attachment')
-            )
-        
-        self.log_action(request.user, f"Tache {tache.numero} terminee", tache)
+        TacheService.terminer(
+            tache, request.user,
+            resultat=serializer.validated_data.get('resultat', ''),
+            commentaire=serializer.validated_data.get('commentaire', ''),
+            piece_jointe=serializer.validated_data.get('attachment'),
+        )
         
         return Response(TacheSerializer(tache).data)
     
@@ -139,22 +147,12 @@ class TacheViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        tache.statut = 'validee'
-        tache.valide_par = request.user
-        tache.date_validation = timezone.now()
-        tache.commentaire_validation = serializer.validated_data.get('commentaire', '')
-        tache.save()
-        
-        # Créer un commentaire
-        CommentaireTache.objects.create(
-            tache=tache,
-            auteur=request.user,
-            message=f"Tâche validée: {serializer.validated_data.get('commentaire', 'Validation effectuée')}",
-            piece_jointe=serializer.validated_data.get('attachment')
+        TacheService.valider(
+            tache, request.user,
+            commentaire=serializer.validated_data.get('commentaire', ''),
+            piece_jointe=serializer.validated_data.get('attachment'),
         )
         
-        self.log_action(request.user, f"Tache {tache.numero} validee", tache, action_type='validation')
-        
         return Response(TacheSerializer(tache).data)
     
     @action(detail=True, methods=['post'])
@@ -172,19 +170,12 @@ class TacheViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        tache.statut = 'annulee'
-        tache.save()
-        
-        # Créer un commentaire
-        CommentaireTache.objects.create(
-            tache=tache,
-            auteur=request.user,
-            message=f"Tâche annulée: {serializer.validated_data.get('commentaire', 'Annulation effectuée')}",
-            piece_jointe=serializer.validated_data.get('attachment')
+        TacheService.annuler(
+            tache, request.user,
+            commentaire=serializer.validated_data.get('commentaire', ''),
+            piece_jointe=serializer.validated_data.get('attachment'),
         )
         
-        self.log_action(request.user, f"Tache {tache.numero} annulee", tache)
-        
         return Response(TacheSerializer(tache).data)
     
     @action(detail=False, methods=['get'])
@@ -210,11 +201,11 @@ class TacheViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        taches_retard = self.get_queryset().filter(est_en_retard=True)
+        taches_retard = self.get_queryset().en_retard().order_by('date_echeance')
         serializer = self.get_serializer(taches_retard, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[StatisticsThrottle])
     def statistiques(self, request):
         """Statistiques des tâches"""
         user = request.user
@@ -227,7 +218,7 @@ class TacheViewSet(viewsets.ModelViewSet):
         # Statistiques globales
         stats_globales = Tache.objects.aggregate(
             total=Count('id'),
-            en_retard=Count('id', filter=Q(est_en_retard=True)),
+            en_retard=Count('id', filter=Tache.objects.q_en_retard()),
             terminees=Count('id', filter=Q(statut='terminee')),
             validees=Count('id', filter=Q(statut='validee')),
         )
@@ -256,19 +247,7 @@ class TacheViewSet(viewsets.ModelViewSet):
             'par_utilisateur': list(par_utilisateur),
         })
     
-    def log_action(self, user, message, tache=None, action_type='update'):
-        """Log une action via le module audit"""
-        AuditLog.log_action(
-            action_type=action_type,
-            module='tasks',
-            message=message,
-            utilisateur=user,
-            objet_type='Tache',
-            objet_id=str(tache.pk) if tache else None,
-            objet_repr=str(tache) if tache else None
-        )
-
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[ExportThrottle])
     def export_csv(self, request):
         """Exporter les tâches en CSV"""
         response = HttpResponse(content_type='text/csv')
@@ -294,32 +273,44 @@ class TacheViewSet(viewsets.ModelViewSet):
 class CommentaireTacheViewSet(viewsets.ModelViewSet):
     queryset = CommentaireTache.objects.all()
     serializer_class = CommentaireTacheSerializer
+    query_budgets = {'list': 3, 'retrieve': 2}
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         user = self.request.user
+        queryset = CommentaireTache.objects.select_related('auteur')
         if user.role in ['admin', 'dg']:
-            return CommentaireTache.objects.all()
+            return queryset
         else:
             # Les utilisateurs voient les commentaires des tâches qui les concernent
-            return CommentaireTache.objects.filter(
+            return queryset.filter(
                 Q(tache__createur=user) | Q(tache__agents_assignes=user)
             ).distinct()
     
     def perform_create(self, serializer):
         serializer.save(auteur=self.request.user)
 
+    @action(detail=True, methods=['get'], url_path='piece-jointe')
+    def telecharger_piece_jointe(self, request, pk=None):
+        """Télécharge la pièce jointe du commentaire"""
+        commentaire = self.get_object()
+        if not commentaire.piece_jointe:
+            return Response({'error': 'Aucune pièce jointe'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_file(request, commentaire.piece_jointe)
+
 class DemandeReportViewSet(viewsets.ModelViewSet):
     queryset = DemandeReport.objects.all()
     serializer_class = DemandeReportSerializer
+    query_budgets = {'list': 3, 'retrieve': 2}
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         user = self.request.user
+        queryset = DemandeReport.objects.select_related('tache', 'demandeur', 'repondu_par')
         if user.role in ['admin', 'dg']:
-            return DemandeReport.objects.all()
+            return queryset
         else:
-            return DemandeReport.objects.filter(demandeur=user)
+            return queryset.filter(demandeur=user)
     
     def perform_create(self, serializer):
         # Vérifier que l'utilisateur est assigné à la tâche
@@ -328,28 +319,9 @@ class DemandeReportViewSet(viewsets.ModelViewSet):
         if not tache.agents_assignes.filter(id=user.id).exists():
              raise PermissionDenied("Vous n'êtes pas assigné à cette tâche.")
              
-        demande = serializer.save(demandeur=user)
-        
-        # Notifier les admins/DG
-        NotificationService.send_notification(
-            recipient=None, # Broadcast to group if possible, or loop admins? 
-            # Simplified: assuming we notify specific roles later or loop here.
-            # For now, let's notify the task creator or a generic admin account if exists.
-            # Ideally NotificationService handles role-based notifs.
-            title="Nouvelle demande de report",
-            message=f"L'agent {user.username} demande un report pour la tâche {tache.numero}",
-            type='warning',
-            link=f"/tasks/{tache.id}"
-        )
-        # Notify task creator if different from demandeur
-        if tache.createur != user:
-             NotificationService.send_notification(
-                recipient=tache.createur,
-                title="Demande de report",
-                message=f"Demande de report pour votre tâche {tache.numero}",
-                type='warning',
-                link=f"/tasks/{tache.id}"
-            )
+        with transaction.atomic():
+            demande = serializer.save(demandeur=user)
+            TacheService.demander_report(demande, user)
 
     @action(detail=True, methods=['post'])
     def approuver(self, request, pk=None):
@@ -362,44 +334,7 @@ class DemandeReportViewSet(viewsets.ModelViewSet):
         if demande.statut != 'en_attente':
             return Response({'error': "Cette demande a déjà été traitée"}, status=status.HTTP_400_BAD_REQUEST)
             
-        # Appliquer le report
-        tache = demande.tache
-        ancien_echeance = tache.date_echeance
-        tache.date_echeance = demande.date_demandee
-        
-        # Si la tâche était en échec/terminée, on la remet en cours
-        if tache.statut == 'terminee' or tache.resultat == "ECHEC_AUTOMATIQUE":
-            tache.statut = 'en_cours'
-            tache.resultat = '' # Clear failure result
-            # tache.date_fin_reelle = None # Keep history? Or clear? Let's clear to indicate active.
-            tache.date_fin_reelle = None
-            
-        tache.save()
-        
-        # Mettre à jour la demande
-        demande.statut = 'approuvee'
-        demande.repondu_par = user
-        demande.date_reponse = timezone.now()
-        demande.commentaire_reponse = request.data.get('commentaire', '')
-        demande.save()
-        
-        # Audit
-        AuditLog.log_action(
-            user, 
-            f"Report approuvé pour tâche {tache.numero}. Nouvelle échéance: {tache.date_echeance}", 
-            demande, 
-            action_type='update'
-        )
-        
-        # Notification
-        NotificationService.send_notification(
-            recipient=demande.demandeur,
-            title="Demande de report approuvée",
-            message=f"Votre demande pour la tâche {tache.numero} a été approuvée.",
-            type='success',
-            link=f"/tasks/{tache.id}"
-        )
-        
+        TacheService.approuver_report(demande, user, request.data.get('commentaire', ''))
         return Response({'status': 'approuvee'})
 
     @action(detail=True, methods=['post'])
@@ -413,27 +348,7 @@ class DemandeReportViewSet(viewsets.ModelViewSet):
         if demande.statut != 'en_attente':
             return Response({'error': "Cette demande a déjà été traitée"}, status=status.HTTP_400_BAD_REQUEST)
             
-        demande.statut = 'rejetee'
-        demande.repondu_par = user
-        demande.date_reponse = timezone.now()
-        demande.commentaire_reponse = request.data.get('commentaire', '')
-        demande.save()
-        
-        AuditLog.log_action(
-            user, 
-            f"Report rejeté pour tâche {demande.tache.numero}", 
-            demande, 
-            action_type='update'
-        )
-        
-        NotificationService.send_notification(
-            recipient=demande.demandeur,
-            title="Demande de report rejetée",
-            message=f"Votre demande pour la tâche {demande.tache.numero} a été rejetée.",
-            type='error',
-            link=f"/tasks/{demande.tache.id}"
-        )
-        
+        TacheService.rejeter_report(demande, user, request.data.get('commentaire', ''))
         return Response({'status': 'rejetee'})
 class SousTacheViewSet(viewsets.ModelViewSet):
     queryset = SousTache.objects.all()
@@ -70,7 +70,7 @@ class UserProfileAdmin(admin.ModelAdmin):
             'fields': ('user',)
         }),
         ('Préférences', {
-            'fields': ('theme_preference', 'language', 'notifications_active')
+            'fields': ('theme_preference', 'language', 'notifications_active', 'notification_channels')
         }),
         ('Fichiers', {
             'fields': ('photo', 'photo_preview', 'signature', 'signature_preview')
@@ -0,0 +1,112 @@
+"""
+Authentification JWT avec résolution de l'utilisateur en cache.
+
+Chaque requête authentifiée chargeait la ligne CustomUser par son id alors que
+les permissions et les get_queryset ne consultent quasiment que `user.role`.
+L'utilisateur est ici reconstruit depuis un cache local au processus, validé
+par un numéro de version stocké dans le cache partagé (Django CACHES) et
+incrémenté à chaque sauvegarde/suppression de l'utilisateur.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+VERSION_KEY = 'users:auth_version:{}'
+
+# Cache local : {user_id: (version, expiration, valeurs des champs)}
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def _local_ttl():
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 300)
+
+
+def get_user_version(user_id):
+    """Version courante de l'utilisateur dans le cache partagé (créée au besoin)"""
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() évite d'écraser une version posée entre-temps par un autre worker
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_user(user_id):
+    """Invalide l'utilisateur dans tous les processus partageant le cache"""
+    cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+    with _local_lock:
+        _local_cache.pop(user_id, None)
+
+
+def clear_local_cache():
+    with _local_lock:
+        _local_cache.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication sans requête SQL tant que l'utilisateur n'a pas changé.
+
+    Le claim `is_active` du jeton permet de refuser un compte désactivé sans
+    même consulter le cache ; `role` est exposé au frontend (voir
+    IPMFTokenObtainPairSerializer).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if validated_token.get('is_active') is False:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        # Version lue avant la requête SQL : une sauvegarde concurrente
+        # invalidera l'entrée au lieu d'y figer une ligne périmée.
+        version = get_user_version(user_id)
+        user = self._get_cached_user(user_id, version)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            self._store_user(user_id, user, version)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+    def _get_cached_user(self, user_id, version):
+        entry = _local_cache.get(user_id)
+        if entry is None:
+            return None
+        cached_version, expiration, values = entry
+        if expiration < time.monotonic() or cached_version != version:
+            return None
+        # Nouvelle instance à chaque requête : aucune mutation partagée entre threads
+        field_names = [f.attname for f in self.user_model._meta.concrete_fields]
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+    def _store_user(self, user_id, user, version):
+        values = [getattr(user, f.attname) for f in self.user_model._meta.concrete_fields]
+        entry = (version, time.monotonic() + _local_ttl(), values)
+        with _local_lock:
+            _local_cache[user_id] = entry
+
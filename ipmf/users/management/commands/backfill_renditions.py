@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from users.models import UserProfile
+from users.utils import generate_profile_renditions
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons (vignettes, WebP) des photos et signatures existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Régénère aussi les déclinaisons existantes")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(
+            (Q(photo='') | Q(photo__isnull=True)) & (Q(signature='') | Q(signature__isnull=True))
+        )
+
+        total = 0
+        for profile in profiles.iterator():
+            for field in ('photo', 'signature'):
+                if not getattr(profile, field):
+                    continue
+                if getattr(profile, f'{field}_renditions') and not options['force']:
+                    continue
+                try:
+                    names = generate_profile_renditions(profile.pk, field)
+                except (OSError, ValueError) as e:
+                    self.stderr.write(f"{profile}: {field} illisible ({e})")
+                    continue
+                total += 1
+                self.stdout.write(f"{profile}: {field} -> {len(names)} déclinaison(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} image(s) traitée(s)."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:41
+
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_customuser_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='signature_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, upload_to=users.models.avatar_upload_path),
+        ),
+    ]
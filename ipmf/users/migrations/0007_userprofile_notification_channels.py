@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_userprofile_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='notification_channels',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
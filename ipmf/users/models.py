@@ -4,7 +4,9 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
 
-class CustomUser(AbstractUser):
+from ipmf.dirty import DirtyFieldsMixin
+
+class CustomUser(DirtyFieldsMixin, AbstractUser):
     phone_regex = RegexValidator(
         regex=r'^\+?1?\d{9,15}$',
         message="Format: '+261321234567'. 9-15 chiffres autorisés."
@@ -64,8 +66,9 @@ class CustomUser(AbstractUser):
 import os
 import uuid
 from django.db import models
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
+from .utils import delete_renditions, schedule_renditions
 
 def avatar_upload_path(instance, filename):
     """Génère un chemin unique pour chaque avatar : avatars/uuid.ext"""
@@ -77,7 +80,12 @@ class UserProfile(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='profile')
     signature = models.ImageField(upload_to='signatures/%Y/%m/', null=True, blank=True)
     photo = models.ImageField(upload_to=avatar_upload_path, null=True, blank=True)
+    # Déclinaisons générées hors requête : {"32": chemin, "32_webp": chemin, ...}
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    signature_renditions = models.JSONField(default=dict, blank=True, editable=False)
     notifications_active = models.BooleanField(default=True)
+    # Canaux externes acceptés {"email": true, "sms": false} ; canal absent : réglage par défaut du canal
+    notification_channels = models.JSONField(default=dict, blank=True)
     theme_preference = models.CharField(max_length=20, default='light', choices=[('light','Clair'),('dark','Sombre')])
     language = models.CharField(max_length=10, default='fr', choices=[('fr','Français'),('mg','Malagasy')])
     date_created = models.DateTimeField(auto_now_add=True)
@@ -86,6 +94,15 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Profil de {self.user.username}"
 
+    def get_rendition_name(self, field_name, key):
+        """Chemin d'une déclinaison, None si elle n'est pas (encore) générée"""
+        renditions = getattr(self, f'{field_name}_renditions') or {}
+        return renditions.get(key) if getattr(self, field_name) else None
+
+    def is_rendition_pending(self, field_name):
+        """Image présente dont les déclinaisons ne sont pas encore générées"""
+        return bool(getattr(self, field_name)) and not getattr(self, f'{field_name}_renditions')
+
 
 # --- SIGNALS POUR LE NETTOYAGE DU DISQUE ---
 
@@ -98,10 +115,18 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     if instance.signature:
         if os.path.isfile(instance.signature.path):
             os.remove(instance.signature.path)
+    delete_renditions(instance.photo_renditions)
+    delete_renditions(instance.signature_renditions)
 
 @receiver(pre_save, sender=UserProfile)
 def auto_delete_file_on_change(sender, instance, **kwargs):
     """Supprime l'ancien fichier du stockage lorsqu'un nouveau est uploadé."""
+    # Images nouvellement envoyées : déclinaisons à générer après sauvegarde
+    instance._renditions_pending = [
+        field for field in ('photo', 'signature')
+        if getattr(instance, field) and not getattr(instance, field)._committed
+    ]
+
     if not instance.pk:
         return False
 
@@ -116,6 +141,8 @@ def auto_delete_file_on_change(sender, instance, **kwargs):
     if old_photo and new_photo != old_photo:
         if os.path.isfile(old_photo.path):
             os.remove(old_photo.path)
+        delete_renditions(old_profile.photo_renditions)
+        instance.photo_renditions = {}
             
     # Nettoyage signature
     new_sig = instance.signature
@@ -123,3 +150,14 @@ def auto_delete_file_on_change(sender, instance, **kwargs):
     if old_sig and new_sig != old_sig:
         if os.path.isfile(old_sig.path):
             os.remove(old_sig.path)
+        delete_renditions(old_profile.signature_renditions)
+        instance.signature_renditions = {}
+
+@receiver(post_save, sender=UserProfile)
+def schedule_profile_renditions(sender, instance, raw=False, **kwargs):
+    """Planifie la génération des déclinaisons (vignettes, WebP) hors requête."""
+    if raw:
+        return
+    for field in getattr(instance, '_renditions_pending', []):
+        schedule_renditions(instance.pk, field)
+    instance._renditions_pending = []
@@ -1,16 +1,33 @@
 # backend/apps/users/serializers.py
 
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
 from .models import UserProfile
-from .utils import process_avatar
 
 User = get_user_model()
 
+def _media_url(request, name):
+    """URL absolue (si requête disponible) d'un fichier du stockage par défaut"""
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def _renditions_urls(request, renditions):
+    return {key: _media_url(request, name) for key, name in (renditions or {}).items()}
+
+
 class UserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     role_display = serializers.CharField(source='get_role_display', read_only=True)
     photo_url = serializers.SerializerMethodField()
+    photo_pending = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = User
@@ -18,22 +35,34 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'username', 'email', 'first_name', 'last_name', 'full_name',
             'role', 'role_display', 'telephone', 'departement', 'date_embauche',
             'is_active', 'is_staff', 'is_superuser', 'date_created', 'date_updated', 
-            'last_login', 'photo_url'
+            'last_login', 'photo_url', 'photo_pending', 'photo_renditions'
+        ]
+        read_only_fields = [
+            'id', 'date_created', 'date_updated', 'last_login', 'is_staff', 'is_superuser',
+            'photo_url', 'photo_pending', 'photo_renditions',
         ]
-        read_only_fields = ['id', 'date_created', 'date_updated', 'last_login', 'is_staff', 'is_superuser', 'photo_url']
         extra_kwargs = {'password': {'write_only': True, 'required': False}}
     
     def get_full_name(self, obj):
         return obj.get_full_name()
 
     def get_photo_url(self, obj):
-        try:
-            if hasattr(obj, 'profile') and obj.profile.photo:
-                request = self.context.get('request')
-                return request.build_absolute_uri(obj.profile.photo.url) if request else obj.profile.photo.url
-        except Exception:
-            pass
-        return None
+        # Profil chargé par select_related('profile') : aucune requête par ligne
+        profile = getattr(obj, 'profile', None)
+        if profile is None or not profile.photo:
+            return None
+        # Jamais l'original : déclinaison 400 px, None tant qu'elle n'est pas générée (photo_pending)
+        return _media_url(self.context.get('request'), profile.get_rendition_name('photo', '400'))
+
+    def get_photo_pending(self, obj):
+        profile = getattr(obj, 'profile', None)
+        return profile is not None and profile.is_rendition_pending('photo')
+
+    def get_photo_renditions(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile is None:
+            return {}
+        return _renditions_urls(self.context.get('request'), profile.photo_renditions)
     
     def create(self, validated_data):
         password = validated_data.pop('password', None)
@@ -69,31 +98,33 @@ class AvatarUpdateSerializer(serializers.ModelSerializer):
         if value.content_type not in valid_mime_types:
             raise serializers.ValidationError("Format non supporté. Utilisez JPG, PNG ou WEBP.")
 
-        # 3. Traitement de l'image (redimensionnement & optimisation)
-        try:
-            processed_image = process_avatar(value)
-            # On conserve le nom d'origine pour l'extension, le modèle gérera le renommage UUID
-            processed_image.name = value.name
-            return processed_image
-        except Exception as e:
-            raise serializers.ValidationError(f"Erreur lors du traitement de l'image : {str(e)}")
+        # 3. Image vérifiée par le champ (Pillow, sans décodage complet) ;
+        #    métadonnées retirées et déclinaisons générées après commit, hors requête
+        return value
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     photo_url = serializers.SerializerMethodField()
+    photo_pending = serializers.SerializerMethodField()
     signature_url = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
+    signature_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProfile
-        fields = '__all__'
+        # La photo d'origine n'est jamais exposée (upload : AvatarUpdateSerializer)
+        exclude = ['photo']
         read_only_fields = ['user', 'date_created', 'date_updated']
     
     def get_photo_url(self, obj):
-        if obj.photo:
-            request = self.context.get('request')
-            return request.build_absolute_uri(obj.photo.url) if request else obj.photo.url
-        return None
+        if not obj.photo:
+            return None
+        return _media_url(self.context.get('request'), obj.get_rendition_name('photo', '400'))
+
+    def get_photo_pending(self, obj):
+        """Photo téléversée dont les déclinaisons ne sont pas encore générées"""
+        return obj.is_rendition_pending('photo')
     
     def get_signature_url(self, obj):
         if obj.signature:
@@ -101,6 +132,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.signature.url) if request else obj.signature.url
         return None
 
+    def get_photo_renditions(self, obj):
+        return _renditions_urls(self.context.get('request'), obj.photo_renditions)
+
+    def get_signature_renditions(self, obj):
+        return _renditions_urls(self.context.get('request'), obj.signature_renditions)
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'}, min_length=8)
@@ -141,3 +178,27 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             instance.set_password(password)
         instance.save()
         return instance
+
+
+class IPMFTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Jetons enrichis des claims `role` et `is_active`.
+    La mise à jour de last_login est un UPDATE unique différé après commit
+    (sans save() : ni signaux de profil, ni audit).
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['role'] = user.role
+        token['is_active'] = user.is_active
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        user_id = self.user.pk
+        now = timezone.now()
+        transaction.on_commit(
+            lambda: User.objects.filter(pk=user_id).update(last_login=now)
+        )
+        return data
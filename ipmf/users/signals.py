@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import UserProfile
+from .authentication import invalidate_user
 
 User = get_user_model()
 
@@ -22,5 +23,16 @@ def save_user_profile(sender, instance, **kwargs):
     """
     Sauvegarde automatiquement le profil utilisateur
     """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        instance.profile.save()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Invalide l'utilisateur mis en cache par CachedJWTAuthentication
+    """
+    invalidate_user(instance.pk)
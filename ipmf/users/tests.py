@@ -1,3 +1,149 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication, clear_local_cache
+from .models import UserProfile
+from .serializers import UserSerializer
+from .utils import strip_metadata
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        clear_local_cache()
+        self.user = User.objects.create_user(username='agent_auth', password='pwd-12345', role='agent')
+        self.client = APIClient()
+
+    def _authenticate(self):
+        token = AccessToken.for_user(self.user)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_token_contient_role_et_statut(self):
+        """Le jeton obtenu embarque role / is_active et last_login est mis à jour"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/', {'username': 'agent_auth', 'password': 'pwd-12345'})
+        self.assertEqual(response.status_code, 200)
+
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['role'], 'agent')
+        self.assertTrue(token['is_active'])
+
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_utilisateur_resolu_sans_requete(self):
+        """La seconde authentification ne recharge pas l'utilisateur"""
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+        with self.assertNumQueries(0):
+            user = self._authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.role, 'agent')
+
+    def test_invalidation_sur_sauvegarde(self):
+        """Une modification de l'utilisateur invalide le cache"""
+        self._authenticate()
+
+        self.user.role = 'comptable'
+        self.user.save()
+        self.assertEqual(self._authenticate().role, 'comptable')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+
+class ProfileRenditionsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=self.media_root, IMAGE_RENDITIONS_SYNC=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = User.objects.create_user(username='agent_photo', password='pwd', role='agent')
+
+    def _image(self, name='photo.jpg', size=(1200, 800), fmt='JPEG'):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Appareil'  # Make
+        Image.new('RGB', size, 'navy').save(buffer, format=fmt, exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_declinaisons_photo(self):
+        """Les vignettes carrées JPEG/WebP sont générées sans métadonnées"""
+        profile = UserProfile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.photo = self._image()
+            profile.save()
+
+        profile.refresh_from_db()
+        self.assertEqual(set(profile.photo_renditions), {'400', '400_webp', '128', '128_webp', '32', '32_webp'})
+        with default_storage.open(profile.photo_renditions['32']) as f:
+            vignette = Image.open(f)
+            self.assertEqual(vignette.size, (32, 32))
+            self.assertEqual(len(vignette.getexif()), 0)
+
+    def test_declinaisons_signature(self):
+        """Les signatures gardent leur ratio"""
+        profile = UserProfile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.signature = self._image('signature.png', size=(800, 200), fmt='PNG')
+            profile.save()
+
+        profile.refresh_from_db()
+        with default_storage.open(profile.signature_renditions['128']) as f:
+            self.assertEqual(Image.open(f).size, (128, 32))
+
+    def test_upload_sans_metadonnees(self):
+        """Original réécrit sans EXIF hors requête, jamais servi ; déclinaison en attente signalée"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch('users.utils.strip_metadata', wraps=strip_metadata) as strip:
+                response = client.post('/api/users/profiles/upload-avatar/', {'photo': self._image()}, format='multipart')
+                # Réponse construite avant la génération (après commit)
+                strip.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('photo', response.data)
+        self.assertEqual((response.data['photo_url'], response.data['photo_pending']), (None, True))
+
+        profile = UserProfile.objects.get(user=self.user)
+        with default_storage.open(profile.photo.name) as f:
+            original = Image.open(f)
+            self.assertEqual(original.size, (1200, 800))
+            self.assertEqual(len(original.getexif()), 0)
+
+        data = client.get('/api/users/profiles/my_profile/').data
+        self.assertNotIn('photo', data)
+        self.assertTrue(data['photo_url'].endswith('_400.jpg'))
+        self.assertFalse(data['photo_pending'])
+
+    def test_photo_url_sans_requete_profil(self):
+        """photo_url utilise le profil joint par select_related"""
+        profile = UserProfile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.photo = self._image()
+            profile.save()
 
-# Create your tests here.
+        users = list(User.objects.select_related('profile').filter(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            data = UserSerializer(users, many=True).data
+        self.assertTrue(data[0]['photo_url'].endswith('_400.jpg'))
+        self.assertIn('32_webp', data[0]['photo_renditions'])
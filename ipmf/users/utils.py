@@ -1,36 +1,194 @@
 import os
-from PIL import Image
-from django.core.files.base import ContentFile
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
-def process_avatar(image_file, size=(400, 400)):
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Tailles (px) des déclinaisons générées pour chaque type d'image
+PHOTO_RENDITION_SIZES = (400, 128, 32)
+SIGNATURE_RENDITION_SIZES = (400, 128)
+
+# Pool dédié : le traitement d'image ne bloque jamais un worker de requête
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='renditions')
+
+
+def _open_reduced(image_file, target):
     """
-    Redimensionne et optimise l'image de l'avatar.
-    Retourne un objet ContentFile prêt à être sauvegardé.
+    Ouvre une image en évitant le décodage pleine résolution :
+    draft() pour le JPEG (décodage DCT à l'échelle), reduce() sinon.
+    L'orientation EXIF est appliquée puis toutes les métadonnées supprimées.
     """
     img = Image.open(image_file)
-    
-    # Conversion en RGB si nécessaire (pour gérer les PNG avec transparence vers JPEG/WebP)
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-    
-    # Redimensionnement (Thumbnail garde le ratio, Resize force la taille)
-    # Pour un avatar, on veut généralement un carré centré (Crop)
-    
+    img.draft('RGB', (target, target))
+    img = ImageOps.exif_transpose(img)
+
+    factor = min(img.size) // target
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    img.info = {}
+    return img
+
+
+def _crop_square(img):
     width, height = img.size
-    new_side = min(width, height)
-    left = (width - new_side) / 2
-    top = (height - new_side) / 2
-    right = (width + new_side) / 2
-    bottom = (height + new_side) / 2
-    
-    # Crop central
-    img = img.crop((left, top, right, bottom))
-    img = img.resize(size, Image.Resampling.LANCZOS)
-    
-    # Sauvegarde dans un buffer
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    return img.crop((left, top, left + side, top + side))
+
+
+def _encode(img, fmt):
     buffer = BytesIO()
-    # On reste en JPEG pour la compatibilité maximale, ou WebP si souhaité
-    img.save(buffer, format='JPEG', quality=85, optimize=True)
-    
-    return ContentFile(buffer.getvalue())
+    if fmt == 'JPEG':
+        img.save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'PNG':
+        img.save(buffer, format='PNG', optimize=True)
+    else:
+        img.save(buffer, format='WEBP', quality=80, method=4)
+    return buffer.getvalue()
+
+
+def strip_metadata(image_file):
+    """
+    Copie d'une image téléversée sans métadonnées (EXIF, dont la position GPS,
+    profils, commentaires), orientation EXIF appliquée, format et dimensions
+    conservés. Retourne un ContentFile de même nom.
+    """
+    img = Image.open(image_file)
+    fmt = img.format
+    img = ImageOps.exif_transpose(img)
+    img.info = {}
+    fmt = fmt if fmt in ('JPEG', 'PNG') else 'WEBP'
+    if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif fmt == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    return ContentFile(_encode(img, fmt), name=image_file.name)
+
+
+def build_renditions(image_file, sizes, square=True):
+    """
+    Produit les déclinaisons d'une image en un seul décodage.
+    Retourne {clé: (extension, octets)} avec les clés '<taille>' et '<taille>_webp'.
+
+    - square=True (avatars) : recadrage carré centré, JPEG + WebP
+    - square=False (signatures) : ratio conservé, transparence conservée, PNG + WebP
+    """
+    img = _open_reduced(image_file, max(sizes))
+    if square:
+        img = _crop_square(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        base_format, base_ext = 'JPEG', 'jpg'
+    else:
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        base_format, base_ext = 'PNG', 'png'
+
+    renditions = {}
+    # Du plus grand au plus petit : chaque taille est dérivée de la précédente
+    for size in sorted(sizes, reverse=True):
+        if square:
+            img = img.resize((size, size), Image.Resampling.LANCZOS)
+        else:
+            img = img.copy()
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        renditions[str(size)] = (base_ext, _encode(img, base_format))
+        renditions[f'{size}_webp'] = ('webp', _encode(img, 'WEBP'))
+    return renditions
+
+
+def _rendition_name(source_name, key, ext):
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    size = key.split('_')[0]
+    return os.path.join(directory, 'renditions', f'{stem}_{size}.{ext}')
+
+
+def delete_renditions(renditions):
+    """Supprime du stockage les fichiers d'un dictionnaire de déclinaisons"""
+    for name in (renditions or {}).values():
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning("Impossible de supprimer la déclinaison %s", name)
+
+
+# champ: (champ des déclinaisons, tailles, carré, original réécrit sans métadonnées)
+RENDITION_FIELDS = {
+    'photo': ('photo_renditions', PHOTO_RENDITION_SIZES, True, True),
+    'signature': ('signature_renditions', SIGNATURE_RENDITION_SIZES, False, False),
+}
+
+
+def generate_profile_renditions(profile_id, field_name):
+    """
+    Génère et enregistre les déclinaisons d'une image de profil ; pour la
+    photo, remplace aussi l'original par une copie sans métadonnées (EXIF,
+    position GPS), décodée ici plutôt que pendant la requête d'upload.
+    Écrit via update() : aucun signal de profil n'est redéclenché.
+    """
+    from .models import UserProfile
+
+    renditions_field, sizes, square, strip_original = RENDITION_FIELDS[field_name]
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is None:
+        return {}
+    image = getattr(profile, field_name)
+    if not image:
+        return {}
+
+    original = None
+    with image.open('rb') as source:
+        rendered = build_renditions(source, sizes, square=square)
+        if strip_original:
+            source.seek(0)
+            original = strip_metadata(source)
+
+    names = {}
+    for key, (ext, data) in rendered.items():
+        names[key] = default_storage.save(_rendition_name(image.name, key, ext), ContentFile(data))
+    fields = {renditions_field: names}
+    if original is not None:
+        fields[field_name] = image.storage.save(image.name, original)
+
+    # L'image a pu être remplacée pendant le traitement : on n'écrase pas
+    updated = UserProfile.objects.filter(pk=profile_id, **{field_name: image.name}).update(**fields)
+    if not updated:
+        delete_renditions(names)
+        if original is not None:
+            image.storage.delete(fields[field_name])
+        return {}
+    if original is not None:
+        image.storage.delete(image.name)
+
+    delete_renditions({k: v for k, v in getattr(profile, renditions_field).items() if v not in names.values()})
+    return names
+
+
+def _run_renditions(profile_id, field_name):
+    try:
+        generate_profile_renditions(profile_id, field_name)
+    except Exception:
+        logger.exception("Échec de génération des déclinaisons (%s, profil %s)", field_name, profile_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(profile_id, field_name):
+    """
+    Planifie la génération après commit, hors du thread de requête.
+    IMAGE_RENDITIONS_SYNC=True force une exécution immédiate (tests, commandes).
+    """
+    if getattr(settings, 'IMAGE_RENDITIONS_SYNC', False):
+        transaction.on_commit(lambda: generate_profile_renditions(profile_id, field_name))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_run_renditions, profile_id, field_name))
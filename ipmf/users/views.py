@@ -13,6 +13,7 @@ from .serializers import (
     UserUpdateSerializer, AvatarUpdateSerializer
 )
 from .permissions import IsAdminUser, IsOwnerOrAdmin, CanManageUsers, CanViewReports
+from ipmf.throttling import StatisticsThrottle
 
 User = get_user_model()
 
@@ -50,17 +51,19 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # Profil joint : photo_url sans requête par utilisateur
+        users = User.objects.select_related('profile')
         if user.role == 'admin':
-            return User.objects.all()
+            return users.all()
         elif user.role == 'dg':
-            return User.objects.exclude(role='admin')
+            return users.exclude(role='admin')
         elif user.role in ['comptable', 'caisse']:
-            return User.objects.filter(
+            return users.filter(
                 Q(id=user.id) | 
                 Q(departement=user.departement) |
                 Q(role__in=['agent', 'superviseur_it'])
             )
-        return User.objects.filter(id=user.id)
+        return users.filter(id=user.id)
 
     def perform_create(self, serializer):
         serializer.save()
@@ -82,7 +85,10 @@ class UserViewSet(viewsets.ModelViewSet):
         roles = dict(User.ROLE_CHOICES)
         return Response(roles)
 
-    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, CanViewReports])
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=[permissions.IsAuthenticated, CanViewReports], throttle_classes=[StatisticsThrottle],
+    )
     def stats(self, request):
         queryset = self.get_queryset()
         stats = {
@@ -98,7 +104,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def activate(self, request, pk=None):
         user = self.get_object()
         user.is_active = not user.is_active
-        user.save()
+        user.save_dirty()
         action = "activé" if user.is_active else "désactivé"
         return Response({'message': f'Utilisateur {action} avec succès', 'is_active': user.is_active})
 
@@ -109,7 +115,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if not new_password:
             return Response({'error': 'Le nouveau mot de passe est requis'}, status=status.HTTP_400_BAD_REQUEST)
         user.set_password(new_password)
-        user.save()
+        user.save_dirty()
         return Response({'message': 'Mot de passe réinitialisé avec succès'})
 
 